@@ -1,8 +1,37 @@
 """LangGraph agent module."""
 
-from .graph import graph, init_patient_info, MainGraphState, create_main_graph
+import sys
+import types
+
 from .schema import MainGraphState, MDTGraphState, ExpertGroupState, SharedBlackboard
 
+# graph 相关对象在首次访问时才构建，避免导入子模块（工具、工具函数、测试）时
+# 就加载全部模型与工具依赖并编译主图
+_GRAPH_EXPORTS = ("graph", "create_main_graph", "init_patient_info")
+
+
+def __getattr__(name):
+    if name in _GRAPH_EXPORTS:
+        import importlib
+        graph_module = importlib.import_module(".graph", __name__)
+        globals().update({export: getattr(graph_module, export) for export in _GRAPH_EXPORTS})
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _PackageModule(types.ModuleType):
+    def __setattr__(self, name, value):
+        # 导入 DeepRareAgent.graph 子模块时，导入系统会把包属性 graph 设为子模块本身，
+        # 之后 `from DeepRareAgent import graph` 拿到的就不是编译后的主图；忽略这次绑定，
+        # 让 graph 始终经 __getattr__ 解析为主图（与原先的 `from .graph import graph` 一致）
+        if name == "graph" and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _PackageModule
+
+
 __all__ = [
     "graph",
     "create_main_graph",
@@ -37,7 +37,8 @@ class Loader:
         self._config = self._load_from_yaml()
 
     def _load_from_yaml(self) -> ConfigObject:
-        config_path = self.project_root / "config.yml"
+        # DEEPRARE_CONFIG_PATH 可指定其他配置文件（配置扫描等场景），相对路径字段仍按项目根目录解析
+        config_path = Path(os.getenv("DEEPRARE_CONFIG_PATH") or self.project_root / "config.yml")
 
         if not config_path.exists():
             # 这里的报错信息更友好一点
@@ -17,30 +17,18 @@ from DeepRareAgent.config import settings
 from DeepRareAgent.p01pre_diagnosis_agent import create_pre_diagnosis_node
 from DeepRareAgent.p02_mdt.graph import create_mdt_graph
 from DeepRareAgent.p03summary_agent import summary_node
-from DeepRareAgent.schema import MainGraphState
+from DeepRareAgent.schema import MainGraphState, init_patient_info
+from DeepRareAgent.utils.loop_watchdog import loop_watchdog_callbacks
+from DeepRareAgent.utils.profiling import profile_node
+from DeepRareAgent.utils.state_size import state_size_callbacks
+from DeepRareAgent.utils.tracing import tracing_callbacks
+from DeepRareAgent.utils.usage import usage_callbacks
 
 from langfuse.langchain import CallbackHandler
 langfuse_handler = CallbackHandler()
 
 
-# --- 3. 状态初始化辅助函数 ---
-def init_patient_info() -> Dict[str, Any]:
-    """
-    初始化患者信息结构，确保所有必需字段都存在。
-    """
-    return {
-        "base_info": {},
-        "symptoms": [],
-        "vitals": [],
-        "exams": [],
-        "medications": [],
-        "family_history": [],
-        "past_medical_history": [],
-        "others": []
-    }
-
-
-# --- 4. 准备MDT的中间节点 ---
+# --- 3. 准备MDT的中间节点 ---
 async def prepare_for_mdt_node(state: MainGraphState):
     """
     在进入MDT之前的准备节点：生成对话总结
@@ -121,7 +109,7 @@ async def prepare_for_mdt_node(state: MainGraphState):
         }
 
 
-# --- 5. 路由逻辑 ---
+# --- 4. 路由逻辑 ---
 def route_after_prediagnosis(state: MainGraphState) -> str:
     """
     预诊断后的路由判断：
@@ -134,11 +122,15 @@ def route_after_prediagnosis(state: MainGraphState) -> str:
 
 
 
-# --- 6. 构建主图 ---
-def create_main_graph():
+# --- 5. 构建主图 ---
+def create_main_graph(checkpointer=None):
     """
     创建罕见病诊断系统主图
 
+    Args:
+        checkpointer: 可选的检查点（基准测试等脚本需要按线程续跑或回溯时传入；
+            通过 LangGraph API 部署时由平台注入，无需传入）
+
     流程：
     START → 预诊断 → (判断) → 准备MDT → MDT 会诊 → 汇总报告 → END
                        ↓
@@ -148,17 +140,17 @@ def create_main_graph():
 
     # 1. 添加预诊断节点
     prediagnosis_node = create_pre_diagnosis_node(settings=settings)
-    workflow.add_node("prediagnosis", prediagnosis_node)
+    workflow.add_node("prediagnosis", profile_node("prediagnosis", prediagnosis_node))
 
     # 2. 添加准备MDT节点（生成对话总结）
-    workflow.add_node("prepare_mdt", prepare_for_mdt_node)
+    workflow.add_node("prepare_mdt", profile_node("prepare_mdt", prepare_for_mdt_node))
 
     # 3. 添加 MDT 多专家会诊子图（作为一个节点）
     mdt_graph = create_mdt_graph()
     workflow.add_node("mdt_diagnosis", mdt_graph)
 
     # 4. 添加汇总节点
-    workflow.add_node("summary", summary_node)
+    workflow.add_node("summary", profile_node("summary", summary_node))
 
     # 5. 连接边
     # START → 预诊断
@@ -183,7 +175,11 @@ def create_main_graph():
     # 汇总报告 → END
     workflow.add_edge("summary", END)
 
-    return workflow.compile(name="RareDiagnosisSystem").with_config({"callbacks": [langfuse_handler]})
+    # tracing / 用量统计 / 状态体积 / 事件循环监测未启用时对应的回调列表为空；
+    # 状态体积写入 tracing span，需排在 tracing 之后
+    callbacks = ([langfuse_handler] + tracing_callbacks() + usage_callbacks() + state_size_callbacks()
+                 + loop_watchdog_callbacks())
+    return workflow.compile(name="RareDiagnosisSystem", checkpointer=checkpointer).with_config({"callbacks": callbacks})
 
 
 # 编译主图
@@ -23,6 +23,9 @@ from langchain.agents.middleware import AgentMiddleware, hook_config
 from DeepRareAgent.tools.patientinfo import PatientInfoManger
 from DeepRareAgent.states.prediagnosis import PreDiagnosisState
 from DeepRareAgent.utils.model_factory import create_llm_from_config
+from DeepRareAgent.utils.llm_governor import LANE_INTERACTIVE, llm_priority
+from DeepRareAgent.utils.prompt_cache import PromptCacheMiddleware
+from DeepRareAgent.utils.cassette import CassetteMiddleware
 
 warnings.filterwarnings("ignore", category=UserWarning, module="langchain")
 
@@ -114,7 +117,8 @@ def create_pre_diagnosis_node(
         model=model,
         tools=all_tools,
         state_schema=PreDiagnosisState,
-        middleware=[PatientContextPlugin()],
+        # 系统提示词与历史对话保持在前，患者信息快照追加在末尾，便于 provider 前缀缓存
+        middleware=[PatientContextPlugin(), PromptCacheMiddleware("pre_diagnosis"), CassetteMiddleware()],
         system_prompt=system_prompt_str,
     )
 
@@ -128,9 +132,10 @@ def create_pre_diagnosis_node(
         2. trigger_deep_diagnosis 工具会通过 Command 自动更新 start_diagnosis
         3. 直接返回 agent 的结果
         """
-        # 调用 agent
+        # 调用 agent（交互式对话走 LLM 优先通道，排在后台 MDT/汇总调用之前）
         state = state.copy()
-        result = await internal_agent.ainvoke(state)
+        with llm_priority(LANE_INTERACTIVE):
+            result = await internal_agent.ainvoke(state)
 
         # 提取最后一条 AI 回复消息（过滤掉工具调用等中间消息）
         messages = result.get('messages', [])
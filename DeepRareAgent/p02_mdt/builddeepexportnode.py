@@ -19,9 +19,12 @@ from langchain.agents.middleware import AgentState, AgentMiddleware
 
 # 1. 核心导入
 from DeepRareAgent.config import settings
-from DeepRareAgent.tools import get_all_tools, get_all_tools_with_biomcp_sync, default_TOOL_EXCLUDE_LIST
+from DeepRareAgent.tools import TOOL_REGISTRY, get_tool
 from DeepRareAgent.tools.patientinfo import patient_info_to_text
 from DeepRareAgent.utils.model_factory import create_llm_from_config
+from DeepRareAgent.utils.prompt_cache import PromptCacheMiddleware
+from DeepRareAgent.utils.context_budget import ContextBudgetMiddleware
+from DeepRareAgent.utils.cassette import CassetteMiddleware
 
 warnings.filterwarnings("ignore", category=UserWarning, module="langchain")
 
@@ -56,10 +59,13 @@ def create_deep_export_node(
     active_settings = custom_settings
     
     # 2.2 使用 main_agent 参数来初始化主模型
-    llm_main = create_llm_from_config(active_settings.main_agent)
-    llm_main.profile = {
-        "max_input_tokens": getattr(active_settings, "max_input_tokens", 80000)
-    }
+    # 模型实例来自客户端池、可能被其他节点共享，这里用浅拷贝设置 profile（底层连接池仍复用）
+    max_input_tokens = getattr(active_settings, "max_input_tokens", 80000)
+    llm_main = create_llm_from_config(active_settings.main_agent).model_copy(update={
+        "profile": {
+            "max_input_tokens": max_input_tokens
+        }
+    })
 
     # 2.7 构建工具错误处理中间件（支持异步）
     class ToolErrorHandlerMiddleware(AgentMiddleware):
@@ -123,10 +129,9 @@ def create_deep_export_node(
         selected_tools = []
         for t_name in getattr(sub_cfg, "additional_tools", []):
             if not t_name: continue # Skip empty strings
-            if t_name in default_TOOL_EXCLUDE_LIST:
-                # pass
-                selected_tools.append(default_TOOL_EXCLUDE_LIST[t_name])
-                pass
+            if t_name in TOOL_REGISTRY:
+                # 按需加载：只有被配置引用的工具模块才会被导入
+                selected_tools.append(get_tool(t_name))
             else:
                 raise ValueError(f"Unsupported tool to add: {t_name}")
         system_prompt = _load_prompt_file(sub_cfg.system_prompt_path)
@@ -143,7 +148,13 @@ def create_deep_export_node(
             system_prompt=system_prompt,
             tools=selected_tools, 
             model=llm_sub,
-            middleware=[ToolErrorHandlerMiddleware(), ContextMiddleware()],
+            middleware=[
+                ToolErrorHandlerMiddleware(),
+                CassetteMiddleware(),
+                ContextMiddleware(),
+                ContextBudgetMiddleware(max_input_tokens, sub_id),
+                PromptCacheMiddleware(sub_id),
+            ],
         )
         return sub_agent
 
@@ -165,8 +176,8 @@ def create_deep_export_node(
     selected_tools = []
     for i in getattr(active_settings.main_agent, "additional_tools", []):
         if not i: continue
-        if i in default_TOOL_EXCLUDE_LIST:
-            selected_tools.append(default_TOOL_EXCLUDE_LIST[i])
+        if i in TOOL_REGISTRY:
+            selected_tools.append(get_tool(i))
         else:
             raise ValueError(f"Unsupported tool to add: {i}")
 
@@ -191,7 +202,16 @@ def create_deep_export_node(
         # subagent_exclude_tools=sub_exculede_tools,
         subagents=subagents,
         system_prompt=full_main_prompt,
-        middleware=[ToolErrorHandlerMiddleware(), ContextMiddleware()],  # 启用工具错误处理中间件（支持异步）
+        # 启用工具错误处理中间件（支持异步）；ContextBudgetMiddleware 在每次调用前把 messages 控制在
+        # max_input_tokens 以内；PromptCacheMiddleware 为系统提示词+工具说明这段不变前缀打缓存断点；
+        # CassetteMiddleware 在录制 / 回放上下文中记录或回放工具 I/O（放在错误处理之内，回放的错误同样被转成提示）
+        middleware=[
+            ToolErrorHandlerMiddleware(),
+            CassetteMiddleware(),
+            ContextMiddleware(),
+            ContextBudgetMiddleware(max_input_tokens, active_settings.main_agent.name),
+            PromptCacheMiddleware(active_settings.main_agent.name),
+        ],
         debug=False
     )
 
@@ -1,14 +1,78 @@
 import asyncio
+import json
 import os
 import json5
-from typing import Any, Dict, List, Optional, Callable
+from typing import Any, Dict, List, Optional, Callable, Tuple
+from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from DeepRareAgent.schema import MDTGraphState, ExpertGroupState, SharedBlackboard
 from DeepRareAgent.config import settings
 from DeepRareAgent.tools.patientinfo import patient_info_to_text
 from langchain_core.runnables import RunnableConfig
 from DeepRareAgent.utils.model_factory import create_llm_from_config
-from DeepRareAgent.utils.json_utils import parse_json_from_markdown
+from DeepRareAgent.utils.json_utils import parse_json_from_markdown, coerce_bool
+from DeepRareAgent.utils.context_budget import apply_context_budget
+
+# 审核结论的输出方式:
+#   tool        - 强制调用 ReviewVerdict 工具（provider 原生 tool calling，默认）
+#   json_schema - provider 原生 JSON Schema 结构化输出
+#   text        - 旧方式，从正文中解析 JSON
+REVIEWER_OUTPUT_MODES = ("tool", "json_schema", "text")
+
+
+class ReviewVerdict(BaseModel):
+    """提交专家互审结论"""
+    is_satisfied: bool = Field(description="是否对本组诊断报告满意（与其他专家报告无需复查的冲突）")
+    reinvestigate_reason: str = Field(default="", description="不满意时需要复查的原因；满意时留空")
+
+
+def _reviewer_output_mode() -> str:
+    mode = getattr(getattr(settings, "mdt_config", None), "reviewer_output_mode", "tool") or "tool"
+    if mode not in REVIEWER_OUTPUT_MODES:
+        print(f"[WARN] 未知的 reviewer_output_mode: {mode}，使用 tool")
+        return "tool"
+    return mode
+
+
+def _reviewer_enabled() -> bool:
+    return bool(getattr(getattr(settings, "mdt_config", None), "enable_reviewer", True))
+
+
+def normalize_verdict(data: Any) -> Dict[str, Any]:
+    """把解析出的审核结论规范为 {is_satisfied: bool, reinvestigate_reason: str}"""
+    if isinstance(data, BaseModel):
+        data = data.model_dump()
+    if not isinstance(data, dict):
+        raise ValueError(f"审核结论不是 JSON 对象: {data!r}")
+    reason = data.get("reinvestigate_reason") or ""
+    return {
+        "is_satisfied": coerce_bool(data.get("is_satisfied", False)),
+        "reinvestigate_reason": reason if isinstance(reason, str) else json.dumps(reason, ensure_ascii=False),
+    }
+
+
+async def _structured_review(model, messages: List[BaseMessage], mode: str) -> Tuple[Dict[str, Any], AIMessage]:
+    """
+    通过 provider 原生结构化输出获取审核结论。
+
+    返回的消息是把结论序列化后的纯文本 AIMessage：原始回复带 tool_calls，
+    直接追加到专家 messages 会缺少对应的 ToolMessage，下一轮调用会被接口拒绝。
+    """
+    method = "json_schema" if mode == "json_schema" else "function_calling"
+    structured = model.with_structured_output(ReviewVerdict, method=method, include_raw=True)
+    output = await structured.ainvoke(messages)
+    raw = output.get("raw")
+    if output.get("parsed") is not None:
+        verdict = normalize_verdict(output["parsed"])
+    else:
+        # schema 校验失败时，退回工具参数或正文的快速解析
+        tool_calls = getattr(raw, "tool_calls", None) or []
+        if tool_calls:
+            verdict = normalize_verdict(tool_calls[0].get("args"))
+        else:
+            verdict = normalize_verdict(parse_json_from_markdown(getattr(raw, "content", "") or ""))
+    content = json.dumps(verdict, ensure_ascii=False)
+    return verdict, AIMessage(content=content, usage_metadata=getattr(raw, "usage_metadata", None))
 
 def build_reviewer_messages(state: MDTGraphState):
     """
@@ -98,17 +162,27 @@ async def process_single_expert_review(group_id: str, expert: ExpertGroupState):
         group_id_model_config = getattr(settings.multi_expert_diagnosis_agent, group_id)
         group_id_main_model_config = group_id_model_config.main_agent
         model = create_llm_from_config(group_id_main_model_config)
-        
-        # Bind output format if supported, but our parsing utility handles loose JSON too.
-        # Most providers support json_object, but some might not. Keep it for safety if config allows.
-        # model = model.bind(response_format={"type": "json_object"}) 
 
-        # 2. 请求model (Async)
-        response = await model.ainvoke(expert["messages"])
-        
+        # 2. 请求model (Async)，发送前按专家组的 max_input_tokens 裁剪历史消息
+        messages = apply_context_budget(
+            expert["messages"],
+            getattr(group_id_model_config, "max_input_tokens", None),
+            name=f"{group_id}_reviewer",
+        )
+        mode = _reviewer_output_mode()
+        if mode != "text":
+            try:
+                result, response = await _structured_review(model, messages, mode)
+                return group_id, result, response
+            except Exception as e:
+                # 部分兼容接口不支持强制 tool_choice / json_schema，退回正文解析
+                print(f"[WARN] {group_id} structured review ({mode}) failed, falling back to text: {e}")
+
+        response = await model.ainvoke(messages)
+
         # 3. 解析结果
-        result = parse_json_from_markdown(response.content)
-        
+        result = normalize_verdict(parse_json_from_markdown(response.content))
+
         return group_id, result, response
         
     except Exception as e:
@@ -132,6 +206,13 @@ async def expert_reviewer_node(state: MDTGraphState, config: RunnableConfig) ->
     
     state["blackboard"]["conflicts"] = {} # 重置冲突
 
+    # 关闭互审时（mdt_config.enable_reviewer: false）发布报告后直接视为满意，MDT 只跑一轮
+    if not _reviewer_enabled():
+        for group_id in need_update_expert:
+            state["expert_pool"][group_id]["is_satisfied"] = True
+        need_update_expert = {}
+        print("[Review] Reviewer disabled, accepting published reports.")
+
     # 2. 并行执行审核
     tasks = []
     for group_id, expert in need_update_expert.items():
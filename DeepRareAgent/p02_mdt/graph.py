@@ -12,6 +12,7 @@ from DeepRareAgent.p02_mdt.nodes import (
 from DeepRareAgent.p02_mdt.export_reviewer_node import expert_reviewer_node
 from DeepRareAgent.config import settings
 from DeepRareAgent.p02_mdt.builddeepexportnode import create_deep_export_node
+from DeepRareAgent.utils.profiling import profile_node
 
 def create_mdt_graph():
     """创建多专家会诊图"""
@@ -19,7 +20,7 @@ def create_mdt_graph():
     graph = StateGraph(MDTGraphState)
 
     # 1. 添加初始化节点
-    graph.add_node("triage_to_mdt_node", triage_to_mdt_node)
+    graph.add_node("triage_to_mdt_node", profile_node("triage_to_mdt_node", triage_to_mdt_node))
 
     # 2. 添加各个专家诊断节点
     expert_nodes = []
@@ -29,17 +30,17 @@ def create_mdt_graph():
         # 1. builddeepexportnode 中通过 config.metadata.langgraph_node 获取 group_id
         # 2. export_reviewer_node 中通过 group_id 获取配置
         expert_config = getattr(settings.multi_expert_diagnosis_agent, group_id)
-        graph.add_node(group_id, create_deep_export_node(expert_config))
+        graph.add_node(group_id, profile_node(group_id, create_deep_export_node(expert_config)))
         expert_nodes.append(group_id)
 
     # 3. 添加专家互审节点
-    graph.add_node("expert_review", expert_reviewer_node)
+    graph.add_node("expert_review", profile_node("expert_review", expert_reviewer_node))
 
     # 4. 添加路由判断节点
-    graph.add_node("routing_decision", routing_decision_node)
+    graph.add_node("routing_decision", profile_node("routing_decision", routing_decision_node))
 
     # 5. 添加扇出节点（重新分发到各专家）
-    graph.add_node("fan_out", fan_out_node)
+    graph.add_node("fan_out", profile_node("fan_out", fan_out_node))
 
     # 6. 连接边
     # START → triage_to_mdt_node
@@ -3,6 +3,9 @@
 汇总诊断智能体 (P03)
 
 整合多个专家组的诊断报告，生成符合临床规范的综合诊断报告。
+
+summary_node 为异步节点，报告通过 LangGraph 的 custom 流逐 token 推送给客户端
+（stream_mode 需包含 "custom"），证据引用在流式过程中增量收集，结束时一次性追加证据详情。
 """
 
 import re
@@ -12,11 +15,14 @@ from datetime import datetime
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 
 from DeepRareAgent.config import settings
 from DeepRareAgent.schema import MainGraphState
 from DeepRareAgent.utils.model_factory import create_llm_from_config
+from DeepRareAgent.utils.prompt_cache import cached_system_message, record_prompt_cache_usage
 from DeepRareAgent.utils.report_utils import process_expert_report_references
+from DeepRareAgent.utils.usage import get_thread_usage
 
 
 def _load_system_prompt() -> str:
@@ -78,6 +84,56 @@ def _format_expert_reports(
     return "\n".join(formatted_reports)
 
 
+# 匹配 <ref>group_id.number</ref> 格式
+_REF_PATTERN = re.compile(r'<ref>([a-zA-Z0-9_]+\.\d+)</ref>')
+# 流式收集时为跨 chunk 的半截标签保留的最大长度
+_MAX_PENDING_TAG = 64
+
+
+class _RefCollector:
+    """
+    流式增量收集 <ref>group_id.index</ref> 引用键（去重并保持出现顺序）。
+
+    每个 chunk 只扫描新增文本，跨 chunk 被截断的标签留在缓冲区中等待后续内容。
+    """
+
+    def __init__(self):
+        self.keys = []
+        self._seen = set()
+        self._pending = ""
+
+    def feed(self, text: str) -> None:
+        buf = self._pending + text
+        last_end = 0
+        for match in _REF_PATTERN.finditer(buf):
+            key = match.group(1)
+            if key not in self._seen:
+                self._seen.add(key)
+                self.keys.append(key)
+            last_end = match.end()
+
+        start = buf.rfind("<ref>", last_end)
+        if start == -1:
+            start = buf.rfind("<", last_end)
+        self._pending = buf[start:] if start != -1 and len(buf) - start <= _MAX_PENDING_TAG else ""
+
+
+def _format_evidence_section(ref_keys, evidence_mapping: Dict[str, str]) -> str:
+    """根据引用键生成追加到报告末尾的证据详情段落（无有效引用时返回空字符串）"""
+    extracted_evidences = []
+    for ref_key in ref_keys:
+        if ref_key in evidence_mapping:
+            evidence_content = evidence_mapping[ref_key]
+            extracted_evidences.append(f"[{ref_key}] {evidence_content}")
+        else:
+            # 如果引用的键不存在，记录警告但不中断
+            print(f"[WARN] 未找到证据引用: {ref_key}")
+
+    if not extracted_evidences:
+        return ""
+    return "\n\n#### 引用证据详情\n" + "\n".join(extracted_evidences)
+
+
 def _resolve_evidence_references(report_text: str, evidence_mapping: Dict[str, str]) -> str:
     """
     解析报告中的 <ref>group_id.index</ref> 标签，并将对应的证据内容追加到报告末尾。
@@ -93,45 +149,28 @@ def _resolve_evidence_references(report_text: str, evidence_mapping: Dict[str, s
     """
     if not report_text or not evidence_mapping:
         return report_text
-    
-    # 1. 查找所有唯一的引用键
-    # 匹配 <ref>group_id.number</ref> 格式
-    ref_pattern = re.compile(r'<ref>([a-zA-Z0-9_]+\.\d+)</ref>')
-    matches = ref_pattern.findall(report_text)
-    
-    if not matches:
-        return report_text
-    
-    # 去重并保持顺序
-    seen = set()
-    ref_keys = []
-    for match in matches:
-        if match not in seen:
-            seen.add(match)
-            ref_keys.append(match)
-    
-    # 2. 提取对应的证据
-    extracted_evidences = []
-    for ref_key in ref_keys:
-        if ref_key in evidence_mapping:
-            evidence_content = evidence_mapping[ref_key]
-            extracted_evidences.append(f"[{ref_key}] {evidence_content}")
-        else:
-            # 如果引用的键不存在，记录警告但不中断
-            print(f"[WARN] 未找到证据引用: {ref_key}")
-    
-    if not extracted_evidences:
-        return report_text
-    
-    # 3. 拼接到报告末尾
-    formatted_evidence_section = "\n\n#### 引用证据详情\n" + "\n".join(extracted_evidences)
-    
-    return report_text + formatted_evidence_section
 
+    collector = _RefCollector()
+    collector.feed(report_text)
+    return report_text + _format_evidence_section(collector.keys, evidence_mapping)
 
-def summary_node(state: MainGraphState, config: RunnableConfig) -> Dict[str, Any]:
+
+def _get_writer():
+    """获取 LangGraph custom 流写入器；不在图中运行（如直接调用节点测试）时返回空操作"""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda _chunk: None
+
+
+async def summary_node(state: MainGraphState, config: RunnableConfig) -> Dict[str, Any]:
     """
     汇总节点：整合多位专家的诊断报告，生成最终综合诊断
+
+    报告生成过程中通过 custom 流推送事件:
+        {"event": "summary_token", "content": "..."}      # 报告正文增量
+        {"event": "summary_evidence", "content": "..."}   # 末尾追加的引用证据详情
+        {"event": "summary_done", "length": N}
     
     Args:
         state: 主图状态，包含专家组报告
@@ -246,26 +285,53 @@ def summary_node(state: MainGraphState, config: RunnableConfig) -> Dict[str, Any
     print("[LLM] 调用 LLM 生成综合诊断报告...")
     
     llm = create_llm_from_config(settings.summary_agent)
+    # 系统提示词在各病例间不变，放在最前并标记缓存断点；病例相关内容与日期放在用户消息中
     messages = [
-        SystemMessage(content=system_prompt),
+        cached_system_message(llm, system_prompt),
         HumanMessage(content=user_prompt)
     ]
     
-    response = llm.invoke(messages)
-    final_report = response.content
-    
-    # 处理汇总报告中的证据引用（使用稳定的group_id.index映射）
+    writer = _get_writer()
+    collector = _RefCollector()
+    parts = []
+    full_message = None
+    async for chunk in llm.astream(messages):
+        full_message = chunk if full_message is None else full_message + chunk
+        text = chunk.text
+        if not text:
+            continue
+        parts.append(text)
+        collector.feed(text)
+        writer({"event": "summary_token", "content": text})
+
+    if full_message is not None:
+        record_prompt_cache_usage("summary_agent", [full_message])
+    final_report = "".join(parts)
+    
+    # 处理汇总报告中的证据引用（使用稳定的group_id.index映射，引用键已在流式过程中收集）
     if evidence_mapping:
-        final_report = _resolve_evidence_references(final_report, evidence_mapping)
+        evidence_section = _format_evidence_section(collector.keys, evidence_mapping)
+        if evidence_section:
+            final_report += evidence_section
+            writer({"event": "summary_evidence", "content": evidence_section})
+    writer({"event": "summary_done", "length": len(final_report)})
     
     print(f"\n[SUCCESS] 综合报告生成成功（{len(final_report)} 字符）")
     print("=" * 80 + "\n")
     
-    # 6. 返回结果
-    return {
+    # 6. 返回结果（附带本线程累计的 token 与费用，含本次汇总调用）
+    result = {
         "messages": [AIMessage(content=final_report)],
         "final_report": final_report
     }
+    usage = get_thread_usage((config or {}).get("configurable", {}).get("thread_id"))
+    if usage is not None:
+        total = usage["total"]
+        print(f"[Usage] 本病例 LLM 调用 {total['llm_calls']} 次，输入 {total['input_tokens']} "
+              f"(缓存命中 {total['cached_tokens']}) / 输出 {total['output_tokens']} tokens，"
+              f"估算费用 ${total['cost_usd']:.4f}")
+        result["usage"] = usage
+    return result
 
 
 # 导出
@@ -333,7 +399,8 @@ if __name__ == "__main__":
     print("测试汇总节点")
     print("=" * 80)
 
-    result = summary_node(test_state, {})
+    import asyncio
+    result = asyncio.run(summary_node(test_state, {}))
 
     print("\n生成的综合报告：")
     print("=" * 80)
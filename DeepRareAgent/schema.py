@@ -55,6 +55,7 @@ class MainGraphState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]  # 对话历史
     start_diagnosis: bool                                  # 是否开始诊断的标志
     final_report: str                                      # 最终综合诊断报告（由 summary_node 生成）
+    usage: Dict[str, Any]                                  # 本线程 LLM token 与费用汇总（由 summary_node 写入，见 utils/usage.py）
 
     # === 患者信息字段（传递给各子图）===
     patient_info: Dict[str, Any]                          # 结构化患者信息
@@ -74,3 +75,20 @@ class MainGraphState(TypedDict):
     
 
 
+
+
+# 状态初始化辅助函数
+def init_patient_info() -> Dict[str, Any]:
+    """
+    初始化患者信息结构，确保所有必需字段都存在。
+    """
+    return {
+        "base_info": {},
+        "symptoms": [],
+        "vitals": [],
+        "exams": [],
+        "medications": [],
+        "family_history": [],
+        "past_medical_history": [],
+        "others": []
+    }
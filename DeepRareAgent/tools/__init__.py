@@ -1,45 +1,154 @@
 """
-工具聚合模块
+工具聚合模块（惰性注册表）
 
-将本目录下的工具统一收口,便于在 deep agent 中一次性导入。
+将本目录下的工具统一收口,便于在 deep agent 中按名称获取。
 包含:
 - HPO 本体查询工具
 - 医学文献检索工具 (PubMed, LitSense)
-- 通用搜索工具 (百度, Wikipedia)
+- 通用搜索工具 (百度, Wikipedia, Tavily)
 - BioMCP 工具集成 (可选)
 - 患者信息管理工具
 - 证据管理工具
+
+所有工具只在首次使用时才导入对应模块:注册表 TOOL_REGISTRY 仅记录
+"工具名 -> 模块路径 + 元数据",因此导入本包不会加载 Biopython、wikipedia、
+baidusearch、langchain_mcp_adapters 等重量级依赖,也不会因缺少某个
+API Key 而失败。专家组配置中的 additional_tools 按名称通过 get_tool() 加载。
 """
 
 # === 标准库导入 ===
+import importlib
 import logging
-from typing import Any, Dict, List
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# === 工具注册表 ===
+@dataclass(frozen=True)
+class ToolSpec:
+    """单个工具的注册信息（不触发导入）"""
+    name: str                       # 配置中使用的工具名（additional_tools 中的名称）
+    module: str                     # 相对于本包的模块路径
+    attr: str                       # 模块中的工具对象名
+    group: str                      # 工具分组: hpo / search / literature / evidence
+    description: str                # 简要说明（完整描述在工具对象的 description 中）
+    requires: Tuple[str, ...] = ()  # 首次加载时引入的第三方依赖
+    default: bool = True            # 是否包含在 get_all_tools() 返回的基础工具列表中
+
+
+TOOL_REGISTRY: Dict[str, ToolSpec] = {
+    spec.name: spec
+    for spec in (
+        # 证据管理工具
+        ToolSpec("save_evidences", ".evidencemanager", "save_evidences",
+                 "evidence", "记录新的诊断证据到状态", default=False),
+        ToolSpec("extract_evidences", ".evidencemanager", "extract_evidences",
+                 "evidence", "读取当前完整证据链", default=False),
+        # HPO 本体工具
+        ToolSpec("phenotype_to_hpo_tool", ".hpo_tools", "phenotype_to_hpo_tool",
+                 "hpo", "表型描述标准化为 HPO 术语", ("requests",)),
+        ToolSpec("hpo_to_diseases_tool", ".hpo_tools", "hpo_to_diseases_tool",
+                 "hpo", "HPO 术语反查共现疾病", ("requests",)),
+        # 搜索工具
+        ToolSpec("search_baidu_tool", ".baidu_tools", "search_baidu_tool",
+                 "search", "百度中文医学信息检索", ("baidusearch",)),
+        ToolSpec("search_wikipedia_tool", ".wiki_tools", "search_wikipedia_tool",
+                 "search", "维基百科词条摘要检索", ("wikipedia",)),
+        ToolSpec("tavily_medical_search", ".tavily_tools", "tavily_medical_search",
+                 "search", "Tavily 可信医学域名搜索（需 TAVILY_API_KEY）",
+                 ("langchain_tavily",), default=False),
+        # 文献检索工具
+        ToolSpec("search_pubmed", ".pubmed_tools", "search_pubmed",
+                 "literature", "PubMed 文献检索", ("Bio",)),
+        ToolSpec("lit_sense_search", ".litsense_tool", "lit_sense_search",
+                 "literature", "LitSense 语义片段检索", ("requests",)),
+    )
+}
+
+# 非工具对象的惰性导出: 名称 -> (模块, 属性)
+_LAZY_EXPORTS: Dict[str, Tuple[str, str]] = {
+    "build_biomcp_agent": (".biomcp_tool", "build_biomcp_agent"),
+    "load_biomcp_tools": (".biomcp_tool", "load_biomcp_tools"),
+    "load_biomcp_tools_sync": (".biomcp_tool", "load_biomcp_tools_sync"),
+    "PatientInfoManger": (".patientinfo", "PatientInfoManger"),
+}
+
+_loaded_tools: Dict[str, Any] = {}
+_load_lock = threading.Lock()
+
+
+def _import_attr(module: str, attr: str) -> Any:
+    return getattr(importlib.import_module(module, __name__), attr)
+
+
+def get_tool(name: str) -> Any:
+    """
+    按注册名获取工具对象，首次调用时才导入对应模块。
+
+    Args:
+        name: 注册表中的工具名（与配置文件 additional_tools 中的名称一致）
+
+    Returns:
+        工具对象
+
+    Raises:
+        ValueError: 工具名未注册
+    """
+    tool_obj = _loaded_tools.get(name)
+    if tool_obj is not None:
+        return tool_obj
 
-# === 第三方库导入 ===
-from langchain_core.tools import tool
+    spec = TOOL_REGISTRY.get(name)
+    if spec is None:
+        raise ValueError(f"Unsupported tool: {name}")
 
-# === 本地工具导入 ===
-# HPO 本体工具
-from .hpo_tools import hpo_to_diseases_tool, phenotype_to_hpo_tool
+    with _load_lock:
+        if name not in _loaded_tools:
+            _loaded_tools[name] = _import_attr(spec.module, spec.attr)
+    return _loaded_tools[name]
 
-# 搜索工具
-from .baidu_tools import search_baidu_tool
-from .wiki_tools import search_wikipedia_tool
 
-# 医学文献工具
-from .litsense_tool import lit_sense_search
-from .pubmed_tools import search_pubmed
+def resolve_tools(names: Iterable[str]) -> List[Any]:
+    """
+    将工具名列表解析为工具对象列表（跳过空字符串）。
+
+    Raises:
+        ValueError: 存在未注册的工具名
+    """
+    return [get_tool(name) for name in names if name]
+
+
+def list_tools(group: Optional[str] = None) -> List[ToolSpec]:
+    """列出已注册工具的元数据（不触发导入），可按分组过滤"""
+    return [spec for spec in TOOL_REGISTRY.values() if group is None or spec.group == group]
+
+
+def is_tool_loaded(name: str) -> bool:
+    """工具模块是否已被加载（便于测试冷启动行为）"""
+    return name in _loaded_tools
+
+
+class _LazyToolMapping(Mapping):
+    """按需加载的 工具名 -> 工具对象 映射，兼容原 default_TOOL_EXCLUDE_LIST 的 dict 用法"""
+
+    def __init__(self, names: Iterable[str]):
+        self._names = tuple(names)
 
-# BioMCP 工具 (可选,需要外部服务)
-from .biomcp_tool import (
-    build_biomcp_agent,
-    load_biomcp_tools,
-    load_biomcp_tools_sync,
-)
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._names:
+            raise KeyError(name)
+        return get_tool(name)
 
-# 患者信息与证据管理
-from .evidencemanager import extract_evidences, save_evidences
-from .patientinfo import PatientInfoManger
+    def __contains__(self, name: object) -> bool:
+        return name in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
 
 
 # === 工具列表构建函数 ===
@@ -50,17 +159,7 @@ def get_all_tools() -> List[Any]:
     Returns:
         包含 HPO、搜索和文献检索工具的列表
     """
-    return [
-        # HPO 本体工具
-        phenotype_to_hpo_tool,
-        hpo_to_diseases_tool,
-        # 搜索工具
-        search_baidu_tool,
-        search_wikipedia_tool,
-        # 文献检索工具
-        search_pubmed,
-        lit_sense_search,  # 直接使用原始工具
-    ]
+    return [get_tool(spec.name) for spec in TOOL_REGISTRY.values() if spec.default]
 
 
 async def get_all_tools_async(include_biomcp: bool = False) -> List[Any]:
@@ -77,6 +176,7 @@ async def get_all_tools_async(include_biomcp: bool = False) -> List[Any]:
 
     if include_biomcp:
         try:
+            load_biomcp_tools = _import_attr(*_LAZY_EXPORTS["load_biomcp_tools"])
             biomcp_tools = await load_biomcp_tools()
             tools.extend(biomcp_tools)
         except Exception as exc:
@@ -97,6 +197,7 @@ def get_all_tools_with_biomcp_sync() -> List[Any]:
     tools = get_all_tools()
 
     try:
+        load_biomcp_tools_sync = _import_attr(*_LAZY_EXPORTS["load_biomcp_tools_sync"])
         tools.extend(load_biomcp_tools_sync())
     except Exception as exc:
         logging.warning("同步加载 BioMCP 工具失败: %s", exc)
@@ -104,30 +205,31 @@ def get_all_tools_with_biomcp_sync() -> List[Any]:
     return tools
 
 
-# === 静态工具列表 ===
-# 直接暴露的静态列表,方便快速导入 (不包含 BioMCP,避免启动外部进程)
-ALL_TOOLS: List[Any] = get_all_tools()
-
-# 目前主要用于测试多专家诊断节点时使用的基础工具用于延长记忆时常所以作为附加工具
+# 专家组 additional_tools 可选的全部工具（按需加载）
 #TODO:后续需要把所有工具都移到这里该变量中同时或者移除删除目前变量改用ALL_TOOLS
-default_TOOL_EXCLUDE_LIST = {
-    "save_evidences": save_evidences,
-    "extract_evidences": extract_evidences,
-    "phenotype_to_hpo_tool":phenotype_to_hpo_tool,
-    "hpo_to_diseases_tool":hpo_to_diseases_tool,
-    "search_baidu_tool":search_baidu_tool,
-    "search_wikipedia_tool":search_wikipedia_tool,
-    "search_pubmed":search_pubmed,
-    "lit_sense_search": lit_sense_search,  # 更新为原始工具
-}
-
-
+default_TOOL_EXCLUDE_LIST = _LazyToolMapping(TOOL_REGISTRY.keys())
 
 
+def __getattr__(name: str) -> Any:
+    """PEP 562: ALL_TOOLS 与各工具对象在首次访问时才加载"""
+    if name == "ALL_TOOLS":
+        return get_all_tools()
+    if name in TOOL_REGISTRY:
+        return get_tool(name)
+    if name in _LAZY_EXPORTS:
+        return _import_attr(*_LAZY_EXPORTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # === 公共接口导出 ===
 __all__ = [
+    # 注册表与加载函数
+    "TOOL_REGISTRY",
+    "ToolSpec",
+    "get_tool",
+    "resolve_tools",
+    "list_tools",
+    "is_tool_loaded",
     # 工具列表与加载函数
     "ALL_TOOLS",
     "default_TOOL_EXCLUDE_LIST",
@@ -140,13 +242,14 @@ __all__ = [
     # 搜索工具
     "search_baidu_tool",
     "search_wikipedia_tool",
+    "tavily_medical_search",
     # 文献检索工具
     "search_pubmed",
-    "lit_sense_search",  # 更新导出
+    "lit_sense_search",
     # BioMCP 工具
     "load_biomcp_tools",
     "load_biomcp_tools_sync",
     "build_biomcp_agent",
     # 管理工具
     "PatientInfoManger",
-]
\ No newline at end of file
+]
@@ -3,14 +3,24 @@ HPO 工具：将表型描述转换为 HPO 术语，并基于 HPO 术语查询关
 
 数据源：Jackson Laboratory (JAX) HPO API (https://ontology.jax.org/)
 版本：1.0.0
+
+接口地址可通过环境变量 HPO_API_BASE_URL 覆盖（如指向 benchmarks.stub_servers 本地替身服务）。
 """
 
+import os
 import requests
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from collections import Counter
 from langchain_core.tools import tool
 
+DEFAULT_HPO_API_BASE_URL = "https://ontology.jax.org/api"
+
+
+def _hpo_api_base() -> str:
+    """JAX HPO API 地址（每次调用时读取，便于压测时切换）"""
+    return os.getenv("HPO_API_BASE_URL", DEFAULT_HPO_API_BASE_URL).rstrip("/")
+
 
 # ============================================================
 # Pydantic 输入/输出模型定义
@@ -122,7 +132,7 @@ def phenotype_to_hpo_tool(phenotypes: List[str], top_k: int = 5) -> PhenotypeToH
     for pheno in phenotypes:
         try:
             resp = requests.get(
-                "https://ontology.jax.org/api/hp/search",
+                f"{_hpo_api_base()}/hp/search",
                 params={"q": pheno, "rows": top_k},
                 timeout=10
             )
@@ -189,7 +199,7 @@ def hpo_to_diseases_tool(hpo_ids: List[str], top_k: int = 10) -> HPOToDiseaseRes
     for hpoid in hpo_ids:
         try:
             resp = requests.get(
-                f"https://ontology.jax.org/api/network/annotation/{hpoid}",
+                f"{_hpo_api_base()}/network/annotation/{hpoid}",
                 timeout=10
             )
             resp.raise_for_status()
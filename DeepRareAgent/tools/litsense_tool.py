@@ -26,15 +26,23 @@ LitSense 文献语义搜索工具集
 安装依赖：
 pip install requests pydantic
 
+接口地址：未显式传入 base_url 时读取环境变量 LITSENSE_API_BASE_URL（如指向
+benchmarks.stub_servers 本地替身服务），再缺省为官方地址。
+
 作者: Rare Diagnosis Agent Team
 版本: 1.0.0
 """
 
+import os
 import requests
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 
+from DeepRareAgent.utils.query_cache import near_duplicate_cached
+
+DEFAULT_LITSENSE_API_BASE_URL = "https://www.ncbi.nlm.nih.gov/research/litsense-api/api/"
+
 
 class LitSenseQueryResult(BaseModel):
     """LitSense 查询单条结果"""
@@ -50,9 +58,9 @@ class LitSenseSearchArgs(BaseModel):
     """LitSense 搜索参数模型"""
     query: str = Field(..., description="语义检索的句子或片段")
     rerank: bool = Field(True, description="是否让 LitSense 重新排序结果")
-    base_url: str = Field(
-        "https://www.ncbi.nlm.nih.gov/research/litsense-api/api/",
-        description="LitSense API 基础地址"
+    base_url: Optional[str] = Field(
+        None,
+        description="LitSense API 基础地址（一般不需要填写，缺省使用配置的地址）"
     )
 
 
@@ -64,12 +72,18 @@ class LitSenseSearchResult(BaseModel):
 
 
 @tool("lit_sense_search", args_schema=LitSenseSearchArgs)
+@near_duplicate_cached(
+    "lit_sense_search",
+    param_args=("rerank", "base_url"),
+    is_cacheable=lambda result: not result.get("error") and bool(result.get("results")),
+)
 def lit_sense_search(
     query: str,
     rerank: bool = True,
-    base_url: str = "https://www.ncbi.nlm.nih.gov/research/litsense-api/api/"
+    base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """LitSense 语义检索，返回片段与评分"""
+    base_url = base_url or os.getenv("LITSENSE_API_BASE_URL", DEFAULT_LITSENSE_API_BASE_URL)
     params = {
         "query": query,
         "rerank": "true" if rerank else "false"
@@ -4,13 +4,25 @@ PubMed 工具：使用 Entrez API 搜索生物医学文献，获取权威研究
 数据源：美国国家医学图书馆 PubMed 数据库 (https://pubmed.ncbi.nlm.nih.gov/)
 依赖：biopython
 版本：1.0.0
+
+E-utilities 地址可通过环境变量 NCBI_EUTILS_BASE_URL 覆盖（如指向 benchmarks.stub_servers 本地替身服务）。
+请求 NCBI 正式地址时按 NCBI 的限额在进程内限速（与 Bio.Entrez 相同: 无 API Key 3 次/秒，
+设置环境变量 NCBI_API_KEY 后 10 次/秒，并随请求携带 api_key）；替身服务不限速。
 """
 
-from typing import List
-from Bio import Entrez, Medline
+import io
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+import requests
+from Bio import Medline
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 
+from DeepRareAgent.utils.query_cache import near_duplicate_cached
+
 
 # ============================================================
 # Pydantic 输入/输出模型定义
@@ -50,11 +62,63 @@ class PubMedSearchResult(BaseModel):
     )
 
 
+# ============================================================
+# E-utilities 请求
+# ============================================================
+
+DEFAULT_NCBI_EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+
+class _RequestThrottle:
+    """进程级请求间隔限制（多个专家组在线程池中并发调用工具时共享）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self, rate_per_s: float) -> None:
+        """按 rate_per_s 预约下一个请求时间片并等待到达"""
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next_at)
+            self._next_at = at + 1.0 / rate_per_s
+        if at > now:
+            time.sleep(at - now)
+
+
+_ncbi_throttle = _RequestThrottle()
+
+
+def _eutils_get(endpoint: str, params: Dict[str, Any]) -> requests.Response:
+    """请求 E-utilities（esearch / efetch），地址每次调用时读取，便于压测时切换"""
+    base_url = os.getenv("NCBI_EUTILS_BASE_URL", DEFAULT_NCBI_EUTILS_BASE_URL).rstrip("/")
+    params = {"tool": "DeepRareAgent", **params}
+    if base_url == DEFAULT_NCBI_EUTILS_BASE_URL.rstrip("/"):
+        # NCBI 限额: 无 API Key 3 次/秒，有 API Key 10 次/秒，超出返回 429
+        api_key = os.getenv("NCBI_API_KEY")
+        if api_key:
+            params["api_key"] = api_key
+        _ncbi_throttle.wait(10.0 if api_key else 3.0)
+    resp = requests.get(
+        f"{base_url}/{endpoint}.fcgi",
+        params=params,
+        timeout=15
+    )
+    resp.raise_for_status()
+    return resp
+
+
 # ============================================================
 # 工具定义
 # ============================================================
 
 @tool("search_pubmed", args_schema=PubMedSearchArgs)
+# 近似命中直接复用缓存结果：再查一次 PubMed 仍是完整的 esearch + efetch 往返，省不下延迟
+@near_duplicate_cached(
+    "search_pubmed",
+    param_args=("max_results",),
+    is_cacheable=lambda result: bool(result.items),
+)
 def search_pubmed(
     query: str,
     max_results: int = 3,
@@ -107,27 +171,31 @@ def search_pubmed(
         - PubMed 摘要可能为空（某些老文献或特殊类型文献）
         - 建议使用具体的医学术语以提高检索精度
         - 可使用布尔运算符（AND、OR、NOT）构建复杂查询
+        - 与已缓存查询高度相似（Jaccard >= 阈值）的请求会直接复用缓存结果（副本）
     """
     try:
-        # 设置 NCBI 邮箱（API 要求）
-        Entrez.email = email
-
-        # 第一步：搜索文献 ID
-        handle = Entrez.esearch(db="pubmed", term=query, retmax=max_results)
-        record = Entrez.read(handle)
-        id_list = record.get("IdList", [])
+        # 第一步：搜索文献 ID（email 为 NCBI API 使用要求）
+        search = _eutils_get("esearch", {
+            "db": "pubmed",
+            "term": query,
+            "retmax": max_results,
+            "retmode": "json",
+            "email": email
+        })
+        id_list = search.json().get("esearchresult", {}).get("idlist", [])
 
         if not id_list:
             return PubMedSearchResult(items=[])
 
         # 第二步：获取文献详细信息
-        handle = Entrez.efetch(
-            db="pubmed",
-            id=",".join(id_list),
-            rettype="medline",
-            retmode="text"
-        )
-        records = list(Medline.parse(handle))
+        fetch = _eutils_get("efetch", {
+            "db": "pubmed",
+            "id": ",".join(id_list),
+            "rettype": "medline",
+            "retmode": "text",
+            "email": email
+        })
+        records = list(Medline.parse(io.StringIO(fetch.text)))
 
         # 第三步：构造结构化结果
         articles: List[PubMedArticle] = []
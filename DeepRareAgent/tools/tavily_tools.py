@@ -5,14 +5,20 @@ import logging
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 
+from DeepRareAgent.utils.query_cache import near_duplicate_cached
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Get API key from environment variable
-TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-if not TAVILY_API_KEY:
-    raise ValueError("TAVILY_API_KEY environment variable is not set")
+
+def _get_tavily_api_key() -> str:
+    """Read TAVILY_API_KEY at build time so importing this module never fails."""
+    api_key = os.getenv("TAVILY_API_KEY")
+    if not api_key:
+        raise ValueError("TAVILY_API_KEY environment variable is not set")
+    return api_key
+
 
 @dataclass
 class TavilyConfig:
@@ -97,7 +103,7 @@ def build_tavily(config: Optional[TavilyConfig] = None) -> TavilySearch:
         logger.info("Initializing TavilySearch with medical domain configuration")
 
         tool = TavilySearch(
-            api_key=TAVILY_API_KEY,
+            api_key=_get_tavily_api_key(),
             max_results=config.max_results,
             topic=config.topic,
             include_answer=config.include_answer,
@@ -170,6 +176,7 @@ def format_search_results(results: Dict[str, Any]) -> List[Dict[str, str]]:
 
 
 @tool()
+@near_duplicate_cached("tavily_medical_search", is_cacheable=bool)
 def tavily_medical_search(query: str) -> List[Dict[str, str]]:
     """用 Tavily 在可信医学域名内搜索，返回标题/内容/URL。自动限制可信站点，减少噪声。适合获取最新医疗资讯或背景资料。"""
     try:
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+LLM / 工具 I/O 录制与回放（Cassette）
+
+修改 build_reviewer_messages、状态 reducer 等代码后，需要在真实会诊轨迹上对比延迟与内存，
+而不是合成数据。本模块把一次真实运行中每个线程（thread_id）的全部 LLM 请求/响应与
+工具调用/结果录制到紧凑的 JSONL 文件，之后离线按原始或缩放后的耗时回放。
+
+录制:
+    with record_cassettes("benchmarks/cassettes"):
+        await graph.ainvoke(inputs, config={"configurable": {"thread_id": "case_001"}})
+    # -> benchmarks/cassettes/case_001.jsonl
+
+    - LLM: 通过 LangChain 回调钩子自动挂到所有模型调用（包括审核、汇总节点的直接调用）
+    - 工具: 通过 CassetteMiddleware 记录模型发出的工具调用参数与返回内容；
+      返回 Command 的状态类工具（如 trigger_deep_diagnosis、evidence 更新）不录制，回放时照常执行
+
+回放:
+    # 所有模型配置为 provider: replay（不填 cassette_path）
+    with replay_cassette("benchmarks/cassettes/case_001.jsonl", time_scale=0):
+        await graph.ainvoke(inputs, config=...)
+
+记录格式（每行一条）:
+    {"kind": "llm",  "key": ..., "message": <dumpd(AIMessage)>, "latency_s": 1.2, "t": 3.4}
+    {"kind": "tool", "key": ..., "name": "phenotype_to_hpo_tool", "args": {...},
+     "content": "...", "latency_s": 0.3, "t": 4.7}
+    工具失败时 content 为空，记录 error / error_type，回放时抛出同类型名的异常
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from uuid import UUID
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.load import dumpd, dumps
+from langchain_core.messages import BaseMessage, ToolMessage
+from langchain_core.tracers.context import register_configure_hook
+
+from DeepRareAgent.utils.llm_cache import canonical_prompt
+
+DEFAULT_THREAD = "default"
+
+
+def prompt_fingerprint(messages: Sequence[BaseMessage]) -> str:
+    """消息列表的稳定指纹（忽略 id 等易变字段），录制与回放共用"""
+    return hashlib.sha256(canonical_prompt(dumps(list(messages))).encode("utf-8")).hexdigest()
+
+
+def tool_fingerprint(name: str, args: Any) -> str:
+    """工具调用的稳定指纹（工具名 + 参数）"""
+    payload = json.dumps([name, args], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _thread_of_config(config: Optional[Dict[str, Any]]) -> str:
+    configurable = (config or {}).get("configurable") or {}
+    return str(configurable.get("thread_id") or DEFAULT_THREAD)
+
+
+# ========== 录制 ==========
+class CassetteRecorder(BaseCallbackHandler):
+    """
+    录制器：按 thread_id 把 LLM 与工具 I/O 追加写入 <directory>/<thread_id>.jsonl。
+
+    同时作为 LangChain 回调处理器（LLM 部分），在 record_cassettes 上下文中自动生效。
+    """
+
+    run_inline = True
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending: Dict[UUID, Dict[str, Any]] = {}
+        self._thread_start: Dict[str, float] = {}
+        self.counts = {"llm": 0, "tool": 0}
+
+    def path_for(self, thread_id: str) -> Path:
+        safe = re.sub(r"[^\w.-]", "_", thread_id) or DEFAULT_THREAD
+        return self.directory / f"{safe}.jsonl"
+
+    def write(self, thread_id: str, record: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            start = self._thread_start.setdefault(thread_id, now - record.get("latency_s", 0.0))
+            record["t"] = round(now - start, 4)
+            with open(self.path_for(thread_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.counts[record["kind"]] = self.counts.get(record["kind"], 0) + 1
+
+    # ---- LLM 回调 ----
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._pending[run_id] = {
+            "key": prompt_fingerprint(messages[0]),
+            "thread": str((metadata or {}).get("thread_id") or DEFAULT_THREAD),
+            "start": time.perf_counter(),
+        }
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        pending = self._pending.pop(run_id, None)
+        if pending is None or not response.generations or not response.generations[0]:
+            return
+        message = getattr(response.generations[0][0], "message", None)
+        if message is None:
+            return
+        self.write(pending["thread"], {
+            "kind": "llm",
+            "key": pending["key"],
+            "message": dumpd(message),
+            "latency_s": round(time.perf_counter() - pending["start"], 4),
+        })
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._pending.pop(run_id, None)
+
+    # ---- 工具（由 CassetteMiddleware 调用）----
+    def record_tool(self, thread_id: str, name: str, args: Any, latency_s: float,
+                    content: Any = None, error: Optional[BaseException] = None) -> None:
+        record = {
+            "kind": "tool",
+            "key": tool_fingerprint(name, args),
+            "name": name,
+            "args": args,
+            "content": content if error is None else None,
+            "latency_s": round(latency_s, 4),
+        }
+        if error is not None:
+            record["error"] = str(error)
+            record["error_type"] = type(error).__name__
+        self.write(thread_id, record)
+
+
+_active_recorder: contextvars.ContextVar[Optional[CassetteRecorder]] = contextvars.ContextVar(
+    "deeprare_cassette_recorder", default=None
+)
+# 上下文中存在录制器时，LangChain 会自动把它加入所有运行的回调
+register_configure_hook(_active_recorder, inheritable=True)
+
+
+@contextmanager
+def record_cassettes(directory: str) -> Iterator[CassetteRecorder]:
+    """在上下文内录制所有线程的 LLM 与工具 I/O"""
+    recorder = CassetteRecorder(directory)
+    token = _active_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _active_recorder.reset(token)
+        print(f"[Cassette] 录制完成: LLM {recorder.counts['llm']} 条，工具 {recorder.counts['tool']} 条 -> {recorder.directory}")
+
+
+def get_active_recorder() -> Optional[CassetteRecorder]:
+    return _active_recorder.get()
+
+
+# ========== 回放 ==========
+class CassetteMissError(KeyError):
+    """录制文件中找不到匹配的记录"""
+
+
+class Cassette:
+    """
+    一个线程的录制记录。取记录时优先按指纹匹配未使用的记录，
+    找不到时（非 strict）按录制顺序取下一条同类记录；给定 name 时只取同名记录（工具），
+    没有同名记录即视为未录制。
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], time_scale: float = 1.0,
+                 strict: bool = False, source: str = ""):
+        self.records = records
+        self.time_scale = time_scale
+        self.strict = strict
+        self.source = source
+        self._by_key: Dict[tuple, List[int]] = {}
+        self._cursor: Dict[tuple, int] = {}
+        self._used: set = set()
+        self._lock = threading.Lock()
+        for idx, record in enumerate(records):
+            record.setdefault("kind", "llm")
+            self._by_key.setdefault((record["kind"], record.get("key", "")), []).append(idx)
+
+    @classmethod
+    def load(cls, path: str, time_scale: float = 1.0, strict: bool = False) -> "Cassette":
+        if not Path(path).exists():
+            raise FileNotFoundError(f"录制文件不存在: {path}")
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+        return cls(records, time_scale=time_scale, strict=strict, source=str(path))
+
+    def take(self, kind: str, key: str, name: Optional[str] = None) -> Dict[str, Any]:
+        """取出一条记录（每条只用一次）；name 限定顺序回退时只取同名记录"""
+        with self._lock:
+            idx = next((i for i in self._by_key.get((kind, key), []) if i not in self._used), None)
+            if idx is None:
+                if self.strict:
+                    raise CassetteMissError(f"录制文件中没有匹配的 {kind} 记录: {key[:12]} ({self.source})")
+                cursor = self._cursor.get((kind, name), 0)
+                while cursor < len(self.records) and (
+                    cursor in self._used or self.records[cursor]["kind"] != kind
+                    or (name is not None and self.records[cursor].get("name") != name)
+                ):
+                    cursor += 1
+                if cursor >= len(self.records):
+                    raise CassetteMissError(f"录制文件中的 {kind} 记录已用完 ({self.source})")
+                idx = cursor
+                self._cursor[(kind, name)] = cursor + 1
+            self._used.add(idx)
+            return self.records[idx]
+
+    def delay_of(self, record: Dict[str, Any]) -> float:
+        return float(record.get("latency_s", 0.0)) * self.time_scale
+
+
+_active_cassette: contextvars.ContextVar[Optional[Cassette]] = contextvars.ContextVar(
+    "deeprare_active_cassette", default=None
+)
+
+
+@contextmanager
+def replay_cassette(path: str, time_scale: float = 1.0, strict: bool = False) -> Iterator[Cassette]:
+    """
+    在上下文内回放录制文件：未指定 cassette_path 的 replay 模型与 CassetteMiddleware 从这里取记录。
+
+    Args:
+        path: 录制文件（单个线程）
+        time_scale: 耗时缩放，1.0 原始耗时，0 不等待
+        strict: 找不到指纹匹配的记录时是否报错
+    """
+    cassette = Cassette.load(path, time_scale=time_scale, strict=strict)
+    token = _active_cassette.set(cassette)
+    try:
+        yield cassette
+    finally:
+        _active_cassette.reset(token)
+
+
+def get_active_cassette() -> Optional[Cassette]:
+    return _active_cassette.get()
+
+
+def _replayed_error(record: Dict[str, Any]) -> Exception:
+    """按录制的异常类型名构造异常，保证工具错误处理中间件的输出与录制时一致"""
+    error_cls = type(record.get("error_type") or "RuntimeError", (RuntimeError,), {})
+    return error_cls(record.get("error", ""))
+
+
+class CassetteMiddleware(AgentMiddleware):
+    """
+    工具调用录制 / 回放中间件。
+
+    - record_cassettes 上下文中: 正常执行工具并记录参数、结果与耗时
+    - replay_cassette 上下文中: 不执行工具，直接返回录制的结果（按缩放后的耗时等待）
+    - 其他情况: 透传
+    """
+
+    def _replay_record(self, request) -> Optional[Dict[str, Any]]:
+        cassette = get_active_cassette()
+        if cassette is None:
+            return None
+        call = request.tool_call
+        try:
+            # 只回退到同名工具的记录，未录制的工具不会错取其他工具的结果
+            return cassette.take("tool", tool_fingerprint(call["name"], call.get("args", {})), name=call["name"])
+        except CassetteMissError:
+            # 未录制的工具（如返回 Command 的状态类工具）照常执行
+            return None
+
+    @staticmethod
+    def _to_message(request, record: Dict[str, Any]) -> ToolMessage:
+        if record.get("error") is not None:
+            raise _replayed_error(record)
+        return ToolMessage(
+            content=record.get("content") or "",
+            name=record.get("name"),
+            tool_call_id=request.tool_call["id"],
+        )
+
+    def _record(self, request, started: float, result: Any = None, error: Optional[BaseException] = None):
+        recorder = get_active_recorder()
+        if recorder is None or (error is None and not isinstance(result, ToolMessage)):
+            return
+        call = request.tool_call
+        recorder.record_tool(
+            _thread_of_config(getattr(request.runtime, "config", None)),
+            call["name"],
+            call.get("args", {}),
+            time.perf_counter() - started,
+            content=result.content if result is not None else None,
+            error=error,
+        )
+
+    def wrap_tool_call(self, request, handler):
+        record = self._replay_record(request)
+        if record is not None:
+            time.sleep(get_active_cassette().delay_of(record))
+            return self._to_message(request, record)
+        started = time.perf_counter()
+        try:
+            result = handler(request)
+        except Exception as e:
+            self._record(request, started, error=e)
+            raise
+        self._record(request, started, result=result)
+        return result
+
+    async def awrap_tool_call(self, request, handler):
+        record = self._replay_record(request)
+        if record is not None:
+            await asyncio.sleep(get_active_cassette().delay_of(record))
+            return self._to_message(request, record)
+        started = time.perf_counter()
+        try:
+            result = await handler(request)
+        except Exception as e:
+            self._record(request, started, error=e)
+            raise
+        self._record(request, started, result=result)
+        return result
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Token 预算上下文管理（Context Budget）
+
+专家组配置中的 max_input_tokens 原先只写进 llm_main.profile，多轮会诊后专家 messages
+会不断膨胀，直到超出模型上下文。本模块在每次调用 LLM 之前按策略裁剪发送的消息
+（只影响本次请求，不修改图状态）：
+
+1. 先省略陈旧的工具输出（保留最近 keep_recent_tool_outputs 条）
+2. 仍超预算时，把较早的轮次压缩成一条摘要消息（每条消息保留前 summary_chars 个字符）
+3. 始终保留: 第一条消息（分诊患者画像）、最新的患者信息 / 审核意见消息、最后一条
+   用户消息，以及最近一次模型回复与其工具结果
+
+Token 数用 token_utils 中的本地估算器计算。
+
+配置 (config.yml):
+    context_budget:
+      enabled: true
+      reserve_output_tokens: 4000
+      keep_recent_tool_outputs: 3
+      summary_chars: 200
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from DeepRareAgent.utils.token_utils import estimate_message_tokens, estimate_text_tokens
+
+# 需要始终保留最新一条的消息前缀（患者画像、审核轮注入的患者信息、审核意见）
+PROTECTED_PREFIXES: Tuple[str, ...] = (
+    "研究和讨论的患者病例信息如下",
+    "诊断的信息如下",
+    "你已经查看了其他专家的报告",
+)
+
+_DEFAULT_BUDGET_SETTINGS: Dict[str, Any] = {
+    "enabled": True,
+    "reserve_output_tokens": 4000,
+    "keep_recent_tool_outputs": 3,
+    "summary_chars": 200,
+}
+
+
+@dataclass
+class BudgetReport:
+    """一次裁剪的结果统计"""
+    budget: int
+    tokens_before: int
+    tokens_after: int
+    dropped_tool_outputs: int = 0
+    summarized_messages: int = 0
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def trimmed(self) -> bool:
+        return self.tokens_after < self.tokens_before
+
+
+def load_budget_settings() -> Dict[str, Any]:
+    """读取 config.yml 中的 context_budget 配置（缺失时使用默认值）"""
+    out = dict(_DEFAULT_BUDGET_SETTINGS)
+    try:
+        from DeepRareAgent.config import settings
+        budget_cfg = getattr(settings, "context_budget", None)
+    except Exception:
+        budget_cfg = None
+    if budget_cfg is not None:
+        out.update({k: v for k, v in budget_cfg.to_dict().items() if v is not None})
+    return out
+
+
+def _text_of(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        b.get("text", "") if isinstance(b, dict) else str(b) for b in (content or [])
+    )
+
+
+def _protected_indices(messages: Sequence[BaseMessage]) -> Tuple[set, int]:
+    """
+    返回 (受保护下标集合, 尾部起始下标)。
+
+    受保护: 第一条消息、各类关键前缀的最新一条、最后一条用户消息；
+    尾部: 最后一次模型回复及其工具结果（当前轮次，整体保留）。
+    """
+    protected = {0} if messages else set()
+    for prefix in PROTECTED_PREFIXES:
+        for idx in range(len(messages) - 1, -1, -1):
+            if _text_of(messages[idx]).lstrip().startswith(prefix):
+                protected.add(idx)
+                break
+
+    last_human = last_ai = None
+    for idx in range(len(messages) - 1, -1, -1):
+        if last_human is None and isinstance(messages[idx], HumanMessage):
+            last_human = idx
+        if last_ai is None and isinstance(messages[idx], AIMessage):
+            last_ai = idx
+        if last_human is not None and last_ai is not None:
+            break
+    if last_human is not None:
+        protected.add(last_human)
+    tail_start = len(messages)
+    if last_ai is not None and (last_human is None or last_ai > last_human):
+        tail_start = last_ai
+    return protected, tail_start
+
+
+def _summary_line(message: BaseMessage, chars: int) -> str:
+    text = " ".join(_text_of(message).split())
+    if len(text) > chars:
+        text = text[:chars] + "…"
+    if isinstance(message, ToolMessage):
+        return f"- 工具 {message.name or ''} 返回: {text}"
+    if isinstance(message, AIMessage):
+        calls = ", ".join(c.get("name", "") for c in (message.tool_calls or []))
+        suffix = f"（调用工具: {calls}）" if calls else ""
+        return f"- 助手: {text}{suffix}"
+    return f"- 用户: {text}"
+
+
+def fit_messages_to_budget(
+    messages: Sequence[BaseMessage],
+    max_tokens: int,
+    fixed_tokens: int = 0,
+    keep_recent_tool_outputs: int = 3,
+    summary_chars: int = 200,
+    summarize: Optional[Callable[[List[BaseMessage]], str]] = None,
+) -> Tuple[List[BaseMessage], BudgetReport]:
+    """
+    按 token 预算裁剪消息列表（返回新列表，不修改输入）。
+
+    Args:
+        messages: 待发送的消息
+        max_tokens: 输入 token 预算
+        fixed_tokens: 系统提示词、工具定义等不可裁剪部分的 token 数
+        keep_recent_tool_outputs: 始终保留的最近工具输出条数
+        summary_chars: 压缩早期轮次时每条消息保留的字符数
+        summarize: 可选的自定义摘要函数（输入被压缩的消息，返回摘要文本）
+
+    Returns:
+        (裁剪后的消息列表, 裁剪统计)
+    """
+    messages = list(messages)
+    tokens = [estimate_message_tokens(m) for m in messages]
+    total = fixed_tokens + sum(tokens)
+    report = BudgetReport(budget=max_tokens, tokens_before=total, tokens_after=total)
+    if total <= max_tokens or not messages:
+        return messages, report
+
+    protected, tail_start = _protected_indices(messages)
+
+    # 1. 省略陈旧的工具输出（从最早的开始）
+    tool_indices = [i for i, m in enumerate(messages) if isinstance(m, ToolMessage)]
+    stale = tool_indices[:-keep_recent_tool_outputs] if keep_recent_tool_outputs else tool_indices
+    for idx in stale:
+        if total <= max_tokens:
+            break
+        if idx in protected or idx >= tail_start:
+            continue
+        placeholder = f"[已省略较早的工具输出，约 {tokens[idx]} tokens，如需可重新调用工具获取]"
+        messages[idx] = messages[idx].model_copy(update={"content": placeholder})
+        new_tokens = estimate_message_tokens(messages[idx])
+        total -= tokens[idx] - new_tokens
+        tokens[idx] = new_tokens
+        report.dropped_tool_outputs += 1
+
+    # 2. 压缩较早的轮次（保留受保护消息与尾部）
+    if total > max_tokens:
+        candidates = [i for i in range(1, tail_start) if i not in protected]
+        collapsed: List[int] = []
+        header_tokens = 20
+        summary_tokens = header_tokens
+        pos = 0
+        while pos < len(candidates) and total - sum(tokens[i] for i in collapsed) + summary_tokens > max_tokens:
+            idx = candidates[pos]
+            collapsed.append(idx)
+            summary_tokens += estimate_text_tokens(_summary_line(messages[idx], summary_chars))
+            pos += 1
+        # 不能留下孤立的工具结果（其发起调用的 AI 消息已被压缩）
+        while pos < len(candidates) and isinstance(messages[candidates[pos]], ToolMessage):
+            collapsed.append(candidates[pos])
+            pos += 1
+
+        if collapsed:
+            folded = [messages[i] for i in collapsed]
+            if summarize is not None:
+                body = summarize(folded)
+            else:
+                body = "\n".join(_summary_line(m, summary_chars) for m in folded)
+            summary_message = HumanMessage(
+                content=f"[早期讨论摘要：为控制上下文长度，已压缩 {len(folded)} 条较早的消息]\n{body}"
+            )
+            collapsed_set = set(collapsed)
+            rebuilt: List[BaseMessage] = []
+            for i, message in enumerate(messages):
+                if i == collapsed[0]:
+                    rebuilt.append(summary_message)
+                if i not in collapsed_set:
+                    rebuilt.append(message)
+            messages = rebuilt
+            total = fixed_tokens + sum(estimate_message_tokens(m) for m in messages)
+            report.summarized_messages = len(folded)
+
+    if total > max_tokens:
+        report.notes.append("受保护的消息本身已超出预算")
+    report.tokens_after = total
+    return messages, report
+
+
+def _log_report(name: str, report: BudgetReport) -> None:
+    if not report.trimmed:
+        return
+    print(
+        f"[ContextBudget] {name}: {report.tokens_before} -> {report.tokens_after} tokens "
+        f"(预算 {report.budget}，省略工具输出 {report.dropped_tool_outputs} 条，"
+        f"压缩早期消息 {report.summarized_messages} 条)"
+        + (f" [WARN] {'; '.join(report.notes)}" if report.notes else "")
+    )
+
+
+def apply_context_budget(
+    messages: Sequence[BaseMessage],
+    max_input_tokens: Optional[int],
+    name: str = "llm",
+    fixed_tokens: int = 0,
+) -> List[BaseMessage]:
+    """
+    按全局 context_budget 配置裁剪消息（供直接调用 LLM 的节点使用，如审核节点）。
+
+    Args:
+        messages: 待发送的消息
+        max_input_tokens: 模型输入上限；None 表示不限制
+        name: 日志中的调用方名称
+        fixed_tokens: 不可裁剪部分的 token 数
+    """
+    cfg = load_budget_settings()
+    if not cfg["enabled"] or not max_input_tokens:
+        return list(messages)
+    budget = int(max_input_tokens) - int(cfg["reserve_output_tokens"])
+    trimmed, report = fit_messages_to_budget(
+        messages,
+        budget,
+        fixed_tokens=fixed_tokens,
+        keep_recent_tool_outputs=int(cfg["keep_recent_tool_outputs"]),
+        summary_chars=int(cfg["summary_chars"]),
+    )
+    _log_report(name, report)
+    return trimmed
+
+
+class ContextBudgetMiddleware(AgentMiddleware):
+    """在每次模型调用前按 token 预算裁剪 messages 的 agent 中间件"""
+
+    def __init__(self, max_input_tokens: Optional[int], name: str = "agent"):
+        super().__init__()
+        self.max_input_tokens = max_input_tokens
+        self.budget_name = name
+
+    def _prepare(self, request):
+        if not self.max_input_tokens:
+            return request
+        fixed = 0
+        if request.system_message is not None:
+            fixed += estimate_message_tokens(request.system_message)
+        for tool in request.tools or []:
+            fixed += estimate_text_tokens(
+                f"{getattr(tool, 'name', '')} {getattr(tool, 'description', '')}"
+            )
+        trimmed = apply_context_budget(
+            request.messages, self.max_input_tokens, self.budget_name, fixed_tokens=fixed
+        )
+        if len(trimmed) == len(request.messages) and all(
+            a is b for a, b in zip(trimmed, request.messages)
+        ):
+            return request
+        return request.override(messages=trimmed)
+
+    def wrap_model_call(self, request, handler):
+        return handler(self._prepare(request))
+
+    async def awrap_model_call(self, request, handler):
+        return await handler(self._prepare(request))
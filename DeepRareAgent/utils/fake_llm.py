@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+离线模型：fake（脚本化响应）与 replay（回放录制的响应）
+
+用于在没有 API Key 的环境下压测整张图、单独测量框架 / 状态 / 工具本身的开销。
+由 create_llm_from_config 在 provider 为 fake / replay 时创建，不接入连接池、
+治理器与对冲（这些都是针对真实 endpoint 的）。
+
+配置示例 (config.yml 中任一模型配置段):
+    provider: fake
+    model_name: fake-expert
+    latency_ms: 200            # 合成延迟均值
+    latency_jitter_ms: 50      # 均匀抖动 ±
+    output_tokens: 300         # 固定输出 token 数（缺省按内容估算）
+    seed: 0
+    rules:                     # 按最后一条消息匹配（正则），先匹配先用
+      - match: "专家的报告"
+        response: '{"is_satisfied": true, "reinvestigate_reason": ""}'
+    responses:                 # 未命中规则时按顺序循环使用
+      - content: ""
+        tool_calls: [{name: "phenotype_to_hpo_tool", args: {phenotypes: ["seizure"]}}]
+      - "## 诊断报告\\n..."
+
+    provider: replay
+    model_name: replay
+    cassette_path: "benchmarks/cassettes/case_001.jsonl"   # 缺省时使用 replay_cassette 上下文
+    time_scale: 1.0            # 1.0 原始耗时；0 不等待；0.5 加速一倍
+    strict: false              # true 时找不到录制响应直接报错，否则按录制顺序回放
+
+录制文件格式与录制方法见 cassette 模块。
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from pydantic import Field, PrivateAttr
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import load
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from DeepRareAgent.utils.cassette import Cassette, get_active_cassette, prompt_fingerprint
+from DeepRareAgent.utils.token_utils import estimate_messages_tokens, estimate_text_tokens
+
+
+def _last_text(messages: Sequence[BaseMessage]) -> str:
+    if not messages:
+        return ""
+    content = messages[-1].content
+    if isinstance(content, str):
+        return content
+    return "".join(b.get("text", "") if isinstance(b, dict) else str(b) for b in content)
+
+
+class _OfflineChatModel(BaseChatModel):
+    """离线模型公共部分：工具绑定、强制工具调用、usage 统计"""
+
+    model_name: str = "offline"
+    output_tokens: Optional[int] = None
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Any = None, **kwargs: Any):
+        formatted = [convert_to_openai_tool(t) for t in tools]
+        return self.bind(tools=formatted, tool_choice=tool_choice, **kwargs)
+
+    @staticmethod
+    def _forced_tool(tools: Optional[List[Dict]], tool_choice: Any) -> Optional[str]:
+        """tool_choice 强制调用时返回工具名（结构化输出走这里）"""
+        if not tools or tool_choice in (None, "auto", "none"):
+            return None
+        if isinstance(tool_choice, dict):
+            name = tool_choice.get("name") or tool_choice.get("function", {}).get("name")
+            return name
+        if isinstance(tool_choice, str) and tool_choice not in ("any", "required"):
+            return tool_choice
+        return tools[0]["function"]["name"] if len(tools) == 1 else None
+
+    def _finalize(
+        self,
+        message: AIMessage,
+        messages: Sequence[BaseMessage],
+        tools: Optional[List[Dict]] = None,
+        tool_choice: Any = None,
+    ) -> ChatResult:
+        forced = self._forced_tool(tools, tool_choice)
+        if forced and not message.tool_calls:
+            # 脚本中只写了 JSON 正文时，按强制工具调用的形式返回
+            try:
+                args = json.loads(message.content) if isinstance(message.content, str) else None
+            except ValueError:
+                args = None
+            if isinstance(args, dict):
+                message = AIMessage(
+                    content="",
+                    tool_calls=[{"name": forced, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}],
+                )
+        if message.usage_metadata is None:
+            input_tokens = estimate_messages_tokens(messages)
+            output_tokens = self.output_tokens
+            if output_tokens is None:
+                output_tokens = estimate_text_tokens(
+                    (message.content if isinstance(message.content, str) else "")
+                    + json.dumps([c.get("args") for c in message.tool_calls], ensure_ascii=False)
+                )
+            message.usage_metadata = {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            }
+        message.response_metadata = {**message.response_metadata, "model_name": self.model_name}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _pick(self, messages: Sequence[BaseMessage]):
+        """返回 (AIMessage, 延迟秒数)"""
+        raise NotImplementedError
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message, delay = self._pick(messages)
+        if delay > 0:
+            time.sleep(delay)
+        return self._finalize(message, messages, kwargs.get("tools"), kwargs.get("tool_choice"))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message, delay = self._pick(messages)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._finalize(message, messages, kwargs.get("tools"), kwargs.get("tool_choice"))
+
+
+def _to_ai_message(spec: Any) -> AIMessage:
+    """脚本响应 -> AIMessage（支持字符串或 {content, tool_calls}）"""
+    if isinstance(spec, AIMessage):
+        return spec.model_copy(deep=True)
+    if isinstance(spec, str):
+        return AIMessage(content=spec)
+    spec = dict(spec)
+    tool_calls = [
+        {"name": c["name"], "args": dict(c.get("args") or {}), "id": c.get("id") or f"call_{uuid.uuid4().hex[:12]}"}
+        for c in spec.get("tool_calls") or []
+    ]
+    return AIMessage(content=spec.get("content", ""), tool_calls=tool_calls)
+
+
+class FakeChatModel(_OfflineChatModel):
+    """按规则 / 顺序返回脚本化响应的确定性模型"""
+
+    model_name: str = "fake"
+    responses: List[Any] = Field(default_factory=list)
+    rules: List[Dict[str, Any]] = Field(default_factory=list)
+    default_response: Any = "fake response"
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    seed: int = 0
+
+    _cursor: int = PrivateAttr(default=0)
+    _rng: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "deeprare-fake"
+
+    def _pick(self, messages):
+        with self._lock:
+            if self._rng is None:
+                self._rng = random.Random(self.seed)
+            delay = self.latency_ms
+            if self.latency_jitter_ms:
+                delay += self._rng.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+
+            text = _last_text(messages)
+            spec = None
+            for rule in self.rules:
+                if re.search(rule.get("match", ""), text):
+                    spec = rule.get("response", "")
+                    break
+            if spec is None and self.responses:
+                spec = self.responses[self._cursor % len(self.responses)]
+                self._cursor += 1
+            if spec is None:
+                spec = self.default_response
+        return _to_ai_message(spec), max(delay, 0.0) / 1000.0
+
+    def reset(self) -> None:
+        """重置脚本游标与随机数（每个基准用例开始时调用，保证可重复）"""
+        with self._lock:
+            self._cursor = 0
+            self._rng = None
+
+
+class ReplayChatModel(_OfflineChatModel):
+    """
+    回放录制的响应：优先按消息指纹匹配，找不到时按录制顺序（录制格式见 cassette）。
+    未配置 cassette_path 时使用 replay_cassette 上下文中的录制文件。
+    """
+
+    model_name: str = "replay"
+    cassette_path: Optional[str] = None
+    time_scale: float = 1.0
+    strict: bool = False
+
+    _cassette: Optional[Cassette] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        if self.cassette_path:
+            self._cassette = Cassette.load(self.cassette_path, self.time_scale, self.strict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "deeprare-replay"
+
+    def _pick(self, messages):
+        cassette = self._cassette or get_active_cassette()
+        if cassette is None:
+            raise RuntimeError("replay 模型未配置 cassette_path，且当前不在 replay_cassette 上下文中")
+        record = cassette.take("llm", prompt_fingerprint(messages))
+        return load(record["message"]), cassette.delay_of(record)
+
+
+def create_offline_llm(provider: str, cfg: Any) -> _OfflineChatModel:
+    """根据 fake / replay 配置创建离线模型"""
+    def _get(name: str, default: Any = None) -> Any:
+        value = getattr(cfg, name, default)
+        if hasattr(value, "to_dict"):
+            return value.to_dict()
+        if isinstance(value, list):
+            return [v.to_dict() if hasattr(v, "to_dict") else v for v in value]
+        return value
+
+    model_name = _get("model_name", provider)
+    if provider == "replay":
+        return ReplayChatModel(
+            model_name=model_name,
+            cassette_path=_get("cassette_path"),
+            time_scale=float(_get("time_scale", 1.0)),
+            strict=bool(_get("strict", False)),
+            output_tokens=_get("output_tokens"),
+        )
+    params = {
+        "model_name": model_name,
+        "responses": _get("responses") or [],
+        "rules": _get("rules") or [],
+        "latency_ms": float(_get("latency_ms", 0.0) or 0.0),
+        "latency_jitter_ms": float(_get("latency_jitter_ms", 0.0) or 0.0),
+        "seed": int(_get("seed", 0) or 0),
+        "output_tokens": _get("output_tokens"),
+    }
+    if _get("default_response") is not None:
+        params["default_response"] = _get("default_response")
+    return FakeChatModel(**params)
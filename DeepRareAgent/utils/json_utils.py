@@ -4,41 +4,67 @@ import re
 import typing
 import json5
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    orjson = None
+
+_FENCED_JSON_PATTERN = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+def _strict_loads(text: str) -> typing.Any:
+    """Strict JSON parse (orjson when installed, stdlib json otherwise)."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _candidate_json_strings(text: str) -> typing.Iterator[str]:
+    """Yield the substrings worth parsing, cheapest first: whole text, fenced block, outer braces."""
+    yield text
+    match = _FENCED_JSON_PATTERN.search(text)
+    if match:
+        yield match.group(1)
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end > start:
+        yield text[start : end + 1]
+
+
 def parse_json_from_markdown(text: str) -> typing.Dict[str, typing.Any]:
     """
     Robustly parse JSON from text that might contain Markdown code blocks
     or be raw JSON.
+
+    Strict JSON (orjson / json) is tried on every candidate first; json5 is only
+    used as a fallback for loose output (single quotes, trailing commas, True/False).
     """
-    # 1. Try parsing directly first
-    try:
-        return json5.loads(text)
-    except Exception:
-        pass
-    
-    # 2. Try extracting from markdown code blocks (```json ... ``` or just ``` ... ```)
-    # Match ```json {content} ``` or ``` {content} ```
-    pattern = r"```(?:json)?\s*(\{.*?\})\s*```"
-    match = re.search(pattern, text, re.DOTALL)
-    
-    if match:
-        json_str = match.group(1)
+    candidates = list(_candidate_json_strings(text.strip()))
+
+    # 1. Fast path: strict parsers on raw text, ```json block, then outer braces
+    for candidate in candidates:
+        try:
+            return _strict_loads(candidate)
+        except ValueError:
+            continue
+
+    # 2. Slow path: json5 on the same candidates
+    for candidate in candidates:
         try:
-            return json5.loads(json_str)
+            return json5.loads(candidate)
         except Exception:
-            pass
-            
-    # 3. Try finding the first '{' and last '}'
-    try:
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1:
-            json_str = text[start : end + 1]
-            return json5.loads(json_str)
-    except Exception:
-        pass
-        
-    # 4. Fallback: If minimal structure exists, return empty or raise error
-    # For this system, we might want to return a safe default or let it fail 
-    # so the caller knows something went wrong. 
-    # Let's let the caller handle exceptions if completely failed.
+            continue
+
+    # 3. Let the caller handle exceptions if parsing completely failed.
     raise ValueError(f"Failed to parse JSON from response: {text[:200]}...")
+
+
+def coerce_bool(value: typing.Any) -> bool:
+    """Normalize model-produced booleans ("true", "是", 1, ...) to bool."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "y", "1", "是", "满意")
+    return False
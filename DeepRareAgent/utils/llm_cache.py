@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 精确匹配响应缓存（可选开启）
+
+基准测试重跑、重复提交的病例会把完全相同的消息列表发给同一个低温模型。
+本模块实现 LangChain 的 BaseCache 接口，由模型工厂通过 cache= 参数挂到模型上：
+
+- 缓存键: provider / model / 参数 / 工具定义（LangChain 的 llm_string）
+  + 规范化后的消息序列化结果，取 sha256
+  规范化会去掉消息 id、response_metadata、usage_metadata 等每次运行都会变化的字段
+- 后端可插拔: 内存 LRU（MemoryResponseBackend）或 SQLite 磁盘（DiskResponseBackend），
+  均支持条目数与总字节数上限
+- 只对温度不高于 max_temperature 的模型启用，避免把采样结果当成确定性输出
+
+配置 (config.yml):
+    llm_cache:
+      enabled: false
+      backend: "disk"            # memory | disk
+      path: ".cache/llm_responses.sqlite"
+      max_entries: 5000
+      max_bytes: 536870912
+      max_temperature: 0.3
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+# 规范化消息时去掉的易变字段
+_VOLATILE_MESSAGE_FIELDS = ("id", "response_metadata", "usage_metadata")
+
+
+# ========== 缓存键 ==========
+def _strip_volatile(node: Any) -> Any:
+    if isinstance(node, dict):
+        out = {}
+        for k, v in node.items():
+            if k == "kwargs" and isinstance(v, dict):
+                v = {kk: vv for kk, vv in v.items() if kk not in _VOLATILE_MESSAGE_FIELDS}
+            out[k] = _strip_volatile(v)
+        return out
+    if isinstance(node, list):
+        return [_strip_volatile(v) for v in node]
+    return node
+
+
+def canonical_prompt(prompt: str) -> str:
+    """规范化 LangChain 序列化后的消息列表（去掉每次运行都会变化的字段）"""
+    try:
+        data = json.loads(prompt)
+    except (TypeError, ValueError):
+        return prompt
+    return json.dumps(_strip_volatile(data), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    """由 llm_string（模型+参数+工具）与消息生成稳定的 sha256 缓存键"""
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(canonical_prompt(prompt).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ========== 后端 ==========
+class ResponseCacheBackend:
+    """缓存后端接口：按键存取已序列化的响应字符串"""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryResponseBackend(ResponseCacheBackend):
+    """进程内 LRU 后端"""
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.encode("utf-8"))
+            self._data[key] = value
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted.encode("utf-8"))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes}
+
+
+class DiskResponseBackend(ResponseCacheBackend):
+    """SQLite 磁盘后端（跨进程、跨次运行复用），按最近访问时间淘汰"""
+
+    def __init__(self, path: str, max_entries: int = 5000, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "path": str(self.path)}
+
+
+# ========== LangChain 缓存适配 ==========
+class ExactMatchLLMCache(BaseCache):
+    """精确匹配响应缓存（LangChain BaseCache 实现）"""
+
+    def __init__(self, backend: Optional[ResponseCacheBackend] = None):
+        self.backend = backend or MemoryResponseBackend()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        raw = self.backend.get(make_cache_key(prompt, llm_string))
+        with self._lock:
+            if raw is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if raw is None:
+            return None
+        return [loads(item) for item in json.loads(raw)]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        raw = json.dumps([dumps(gen) for gen in return_val], ensure_ascii=False)
+        self.backend.set(make_cache_key(prompt, llm_string), raw)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {"hits": self._hits, "misses": self._misses}
+        out.update(self.backend.stats())
+        return out
+
+
+# ========== 进程级单例 ==========
+_response_cache: Optional[ExactMatchLLMCache] = None
+_cache_settings: Optional[Dict[str, Any]] = None
+_init_lock = threading.Lock()
+
+_DEFAULT_CACHE_SETTINGS: Dict[str, Any] = {
+    "enabled": False,
+    "backend": "memory",
+    "path": ".cache/llm_responses.sqlite",
+    "max_entries": 5000,
+    "max_bytes": 512 * 1024 * 1024,
+    "max_temperature": 0.3,
+}
+
+
+def _load_cache_settings() -> Dict[str, Any]:
+    global _cache_settings
+    if _cache_settings is None:
+        out = dict(_DEFAULT_CACHE_SETTINGS)
+        try:
+            from DeepRareAgent.config import settings
+            cache_cfg = getattr(settings, "llm_cache", None)
+        except Exception:
+            cache_cfg = None
+        if cache_cfg is not None:
+            out.update({k: v for k, v in cache_cfg.to_dict().items() if v is not None})
+        _cache_settings = out
+    return _cache_settings
+
+
+def configure_response_cache(
+    config: Optional[Dict[str, Any]] = None,
+    backend: Optional[ResponseCacheBackend] = None,
+) -> Optional[ExactMatchLLMCache]:
+    """
+    覆盖缓存配置（脚本或测试中使用），也可直接注入自定义后端。
+
+    Args:
+        config: 结构同 config.yml 中 llm_cache 段；None 表示重新从 settings 读取
+        backend: 自定义后端实例，提供时忽略 config 中的 backend/path
+
+    Returns:
+        启用时返回缓存实例，否则 None
+    """
+    global _response_cache, _cache_settings
+    with _init_lock:
+        _response_cache = None
+        _cache_settings = None if config is None else {**_DEFAULT_CACHE_SETTINGS, **config}
+        if backend is not None:
+            _response_cache = ExactMatchLLMCache(backend)
+    return get_response_cache()
+
+
+def get_response_cache() -> Optional[ExactMatchLLMCache]:
+    """返回进程级响应缓存；未启用时返回 None"""
+    global _response_cache
+    cfg = _load_cache_settings()
+    if not cfg.get("enabled"):
+        return None
+    if _response_cache is None:
+        with _init_lock:
+            if _response_cache is None:
+                if cfg.get("backend") == "disk":
+                    backend: ResponseCacheBackend = DiskResponseBackend(
+                        cfg["path"], int(cfg["max_entries"]), int(cfg["max_bytes"])
+                    )
+                else:
+                    backend = MemoryResponseBackend(int(cfg["max_entries"]), int(cfg["max_bytes"]))
+                _response_cache = ExactMatchLLMCache(backend)
+    return _response_cache
+
+
+def cache_for_temperature(temperature: Optional[float]) -> Optional[ExactMatchLLMCache]:
+    """按模型温度决定是否挂载缓存（温度未知或高于 max_temperature 时不缓存）"""
+    cache = get_response_cache()
+    if cache is None or temperature is None:
+        return None
+    if float(temperature) > float(_load_cache_settings()["max_temperature"]):
+        return None
+    return cache
@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 调用治理器（按 endpoint 的并发 + TPM 限流，带优先级通道）
+
+多个专家组、子代理、审核员往往同时打到同一个 base_url，容易触发 429 后反复重试。
+本模块在模型工厂层为每个 endpoint 维护一个进程级共享的 EndpointGovernor：
+- max_concurrency: 同时在途的请求数上限
+- tokens_per_minute: 令牌桶限流（按估算输入 token 预留，返回后按真实用量校正）
+- 优先级通道: 交互式的预诊断对话 (interactive) 排在后台 MDT / 汇总调用 (background) 前面
+- 收到 429 时暂停该 endpoint 一段冷却时间
+
+同一个治理器同时服务同步调用（线程中运行的节点）和异步调用（事件循环中的节点），
+内部状态由线程锁保护。
+
+使用方式:
+    with llm_priority("interactive"):
+        await agent.ainvoke(state)   # 该上下文中的所有 LLM 调用都走优先通道
+
+配置 (config.yml):
+    llm_governor:
+      enabled: true
+      default: {max_concurrency: 8, tokens_per_minute: 0, cooldown_seconds: 5}
+      endpoints:
+        - match: "aiping.cn"
+          max_concurrency: 4
+          tokens_per_minute: 200000
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional
+
+from DeepRareAgent.utils.token_utils import estimate_messages_tokens
+from DeepRareAgent.utils.tracing import annotate_run
+
+# ========== 优先级通道 ==========
+LANE_INTERACTIVE = "interactive"
+LANE_BACKGROUND = "background"
+_LANE_PRIORITY = {LANE_INTERACTIVE: 0, LANE_BACKGROUND: 1}
+
+_current_lane: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "deeprare_llm_lane", default=LANE_BACKGROUND
+)
+# 当前上下文已持有的 endpoint（防止 _generate 内部再走 _stream 时重复占用）
+_held_endpoints: contextvars.ContextVar[FrozenSet[str]] = contextvars.ContextVar(
+    "deeprare_llm_held_endpoints", default=frozenset()
+)
+
+
+@contextmanager
+def llm_priority(lane: str) -> Iterator[None]:
+    """在上下文内设置 LLM 调用的优先级通道（interactive / background）"""
+    if lane not in _LANE_PRIORITY:
+        raise ValueError(f"未知的优先级通道: {lane}，可选值: {list(_LANE_PRIORITY)}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def current_lane() -> str:
+    """返回当前上下文的优先级通道"""
+    return _current_lane.get()
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """判断异常是否为服务端限流（429）"""
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return "RateLimit" in type(exc).__name__
+
+
+# ========== 治理器 ==========
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "lane", "granted", "cancelled", "_wake")
+
+    def __init__(self, priority: int, seq: int, tokens: int, lane: str):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.lane = lane
+        self.granted = False
+        self.cancelled = False
+        self._wake = None
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake()
+
+
+class Grant:
+    """一次获批的调用许可；调用结束后可设置 used_tokens 用于校正令牌桶"""
+    __slots__ = ("reserved_tokens", "used_tokens", "waited")
+
+    def __init__(self, reserved_tokens: int, waited: float):
+        self.reserved_tokens = reserved_tokens
+        self.used_tokens: Optional[int] = None
+        self.waited = waited
+
+
+class EndpointGovernor:
+    """单个 endpoint 的并发与 TPM 治理器（线程安全，同时支持同步与异步等待）"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 8,
+        tokens_per_minute: int = 0,
+        cooldown_seconds: float = 5.0,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.tokens_per_minute = int(tokens_per_minute or 0)
+        self.cooldown_seconds = float(cooldown_seconds)
+
+        self._lock = threading.Lock()
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._tokens = float(self.tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._stats: Dict[str, Any] = {
+            "granted": 0,
+            "queued": 0,
+            "rate_limited": 0,
+            "wait_seconds": {lane: 0.0 for lane in _LANE_PRIORITY},
+        }
+
+    # ---------- 内部调度（需持有锁） ----------
+    def _refill_locked(self, now: float) -> None:
+        if self.tokens_per_minute:
+            elapsed = now - self._last_refill
+            self._tokens = min(
+                float(self.tokens_per_minute),
+                self._tokens + elapsed * self.tokens_per_minute / 60.0,
+            )
+        self._last_refill = now
+
+    def _dispatch_locked(self) -> Optional[float]:
+        """
+        按优先级依次放行队首请求。
+
+        Returns:
+            队首因 TPM/冷却 被阻塞时返回需要等待的秒数，否则 None（等待其他请求释放）
+        """
+        now = time.monotonic()
+        self._refill_locked(now)
+        while self._waiters:
+            head = self._waiters[0]
+            if head.cancelled:
+                heapq.heappop(self._waiters)
+                continue
+            if self._in_flight >= self.max_concurrency:
+                return None
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.tokens_per_minute and self._tokens < head.tokens:
+                return (head.tokens - self._tokens) * 60.0 / self.tokens_per_minute
+
+            heapq.heappop(self._waiters)
+            head.granted = True
+            self._in_flight += 1
+            if self.tokens_per_minute:
+                self._tokens -= head.tokens
+            self._stats["granted"] += 1
+            head.wake()
+        return None
+
+    def _enqueue(self, tokens: int, lane: str) -> _Waiter:
+        if self.tokens_per_minute:
+            # 单个请求最多预留一整桶，避免超大请求永远无法放行
+            tokens = min(tokens, self.tokens_per_minute)
+        waiter = _Waiter(_LANE_PRIORITY.get(lane, 1), next(self._seq), tokens, lane)
+        heapq.heappush(self._waiters, waiter)
+        return waiter
+
+    def _record_wait(self, waiter: _Waiter, started: float) -> Grant:
+        waited = time.monotonic() - started
+        with self._lock:
+            if waited > 0.001:
+                self._stats["queued"] += 1
+            self._stats["wait_seconds"][waiter.lane] += waited
+        return Grant(waiter.tokens, waited)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter.granted:
+                self._release_locked(waiter.tokens, None)
+            else:
+                waiter.cancelled = True
+            self._dispatch_locked()
+
+    def _release_locked(self, reserved: int, used: Optional[int]) -> None:
+        self._in_flight = max(0, self._in_flight - 1)
+        if self.tokens_per_minute and used is not None:
+            # 按真实用量校正（允许为负，后续请求会相应推迟）
+            self._tokens -= used - reserved
+
+    # ---------- 公共接口 ----------
+    def acquire(self, tokens: int = 0, lane: Optional[str] = None) -> Grant:
+        """同步获取调用许可（阻塞当前线程）"""
+        lane = lane or current_lane()
+        started = time.monotonic()
+        event = threading.Event()
+        with self._lock:
+            waiter = self._enqueue(tokens, lane)
+            waiter._wake = event.set
+            delay = self._dispatch_locked()
+        try:
+            while not waiter.granted:
+                event.wait(timeout=delay)
+                event.clear()
+                with self._lock:
+                    delay = None if waiter.granted else self._dispatch_locked()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return self._record_wait(waiter, started)
+
+    async def acquire_async(self, tokens: int = 0, lane: Optional[str] = None) -> Grant:
+        """异步获取调用许可（不阻塞事件循环）"""
+        lane = lane or current_lane()
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def _wake() -> None:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+        with self._lock:
+            waiter = self._enqueue(tokens, lane)
+            waiter._wake = _wake
+            delay = self._dispatch_locked()
+        try:
+            while not waiter.granted:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+                with self._lock:
+                    delay = None if waiter.granted else self._dispatch_locked()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return self._record_wait(waiter, started)
+
+    def release(self, grant: Grant, exc: Optional[BaseException] = None) -> None:
+        """释放许可；exc 为 429 时暂停该 endpoint 冷却时间"""
+        with self._lock:
+            self._release_locked(grant.reserved_tokens, grant.used_tokens)
+            if exc is not None and is_rate_limit_error(exc):
+                self._stats["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + self.cooldown_seconds)
+            self._dispatch_locked()
+
+    @contextmanager
+    def slot(self, tokens: int = 0, lane: Optional[str] = None) -> Iterator[Grant]:
+        """同步上下文管理器形式"""
+        grant = self.acquire(tokens, lane)
+        try:
+            yield grant
+        except BaseException as e:
+            self.release(grant, e)
+            raise
+        else:
+            self.release(grant)
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int = 0, lane: Optional[str] = None):
+        """异步上下文管理器形式"""
+        grant = await self.acquire_async(tokens, lane)
+        try:
+            yield grant
+        except BaseException as e:
+            self.release(grant, e)
+            raise
+        else:
+            self.release(grant)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回统计信息（在途数、排队数、各通道等待时长等）"""
+        with self._lock:
+            out = dict(self._stats)
+            out["wait_seconds"] = dict(self._stats["wait_seconds"])
+            out["in_flight"] = self._in_flight
+            out["waiting"] = sum(1 for w in self._waiters if not w.cancelled)
+            out["max_concurrency"] = self.max_concurrency
+            out["tokens_per_minute"] = self.tokens_per_minute
+        return out
+
+
+# ========== 进程级注册表 ==========
+_governors: Dict[str, EndpointGovernor] = {}
+_registry_lock = threading.Lock()
+_governor_settings: Optional[Dict[str, Any]] = None
+
+
+def _load_governor_settings() -> Dict[str, Any]:
+    """读取 config.yml 中的 llm_governor 配置（缺失时禁用）"""
+    global _governor_settings
+    if _governor_settings is not None:
+        return _governor_settings
+
+    out: Dict[str, Any] = {"enabled": False, "default": {}, "endpoints": []}
+    try:
+        from DeepRareAgent.config import settings
+        gov_cfg = getattr(settings, "llm_governor", None)
+    except Exception:
+        gov_cfg = None
+    if gov_cfg is not None:
+        data = gov_cfg.to_dict()
+        out["enabled"] = bool(data.get("enabled", True))
+        out["default"] = data.get("default") or {}
+        out["endpoints"] = data.get("endpoints") or []
+    _governor_settings = out
+    return out
+
+
+def configure_governors(config: Optional[Dict[str, Any]]) -> None:
+    """
+    以字典形式覆盖治理器配置（测试或脚本中使用），并清空已创建的治理器。
+
+    Args:
+        config: 结构同 config.yml 中 llm_governor 段；None 表示重新从 settings 读取
+    """
+    global _governor_settings
+    with _registry_lock:
+        _governors.clear()
+        if config is None:
+            _governor_settings = None
+        else:
+            _governor_settings = {
+                "enabled": bool(config.get("enabled", True)),
+                "default": config.get("default") or {},
+                "endpoints": config.get("endpoints") or [],
+            }
+
+
+def get_governor(endpoint: str) -> Optional[EndpointGovernor]:
+    """
+    获取某个 endpoint 的共享治理器；未启用治理时返回 None。
+
+    Args:
+        endpoint: "provider:base_url" 形式的 endpoint 标识
+    """
+    governor = _governors.get(endpoint)
+    if governor is not None:
+        return governor
+
+    gov_settings = _load_governor_settings()
+    if not gov_settings["enabled"]:
+        return None
+
+    with _registry_lock:
+        governor = _governors.get(endpoint)
+        if governor is None:
+            params = dict(gov_settings["default"])
+            for rule in gov_settings["endpoints"]:
+                if rule.get("match") and rule["match"] in endpoint:
+                    params.update({k: v for k, v in rule.items() if k != "match"})
+                    break
+            governor = EndpointGovernor(
+                endpoint,
+                max_concurrency=params.get("max_concurrency", 8),
+                tokens_per_minute=params.get("tokens_per_minute", 0),
+                cooldown_seconds=params.get("cooldown_seconds", 5.0),
+            )
+            _governors[endpoint] = governor
+    return governor
+
+
+def get_governor_stats() -> Dict[str, Dict[str, Any]]:
+    """返回所有 endpoint 治理器的统计信息"""
+    return {name: gov.stats() for name, gov in list(_governors.items())}
+
+
+# ========== 模型混入 ==========
+def _usage_from_result(result: Any) -> Optional[int]:
+    try:
+        usage = result.generations[0].message.usage_metadata
+    except (AttributeError, IndexError):
+        return None
+    return usage.get("total_tokens") if usage else None
+
+
+class LLMGovernorMixin:
+    """
+    为 Chat 模型增加 endpoint 治理。子类需实现 _governor_endpoint() 返回 endpoint 标识。
+
+    覆盖 _generate / _agenerate / _stream / _astream，因此 invoke、ainvoke、
+    stream 以及 agent 内部的调用都会经过治理器。
+    """
+
+    def _governor_endpoint(self) -> str:
+        raise NotImplementedError
+
+    def _acquire_governor(self) -> Optional[EndpointGovernor]:
+        endpoint = self._governor_endpoint()
+        if endpoint in _held_endpoints.get():
+            return None
+        return get_governor(endpoint)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        governor = self._acquire_governor()
+        if governor is None:
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        with governor.slot(estimate_messages_tokens(messages)) as grant:
+            annotate_run(getattr(run_manager, "run_id", None), queue_wait_s=round(grant.waited, 4))
+            token = _held_endpoints.set(_held_endpoints.get() | {governor.name})
+            try:
+                result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            finally:
+                _held_endpoints.reset(token)
+            grant.used_tokens = _usage_from_result(result)
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        governor = self._acquire_governor()
+        if governor is None:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        async with governor.aslot(estimate_messages_tokens(messages)) as grant:
+            annotate_run(getattr(run_manager, "run_id", None), queue_wait_s=round(grant.waited, 4))
+            token = _held_endpoints.set(_held_endpoints.get() | {governor.name})
+            try:
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            finally:
+                _held_endpoints.reset(token)
+            grant.used_tokens = _usage_from_result(result)
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        governor = self._acquire_governor()
+        if governor is None:
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        with governor.slot(estimate_messages_tokens(messages)) as grant:
+            annotate_run(getattr(run_manager, "run_id", None), queue_wait_s=round(grant.waited, 4))
+            for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                usage = getattr(chunk.message, "usage_metadata", None)
+                if usage:
+                    grant.used_tokens = (grant.used_tokens or 0) + usage.get("total_tokens", 0)
+                yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        governor = self._acquire_governor()
+        if governor is None:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+        async with governor.aslot(estimate_messages_tokens(messages)) as grant:
+            annotate_run(getattr(run_manager, "run_id", None), queue_wait_s=round(grant.waited, 4))
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                usage = getattr(chunk.message, "usage_metadata", None)
+                if usage:
+                    grant.used_tokens = (grant.used_tokens or 0) + usage.get("total_tokens", 0)
+                yield chunk
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+对冲请求与故障切换（Hedged / Failover LLM Requests）
+
+专家、审核员调用第三方 endpoint 时尾延迟很重，expert_reviewer_node 用 gather
+等待所有审核员，一个卡住的请求会拖住整轮。本模块为模型配置增加备用模型：
+
+- 对冲 (hedge): 主请求耗时超过该模型历史延迟的某个分位数后，向备用模型再发一份，
+  先返回者获胜，另一个被取消
+- 故障切换 (failover): 主请求直接报错时立即改用下一个备用模型
+
+配置示例（任意模型配置段中）:
+    fallbacks:
+      - provider: "openai"
+        model_name: "deepseek-chat"
+        base_url: "https://api.deepseek.com/v1"
+        api_key: "..."
+        temperature: 0.1
+    hedging:
+      percentile: 0.9       # 超过历史延迟该分位数后发起对冲
+      min_samples: 10       # 样本不足时使用 initial_delay
+      initial_delay: 60     # 样本不足时的对冲延迟（秒），0 表示只做故障切换
+      min_delay: 2          # 对冲延迟下限（秒）
+
+说明:
+- 异步调用 (_agenerate / _astream) 支持对冲与故障切换；流式调用以首个 chunk 为准决出胜者
+- 同步调用 (_generate / _stream) 无法取消线程中的请求，只做故障切换
+- 绑定工具后，备用模型会用原始工具定义重新 bind_tools，因此可以跨 provider 对冲
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from langchain_anthropic import ChatAnthropic
+
+_DEFAULT_HEDGING: Dict[str, Any] = {
+    "percentile": 0.9,
+    "min_samples": 10,
+    "initial_delay": 60.0,
+    "min_delay": 2.0,
+}
+
+# bind_tools 时附带的原始工具定义（供备用模型重新绑定），调用底层 API 前会被移除
+HEDGE_TOOL_SPEC_KWARG = "_hedge_tool_spec"
+_TOOL_KWARGS = ("tools", "tool_choice", "parallel_tool_calls", "strict")
+
+
+# ========== 延迟统计 ==========
+class LatencyTracker:
+    """按模型记录最近 N 次调用延迟，用于计算对冲阈值（线程安全）"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, key: str, q: float) -> Optional[Tuple[float, int]]:
+        """返回 (分位数延迟, 样本数)，无样本时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None
+        idx = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+        return samples[idx], len(samples)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+_latency_tracker = LatencyTracker()
+_hedge_stats = {"hedged": 0, "hedge_wins": 0, "failovers": 0}
+_stats_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """返回进程级延迟统计器"""
+    return _latency_tracker
+
+
+def get_hedge_stats() -> Dict[str, int]:
+    """返回对冲/故障切换次数统计"""
+    with _stats_lock:
+        return dict(_hedge_stats)
+
+
+def _bump(name: str) -> None:
+    with _stats_lock:
+        _hedge_stats[name] += 1
+
+
+async def _cancel_tasks(tasks) -> None:
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except BaseException:
+            pass
+
+
+# ========== 模型混入 ==========
+class HedgedRequestMixin:
+    """
+    为 Chat 模型增加对冲与故障切换。具体类需声明以下字段:
+        hedge_fallbacks: List[BaseChatModel]   备用模型（按优先级排列）
+        hedge_settings: Dict[str, Any]         对冲参数（见模块说明）
+    """
+
+    def _hedge_key(self) -> str:
+        return f"{type(self).__name__}:{getattr(self, 'model_name', None) or getattr(self, 'model', '')}"
+
+    def _hedge_delay(self) -> Optional[float]:
+        """计算本次调用的对冲延迟（秒），None 表示不对冲"""
+        cfg = {**_DEFAULT_HEDGING, **(self.hedge_settings or {})}
+        observed = _latency_tracker.percentile(self._hedge_key(), float(cfg["percentile"]))
+        if observed is not None and observed[1] >= int(cfg["min_samples"]):
+            delay = observed[0]
+        else:
+            delay = float(cfg["initial_delay"] or 0)
+            if delay <= 0:
+                return None
+        return max(float(cfg["min_delay"]), delay)
+
+    def bind_tools(self, tools, **kwargs):
+        bound = super().bind_tools(tools, **kwargs)
+        if not self.hedge_fallbacks:
+            return bound
+        return bound.bind(**{HEDGE_TOOL_SPEC_KWARG: (list(tools), kwargs)})
+
+    def _get_llm_string(self, stop=None, **kwargs) -> str:
+        # 原始工具对象只用于备用模型重新绑定，不参与缓存键
+        kwargs.pop(HEDGE_TOOL_SPEC_KWARG, None)
+        return super()._get_llm_string(stop=stop, **kwargs)
+
+    def _fallback_kwargs(self, fallback: Any, kwargs: Dict[str, Any], tool_spec) -> Dict[str, Any]:
+        """为备用模型准备调用参数：按其 provider 重新格式化工具定义"""
+        out = dict(kwargs)
+        if "cache_control" in out and not isinstance(fallback, ChatAnthropic):
+            # cache_control 断点只有 Anthropic 兼容接口支持
+            out.pop("cache_control")
+        if tool_spec is None:
+            return out
+        tools, tool_kwargs = tool_spec
+        out = {k: v for k, v in out.items() if k not in _TOOL_KWARGS}
+        out.update(fallback.bind_tools(tools, **tool_kwargs).kwargs)
+        out.pop(HEDGE_TOOL_SPEC_KWARG, None)
+        return out
+
+    # ---------- 同步：只做故障切换 ----------
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_spec = kwargs.pop(HEDGE_TOOL_SPEC_KWARG, None)
+        if not self.hedge_fallbacks:
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        started = time.monotonic()
+        try:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            _latency_tracker.record(self._hedge_key(), time.monotonic() - started)
+            return result
+        except Exception as primary_error:
+            last_error = primary_error
+        for fallback in self.hedge_fallbacks:
+            _bump("failovers")
+            print(f"[Hedge] {self._hedge_key()} 调用失败，切换到备用模型: {last_error}")
+            try:
+                return fallback._generate(
+                    messages, stop=stop, **self._fallback_kwargs(fallback, kwargs, tool_spec)
+                )
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_spec = kwargs.pop(HEDGE_TOOL_SPEC_KWARG, None)
+        if not self.hedge_fallbacks:
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+
+        candidates = [(None, super()._stream, kwargs, run_manager)] + [
+            (fb, fb._stream, None, None) for fb in self.hedge_fallbacks
+        ]
+        last_error = None
+        for fallback, stream_fn, call_kwargs, manager in candidates:
+            if fallback is not None:
+                _bump("failovers")
+                print(f"[Hedge] {self._hedge_key()} 流式调用失败，切换到备用模型: {last_error}")
+                call_kwargs = self._fallback_kwargs(fallback, kwargs, tool_spec)
+            yielded = False
+            try:
+                for chunk in stream_fn(messages, stop=stop, run_manager=manager, **call_kwargs):
+                    yielded = True
+                    yield chunk
+                return
+            except Exception as e:
+                # 已经输出过内容就不能再切换，否则会出现重复输出
+                if yielded:
+                    raise
+                last_error = e
+        raise last_error
+
+    # ---------- 异步：对冲 + 故障切换 ----------
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_spec = kwargs.pop(HEDGE_TOOL_SPEC_KWARG, None)
+        if not self.hedge_fallbacks:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        key = self._hedge_key()
+        delay = self._hedge_delay()
+        started = time.monotonic()
+        primary = asyncio.ensure_future(
+            super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+        pending_fallbacks = list(self.hedge_fallbacks)
+        running: Dict[asyncio.Future, str] = {primary: "primary"}
+        last_error: Optional[BaseException] = None
+
+        def launch_next(reason: str) -> bool:
+            if not pending_fallbacks:
+                return False
+            fallback = pending_fallbacks.pop(0)
+            _bump(reason)
+            task = asyncio.ensure_future(fallback._agenerate(
+                messages, stop=stop, **self._fallback_kwargs(fallback, kwargs, tool_spec)
+            ))
+            running[task] = reason
+            return True
+
+        try:
+            while running:
+                timeout = None
+                if pending_fallbacks and delay is not None:
+                    timeout = max(0.0, started + delay * (len(running)) - time.monotonic())
+                done, _ = await asyncio.wait(
+                    set(running), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    print(f"[Hedge] {key} 超过 {delay:.1f}s 未返回，向备用模型发起对冲请求")
+                    launch_next("hedged")
+                    continue
+                for task in done:
+                    role = running.pop(task)
+                    if role == "primary":
+                        _latency_tracker.record(key, time.monotonic() - started)
+                    if task.exception() is None:
+                        if role == "hedged":
+                            _bump("hedge_wins")
+                        return task.result()
+                    last_error = task.exception()
+                    if role == "primary" or not running:
+                        print(f"[Hedge] {key} 请求失败，切换到备用模型: {last_error}")
+                        launch_next("failovers")
+            raise last_error
+        finally:
+            if primary in running:
+                _latency_tracker.record(key, time.monotonic() - started)
+            await _cancel_tasks(list(running))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_spec = kwargs.pop(HEDGE_TOOL_SPEC_KWARG, None)
+        if not self.hedge_fallbacks:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+
+        key = self._hedge_key()
+        delay = self._hedge_delay()
+        started = time.monotonic()
+        pending_fallbacks = list(self.hedge_fallbacks)
+        # 流对象 -> 正在等待首个 chunk 的任务
+        streams: Dict[Any, asyncio.Future] = {}
+        roles: Dict[Any, str] = {}
+
+        def start(stream, role: str) -> None:
+            streams[stream] = asyncio.ensure_future(stream.__anext__())
+            roles[stream] = role
+
+        def launch_next(reason: str) -> bool:
+            if not pending_fallbacks:
+                return False
+            fallback = pending_fallbacks.pop(0)
+            _bump(reason)
+            start(fallback._astream(
+                messages, stop=stop, **self._fallback_kwargs(fallback, kwargs, tool_spec)
+            ), reason)
+            return True
+
+        start(super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs), "primary")
+        winner = first_chunk = None
+        last_error: Optional[BaseException] = None
+        try:
+            # 以首个 chunk 决出胜者
+            while streams and winner is None:
+                timeout = None
+                if pending_fallbacks and delay is not None:
+                    timeout = max(0.0, started + delay * len(streams) - time.monotonic())
+                done, _ = await asyncio.wait(
+                    set(streams.values()), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    print(f"[Hedge] {key} 超过 {delay:.1f}s 无首包，向备用模型发起对冲请求")
+                    launch_next("hedged")
+                    continue
+                for stream, task in list(streams.items()):
+                    if task not in done or winner is not None:
+                        continue
+                    del streams[stream]
+                    if roles[stream] == "primary":
+                        _latency_tracker.record(key, time.monotonic() - started)
+                    error = task.exception()
+                    if error is None:
+                        winner, first_chunk = stream, task.result()
+                    elif isinstance(error, StopAsyncIteration):
+                        winner, first_chunk = stream, None
+                    else:
+                        last_error = error
+                        print(f"[Hedge] {key} 流式请求失败，切换到备用模型: {error}")
+                        if roles[stream] == "primary" or not streams:
+                            launch_next("failovers")
+                    if stream is not winner:
+                        await stream.aclose()
+        finally:
+            for stream, task in streams.items():
+                if roles[stream] == "primary":
+                    _latency_tracker.record(key, time.monotonic() - started)
+            await _cancel_tasks(list(streams.values()))
+            for stream in list(streams):
+                try:
+                    await stream.aclose()
+                except BaseException:
+                    pass
+
+        if winner is None:
+            raise last_error
+        if roles[winner] == "hedged":
+            _bump("hedge_wins")
+        if first_chunk is None:
+            return
+        yield first_chunk
+        async for chunk in winner:
+            yield chunk
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+"""
+事件循环阻塞监测（循环延迟 + 阻塞调用栈归属到节点 / 工具 / LLM 调用）
+
+所有患者线程共用一个事件循环，异步代码里的同步调用（requests、Entrez、同步 IO、长时间的
+纯 Python 计算）会把整个循环卡住，其他线程的节点、LLM 流式输出一起停顿。LoopWatchdog 是一个
+LangChain 回调处理器，挂到主图后:
+
+- 第一次在某个事件循环上收到回调时接入该循环: 启动心跳任务，每 interval_ms 醒来一次，
+  实际醒来时间与预期之差即循环延迟（lag），持续统计 p50 / p95 / p99 / max
+- 后台看门狗线程发现心跳超过 threshold_ms 未到，即判定循环被阻塞，采样循环线程的调用栈
+  （阻塞期间持续采样），并按循环当前正在执行的任务归属:
+  回调记录了每个任务内进行中的节点 / 工具 / LLM 运行，任务自身没有运行时沿创建它的父任务查找
+- 心跳恢复后记录一次阻塞事件: 时长、线程、节点路径（如 mdt_diagnosis/group_1/tools）、
+  进行中的工具或 LLM 调用、最常见的调用栈及其最内层帧
+- 按 (节点路径, 调用, 最内层帧) 汇总热点，report() / format_report() / render_prometheus() 输出
+
+只在排查时开启: 每个回调多一次加锁，并在循环上装一个任务工厂记录父任务。
+
+开关（环境变量优先于 config.yml）:
+    DEEPRARE_LOOP_WATCHDOG=1|0
+
+配置 (config.yml):
+    loop_watchdog:
+      enabled: false
+      interval_ms: 50
+      threshold_ms: 200
+      max_events: 200
+      log_blocks: true
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from DeepRareAgent.utils.profiling import _stack_of
+
+LAG_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _frame_label(frame: Tuple[str, str, int]) -> str:
+    name, filename, line = frame
+    return f"{name} ({Path(filename).name}:{line})"
+
+
+class _LoopState:
+    """一个被监测的事件循环"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, ident: int):
+        self.loop = loop
+        self.ident = ident
+        self.last_beat = time.perf_counter()
+        self.heartbeat: Optional[asyncio.Task] = None
+        # 看门狗线程正在记录的阻塞: {"started", "where", "samples": Counter}
+        self.pending: Optional[Dict[str, Any]] = None
+
+
+class LoopWatchdog(BaseCallbackHandler):
+    """
+    事件循环延迟与阻塞监测。
+
+    回调只负责两件事：在运行所在的循环上接入心跳，以及记录每个任务内进行中的运行
+    （用于把阻塞归属到节点 / 工具 / LLM 调用）。
+    """
+
+    run_inline = True
+
+    def __init__(self, interval_ms: float = 50, threshold_ms: float = 200, max_events: int = 200,
+                 log_blocks: bool = True, lag_window: int = 2000):
+        super().__init__()
+        self.interval_s = float(interval_ms) / 1000.0
+        self.threshold_s = float(threshold_ms) / 1000.0
+        self.log_blocks = log_blocks
+        self._lock = threading.Lock()
+        self._loops: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+        self._thread: Optional[threading.Thread] = None
+        # 运行 run_id -> (kind, label, parent_run_id, thread_id)；kind 为 chain / node / tool / llm
+        self._runs: Dict[UUID, Tuple[str, str, Optional[UUID], Optional[str]]] = {}
+        # 任务 -> 在该任务内开始、尚未结束的运行（按开始顺序）
+        self._task_runs: "weakref.WeakKeyDictionary[asyncio.Task, List[UUID]]" = weakref.WeakKeyDictionary()
+        self._run_tasks: Dict[UUID, asyncio.Task] = {}
+        # 任务 -> 创建它的任务（由任务工厂记录）
+        self._task_parents: "weakref.WeakKeyDictionary[asyncio.Task, asyncio.Task]" = weakref.WeakKeyDictionary()
+        self._lags: deque = deque(maxlen=lag_window)
+        self._lag_count = 0
+        self._lag_max = 0.0
+        self._events: deque = deque(maxlen=max_events)
+        self._hotspots: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._blocked_total = 0.0
+        self._block_count = 0
+
+    # ---- 接入事件循环 ----
+    def _ensure_attached(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 同步调用（线程池中的同步节点 / 工具）不涉及事件循环
+        if loop in self._loops:
+            return
+        state = _LoopState(loop, threading.get_ident())
+        with self._lock:
+            if loop in self._loops:
+                return
+            self._loops[loop] = state
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name="deeprare-loop-watchdog", daemon=True)
+                self._thread.start()
+        previous = loop.get_task_factory()
+
+        def _task_factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous is not None else asyncio.Task(coro, loop=loop, **kwargs)
+            parent = asyncio.current_task(loop)
+            if parent is not None:
+                self._task_parents[task] = parent
+            return task
+
+        loop.set_task_factory(_task_factory)
+        state.heartbeat = loop.create_task(self._heartbeat(state), name="deeprare-loop-heartbeat")
+
+    async def _heartbeat(self, state: _LoopState) -> None:
+        try:
+            while True:
+                expected = time.perf_counter() + self.interval_s
+                await asyncio.sleep(self.interval_s)
+                now = time.perf_counter()
+                state.last_beat = now
+                self._record_lag(state, max(0.0, now - expected))
+        finally:
+            with self._lock:
+                self._loops.pop(state.loop, None)
+
+    # ---- 看门狗线程 ----
+    def _watch(self) -> None:
+        poll = min(self.interval_s, self.threshold_s) / 2
+        while True:
+            time.sleep(poll)
+            with self._lock:
+                if not self._loops:
+                    self._thread = None
+                    return
+                states = list(self._loops.values())
+            now = time.perf_counter()
+            frames = None
+            for state in states:
+                if state.loop.is_closed() or not state.loop.is_running():
+                    # 循环未取消心跳就关闭（如 loop.close()），不再监测
+                    with self._lock:
+                        self._loops.pop(state.loop, None)
+                    continue
+                if now - state.last_beat - self.interval_s < self.threshold_s:
+                    continue
+                if frames is None:
+                    frames = sys._current_frames()
+                frame = frames.get(state.ident)
+                if frame is None:
+                    continue
+                try:
+                    task = asyncio.current_task(state.loop)
+                except RuntimeError:
+                    continue
+                stack = tuple(_stack_of(frame))
+                with self._lock:
+                    if state.pending is None:
+                        # 阻塞期间运行不会结束，此时归属；等心跳恢复时运行可能已经结束
+                        state.pending = {"started": now, "where": self._attribute(task), "samples": Counter()}
+                    state.pending["samples"][stack] += 1
+            del frames
+
+    # ---- 记录 ----
+    def _record_lag(self, state: _LoopState, lag: float) -> None:
+        with self._lock:
+            self._lags.append(lag)
+            self._lag_count += 1
+            self._lag_max = max(self._lag_max, lag)
+            pending, state.pending = state.pending, None
+            if lag < self.threshold_s:
+                return
+            if pending is not None:
+                stack = pending["samples"].most_common(1)[0][0]
+                where = pending["where"]
+            else:
+                # 阻塞刚超过阈值就结束，看门狗线程来不及采样
+                stack = ()
+                where = {"path": "(uncaptured)", "call": "", "thread_id": None}
+            frame = _frame_label(stack[-1]) if stack else ""
+            event = {"ts": time.time(), "duration_s": round(lag, 4), **where, "frame": frame,
+                     "stack": ";".join(_frame_label(f) for f in stack)}
+            self._events.append(event)
+            self._block_count += 1
+            self._blocked_total += lag
+            key = (where["path"], where["call"], frame)
+            spot = self._hotspots.get(key)
+            if spot is None:
+                spot = self._hotspots[key] = {"path": where["path"], "call": where["call"], "frame": frame,
+                                              "count": 0, "total_s": 0.0, "max_s": 0.0, "stack": event["stack"]}
+            spot["count"] += 1
+            spot["total_s"] += lag
+            if lag > spot["max_s"]:
+                spot["max_s"], spot["stack"] = lag, event["stack"]
+        if self.log_blocks:
+            call = f" > {where['call']}" if where["call"] else ""
+            print(f"[WARN] [LoopWatchdog] 事件循环被阻塞 {lag:.3f}s: {where['path']}{call}"
+                  f"（线程 {where['thread_id'] or '-'}，{frame or '未采到调用栈'}）")
+
+    def _attribute(self, task: Optional[asyncio.Task]) -> Dict[str, Any]:
+        """阻塞时正在执行的任务 -> 节点路径、进行中的工具 / LLM 调用、thread_id（需持有锁）"""
+        runs: List[UUID] = []
+        seen = set()
+        while task is not None and task not in seen:
+            seen.add(task)
+            runs = self._task_runs.get(task) or []
+            if runs:
+                break
+            task = self._task_parents.get(task)
+        if not runs:
+            return {"path": "(no run)", "call": "", "thread_id": None}
+        innermost = runs[-1]
+        call = ""
+        nodes: List[str] = []
+        thread_id = None
+        run_id: Optional[UUID] = innermost
+        while run_id is not None and run_id in self._runs:
+            kind, label, parent, run_thread = self._runs[run_id]
+            thread_id = thread_id or run_thread
+            if kind in ("tool", "llm") and not call:
+                call = label
+            elif kind == "node":
+                nodes.append(label)
+            run_id = parent
+        return {"path": "/".join(reversed(nodes)) or "(graph)", "call": call, "thread_id": thread_id}
+
+    # ---- 回调 ----
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], kind: str, label: str,
+               metadata: Optional[Dict[str, Any]]) -> None:
+        self._ensure_attached()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        thread_id = (metadata or {}).get("thread_id")
+        with self._lock:
+            self._runs[run_id] = (kind, label, parent_run_id, str(thread_id) if thread_id is not None else None)
+            if task is not None:
+                self._task_runs.setdefault(task, []).append(run_id)
+                self._run_tasks[run_id] = task
+
+    def _end(self, run_id: UUID) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+            task = self._run_tasks.pop(run_id, None)
+            if task is not None:
+                runs = self._task_runs.get(task)
+                if runs is not None and run_id in runs:
+                    runs.remove(run_id)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        kind = "node" if (metadata or {}).get("langgraph_node") == name else "chain"
+        self._start(run_id, parent_run_id, kind, name, metadata)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, parent_run_id, "tool", f"tool:{name}", metadata)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = (metadata or {}).get("ls_model_name") or params.get("model") or params.get("model_name") or "unknown"
+        self._start(run_id, parent_run_id, "llm", f"llm:{model}", metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name") or "unknown"
+        self._start(run_id, parent_run_id, "llm", f"llm:{model}", metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    # ---- 输出 ----
+    def report(self, top: int = 20) -> Dict[str, Any]:
+        """循环延迟分布、阻塞总计、按累计阻塞时长排序的热点与最近的阻塞事件"""
+        with self._lock:
+            lags = list(self._lags)
+            hotspots = sorted(self._hotspots.values(), key=lambda s: s["total_s"], reverse=True)[:top]
+            hotspots = [{**s, "total_s": round(s["total_s"], 4), "max_s": round(s["max_s"], 4)} for s in hotspots]
+            return {
+                "interval_s": self.interval_s,
+                "threshold_s": self.threshold_s,
+                "loops": len(self._loops),
+                "lag": {
+                    "samples": self._lag_count,
+                    "max_s": round(self._lag_max, 4),
+                    **{f"p{int(q * 100)}_s": round(_percentile(lags, q), 4) for q in LAG_QUANTILES},
+                },
+                "blocks": {"count": self._block_count, "total_s": round(self._blocked_total, 4)},
+                "hotspots": hotspots,
+                "events": list(self._events),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._lags.clear()
+            self._lag_count = 0
+            self._lag_max = 0.0
+            self._events.clear()
+            self._hotspots.clear()
+            self._blocked_total = 0.0
+            self._block_count = 0
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """把 report() 的结果渲染为便于阅读的文本"""
+    lag = report["lag"]
+    lines = [
+        f"事件循环延迟: p50={lag['p50_s'] * 1000:.1f}ms p95={lag['p95_s'] * 1000:.1f}ms "
+        f"p99={lag['p99_s'] * 1000:.1f}ms max={lag['max_s'] * 1000:.1f}ms（{lag['samples']} 次心跳）",
+        f"阻塞 ≥{report['threshold_s'] * 1000:.0f}ms: {report['blocks']['count']} 次，"
+        f"共 {report['blocks']['total_s']:.3f}s",
+    ]
+    if report["hotspots"]:
+        lines.append("热点（按累计阻塞时长）:")
+        for spot in report["hotspots"]:
+            call = f" > {spot['call']}" if spot["call"] else ""
+            lines.append(f"  {spot['total_s']:8.3f}s  {spot['count']:4d} 次  max {spot['max_s']:.3f}s  "
+                         f"{spot['path']}{call}  @ {spot['frame'] or '-'}")
+    return "\n".join(lines)
+
+
+def render_prometheus(report: Dict[str, Any], prefix: str = "deeprare_event_loop") -> str:
+    """把 report() 的结果渲染为 Prometheus 文本格式"""
+    lag = report["lag"]
+    lines = [f"# TYPE {prefix}_lag_seconds summary"]
+    for q in LAG_QUANTILES:
+        lines.append(f'{prefix}_lag_seconds{{quantile="{q}"}} {lag[f"p{int(q * 100)}_s"]}')
+    lines.append(f"{prefix}_lag_seconds_count {lag['samples']}")
+    lines.append(f"# TYPE {prefix}_lag_max_seconds gauge")
+    lines.append(f"{prefix}_lag_max_seconds {lag['max_s']}")
+    lines.append(f"# TYPE {prefix}_blocked_seconds_total counter")
+    lines.append(f"{prefix}_blocked_seconds_total {report['blocks']['total_s']}")
+    lines.append(f"# TYPE {prefix}_blocks_total counter")
+    lines.append(f"{prefix}_blocks_total {report['blocks']['count']}")
+    lines.append(f"# TYPE {prefix}_hotspot_blocked_seconds_total counter")
+    for spot in report["hotspots"]:
+        labels = ",".join(f'{k}="{str(spot[k]).replace(chr(34), chr(39))}"' for k in ("path", "call", "frame"))
+        lines.append(f"{prefix}_hotspot_blocked_seconds_total{{{labels}}} {spot['total_s']}")
+    return "\n".join(lines) + "\n"
+
+
+# ========== 进程级看门狗 ==========
+_watchdog: Optional[LoopWatchdog] = None
+_watchdog_loaded = False
+
+
+def get_loop_watchdog() -> Optional[LoopWatchdog]:
+    """按 config.yml 的 loop_watchdog 段（DEEPRARE_LOOP_WATCHDOG 优先）创建进程级看门狗；未启用时返回 None"""
+    global _watchdog, _watchdog_loaded
+    if _watchdog_loaded:
+        return _watchdog
+    _watchdog_loaded = True
+    try:
+        from DeepRareAgent.config import settings
+        cfg = getattr(settings, "loop_watchdog", None)
+    except Exception:
+        cfg = None
+    data = cfg.to_dict() if cfg is not None else {}
+    enabled = data.get("enabled", False)
+    env = os.getenv("DEEPRARE_LOOP_WATCHDOG")
+    if env:
+        enabled = env.strip().lower() in ("1", "true", "on", "yes")
+    if enabled:
+        _watchdog = LoopWatchdog(
+            interval_ms=float(data.get("interval_ms", 50)),
+            threshold_ms=float(data.get("threshold_ms", 200)),
+            max_events=int(data.get("max_events", 200)),
+            log_blocks=bool(data.get("log_blocks", True)),
+        )
+        print(f"[LoopWatchdog] 已启用，心跳 {_watchdog.interval_s * 1000:.0f}ms，阈值 {_watchdog.threshold_s * 1000:.0f}ms")
+    return _watchdog
+
+
+def loop_watchdog_callbacks() -> List[BaseCallbackHandler]:
+    """主图使用的事件循环监测回调列表（未启用时为空）"""
+    watchdog = get_loop_watchdog()
+    return [watchdog] if watchdog is not None else []
+
+
+def get_loop_report(top: int = 20) -> Optional[Dict[str, Any]]:
+    """进程级看门狗的报告；未启用时返回 None"""
+    watchdog = get_loop_watchdog()
+    return watchdog.report(top) if watchdog is not None else None
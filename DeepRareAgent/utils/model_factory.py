@@ -2,31 +2,301 @@
 """
 模型工厂模块
 提供统一的 LLM 初始化接口，支持 OpenAI 和 Anthropic 两种 provider
+
+客户端池：
+- 相同 provider / base_url / model / 参数 的配置复用同一个 Chat 模型实例
+- 相同 endpoint 的所有模型共享同一组 httpx 连接池（同步 + 异步），
+  避免每次专家审核、汇总调用都重新构建客户端并重复 TLS 握手
+- 异步连接池按事件循环分别创建（连接绑定在创建它的循环上），池中模型可以在多次
+  asyncio.run（基准脚本、分片进程）之间复用
+- 每个 endpoint 的最大连接数可通过 config.yml 中 llm_pool 配置
+
+治理：
+- 工厂返回的模型都接入 llm_governor，按 endpoint 共享并发 / TPM 限额与优先级通道
+- 模型配置可声明 fallbacks / hedging，慢请求向备用模型对冲、失败时立即切换（见 llm_hedging）
+- 开启 llm_cache 后，低温模型挂载精确匹配响应缓存（见 llm_cache）
+
+离线：
+- provider: fake / replay 返回脚本化或回放录制响应的离线模型（见 fake_llm），
+  不入池、不接治理器，用于无 API Key 时压测图本身的开销
 """
-from typing import Any, Optional, Union
+import asyncio
+import hashlib
+import json
+import threading
+import weakref
+from functools import cached_property
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+from pydantic import Field
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 
+from DeepRareAgent.utils.fake_llm import create_offline_llm
+from DeepRareAgent.utils.llm_cache import cache_for_temperature
+from DeepRareAgent.utils.llm_governor import LLMGovernorMixin
+from DeepRareAgent.utils.llm_hedging import HedgedRequestMixin
+
+
+# ========== 客户端池 ==========
+_DEFAULT_POOL_SETTINGS: Dict[str, Any] = {
+    "enabled": True,
+    "max_connections_per_endpoint": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+}
+
+_pool_lock = threading.RLock()
+_llm_pool: Dict[Tuple, Any] = {}
+# (sync|async, endpoint) -> httpx 客户端
+_http_client_pool: Dict[Tuple[str, str], Any] = {}
+_pool_stats = {"llm_created": 0, "llm_reused": 0, "http_clients_created": 0}
+
+
+def _load_pool_settings() -> Dict[str, Any]:
+    """读取 config.yml 中的 llm_pool 配置（缺失时使用默认值）"""
+    out = dict(_DEFAULT_POOL_SETTINGS)
+    try:
+        from DeepRareAgent.config import settings
+    except Exception:
+        return out
+    pool_cfg = getattr(settings, "llm_pool", None)
+    if pool_cfg is not None:
+        out.update({k: v for k, v in pool_cfg.to_dict().items() if v is not None})
+    return out
+
+
+def _endpoint_key(provider: str, base_url: Optional[str]) -> str:
+    return f"{provider}:{(base_url or '').rstrip('/')}"
+
+
+class LoopLocalAsyncClient(httpx.AsyncClient):
+    """
+    按事件循环分别持有连接池的 httpx.AsyncClient。
+
+    httpx 的异步连接绑定在创建它的事件循环上，循环关闭后复用会抛出
+    "Event loop is closed"。本类自身只作为 SDK 持有的外壳（build_request 等），
+    send 时按当前运行中的循环取出（或创建）真正的 AsyncClient。
+    """
+
+    def __init__(self, **client_kwargs: Any):
+        super().__init__(**client_kwargs)
+        self._client_kwargs = client_kwargs
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._loop_lock = threading.Lock()
+
+    def _loop_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            client = self._loop_clients.get(loop)
+            if client is None or client.is_closed:
+                client = self._loop_clients[loop] = httpx.AsyncClient(**self._client_kwargs)
+            return client
+
+    @property
+    def loop_client_count(self) -> int:
+        return len(self._loop_clients)
+
+    async def send(self, request: httpx.Request, **kwargs: Any) -> httpx.Response:
+        return await self._loop_client().send(request, **kwargs)
+
+    def discard(self) -> None:
+        """丢弃所有循环的连接池（不等待关闭，所属循环可能已经结束）"""
+        with self._loop_lock:
+            self._loop_clients.clear()
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            client = self._loop_clients.pop(loop, None)
+            self._loop_clients.clear()
+        if client is not None:
+            await client.aclose()
+        await super().aclose()
+
+
+def get_http_client(
+    provider: str,
+    base_url: Optional[str],
+    is_async: bool,
+    max_connections: Optional[int] = None,
+) -> Union[httpx.Client, httpx.AsyncClient]:
+    """
+    获取某个 endpoint 的共享 httpx 客户端（连接池按 endpoint 复用）
+
+    Args:
+        provider: "openai" 或 "anthropic"
+        base_url: API 端点
+        is_async: 是否返回异步客户端
+        max_connections: 该 endpoint 的最大连接数；首次创建时生效，None 使用全局配置
+
+    Returns:
+        httpx.Client 或 LoopLocalAsyncClient（按事件循环分别持有连接池）
+    """
+    key = ("async" if is_async else "sync", _endpoint_key(provider, base_url))
+    with _pool_lock:
+        client = _http_client_pool.get(key)
+        if client is not None and not client.is_closed:
+            return client
+
+        pool_settings = _load_pool_settings()
+        limits = httpx.Limits(
+            max_connections=int(max_connections or pool_settings["max_connections_per_endpoint"]),
+            max_keepalive_connections=int(pool_settings["max_keepalive_connections"]),
+            keepalive_expiry=float(pool_settings["keepalive_expiry"]),
+        )
+        client_cls = LoopLocalAsyncClient if is_async else httpx.Client
+        # 超时由 SDK 在每次请求时传入，这里只负责连接池
+        client = client_cls(limits=limits, follow_redirects=True)
+        _http_client_pool[key] = client
+        _pool_stats["http_clients_created"] += 1
+        return client
+
+
+class DeepRareChatOpenAI(HedgedRequestMixin, LLMGovernorMixin, ChatOpenAI):
+    """接入对冲/故障切换与 endpoint 治理器的 ChatOpenAI（连接池通过 http_client 参数注入）"""
+
+    hedge_fallbacks: List[Any] = Field(default_factory=list, exclude=True)
+    hedge_settings: Dict[str, Any] = Field(default_factory=dict, exclude=True)
+
+    def _governor_endpoint(self) -> str:
+        return _endpoint_key("openai", self.openai_api_base)
+
+
+class DeepRareChatAnthropic(HedgedRequestMixin, LLMGovernorMixin, ChatAnthropic):
+    """
+    接入对冲/故障切换与 endpoint 治理器、并使用共享 httpx 连接池的 ChatAnthropic
+    （原实现只按 base_url 缓存默认客户端，无法配置连接数）
+    """
+
+    use_shared_http_pool: bool = True
+    hedge_fallbacks: List[Any] = Field(default_factory=list, exclude=True)
+    hedge_settings: Dict[str, Any] = Field(default_factory=dict, exclude=True)
+
+    def _governor_endpoint(self) -> str:
+        return _endpoint_key("anthropic", self.anthropic_api_url)
+
+    @cached_property
+    def _client(self):
+        import anthropic
+
+        if self.anthropic_proxy or not self.use_shared_http_pool:
+            # 代理或未启用连接池时沿用原实现
+            return super()._client
+        return anthropic.Client(
+            **self._client_params,
+            http_client=get_http_client("anthropic", self.anthropic_api_url, is_async=False),
+        )
+
+    @cached_property
+    def _async_client(self):
+        import anthropic
+
+        if self.anthropic_proxy or not self.use_shared_http_pool:
+            return super()._async_client
+        return anthropic.AsyncClient(
+            **self._client_params,
+            http_client=get_http_client("anthropic", self.anthropic_api_url, is_async=True),
+        )
+
+
+def _extract_extra_params(cfg: Any) -> Dict[str, Any]:
+    """提取模型参数（支持 ConfigObject 和普通字典）"""
+    extra_params = {}
+    if hasattr(cfg, 'model_kwargs'):
+        model_kwargs = cfg.model_kwargs
+        if hasattr(model_kwargs, 'to_dict'):
+            extra_params = model_kwargs.to_dict()
+        elif hasattr(model_kwargs, '__dict__'):
+            extra_params = vars(model_kwargs)
+        elif isinstance(model_kwargs, dict):
+            extra_params = model_kwargs
+    return dict(extra_params)
+
+
+def _as_plain(value: Any) -> Any:
+    """ConfigObject -> dict（列表中的配置段保持为 dict）"""
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_as_plain(v) for v in value]
+    return value
+
+
+def _extract_hedging(cfg: Any) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """提取备用模型列表与对冲参数"""
+    fallbacks = _as_plain(getattr(cfg, 'fallbacks', None)) or []
+    hedging = _as_plain(getattr(cfg, 'hedging', None)) or {}
+    return list(fallbacks), dict(hedging)
+
+
+def _pool_key(provider: str, cfg: Any, extra_params: Dict[str, Any]) -> Tuple:
+    """客户端池键：provider + base_url + model + 参数（API Key 只保留摘要）"""
+    api_key = getattr(cfg, 'api_key', None) or ""
+    return (
+        provider,
+        (getattr(cfg, 'base_url', None) or "").rstrip("/"),
+        cfg.model_name,
+        hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()[:16],
+        getattr(cfg, 'temperature', None),
+        json.dumps(extra_params, sort_keys=True, default=str),
+        json.dumps(_extract_hedging(cfg), sort_keys=True, default=str),
+    )
+
+
+def get_llm_pool_stats() -> Dict[str, int]:
+    """返回客户端池统计信息"""
+    with _pool_lock:
+        out = dict(_pool_stats)
+        out["pooled_models"] = len(_llm_pool)
+        out["http_clients"] = len(_http_client_pool)
+    return out
+
+
+def clear_llm_pool() -> None:
+    """清空模型池与 httpx 连接池（主要用于测试或配置热更新）"""
+    with _pool_lock:
+        for (kind, _), client in _http_client_pool.items():
+            if kind == "sync" and not client.is_closed:
+                client.close()
+            elif kind == "async":
+                # 异步连接属于各自的事件循环，无法在这里同步关闭，直接丢弃
+                client.discard()
+        _llm_pool.clear()
+        _http_client_pool.clear()
+        for key in _pool_stats:
+            _pool_stats[key] = 0
+
 
 def create_llm_from_config(
     cfg: Any,
-    override_model: Optional[Union[ChatOpenAI, ChatAnthropic]] = None
+    override_model: Optional[Union[ChatOpenAI, ChatAnthropic]] = None,
+    use_pool: bool = True
 ) -> Union[ChatOpenAI, ChatAnthropic]:
     """
     根据配置对象动态创建 LLM 实例
 
     Args:
         cfg: 配置对象，应包含以下字段：
-            - provider: str, "openai" 或 "anthropic"
+            - provider: str, "openai"、"anthropic"，离线运行时为 "fake" 或 "replay"
             - model_name: str, 模型名称
             - api_key: str, API 密钥
             - base_url: str, API 端点（可选）
             - temperature: float, 温度参数
             - model_kwargs: 其他模型参数（可选）
+            - max_connections: 该 endpoint 的最大连接数（可选，覆盖 llm_pool 全局配置）
+            - fallbacks: 备用模型配置列表（可选，字段同上）
+            - hedging: 对冲参数（可选，见 llm_hedging）
         override_model: 可选的预构建模型实例，如果提供则直接返回
+        use_pool: 是否从客户端池复用实例（默认 True）。池中实例在多个节点间共享，
+            调用方不应直接修改其属性，需要定制时请使用 model_copy(update=...)
 
     Returns:
-        ChatOpenAI 或 ChatAnthropic 实例
+        ChatOpenAI 或 ChatAnthropic 实例（provider 为 fake / replay 时返回离线模型）
 
     Examples:
         # 使用 OpenAI 兼容接口（DeepSeek）
@@ -46,20 +316,57 @@ def create_llm_from_config(
         return override_model
 
     # 提取模型参数（支持 ConfigObject 和普通字典）
-    extra_params = {}
-    if hasattr(cfg, 'model_kwargs'):
-        model_kwargs = cfg.model_kwargs
-        if hasattr(model_kwargs, 'to_dict'):
-            extra_params = model_kwargs.to_dict()
-        elif hasattr(model_kwargs, '__dict__'):
-            extra_params = vars(model_kwargs)
-        elif isinstance(model_kwargs, dict):
-            extra_params = model_kwargs
+    extra_params = _extract_extra_params(cfg)
 
     # 获取 provider，默认为 openai（向后兼容）
     provider = getattr(cfg, 'provider', 'openai').lower()
+    if provider in ('fake', 'replay'):
+        return create_offline_llm(provider, cfg)
+    if provider not in ('openai', 'anthropic'):
+        raise ValueError(
+            f"不支持的 provider: '{provider}'。"
+            f"请使用 'openai'、'anthropic'、'fake' 或 'replay'。"
+        )
+
+    pool_enabled = use_pool and _load_pool_settings().get("enabled", True)
+    key = _pool_key(provider, cfg, extra_params) if pool_enabled else None
+    if key is not None:
+        with _pool_lock:
+            cached = _llm_pool.get(key)
+            if cached is not None:
+                _pool_stats["llm_reused"] += 1
+                return cached
+
+    llm = _build_llm(provider, cfg, extra_params, pooled=pool_enabled)
+    fallbacks, hedging = _extract_hedging(cfg)
+    if fallbacks:
+        llm.hedge_fallbacks = [
+            create_llm_from_config(SimpleNamespace(**fb), use_pool=use_pool) for fb in fallbacks
+        ]
+        llm.hedge_settings = hedging
+
+    if key is not None:
+        with _pool_lock:
+            # 并发构建时以先写入者为准，保证同一配置只有一个共享实例
+            llm = _llm_pool.setdefault(key, llm)
+            _pool_stats["llm_created"] += 1
+    return llm
+
+
+def _build_llm(
+    provider: str,
+    cfg: Any,
+    extra_params: Dict[str, Any],
+    pooled: bool
+) -> Union[ChatOpenAI, ChatAnthropic]:
+    """根据 provider 创建对应的 LLM 实例"""
+    base_url = getattr(cfg, 'base_url', None)
+    max_connections = getattr(cfg, 'max_connections', None)
+    # 精确匹配响应缓存（仅在 llm_cache 启用且温度足够低时挂载）
+    response_cache = cache_for_temperature(getattr(cfg, 'temperature', None))
+    if response_cache is not None:
+        extra_params = {**extra_params, 'cache': response_cache}
 
-    # 根据 provider 创建对应的 LLM 实例
     if provider == 'anthropic':
         # 构建 ChatAnthropic 参数
         anthropic_params = {
@@ -70,26 +377,33 @@ def create_llm_from_config(
         }
 
         # 如果配置中有 base_url，添加进去（支持 GLM 等兼容接口）
-        if hasattr(cfg, 'base_url') and cfg.base_url:
-            anthropic_params['base_url'] = cfg.base_url
-
-        return ChatAnthropic(**anthropic_params)
-
-    elif provider == 'openai':
-        # 构建 ChatOpenAI 参数
-        return ChatOpenAI(
-            model_name=cfg.model_name,
-            api_key=cfg.api_key,
-            base_url=cfg.base_url,
-            temperature=cfg.temperature,
-            **extra_params
-        )
+        if base_url:
+            anthropic_params['base_url'] = base_url
 
-    else:
-        raise ValueError(
-            f"不支持的 provider: '{provider}'。"
-            f"请使用 'openai' 或 'anthropic'。"
+        if not pooled:
+            return DeepRareChatAnthropic(use_shared_http_pool=False, **anthropic_params)
+        if max_connections:
+            # 预先按模型配置的连接数创建该 endpoint 的连接池
+            get_http_client("anthropic", base_url, is_async=False, max_connections=max_connections)
+            get_http_client("anthropic", base_url, is_async=True, max_connections=max_connections)
+        return DeepRareChatAnthropic(**anthropic_params)
+
+    # 构建 ChatOpenAI 参数
+    openai_params = {
+        'model_name': cfg.model_name,
+        'api_key': cfg.api_key,
+        'base_url': base_url,
+        'temperature': cfg.temperature,
+        **extra_params
+    }
+    if pooled:
+        openai_params['http_client'] = get_http_client(
+            "openai", base_url, is_async=False, max_connections=max_connections
+        )
+        openai_params['http_async_client'] = get_http_client(
+            "openai", base_url, is_async=True, max_connections=max_connections
         )
+    return DeepRareChatOpenAI(**openai_params)
 
 
 # 向后兼容的别名
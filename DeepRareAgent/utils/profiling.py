@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+按需的节点性能剖析（采样火焰图 + asyncio 任务时间线）
+
+某个阶段变慢时只有耗时不够，需要看 CPU 花在哪些调用栈、节点内的异步任务如何排布。
+本模块用 profile_node(name, fn) 包装图节点，被选中的运行会：
+
+- 由后台采样线程按 interval_ms 采样调用栈（sys._current_frames），只统计属于该节点的样本:
+  异步节点按“事件循环当前正在执行的任务是否由该节点创建”归属，并发的其他专家组不会混进来；
+  同步节点（在线程池中执行）直接采样其所在线程；异步节点内交给线程池执行的同步调用不在
+  事件循环线程上，不计入样本（其耗时见 tracing 的工具 span）
+- 在该节点运行期间给事件循环装上任务工厂，记录节点内创建的每个 asyncio 任务的起止时间
+- 节点结束时写出到 <output_dir>/<thread_id>/:
+    <时间>-<节点>.speedscope.json   在 https://www.speedscope.app 打开
+    <时间>-<节点>.folded            折叠栈，flamegraph.pl / inferno 生成火焰图
+    <时间>-<节点>.tasks.json        Chrome Trace 格式的任务时间线（Perfetto / chrome://tracing）
+
+开关（环境变量优先于 config.yml）:
+    mode: off        节点不被包装，没有任何开销（默认）
+    mode: on_demand  节点被包装，但只有被选中的运行才剖析，其余运行只多一次字典查找:
+                     运行配置带 configurable.profile=true（如 API 请求的 config），
+                     或 thread_id 在 threads 列表 / DEEPRARE_PROFILE_THREADS 中
+    mode: always     剖析每次运行（本地调试）
+    DEEPRARE_PROFILE=off|on_demand|always, DEEPRARE_PROFILE_THREADS=tid1,tid2
+
+配置 (config.yml):
+    profiling:
+      mode: "off"
+      nodes: ["*"]                # 要剖析的节点名，"*" 表示全部
+      threads: []
+      output_dir: "logs/profiles"
+      interval_ms: 5
+      formats: ["speedscope", "folded", "tasks"]
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MODES = ("off", "on_demand", "always")
+DEFAULT_FORMATS = ("speedscope", "folded", "tasks")
+
+# 当前上下文所属的剖析会话（节点内创建的子任务会继承）
+_current_profile: contextvars.ContextVar[Optional["NodeProfile"]] = contextvars.ContextVar(
+    "deeprare_node_profile", default=None
+)
+
+Frame = Tuple[str, str, int]
+
+
+# ========== 配置 ==========
+_profiling_settings: Optional[Dict[str, Any]] = None
+
+
+def _load_profiling_settings() -> Dict[str, Any]:
+    """读取 config.yml 的 profiling 段，环境变量覆盖 mode / threads"""
+    global _profiling_settings
+    if _profiling_settings is not None:
+        return _profiling_settings
+    try:
+        from DeepRareAgent.config import settings
+        cfg = getattr(settings, "profiling", None)
+    except Exception:
+        cfg = None
+    data = cfg.to_dict() if cfg is not None else {}
+    configure_profiling(data)
+    return _profiling_settings
+
+
+def configure_profiling(config: Optional[Dict[str, Any]]) -> None:
+    """
+    以字典形式设置剖析配置（测试或脚本中使用）。
+
+    Args:
+        config: 结构同 config.yml 中 profiling 段；None 表示重新从 settings 读取
+    """
+    global _profiling_settings
+    if config is None:
+        _profiling_settings = None
+        return
+    mode = os.getenv("DEEPRARE_PROFILE") or config.get("mode") or "off"
+    if mode not in MODES:
+        print(f"[Profiling] 未知的 mode: {mode}，按 off 处理")
+        mode = "off"
+    threads = set(str(t) for t in config.get("threads") or [])
+    threads.update(t.strip() for t in os.getenv("DEEPRARE_PROFILE_THREADS", "").split(",") if t.strip())
+    _profiling_settings = {
+        "mode": mode,
+        "nodes": set(config.get("nodes") or ["*"]),
+        "threads": threads,
+        "output_dir": config.get("output_dir") or "logs/profiles",
+        "interval_s": float(config.get("interval_ms", 5)) / 1000.0,
+        "formats": tuple(config.get("formats") or DEFAULT_FORMATS),
+    }
+
+
+# ========== 剖析会话 ==========
+def _trim_loop_frames(stack: List[Frame]) -> List[Frame]:
+    """去掉事件循环自身的栈帧（run_forever -> _run_once -> Handle._run），从任务的协程开始"""
+    for i in range(len(stack) - 1, -1, -1):
+        name, filename, _ = stack[i]
+        if name == "_run" and filename.endswith(os.path.join("asyncio", "events.py")):
+            return stack[i + 1:]
+    return stack
+
+
+def _stack_of(frame: Any) -> List[Frame]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, frame.f_lineno))
+        frame = frame.f_back
+    stack.reverse()
+    return _trim_loop_frames(stack)
+
+
+class NodeProfile:
+    """一次节点运行的剖析数据：采样到的调用栈计数与任务时间线"""
+
+    def __init__(self, thread_id: str, node: str, interval_s: float):
+        self.thread_id = thread_id
+        self.node = node
+        self.interval_s = interval_s
+        self.started = time.perf_counter()
+        self.started_wall = time.time()
+        self.ended: Optional[float] = None
+        self.samples: Counter = Counter()
+        self.tasks: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_sample(self, stack: List[Frame]) -> None:
+        with self._lock:
+            self.samples[tuple(stack)] += 1
+
+    def task_started(self, task: "asyncio.Task") -> None:
+        record = {"name": task.get_name(), "coro": getattr(task.get_coro(), "__qualname__", "?"),
+                  "start": time.perf_counter() - self.started, "end": None}
+        with self._lock:
+            self.tasks.append(record)
+
+        def _done(_task, record=record):
+            record["end"] = time.perf_counter() - self.started
+
+        task.add_done_callback(_done)
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+    # ---- 输出格式 ----
+    def folded(self) -> str:
+        lines = []
+        for stack, count in self.samples.most_common():
+            names = [f"{name} ({Path(filename).name}:{line})" for name, filename, line in stack]
+            lines.append(";".join([self.node] + names).replace(" ", "_") + f" {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self) -> Dict[str, Any]:
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(count * self.interval_s)
+        duration = (self.ended or time.perf_counter()) - self.started
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.thread_id} / {self.node}",
+            "exporter": "DeepRareAgent.utils.profiling",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.node,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": max(duration, sum(weights)),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+    def task_timeline(self) -> Dict[str, Any]:
+        """Chrome Trace 事件：节点本身一行，节点内每个任务一行"""
+        end = (self.ended or time.perf_counter()) - self.started
+        events = [{"name": self.node, "cat": "node", "ph": "X", "ts": 0, "dur": round(end * 1e6),
+                   "pid": 1, "tid": 0}]
+        for i, task in enumerate(self.tasks, 1):
+            task_end = task["end"] if task["end"] is not None else end
+            events.append({
+                "name": f"{task['coro']} [{task['name']}]", "cat": "task", "ph": "X",
+                "ts": round(task["start"] * 1e6), "dur": round((task_end - task["start"]) * 1e6),
+                "pid": 1, "tid": i, "args": {"finished": task["end"] is not None},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"thread_id": self.thread_id, "node": self.node, "started": self.started_wall}}
+
+    def write(self, output_dir: str, formats=DEFAULT_FORMATS) -> List[Path]:
+        directory = Path(output_dir) / re.sub(r"[^\w.-]", "_", self.thread_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_wall)) + f"-{int(self.started_wall * 1000) % 1000:03d}-{self.node}"
+        written = []
+        if "speedscope" in formats:
+            written.append(directory / f"{stem}.speedscope.json")
+            written[-1].write_text(json.dumps(self.speedscope(), ensure_ascii=False), encoding="utf-8")
+        if "folded" in formats:
+            written.append(directory / f"{stem}.folded")
+            written[-1].write_text(self.folded(), encoding="utf-8")
+        if "tasks" in formats:
+            written.append(directory / f"{stem}.tasks.json")
+            written[-1].write_text(json.dumps(self.task_timeline(), ensure_ascii=False), encoding="utf-8")
+        return written
+
+
+# ========== 采样线程 ==========
+class _Sampler:
+    """
+    进程级采样线程，只在有剖析会话时运行。
+
+    异步会话：采样事件循环线程，按当前正在执行的任务归属到会话；
+    同步会话：直接采样会话所在线程。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 事件循环 -> 线程 ident
+        self._loops: Dict[asyncio.AbstractEventLoop, int] = {}
+        # 任务 -> 会话（节点任务及其创建的子任务）
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.Task, NodeProfile]" = weakref.WeakKeyDictionary()
+        # 线程 ident -> 会话（同步节点）
+        self._threads: Dict[int, NodeProfile] = {}
+        # 事件循环 -> (原任务工厂, 引用计数)
+        self._factories: Dict[asyncio.AbstractEventLoop, Tuple[Any, int]] = {}
+        self._active = 0
+        self._interval = 0.005
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                if self._active == 0:
+                    self._thread = None
+                    return
+                loops = list(self._loops.items())
+                threads = list(self._threads.items())
+            frames = sys._current_frames()
+            for loop, ident in loops:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                try:
+                    task = asyncio.current_task(loop)
+                except RuntimeError:
+                    continue
+                profile = self._tasks.get(task) if task is not None else None
+                if profile is not None:
+                    profile.add_sample(_stack_of(frame))
+            for ident, profile in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.add_sample(_stack_of(frame))
+            del frames
+
+    def _ensure_running(self, interval: float) -> None:
+        self._active += 1
+        self._interval = min(self._interval, interval) if self._active > 1 else interval
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="deeprare-profiler", daemon=True)
+            self._thread.start()
+
+    # ---- 异步会话 ----
+    def _task_factory(self, loop, coro, **kwargs):
+        previous = self._factories.get(loop, (None, 0))[0]
+        task = previous(loop, coro, **kwargs) if previous is not None else asyncio.Task(coro, loop=loop, **kwargs)
+        profile = _current_profile.get()
+        if profile is not None:
+            self._tasks[task] = profile
+            profile.task_started(task)
+        return task
+
+    def attach_task(self, profile: NodeProfile) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._loops[loop] = threading.get_ident()
+            self._tasks[asyncio.current_task()] = profile
+            factory, refs = self._factories.get(loop, (loop.get_task_factory(), 0))
+            if refs == 0:
+                loop.set_task_factory(self._task_factory)
+            self._factories[loop] = (factory, refs + 1)
+            self._ensure_running(profile.interval_s)
+
+    def detach_task(self, profile: NodeProfile) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = asyncio.current_task()
+            if self._tasks.get(task) is profile:
+                del self._tasks[task]
+            factory, refs = self._factories.get(loop, (None, 1))
+            if refs <= 1:
+                self._factories.pop(loop, None)
+                self._loops.pop(loop, None)
+                loop.set_task_factory(factory)
+            else:
+                self._factories[loop] = (factory, refs - 1)
+            self._active -= 1
+
+    # ---- 同步会话 ----
+    def attach_thread(self, profile: NodeProfile) -> None:
+        with self._lock:
+            self._threads[threading.get_ident()] = profile
+            self._ensure_running(profile.interval_s)
+
+    def detach_thread(self, profile: NodeProfile) -> None:
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+            self._active -= 1
+
+
+_sampler = _Sampler()
+
+
+# ========== 节点包装 ==========
+def _selected(config: Dict[str, Any], prof_settings: Dict[str, Any]) -> Optional[str]:
+    """本次运行是否需要剖析；需要时返回 thread_id"""
+    configurable = (config or {}).get("configurable") or {}
+    thread_id = str(configurable.get("thread_id") or "default")
+    if prof_settings["mode"] == "always" or configurable.get("profile") or thread_id in prof_settings["threads"]:
+        return thread_id
+    return None
+
+
+def _finish(profile: NodeProfile, prof_settings: Dict[str, Any]) -> None:
+    profile.ended = time.perf_counter()
+    try:
+        paths = profile.write(prof_settings["output_dir"], prof_settings["formats"])
+        print(f"[Profiling] {profile.thread_id}/{profile.node}: {profile.sample_count} 个样本，"
+              f"{len(profile.tasks)} 个任务 -> {paths[0].parent if paths else '-'}")
+    except OSError as e:
+        print(f"[Profiling] 写出剖析结果失败: {e}")
+
+
+def profile_node(name: str, fn: Callable) -> Callable:
+    """
+    按配置包装图节点函数。
+
+    mode=off 或该节点未被选中时原样返回 fn（零开销）；否则返回签名相同的包装函数
+    （functools.wraps 保留签名，LangGraph 仍按原函数的参数注入 config / runtime）。
+    """
+    prof_settings = _load_profiling_settings()
+    if prof_settings["mode"] == "off" or not callable(fn) or hasattr(fn, "get_graph"):
+        return fn
+    if "*" not in prof_settings["nodes"] and name not in prof_settings["nodes"]:
+        return fn
+
+    from langgraph.config import get_config
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            thread_id = _selected(get_config(), prof_settings)
+            if thread_id is None:
+                return await fn(*args, **kwargs)
+            profile = NodeProfile(thread_id, name, prof_settings["interval_s"])
+            token = _current_profile.set(profile)
+            _sampler.attach_task(profile)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _sampler.detach_task(profile)
+                _current_profile.reset(token)
+                _finish(profile, prof_settings)
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def sync_wrapper(*args, **kwargs):
+        thread_id = _selected(get_config(), prof_settings)
+        if thread_id is None:
+            return fn(*args, **kwargs)
+        profile = NodeProfile(thread_id, name, prof_settings["interval_s"])
+        _sampler.attach_thread(profile)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _sampler.detach_thread(profile)
+            _finish(profile, prof_settings)
+
+    return sync_wrapper
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Provider 提示前缀缓存（Prompt Prefix Caching）
+
+每个专家回合都会重复发送同样的大段前缀：系统提示词、工具说明、分诊患者报告。
+- Anthropic 兼容接口 (provider: anthropic) 支持 cache_control 断点，需要显式标记
+- OpenAI 兼容接口会自动缓存稳定前缀，只要保证不变的内容排在最前面
+
+本模块提供:
+- PromptCacheMiddleware: agent 中间件，Anthropic 模型在系统提示词末尾与最后一条消息上
+  打 cache_control 断点（工具定义位于系统提示词之前，一并被缓存），并统计缓存命中 token
+- cached_system_message: 非 agent 场景（如 summary_node）构建带断点的系统消息
+- record_prompt_cache_usage / get_prompt_cache_stats: 按调用方汇总 cache_read / cache_creation token
+
+缓存命中 token 取自 usage_metadata.input_token_details（OpenAI 的 cached_tokens
+与 Anthropic 的 cache_read_input_tokens 都被 LangChain 统一到该字段）。
+"""
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import BaseMessage, SystemMessage
+
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+_stats_lock = threading.Lock()
+_prompt_cache_stats: Dict[str, Dict[str, int]] = {}
+
+
+def supports_cache_control(model: Any) -> bool:
+    """模型是否支持显式 cache_control 断点（Anthropic 兼容接口）"""
+    return isinstance(model, ChatAnthropic)
+
+
+def with_cache_breakpoint(message: SystemMessage, ttl: Optional[str] = None) -> SystemMessage:
+    """在系统消息最后一个内容块上标记 cache_control 断点"""
+    cache_control = dict(_CACHE_CONTROL, **({"ttl": ttl} if ttl else {}))
+    content = message.content
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content, "cache_control": cache_control}]
+    else:
+        blocks = [dict(b) if isinstance(b, dict) else {"type": "text", "text": str(b)} for b in content]
+        if not blocks:
+            return message
+        blocks[-1]["cache_control"] = cache_control
+    return SystemMessage(content=blocks)
+
+
+def cached_system_message(model: Any, text: str, ttl: Optional[str] = None) -> SystemMessage:
+    """构建系统消息；模型支持时附带缓存断点"""
+    message = SystemMessage(content=text)
+    return with_cache_breakpoint(message, ttl) if supports_cache_control(model) else message
+
+
+def record_prompt_cache_usage(name: str, messages: Iterable[BaseMessage]) -> Dict[str, int]:
+    """
+    从模型返回消息的 usage_metadata 中累计缓存命中 token。
+
+    Args:
+        name: 调用方名称（如 agent 名、节点名）
+        messages: 模型返回的消息
+
+    Returns:
+        本次调用的 {"input_tokens", "cache_read", "cache_creation"}
+    """
+    current = {"input_tokens": 0, "cache_read": 0, "cache_creation": 0}
+    for message in messages:
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            continue
+        details = usage.get("input_token_details") or {}
+        current["input_tokens"] += usage.get("input_tokens", 0) or 0
+        current["cache_read"] += details.get("cache_read", 0) or 0
+        current["cache_creation"] += details.get("cache_creation", 0) or 0
+
+    if current["input_tokens"]:
+        with _stats_lock:
+            total = _prompt_cache_stats.setdefault(
+                name, {"calls": 0, "input_tokens": 0, "cache_read": 0, "cache_creation": 0}
+            )
+            total["calls"] += 1
+            for key, value in current.items():
+                total[key] += value
+        if current["cache_read"] or current["cache_creation"]:
+            ratio = current["cache_read"] / current["input_tokens"]
+            print(
+                f"[PromptCache] {name}: 输入 {current['input_tokens']} tokens，"
+                f"缓存命中 {current['cache_read']} ({ratio:.0%})，新写入 {current['cache_creation']}"
+            )
+    return current
+
+
+def get_prompt_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """返回各调用方累计的缓存命中统计（含命中率）"""
+    with _stats_lock:
+        out = {name: dict(v) for name, v in _prompt_cache_stats.items()}
+    for v in out.values():
+        v["hit_ratio"] = round(v["cache_read"] / v["input_tokens"], 4) if v["input_tokens"] else 0.0
+    return out
+
+
+def reset_prompt_cache_stats() -> None:
+    """清空缓存命中统计"""
+    with _stats_lock:
+        _prompt_cache_stats.clear()
+
+
+class PromptCacheMiddleware(AgentMiddleware):
+    """
+    提示前缀缓存中间件。
+
+    - Anthropic 模型: 系统提示词末尾 + 最后一条消息 两个 cache_control 断点，
+      多轮调用时前面的对话都能命中缓存
+    - 其他模型: 不修改请求，只统计 provider 自动前缀缓存的命中情况
+    """
+
+    def __init__(self, name: str, ttl: Optional[str] = None):
+        super().__init__()
+        self.cache_name = name
+        self.ttl = ttl
+
+    def _prepare(self, request):
+        if not supports_cache_control(request.model):
+            return request
+        overrides = {
+            "model_settings": {
+                **request.model_settings,
+                "cache_control": dict(_CACHE_CONTROL, **({"ttl": self.ttl} if self.ttl else {})),
+            }
+        }
+        if request.system_message is not None:
+            overrides["system_message"] = with_cache_breakpoint(request.system_message, self.ttl)
+        return request.override(**overrides)
+
+    def _record(self, response) -> None:
+        result = getattr(response, "result", None)
+        record_prompt_cache_usage(self.cache_name, result if result is not None else [response])
+
+    def wrap_model_call(self, request, handler):
+        response = handler(self._prepare(request))
+        self._record(response)
+        return response
+
+    async def awrap_model_call(self, request, handler):
+        response = await handler(self._prepare(request))
+        self._record(response)
+        return response
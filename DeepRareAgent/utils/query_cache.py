@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+近似重复查询缓存 (Near-duplicate Query Cache)
+
+LLM 在同一会话甚至不同患者会话中，经常发出几乎相同的检索请求，例如：
+    "Fabry disease GLA mutation"  vs  "GLA mutation Fabry disease diagnosis"
+精确键缓存无法命中这类请求。本模块为文献/搜索工具提供一层相似度感知的缓存：
+
+1. 查询归一化：小写、NFKC、去标点、去停用词、简单去复数；中文按字二元组切分
+2. MinHash 签名：对归一化后的 token 集合计算 MinHash 签名
+3. LSH 索引：签名分段 (band) 入桶，只对同桶候选计算精确 Jaccard 相似度
+4. 命中判定：Jaccard >= threshold 时直接复用已有结果
+
+装饰器返回与写入的都是结果的深拷贝，调用方修改返回值不会污染缓存。
+
+缓存为进程级单例，因此同一服务进程内的多个患者线程共享命中。
+"""
+import copy
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+
+# Mersenne 素数 2^61 - 1，用于通用哈希族 (a*x + b) mod p
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*|[一-鿿]+")
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "of", "on", "or", "the", "to", "with", "what", "which", "about", "between",
+    "的", "和", "与", "及",
+})
+
+
+def normalize_query_tokens(query: str) -> FrozenSet[str]:
+    """
+    将查询语句归一化为 token 集合
+
+    - 英文/数字：按单词切分，去停用词，长度 > 3 的词去掉末尾复数 s（保留 -ss/-is/-us 结尾）
+    - 中文：连续汉字按字二元组 (bigram) 切分，单字保留本身
+
+    Args:
+        query: 原始查询语句
+
+    Returns:
+        归一化后的 token 集合（可能为空）
+    """
+    if not query:
+        return frozenset()
+
+    text = unicodedata.normalize("NFKC", query).lower()
+    tokens = set()
+    for piece in _TOKEN_PATTERN.findall(text):
+        if "一" <= piece[0] <= "鿿":
+            if len(piece) == 1:
+                tokens.add(piece)
+            else:
+                tokens.update(piece[i:i + 2] for i in range(len(piece) - 1))
+            continue
+        if piece in _STOPWORDS:
+            continue
+        if len(piece) > 3 and piece.endswith("s") and not piece.endswith(("ss", "is", "us")):
+            piece = piece[:-1]
+        tokens.add(piece)
+    return frozenset(tokens)
+
+
+def jaccard_similarity(left: FrozenSet[str], right: FrozenSet[str]) -> float:
+    """计算两个 token 集合的精确 Jaccard 相似度"""
+    if not left and not right:
+        return 1.0
+    union = len(left | right)
+    return len(left & right) / union if union else 0.0
+
+
+class MinHasher:
+    """基于通用哈希族的 MinHash 签名生成器（确定性种子，跨进程结果一致）"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        self.num_perm = num_perm
+        params = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"{seed}:{i}".encode("utf-8"), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], "little") % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], "little") % _MERSENNE_PRIME
+            params.append((a, b))
+        self._params = params
+
+    @staticmethod
+    def _hash_token(token: str) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little"
+        )
+
+    def signature(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        """计算 token 集合的 MinHash 签名；空集合返回全最大值签名"""
+        if not tokens:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashed = [self._hash_token(t) for t in tokens]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+            for a, b in self._params
+        )
+
+
+@dataclass
+class CacheHit:
+    """近似缓存命中结果"""
+    result: Any
+    matched_query: str
+    similarity: float
+
+
+@dataclass
+class _Entry:
+    partition: str
+    query: str
+    tokens: FrozenSet[str]
+    band_keys: Tuple[Tuple[int, ...], ...]
+    result: Any
+    created_at: float
+
+
+class NearDuplicateQueryCache:
+    """
+    MinHash/LSH 近似重复查询缓存
+
+    - 以 partition（工具命名空间 + 非查询参数）隔离不同工具/参数组合
+    - LRU 淘汰 + TTL 过期
+    - 线程安全（同步工具会在线程池中执行）
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.7,
+        num_perm: int = 64,
+        bands: int = 16,
+        max_entries: int = 2048,
+        ttl_seconds: Optional[float] = 24 * 3600,
+    ):
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) 必须能被 bands ({bands}) 整除")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._hasher = MinHasher(num_perm=num_perm)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # (partition, band_index, band_values) -> {entry_id}
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "exact_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+    def lookup(
+        self,
+        namespace: str,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Optional[CacheHit]:
+        """查找与 query 相似度不低于阈值的缓存结果，返回相似度最高的一条"""
+        tokens = normalize_query_tokens(query)
+        if not tokens:
+            return None
+        partition = self._partition(namespace, params)
+        band_keys = self._band_keys(self._hasher.signature(tokens))
+
+        with self._lock:
+            now = time.monotonic()
+            candidates = set()
+            for band_index, band in enumerate(band_keys):
+                candidates.update(self._buckets.get((partition, band_index, band), ()))
+
+            best_id, best_sim = None, -1.0
+            for entry_id in candidates:
+                entry = self._entries.get(entry_id)
+                if entry is None:
+                    continue
+                if self._is_expired(entry, now):
+                    self._remove(entry_id)
+                    continue
+                sim = jaccard_similarity(tokens, entry.tokens)
+                if sim > best_sim:
+                    best_id, best_sim = entry_id, sim
+
+            if best_id is None or best_sim < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            if best_sim >= 1.0:
+                self._stats["exact_hits"] += 1
+            return CacheHit(
+                result=entry.result,
+                matched_query=entry.query,
+                similarity=best_sim,
+            )
+
+    def store(
+        self,
+        namespace: str,
+        query: str,
+        result: Any,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """写入缓存；相同 token 集合的旧条目会被替换"""
+        tokens = normalize_query_tokens(query)
+        if not tokens:
+            return
+        partition = self._partition(namespace, params)
+        band_keys = self._band_keys(self._hasher.signature(tokens))
+
+        with self._lock:
+            for band_index, band in enumerate(band_keys):
+                for entry_id in list(self._buckets.get((partition, band_index, band), ())):
+                    entry = self._entries.get(entry_id)
+                    if entry is not None and entry.tokens == tokens:
+                        self._remove(entry_id)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(
+                partition=partition,
+                query=query,
+                tokens=tokens,
+                band_keys=band_keys,
+                result=result,
+                created_at=time.monotonic(),
+            )
+            for band_index, band in enumerate(band_keys):
+                self._buckets.setdefault((partition, band_index, band), set()).add(entry_id)
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        """清空缓存与统计"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            for key in self._stats:
+                self._stats[key] = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中统计（hits/misses/hit_rate 等）"""
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+        total = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / total if total else 0.0
+        return out
+
+    # ------------------------------------------------------------------
+    # 内部方法
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _partition(namespace: str, params: Optional[Dict[str, Any]]) -> str:
+        if not params:
+            return namespace
+        items = ",".join(f"{k}={params[k]!r}" for k in sorted(params))
+        return f"{namespace}|{items}"
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> Tuple[Tuple[int, ...], ...]:
+        return tuple(
+            signature[i * self.rows:(i + 1) * self.rows] for i in range(self.bands)
+        )
+
+    def _is_expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry.created_at > self.ttl_seconds
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for band_index, band in enumerate(entry.band_keys):
+            key = (entry.partition, band_index, band)
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+
+# ============================================================
+# 进程级单例与工具装饰器
+# ============================================================
+
+_query_cache: Optional[NearDuplicateQueryCache] = None
+_query_cache_enabled: Optional[bool] = None
+_query_cache_lock = threading.Lock()
+
+
+def _load_cache_settings() -> Dict[str, Any]:
+    """读取 config.yml 中的 tool_cache.near_duplicate 配置（缺失时使用默认值）"""
+    try:
+        from DeepRareAgent.config import settings
+    except Exception:
+        return {}
+    tool_cache = getattr(settings, "tool_cache", None)
+    near_dup = getattr(tool_cache, "near_duplicate", None) if tool_cache else None
+    if near_dup is None:
+        return {}
+    return near_dup.to_dict() if hasattr(near_dup, "to_dict") else dict(near_dup)
+
+
+def get_query_cache() -> Optional[NearDuplicateQueryCache]:
+    """
+    获取进程级近似查询缓存单例
+
+    Returns:
+        缓存实例；若配置中 tool_cache.near_duplicate.enabled 为 false 则返回 None
+    """
+    global _query_cache, _query_cache_enabled
+    if _query_cache_enabled is not None:
+        return _query_cache
+
+    with _query_cache_lock:
+        if _query_cache_enabled is None:
+            cfg = _load_cache_settings()
+            if cfg.get("enabled", True):
+                _query_cache = NearDuplicateQueryCache(
+                    threshold=float(cfg.get("threshold", 0.7)),
+                    num_perm=int(cfg.get("num_perm", 64)),
+                    bands=int(cfg.get("bands", 16)),
+                    max_entries=int(cfg.get("max_entries", 2048)),
+                    ttl_seconds=cfg.get("ttl_seconds", 24 * 3600),
+                )
+            _query_cache_enabled = _query_cache is not None
+    return _query_cache
+
+
+def near_duplicate_cached(
+    namespace: str,
+    query_arg: str = "query",
+    param_args: Tuple[str, ...] = (),
+    is_cacheable: Optional[Callable[[Any], bool]] = None,
+):
+    """
+    为检索工具函数添加近似重复缓存的装饰器（放在 @tool 之下）
+
+    Args:
+        namespace: 缓存命名空间（通常为工具名）
+        query_arg: 查询语句参数名
+        param_args: 参与分区的其他参数名（如 max_results），不同取值互不复用
+        is_cacheable: 判定结果是否可缓存（如空结果、错误结果不缓存）
+
+    Example:
+        @tool("search_pubmed", args_schema=PubMedSearchArgs)
+        @near_duplicate_cached("search_pubmed", param_args=("max_results",))
+        def search_pubmed(query: str, max_results: int = 3): ...
+    """
+    def decorator(func: Callable) -> Callable:
+        import inspect
+
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_query_cache()
+            if cache is None:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            query = bound.arguments.get(query_arg)
+            if not isinstance(query, str) or not query.strip():
+                return func(*args, **kwargs)
+            params = {name: bound.arguments.get(name) for name in param_args}
+
+            hit = cache.lookup(namespace, query, params)
+            if hit is not None:
+                return copy.deepcopy(hit.result)
+
+            result = func(*args, **kwargs)
+            if is_cacheable is None or is_cacheable(result):
+                cache.store(namespace, query, copy.deepcopy(result), params)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+图状态体积监测（每个超步各状态字段的序列化字节数 / 消息条数 / 估算 token）
+
+MDTGraphState 与 MainGraphState 每轮都在增长（专家消息、证据、黑板报告、主对话 messages），
+检查点写入与序列化的开销随之增长。StateSizeMonitor 是一个 LangChain 回调处理器，挂到主图后:
+
+- 每个超步开始时（即上一步各节点的更新合并之后）测量一次节点读到的状态，同一超步的并行节点
+  只测一次；图运行结束时再测一次最终状态
+- 每个字段记录: 序列化字节数（与检查点相同的 JsonPlusSerializer）、BaseMessage 条数、估算 token；
+  字典型字段（expert_pool、blackboard ...）再按一层子键细分，如 expert_pool.group_1
+- 结果写入:
+  - tracing span（state_total_bytes、state_bytes.<key>、state_messages.<key>、state_tokens.<key>）
+  - 每个线程按图层（main / mdt_diagnosis）的汇总 get_state_size_summary(thread_id):
+    最近一次 / 峰值 / 相对首次的增长，以及各字段增长归属到哪些节点（growth_by_node，并行节点以逗号连接）
+  - 可选的 JSONL 文件（每次测量一行，由后台线程写入，见 tracing.JsonlWriter）
+- 总字节数或单个字段的字节数 / token 首次超过阈值时打印警告（每个线程每个图层每个字段只警告一次）
+
+测量在回调中同步进行，会占用事件循环时间，只在排查时开启。max_depth 限制测量的图层级:
+1 为主图，2 再包含 MDT 子图；更深的 agent 内部循环不测量。
+
+配置 (config.yml):
+    state_size:
+      enabled: false
+      max_depth: 2
+      # jsonl_path: "logs/state_size.jsonl"
+      max_threads: 1000
+      warn_total_bytes: 0
+      warn_key_bytes: 0
+      warn_key_tokens: 0
+"""
+import atexit
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+
+from DeepRareAgent.utils.token_utils import estimate_message_tokens, estimate_text_tokens
+from DeepRareAgent.utils.tracing import JsonlWriter, annotate_run
+
+_serializer = None
+
+
+def _serialized_bytes(value: Any) -> int:
+    """按检查点使用的序列化器计算字节数；序列化失败时退回 JSON"""
+    global _serializer
+    try:
+        if _serializer is None:
+            from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+            _serializer = JsonPlusSerializer()
+        return len(_serializer.dumps_typed(value)[1])
+    except Exception:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _count(value: Any) -> Tuple[int, int]:
+    """递归统计 (消息条数, 估算 token)"""
+    if isinstance(value, BaseMessage):
+        return 1, estimate_message_tokens(value)
+    if isinstance(value, str):
+        return 0, estimate_text_tokens(value)
+    if isinstance(value, dict):
+        items = value.values()
+    elif isinstance(value, (list, tuple, set)):
+        items = value
+    else:
+        return 0, 0
+    messages = tokens = 0
+    for item in items:
+        m, t = _count(item)
+        messages += m
+        tokens += t
+    return messages, tokens
+
+
+def measure_state(state: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    """
+    测量状态各字段: {key: {"bytes", "messages", "tokens"}}。
+
+    字典型字段额外给出一层子键 "key.sub"，其父字段字节数为子键之和。
+    """
+    sizes: Dict[str, Dict[str, int]] = {}
+    for key, value in state.items():
+        if isinstance(value, dict) and value:
+            total = {"bytes": 0, "messages": 0, "tokens": 0}
+            for sub, sub_value in value.items():
+                messages, tokens = _count(sub_value)
+                entry = {"bytes": _serialized_bytes(sub_value), "messages": messages, "tokens": tokens}
+                sizes[f"{key}.{sub}"] = entry
+                for field in total:
+                    total[field] += entry[field]
+            sizes[key] = total
+        else:
+            messages, tokens = _count(value)
+            sizes[key] = {"bytes": _serialized_bytes(value), "messages": messages, "tokens": tokens}
+    return sizes
+
+
+def _total_bytes(sizes: Dict[str, Dict[str, int]]) -> int:
+    return sum(entry["bytes"] for key, entry in sizes.items() if "." not in key)
+
+
+def _layer(checkpoint_ns: str) -> str:
+    """节点的 checkpoint_ns 去掉自身与各层任务 id 后的图层名: 主图为 main，MDT 子图为 mdt_diagnosis"""
+    parents = checkpoint_ns.split("|")[:-1]
+    return "/".join(segment.split(":")[0] for segment in parents) or "main"
+
+
+def _layer_record() -> Dict[str, Any]:
+    return {"snapshots": 0, "last_total_bytes": 0, "peak_total_bytes": 0,
+            "first": {}, "last": {}, "peak": {}, "growth_by_node": {}}
+
+
+class StateSizeMonitor(BaseCallbackHandler):
+    """按超步测量图状态体积；线程汇总按最近使用保留 max_threads 个"""
+
+    run_inline = True
+
+    def __init__(self, max_depth: int = 2, jsonl_path: Optional[str] = None, warn_total_bytes: int = 0,
+                 warn_key_bytes: int = 0, warn_key_tokens: int = 0, max_threads: int = 1000):
+        super().__init__()
+        self.max_depth = max_depth
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self._writer = (JsonlWriter(str(self.jsonl_path), thread_name="state-size-jsonl", tag="StateSize")
+                        if self.jsonl_path is not None else None)
+        self.warn_total_bytes = int(warn_total_bytes or 0)
+        self.warn_key_bytes = int(warn_key_bytes or 0)
+        self.warn_key_tokens = int(warn_key_tokens or 0)
+        self.max_threads = max_threads
+        self._lock = threading.Lock()
+        # 图运行 run_id -> {thread_id, layer, step, nodes（当前超步已开始的节点）, last_step_nodes, last_sizes}
+        self._graphs: Dict[UUID, Dict[str, Any]] = {}
+        self._threads: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._warned: set = set()
+
+    # ---- 回调 ----
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        if parent_run_id is None or not name or metadata.get("langgraph_node") != name:
+            return
+        depth = metadata.get("langgraph_checkpoint_ns", "").count("|") + 1
+        if depth > self.max_depth or not isinstance(inputs, dict):
+            return
+        step = metadata.get("langgraph_step")
+        with self._lock:
+            graph = self._graphs.get(parent_run_id)
+            if graph is None:
+                graph = self._graphs[parent_run_id] = {
+                    "thread_id": str(metadata.get("thread_id") or "default"),
+                    "layer": _layer(metadata.get("langgraph_checkpoint_ns", "")),
+                    "step": None, "nodes": [], "last_step_nodes": [], "last_sizes": {},
+                }
+            new_step = graph["step"] != step
+            if new_step:
+                graph["last_step_nodes"], graph["nodes"], graph["step"] = graph["nodes"], [], step
+            graph["nodes"].append(name)
+        if new_step:
+            # 同一超步的并行节点读到的是同一份状态，只测第一个
+            sizes = self.record(graph, inputs, step)
+            annotate_run(run_id, **self._span_attributes(sizes))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self._lock:
+            graph = self._graphs.pop(run_id, None)
+        if graph is not None and isinstance(outputs, dict):
+            # 最终状态：归属到最后一个超步的节点
+            graph["last_step_nodes"] = graph["nodes"]
+            self.record(graph, outputs, "final")
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._graphs.pop(run_id, None)
+
+    @staticmethod
+    def _span_attributes(sizes: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+        attrs: Dict[str, Any] = {"state_total_bytes": _total_bytes(sizes)}
+        for key, entry in sizes.items():
+            if "." in key:
+                continue
+            attrs[f"state_bytes.{key}"] = entry["bytes"]
+            if entry["messages"]:
+                attrs[f"state_messages.{key}"] = entry["messages"]
+            attrs[f"state_tokens.{key}"] = entry["tokens"]
+        return attrs
+
+    # ---- 汇总 ----
+    def record(self, graph: Dict[str, Any], state: Dict[str, Any], step: Any) -> Dict[str, Dict[str, int]]:
+        """测量一次状态并计入线程汇总（按图层分开），返回各字段大小"""
+        sizes = measure_state(state)
+        total = _total_bytes(sizes)
+        thread_id, layer = graph["thread_id"], graph["layer"]
+        after = ",".join(graph["last_step_nodes"]) or "(input)"
+        warnings: List[str] = []
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            if thread is None:
+                thread = self._threads[thread_id] = {}
+                while len(self._threads) > self.max_threads:
+                    evicted, _ = self._threads.popitem(last=False)
+                    self._warned = {w for w in self._warned if w[0] != evicted}
+            else:
+                self._threads.move_to_end(thread_id)
+            record = thread.setdefault(layer, _layer_record())
+            record["snapshots"] += 1
+            record["last_total_bytes"] = total
+            record["peak_total_bytes"] = max(record["peak_total_bytes"], total)
+            growth = record["growth_by_node"].setdefault(after, {})
+            for key, entry in sizes.items():
+                record["first"].setdefault(key, dict(entry))
+                peak = record["peak"].setdefault(key, dict(entry))
+                for field, value in entry.items():
+                    peak[field] = max(peak[field], value)
+                # 与同一次图运行的上一次测量比较
+                if key in graph["last_sizes"] and "." not in key:
+                    delta = entry["bytes"] - graph["last_sizes"][key]["bytes"]
+                    if delta:
+                        growth[key] = growth.get(key, 0) + delta
+            record["last"] = sizes
+            graph["last_sizes"] = sizes
+
+            checks = [("total", "bytes", total, self.warn_total_bytes)]
+            for key, entry in sizes.items():
+                checks.append((key, "bytes", entry["bytes"], self.warn_key_bytes))
+                checks.append((key, "tokens", entry["tokens"], self.warn_key_tokens))
+            for key, unit, value, limit in checks:
+                if limit and value > limit and (thread_id, layer, key, unit) not in self._warned:
+                    self._warned.add((thread_id, layer, key, unit))
+                    warnings.append(f"{layer}.{key} {value} {unit} > {limit}")
+
+        for warning in warnings:
+            print(f"[WARN] [StateSize] 线程 {thread_id} 状态超出阈值: {warning}（在 {after} 之后）")
+        if self._writer is not None:
+            self._writer.write({"ts": time.time(), "thread_id": thread_id, "layer": layer, "step": step,
+                                "after": after, "total_bytes": total, "keys": sizes})
+        return sizes
+
+    def flush(self) -> None:
+        """等待已入队的 JSONL 记录写完"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+    def thread_summary(self, thread_id: str) -> Dict[str, Any]:
+        """
+        某线程的状态体积汇总: {图层: {...}}，图层为 main 或子图节点名（如 mdt_diagnosis）。
+
+        growth 为最近一次相对首次测量的字节增长；没有记录时返回空字典。
+        """
+        with self._lock:
+            summary = json.loads(json.dumps(self._threads.get(str(thread_id), {})))
+        for record in summary.values():
+            record["growth"] = {key: entry["bytes"] - record["first"].get(key, {}).get("bytes", 0)
+                                for key, entry in record["last"].items()}
+        return summary
+
+    def reset(self) -> None:
+        with self._lock:
+            self._graphs.clear()
+            self._threads.clear()
+            self._warned.clear()
+
+
+# ========== 进程级监测器 ==========
+_monitor: Optional[StateSizeMonitor] = None
+_monitor_loaded = False
+
+
+def get_state_size_monitor() -> Optional[StateSizeMonitor]:
+    """按 config.yml 的 state_size 段创建进程级监测器；未启用时返回 None"""
+    global _monitor, _monitor_loaded
+    if _monitor_loaded:
+        return _monitor
+    _monitor_loaded = True
+    try:
+        from DeepRareAgent.config import settings
+        cfg = getattr(settings, "state_size", None)
+    except Exception:
+        cfg = None
+    _monitor = build_state_size_monitor(cfg.to_dict() if cfg is not None else {})
+    if _monitor is not None:
+        # JSONL 在后台线程中写出，进程退出前把排队的记录写完
+        atexit.register(_monitor.close)
+        print(f"[StateSize] 已启用，max_depth={_monitor.max_depth}")
+    return _monitor
+
+
+def build_state_size_monitor(data: Dict[str, Any]) -> Optional[StateSizeMonitor]:
+    """按 state_size 配置段（字典）创建监测器；未启用时返回 None"""
+    if not data.get("enabled", False):
+        return None
+    # 配置加载器会把含 path 的键解析到项目根目录，空值因此变成一个目录，视为不写 JSONL
+    jsonl_path = data.get("jsonl_path") or None
+    if jsonl_path is not None and Path(jsonl_path).is_dir():
+        print(f"[StateSize] jsonl_path 指向目录 {jsonl_path}，不写 JSONL")
+        jsonl_path = None
+    return StateSizeMonitor(
+        max_depth=int(data.get("max_depth", 2)),
+        jsonl_path=jsonl_path,
+        warn_total_bytes=data.get("warn_total_bytes", 0),
+        warn_key_bytes=data.get("warn_key_bytes", 0),
+        warn_key_tokens=data.get("warn_key_tokens", 0),
+        max_threads=int(data.get("max_threads", 1000)),
+    )
+
+
+def state_size_callbacks() -> List[BaseCallbackHandler]:
+    """主图使用的状态体积监测回调列表（未启用时为空）"""
+    monitor = get_state_size_monitor()
+    return [monitor] if monitor is not None else []
+
+
+def get_state_size_summary(thread_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """某线程的状态体积汇总；监测未启用时返回 None"""
+    monitor = get_state_size_monitor()
+    if monitor is None:
+        return None
+    return monitor.thread_summary(str(thread_id or "default"))
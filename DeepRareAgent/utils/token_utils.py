@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Token 估算工具
+
+在不引入 tokenizer 依赖的前提下粗略估算消息的 token 数：
+- CJK 字符按 1 字符 ≈ 1 token
+- 其他字符按 4 字符 ≈ 1 token
+
+仅用于限流预留、上下文预算等需要"量级正确"的场景，真实用量以模型返回的
+usage_metadata 为准。
+"""
+import json
+from typing import Any, Iterable
+
+# 每条消息的固定开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF
+        or 0x3400 <= code <= 0x4DBF
+        or 0x3000 <= code <= 0x303F
+        or 0xFF00 <= code <= 0xFFEF
+    )
+
+
+def estimate_text_tokens(text: str) -> int:
+    """估算一段文本的 token 数"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def _content_to_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif isinstance(block, dict):
+                parts.append(str(block.get("text") or block.get("content") or ""))
+        return "".join(parts)
+    return str(content or "")
+
+
+def estimate_message_tokens(message: Any) -> int:
+    """估算单条消息（BaseMessage 或 dict）的 token 数，包含工具调用参数"""
+    if isinstance(message, dict):
+        content = message.get("content", "")
+        tool_calls = message.get("tool_calls") or []
+    else:
+        content = getattr(message, "content", message)
+        tool_calls = getattr(message, "tool_calls", None) or []
+
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_text_tokens(_content_to_text(content))
+    for call in tool_calls:
+        args = call.get("args", {}) if isinstance(call, dict) else {}
+        tokens += estimate_text_tokens(json.dumps(args, ensure_ascii=False, default=str))
+    return tokens
+
+
+def estimate_messages_tokens(messages: Iterable[Any]) -> int:
+    """估算消息列表的总 token 数"""
+    return sum(estimate_message_tokens(m) for m in messages)
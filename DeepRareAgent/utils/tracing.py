@@ -0,0 +1,608 @@
+# -*- coding: utf-8 -*-
+"""
+节点 / LLM / 工具 计时 span（兼容 OpenTelemetry 的本地导出）
+
+一次 MDT 动辄数分钟，过去只能靠 print 与 Langfuse 回调，分不清时间花在 LLM、工具、
+排队（LLM 治理器）还是框架本身。SpanTracer 是一个 LangChain 回调处理器，挂到主图后：
+
+- 每个图节点（prediagnosis、prepare_mdt、group_N、expert_review、summary，以及
+  子图 / agent 内部节点）生成 kind=node 的 span，整次图调用为 kind=graph 的根 span
+- 每次 LLM 调用生成 kind=llm 的 span: 模型、输入 / 输出 / 缓存 token、响应缓存命中、
+  请求体大小、治理器排队时间（由 llm_governor 通过 annotate_run 补充）
+- 每次工具调用生成 kind=tool 的 span: 输入 / 输出大小、是否出错
+- 重试（on_retry）计入所在 span 的 retries 属性
+
+span 在结束时交给导出器:
+- InMemorySpanExporter: 进程内列表（测试、基准脚本）
+- JsonlSpanExporter: 追加写入 JSONL 文件，每行一个 span（后台线程批量写入）
+- OTLPSpanExporter: OTLP/HTTP JSON（POST <endpoint>/v1/traces），后台线程批量发送，
+  可直接发给 OpenTelemetry Collector / Jaeger / Tempo，不需要额外依赖
+
+span_breakdown() 把每个节点的耗时拆成 LLM / 工具 / 排队 / 其余（框架开销与本地计算）。
+
+配置 (config.yml):
+    tracing:
+      enabled: false
+      exporters: ["jsonl"]             # memory | jsonl | otlp
+      jsonl_path: "logs/traces.jsonl"
+      otlp_endpoint: "http://127.0.0.1:4318"
+      otlp_headers: {}
+      service_name: "deeprare-agent"
+"""
+import atexit
+import json
+import queue
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+SPAN_KINDS = ("graph", "node", "llm", "tool")
+
+
+# ========== Span ==========
+class Span:
+    """一次计时区间；时间为 Unix 纳秒，属性值限于 str / int / float / bool"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "status", "error")
+
+    def __init__(self, trace_id: str, span_id: str, parent_id: Optional[str], name: str, kind: str,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    @property
+    def duration_s(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_s": round(self.duration_s, 6),
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+# ========== 导出器 ==========
+class SpanExporter:
+    """导出器接口：span 结束时调用 export（参数为 Span.to_dict() 的结果）"""
+
+    def export(self, span: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        self.flush()
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class JsonlWriter:
+    """
+    后台线程追加写入 JSONL 文件（每条记录一行）。记录通常在回调中（就在事件循环线程上）产生，
+    write 只做序列化与入队，文件写入由后台线程批量完成；写入失败时打印一次警告并停止写入
+    """
+
+    def __init__(self, path: str, thread_name: str = "jsonl-writer", tag: str = "JSONL"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tag = tag
+        self._failed = False
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=thread_name, daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._queue.put(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def _write(self, lines: List[str]) -> None:
+        if self._failed:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        except OSError as e:
+            self._failed = True
+            print(f"[{self.tag}] 写入 {self.path} 失败（{len(lines)} 行），不再写 JSONL: {e}")
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            items = [self._queue.get()]
+            # 取走已排队的全部记录，一次打开文件写完
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for item in items:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    if lines:
+                        self._write(lines)
+                        lines = []
+                    item.set()
+                else:
+                    lines.append(item)
+            if lines:
+                self._write(lines)
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """等待已入队的记录写完"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=10.0)
+
+
+class JsonlSpanExporter(JsonlWriter, SpanExporter):
+    """追加写入 JSONL 文件，每行一个 span（后台线程批量写入，见 JsonlWriter）"""
+
+    def __init__(self, path: str):
+        super().__init__(path, thread_name="jsonl-span-exporter", tag="Tracing")
+
+    def export(self, span: Dict[str, Any]) -> None:
+        self.write(span)
+
+    def shutdown(self) -> None:
+        self.close()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp_json(spans: Sequence[Dict[str, Any]], service_name: str = "deeprare-agent") -> Dict[str, Any]:
+    """按 OTLP/HTTP JSON 编码（ExportTraceServiceRequest）"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(service_name)}]},
+            "scopeSpans": [{
+                "scope": {"name": "DeepRareAgent.tracing"},
+                "spans": [{
+                    "traceId": span["trace_id"],
+                    "spanId": span["span_id"],
+                    **({"parentSpanId": span["parent_id"]} if span.get("parent_id") else {}),
+                    "name": span["name"],
+                    "kind": 3 if span["kind"] in ("llm", "tool") else 1,  # CLIENT / INTERNAL
+                    "startTimeUnixNano": str(span["start_ns"]),
+                    "endTimeUnixNano": str(span["end_ns"]),
+                    "attributes": [
+                        {"key": k, "value": _otlp_value(v)}
+                        for k, v in {"deeprare.kind": span["kind"], **span["attributes"]}.items()
+                    ],
+                    "status": {"code": 2, "message": span.get("error") or ""} if span["status"] == "error" else {"code": 1},
+                } for span in spans],
+            }],
+        }],
+    }
+
+
+class OTLPSpanExporter(SpanExporter):
+    """OTLP/HTTP JSON 导出器；在后台线程中批量发送，发送失败只打印警告不影响诊断流程"""
+
+    def __init__(self, endpoint: str = "http://127.0.0.1:4318", headers: Optional[Dict[str, str]] = None,
+                 service_name: str = "deeprare-agent", batch_size: int = 256, interval: float = 2.0):
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="otlp-span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        self._queue.put(span)
+
+    def _send(self, batch: List[Dict[str, Any]]) -> None:
+        import httpx
+
+        try:
+            httpx.post(self.url, json=to_otlp_json(batch, self.service_name), headers=self.headers,
+                       timeout=10.0).raise_for_status()
+        except Exception as e:
+            print(f"[Tracing] OTLP 导出失败（{len(batch)} 个 span）: {type(e).__name__}: {e}")
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=self.interval)
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    if batch:
+                        self._send(batch)
+                        batch = []
+                    item.set()
+                    continue
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            if batch and (stop or len(batch) >= self.batch_size or self._queue.empty()):
+                self._send(batch)
+                batch = []
+
+    def flush(self, timeout: float = 10.0) -> None:
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=10.0)
+
+
+# ========== 回调处理器 ==========
+# 当前存活的 tracer，供 annotate_run 在调用链深处（如 LLM 治理器）补充属性
+_active_tracers: "weakref.WeakSet[SpanTracer]" = weakref.WeakSet()
+
+
+def annotate_run(run_id: Optional[UUID], **attributes: Any) -> None:
+    """给某次运行（LangChain run_id）对应的进行中 span 补充属性；没有 tracer 时无开销"""
+    if run_id is None or not _active_tracers:
+        return
+    for tracer in list(_active_tracers):
+        span = tracer._open.get(run_id)
+        if span is not None:
+            span.attributes.update(attributes)
+
+
+def _text_bytes(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content.encode("utf-8"))
+    if isinstance(content, list):
+        return sum(_text_bytes(b.get("text", "") if isinstance(b, dict) else b) for b in content)
+    return len(str(content).encode("utf-8")) if content is not None else 0
+
+
+def _message_bytes(message: Any) -> int:
+    size = _text_bytes(getattr(message, "content", message))
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        size += len(json.dumps(tool_calls, ensure_ascii=False, default=str).encode("utf-8"))
+    return size
+
+
+class SpanTracer(BaseCallbackHandler):
+    """
+    把 LangChain / LangGraph 回调转换为 span。
+
+    只有图调用、图节点、LLM、工具生成 span；RunnableSequence 等中间链不生成 span，
+    其子运行挂到最近的已生成 span 之下。
+    """
+
+    run_inline = True
+
+    def __init__(self, exporters: Optional[Iterable[SpanExporter]] = None):
+        super().__init__()
+        self.exporters: List[SpanExporter] = list(exporters or [])
+        self._open: Dict[UUID, Span] = {}
+        # 不生成 span 的运行 -> 其最近的已生成祖先 span
+        self._passthrough: Dict[UUID, Optional[Span]] = {}
+        self._lock = threading.Lock()
+        _active_tracers.add(self)
+
+    # ---- span 生命周期 ----
+    def _enclosing(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        if parent_run_id is None:
+            return None
+        span = self._open.get(parent_run_id)
+        if span is not None:
+            return span
+        return self._passthrough.get(parent_run_id)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str,
+               attributes: Dict[str, Any]) -> Span:
+        parent = self._enclosing(parent_run_id)
+        span = Span(
+            trace_id=parent.trace_id if parent is not None else run_id.hex,
+            # run_id 为 uuid7（前半部分是时间戳），取随机的后 64 位作为 span id
+            span_id=run_id.hex[16:],
+            parent_id=parent.span_id if parent is not None else None,
+            name=name,
+            kind=kind,
+            attributes=attributes,
+        )
+        with self._lock:
+            self._open[run_id] = span
+        return span
+
+    def _passthrough_start(self, run_id: UUID, parent_run_id: Optional[UUID]) -> None:
+        with self._lock:
+            self._passthrough[run_id] = self._enclosing(parent_run_id)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        with self._lock:
+            self._passthrough.pop(run_id, None)
+            span = self._open.pop(run_id, None)
+        if span is None:
+            return None
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.status = "error"
+            span.error = f"{type(error).__name__}: {error}"[:500]
+        record = span.to_dict()
+        for exporter in self.exporters:
+            try:
+                exporter.export(record)
+            except Exception as e:
+                print(f"[Tracing] 导出器 {type(exporter).__name__} 失败: {e}")
+        return span
+
+    @staticmethod
+    def _common_attributes(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        metadata = metadata or {}
+        attrs = {}
+        if metadata.get("thread_id") is not None:
+            attrs["thread_id"] = str(metadata["thread_id"])
+        if metadata.get("langgraph_node"):
+            attrs["node"] = metadata["langgraph_node"]
+        return attrs
+
+    # ---- 图与节点 ----
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        known_parent = parent_run_id in self._open or parent_run_id in self._passthrough
+        if not known_parent:
+            kind = "graph"
+        elif metadata.get("langgraph_node") == name:
+            kind = "node"
+        else:
+            self._passthrough_start(run_id, parent_run_id)
+            return
+        attrs = self._common_attributes(metadata)
+        if kind == "node":
+            attrs["step"] = metadata.get("langgraph_step")
+            attrs["checkpoint_ns"] = metadata.get("langgraph_checkpoint_ns", "")
+            if isinstance(inputs, dict) and isinstance(inputs.get("round_count"), int):
+                attrs["mdt_round"] = inputs["round_count"]
+        self._start(run_id, parent_run_id, name, kind, {k: v for k, v in attrs.items() if v is not None})
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # ---- LLM ----
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        model = metadata.get("ls_model_name") or params.get("model") or params.get("model_name") or "unknown"
+        batch = messages[0] if messages else []
+        self._start(run_id, parent_run_id, f"llm:{model}", "llm", {
+            **self._common_attributes(metadata),
+            "model": str(model),
+            "provider": str(metadata.get("ls_provider", "")),
+            "input_messages": len(batch),
+            "request_bytes": sum(_message_bytes(m) for m in batch),
+        })
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (serialized or {}).get("name") or "unknown"
+        self._start(run_id, parent_run_id, f"llm:{model}", "llm", {
+            **self._common_attributes(metadata),
+            "model": str(model),
+            "request_bytes": sum(_text_bytes(p) for p in prompts),
+        })
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._open.get(run_id)
+        if span is not None:
+            input_tokens = output_tokens = cached_tokens = response_bytes = 0
+            cache_hit = False
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    response_bytes += _message_bytes(message) if message is not None else _text_bytes(generation.text)
+                    usage = getattr(message, "usage_metadata", None) or {}
+                    input_tokens += usage.get("input_tokens", 0) or 0
+                    output_tokens += usage.get("output_tokens", 0) or 0
+                    cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+                    # LangChain 在响应缓存命中时把 total_cost 置 0
+                    cache_hit = cache_hit or ("total_cost" in usage and usage["total_cost"] == 0)
+            span.attributes.update({
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cached_input_tokens": cached_tokens,
+                "response_cache_hit": cache_hit,
+                "response_bytes": response_bytes,
+            })
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # ---- 工具 ----
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._start(run_id, parent_run_id, f"tool:{name}", "tool", {
+            **self._common_attributes(metadata),
+            "tool": name,
+            "request_bytes": _text_bytes(input_str),
+        })
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        span = self._open.get(run_id)
+        error = None
+        if span is not None:
+            span.attributes["response_bytes"] = _message_bytes(output)
+            if getattr(output, "status", None) == "error":
+                error = RuntimeError(str(getattr(output, "content", ""))[:200])
+        self._end(run_id, error)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # ---- 重试 ----
+    def on_retry(self, retry_state, *, run_id, parent_run_id=None, **kwargs):
+        span = self._open.get(run_id) or self._passthrough.get(run_id)
+        if span is not None:
+            span.attributes["retries"] = span.attributes.get("retries", 0) + 1
+
+    def shutdown(self) -> None:
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+# ========== 分析 ==========
+def span_breakdown(spans: Sequence[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    按节点名汇总耗时构成（同名节点多次执行累加）。
+
+    llm_s / tool_s 只统计节点内最外层的 LLM 与工具 span（工具内部子代理的 LLM 计入工具时间），
+    queue_s 为其中 LLM 在治理器中的排队时间，other_s = 节点耗时 - LLM - 工具（框架与本地计算，
+    节点内并发调用时可能为 0）。
+    """
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    for span in spans:
+        if span.get("parent_id"):
+            children.setdefault(span["parent_id"], []).append(span)
+
+    def _collect(span_id: str, acc: Dict[str, float]) -> None:
+        for child in children.get(span_id, []):
+            if child["kind"] == "llm":
+                acc["llm_s"] += child["duration_s"]
+                acc["queue_s"] += child["attributes"].get("queue_wait_s", 0.0)
+                acc["llm_calls"] += 1
+                acc["tokens"] += child["attributes"].get("input_tokens", 0) + child["attributes"].get("output_tokens", 0)
+            elif child["kind"] == "tool":
+                acc["tool_s"] += child["duration_s"]
+                acc["tool_calls"] += 1
+            else:
+                _collect(child["span_id"], acc)
+
+    out: Dict[str, Dict[str, Any]] = {}
+    for span in spans:
+        if span["kind"] not in ("graph", "node"):
+            continue
+        acc = {"llm_s": 0.0, "queue_s": 0.0, "tool_s": 0.0, "llm_calls": 0, "tool_calls": 0, "tokens": 0}
+        _collect(span["span_id"], acc)
+        row = out.setdefault(span["name"], {"count": 0, "total_s": 0.0, "llm_s": 0.0, "queue_s": 0.0,
+                                             "tool_s": 0.0, "other_s": 0.0, "llm_calls": 0,
+                                             "tool_calls": 0, "tokens": 0})
+        row["count"] += 1
+        row["total_s"] += span["duration_s"]
+        row["other_s"] += max(0.0, span["duration_s"] - acc["llm_s"] - acc["tool_s"])
+        for key, value in acc.items():
+            row[key] += value
+    for row in out.values():
+        for key in ("total_s", "llm_s", "queue_s", "tool_s", "other_s"):
+            row[key] = round(row[key], 4)
+    return out
+
+
+def read_spans(path: str) -> List[Dict[str, Any]]:
+    """读取 JsonlSpanExporter 写出的文件"""
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return spans
+
+
+# ========== 进程级 tracer ==========
+_tracer: Optional[SpanTracer] = None
+_tracer_loaded = False
+
+
+def build_exporters(config: Dict[str, Any]) -> List[SpanExporter]:
+    exporters: List[SpanExporter] = []
+    for name in config.get("exporters") or ["jsonl"]:
+        if name == "memory":
+            exporters.append(InMemorySpanExporter())
+        elif name == "jsonl":
+            exporters.append(JsonlSpanExporter(config.get("jsonl_path") or "logs/traces.jsonl"))
+        elif name == "otlp":
+            exporters.append(OTLPSpanExporter(
+                config.get("otlp_endpoint") or "http://127.0.0.1:4318",
+                headers=config.get("otlp_headers") or {},
+                service_name=config.get("service_name") or "deeprare-agent",
+            ))
+        else:
+            print(f"[Tracing] 未知的导出器: {name}，已忽略")
+    return exporters
+
+
+def get_tracer() -> Optional[SpanTracer]:
+    """按 config.yml 的 tracing 段创建进程级 tracer；未启用时返回 None"""
+    global _tracer, _tracer_loaded
+    if _tracer_loaded:
+        return _tracer
+    _tracer_loaded = True
+    try:
+        from DeepRareAgent.config import settings
+        cfg = getattr(settings, "tracing", None)
+    except Exception:
+        cfg = None
+    data = cfg.to_dict() if cfg is not None else {}
+    if data.get("enabled", False):
+        _tracer = SpanTracer(build_exporters(data))
+        # 导出器在后台线程中写出，进程退出前把排队的 span 写完
+        atexit.register(_tracer.shutdown)
+        print(f"[Tracing] 已启用，导出器: {[type(e).__name__ for e in _tracer.exporters]}")
+    return _tracer
+
+
+def tracing_callbacks() -> List[BaseCallbackHandler]:
+    """主图使用的 tracing 回调列表（未启用时为空）"""
+    tracer = get_tracer()
+    return [tracer] if tracer is not None else []
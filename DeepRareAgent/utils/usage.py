@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+Token 与费用统计（按线程 / 节点 / 专家组 / 子代理 / MDT 轮次汇总）
+
+各服务商按 token 计费，但过去没有任何地方汇总 usage_metadata。UsageTracker 是一个
+LangChain 回调处理器，挂到主图后累计每次 LLM 调用的输入 / 输出 / 缓存命中 token 与估算费用，
+并按调用所处的位置归类:
+
+- node: 主图节点（prediagnosis、prepare_mdt、summary）或 MDT 子图节点（group_N、expert_review ...）
+- group_id: 专家组（group_N 节点及其内部的所有调用）
+- subagent: 专家组通过 task 工具调用的子代理（subagent_type）
+- round: MDT 轮次（从 1 开始，取自节点输入的 round_count + 1）
+- model: 模型名
+
+结果:
+- summary_node 把本线程的汇总写入最终状态的 usage 字段（与 final_report 并列）
+- get_usage_metrics() / render_prometheus(): 进程级累计（按节点 / 专家组 / 模型，不含线程维度）
+- budget_usd_per_thread > 0 时，线程累计费用首次超出即打印警告
+
+费用按 prices 中第一条子串匹配模型名的价格计算（美元 / 百万 token），缓存命中的输入 token
+按 cached_input 计价（缺省同 input）；没有匹配价格的调用计入 unpriced_calls。
+
+配置 (config.yml):
+    usage_accounting:
+      enabled: true
+      max_threads: 1000
+      budget_usd_per_thread: 0
+      prices:
+        - match: "DeepSeek-V3"
+          input: 0.28
+          cached_input: 0.028
+          output: 0.42
+"""
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+MDT_NODE = "mdt_diagnosis"
+DIMENSIONS = ("by_node", "by_group", "by_round", "by_subagent", "by_model")
+# 进程级指标不含线程与轮次维度（避免标签基数随病例数增长）
+METRIC_DIMENSIONS = ("by_node", "by_group", "by_subagent", "by_model")
+
+
+def _bucket() -> Dict[str, Any]:
+    return {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0,
+            "cost_usd": 0.0, "unpriced_calls": 0}
+
+
+def _record() -> Dict[str, Any]:
+    return {"total": _bucket(), **{dim: {} for dim in DIMENSIONS}}
+
+
+def _add(bucket: Dict[str, Any], call: Dict[str, Any]) -> None:
+    bucket["llm_calls"] += 1
+    for key in ("input_tokens", "output_tokens", "cached_tokens", "cost_usd"):
+        bucket[key] += call[key]
+    bucket["unpriced_calls"] += 0 if call["priced"] else 1
+
+
+def _rounded(record: Dict[str, Any]) -> Dict[str, Any]:
+    out = copy.deepcopy(record)
+
+    def _fix(bucket):
+        bucket["cost_usd"] = round(bucket["cost_usd"], 6)
+
+    _fix(out["total"])
+    for dim in DIMENSIONS:
+        for bucket in out.get(dim, {}).values():
+            _fix(bucket)
+    return out
+
+
+def estimate_cost(prices: List[Dict[str, Any]], model: str, input_tokens: int, output_tokens: int,
+                  cached_tokens: int = 0) -> Optional[float]:
+    """按第一条匹配的价格估算费用（美元）；没有匹配价格时返回 None"""
+    for rule in prices:
+        if rule.get("match") and rule["match"] in model:
+            input_price = float(rule.get("input", 0.0))
+            cached_price = float(rule.get("cached_input", input_price))
+            output_price = float(rule.get("output", 0.0))
+            uncached = max(0, input_tokens - cached_tokens)
+            return (uncached * input_price + cached_tokens * cached_price + output_tokens * output_price) / 1_000_000
+    return None
+
+
+class UsageTracker(BaseCallbackHandler):
+    """累计 LLM 调用的 token 与费用；线程记录按最近使用保留 max_threads 个"""
+
+    run_inline = True
+
+    def __init__(self, prices: Optional[List[Dict[str, Any]]] = None, max_threads: int = 1000,
+                 budget_usd_per_thread: float = 0.0):
+        super().__init__()
+        self.prices = list(prices or [])
+        self.max_threads = max_threads
+        self.budget_usd_per_thread = float(budget_usd_per_thread or 0.0)
+        self._lock = threading.Lock()
+        self._context: Dict[UUID, Dict[str, Any]] = {}
+        self._threads: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._global = _record()
+        self._over_budget: set = set()
+
+    # ---- 调用位置 ----
+    def _push(self, run_id: UUID, parent_run_id: Optional[UUID], **updates: Any) -> None:
+        context = dict(self._context.get(parent_run_id, {})) if parent_run_id is not None else {}
+        context.update({k: v for k, v in updates.items() if v is not None})
+        self._context[run_id] = context
+
+    def _pop(self, run_id: UUID) -> Dict[str, Any]:
+        return self._context.pop(run_id, {})
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        parent = self._context.get(parent_run_id, {}) if parent_run_id is not None else {}
+        updates: Dict[str, Any] = {"thread_id": metadata.get("thread_id")}
+        if name and metadata.get("langgraph_node") == name:
+            # 只记录主图节点与 MDT 子图节点；更深的 agent 内部节点（model、tools ...）归属到外层节点
+            if "node" not in parent:
+                updates["node"] = name
+            elif parent["node"] == MDT_NODE and not parent.get("in_mdt"):
+                updates["node"] = name
+                updates["in_mdt"] = True
+                if name.startswith("group_"):
+                    updates["group_id"] = name
+                if isinstance(inputs, dict) and isinstance(inputs.get("round_count"), int):
+                    updates["round"] = inputs["round_count"] + 1
+        self._push(run_id, parent_run_id, **updates)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._pop(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._pop(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, inputs=None, **kwargs):
+        subagent = None
+        if (serialized or {}).get("name") == "task" and isinstance(inputs, dict):
+            subagent = inputs.get("subagent_type")
+        self._push(run_id, parent_run_id, subagent=subagent)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._pop(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._pop(run_id)
+
+    # ---- LLM ----
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        model = metadata.get("ls_model_name") or params.get("model") or params.get("model_name") or "unknown"
+        self._push(run_id, parent_run_id, model=str(model), thread_id=metadata.get("thread_id"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (serialized or {}).get("name") or "unknown"
+        self._push(run_id, parent_run_id, model=str(model), thread_id=metadata.get("thread_id"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._pop(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        context = self._pop(run_id)
+        input_tokens = output_tokens = cached_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                # 响应缓存命中的调用不产生费用（LangChain 会把 total_cost 置 0）
+                if "total_cost" in usage and usage["total_cost"] == 0:
+                    continue
+                input_tokens += usage.get("input_tokens", 0) or 0
+                output_tokens += usage.get("output_tokens", 0) or 0
+                cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        model = context.get("model", "unknown")
+        cost = estimate_cost(self.prices, model, input_tokens, output_tokens, cached_tokens)
+        self.record(context, {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+            "cost_usd": cost or 0.0,
+            "priced": cost is not None or not (input_tokens or output_tokens),
+        })
+
+    # ---- 汇总 ----
+    def record(self, context: Dict[str, Any], call: Dict[str, Any]) -> None:
+        """把一次调用计入线程与进程级汇总"""
+        keys = {
+            "by_node": context.get("node", "(none)"),
+            "by_group": context.get("group_id"),
+            "by_round": str(context["round"]) if "round" in context else None,
+            "by_subagent": context.get("subagent"),
+            "by_model": context.get("model", "unknown"),
+        }
+        thread_id = str(context.get("thread_id") or "default")
+        warn = None
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            if thread is None:
+                thread = self._threads[thread_id] = _record()
+                while len(self._threads) > self.max_threads:
+                    evicted, _ = self._threads.popitem(last=False)
+                    self._over_budget.discard(evicted)
+            else:
+                self._threads.move_to_end(thread_id)
+            for record, dims in ((thread, DIMENSIONS), (self._global, METRIC_DIMENSIONS)):
+                _add(record["total"], call)
+                for dim in dims:
+                    if keys[dim] is not None:
+                        _add(record[dim].setdefault(keys[dim], _bucket()), call)
+            cost = thread["total"]["cost_usd"]
+            if self.budget_usd_per_thread and cost > self.budget_usd_per_thread and thread_id not in self._over_budget:
+                self._over_budget.add(thread_id)
+                warn = cost
+        if warn is not None:
+            print(f"[WARN] [Usage] 线程 {thread_id} 累计费用 ${warn:.4f} 超出预算 ${self.budget_usd_per_thread:.4f}"
+                  f"（当前节点: {keys['by_node']}）")
+
+    def thread_usage(self, thread_id: str) -> Dict[str, Any]:
+        """某线程的累计用量（total + 各维度明细）；没有记录时各项为 0"""
+        with self._lock:
+            record = self._threads.get(str(thread_id))
+            return _rounded(record) if record is not None else _record()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return _rounded(self._global)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._threads.clear()
+            self._global = _record()
+            self._over_budget.clear()
+
+
+def render_prometheus(metrics: Dict[str, Any], prefix: str = "deeprare_llm") -> str:
+    """把 metrics() 的结果渲染为 Prometheus 文本格式（counter）"""
+    lines = []
+    series = (("input_tokens", "tokens_total", 'type="input"'),
+              ("output_tokens", "tokens_total", 'type="output"'),
+              ("cached_tokens", "tokens_total", 'type="cached_input"'),
+              ("cost_usd", "cost_usd_total", ""),
+              ("llm_calls", "calls_total", ""))
+    for name in ("tokens_total", "cost_usd_total", "calls_total"):
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        for key, metric, extra in series:
+            if metric != name:
+                continue
+            for dim in METRIC_DIMENSIONS:
+                label = dim[3:]
+                for value, bucket in sorted(metrics.get(dim, {}).items()):
+                    labels = ",".join(filter(None, [f'{label}="{value}"', extra]))
+                    lines.append(f"{prefix}_{name}{{{labels}}} {bucket[key]}")
+    return "\n".join(lines) + "\n"
+
+
+# ========== 进程级 tracker ==========
+_tracker: Optional[UsageTracker] = None
+_tracker_loaded = False
+
+
+def get_usage_tracker() -> Optional[UsageTracker]:
+    """按 config.yml 的 usage_accounting 段创建进程级 tracker；显式关闭时返回 None"""
+    global _tracker, _tracker_loaded
+    if _tracker_loaded:
+        return _tracker
+    _tracker_loaded = True
+    try:
+        from DeepRareAgent.config import settings
+        cfg = getattr(settings, "usage_accounting", None)
+    except Exception:
+        cfg = None
+    data = cfg.to_dict() if cfg is not None else {}
+    if data.get("enabled", True):
+        _tracker = UsageTracker(
+            prices=data.get("prices") or [],
+            max_threads=int(data.get("max_threads", 1000)),
+            budget_usd_per_thread=float(data.get("budget_usd_per_thread", 0.0) or 0.0),
+        )
+    return _tracker
+
+
+def usage_callbacks() -> List[BaseCallbackHandler]:
+    """主图使用的用量统计回调列表（关闭时为空）"""
+    tracker = get_usage_tracker()
+    return [tracker] if tracker is not None else []
+
+
+def get_thread_usage(thread_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """当前线程的累计用量；统计关闭时返回 None"""
+    tracker = get_usage_tracker()
+    if tracker is None:
+        return None
+    return tracker.thread_usage(str(thread_id or "default"))
+
+
+def get_usage_metrics() -> Dict[str, Any]:
+    tracker = get_usage_tracker()
+    return tracker.metrics() if tracker is not None else _record()
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""DeepRareAgent 基准测试与压测工具"""
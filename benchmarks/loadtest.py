@@ -0,0 +1,334 @@
+"""
+LangGraph HTTP API 压测：模拟并发的多轮问诊患者
+----------------------------------------------
+examples/api_client.py 与 tests/scripts/test_multi_round_conversation.py 只驱动单个会话，
+无法回答“一个部署能同时承载多少患者”。本模块模拟 K 个并发患者，每个患者:
+
+    1. POST /threads 创建线程
+    2. 按脚本逐轮发送预诊断对话（stage=prediagnosis）
+    3. 最后一轮带 start_diagnosis=True 触发 MDT 会诊与汇总（stage=mdt）
+
+每轮都通过 POST /threads/{id}/runs/stream 流式执行，记录首字节时间（TTFB）与完整耗时，
+最后输出吞吐量、各阶段延迟分位数、流首字节时间分位数，以及（给出 --server-pid 时）服务进程内存增长。
+
+离线压测（不消耗 API 配额，只测框架 / 状态 / 检查点本身的开销）:
+    # 1. config.yml 中各模型段改为 provider: fake（见 DeepRareAgent/utils/fake_llm.py）
+    # 2. 启动工具替身服务并把工具指向它
+    python -m benchmarks.stub_servers --port 8765
+    export HPO_API_BASE_URL=http://127.0.0.1:8765/hpo/api
+    export NCBI_EUTILS_BASE_URL=http://127.0.0.1:8765/eutils/
+    export LITSENSE_API_BASE_URL=http://127.0.0.1:8765/litsense/api/
+    # 3. 启动服务并压测
+    langgraph dev --port 2024 --no-browser &
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:2024 --patients 20 \\
+        --concurrency 10 --server-pid $(pgrep -f "langgraph dev") --output runs/loadtest.json
+
+对话脚本 (--script，JSON):
+    {"turns": ["你好，我想咨询...", "..."], "trigger": "请开始深度诊断"}
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.run_rarebench import _percentile
+
+DEFAULT_TURNS = [
+    "你好，我家孩子 6 岁，男孩，最近半年走路越来越不稳，经常摔跤。",
+    "大概从 5 岁开始的，爬楼梯很吃力，小腿看起来比较粗，跑步也比同龄孩子慢。",
+    "他舅舅小时候也有类似的情况，后来坐轮椅了。之前查过肌酸激酶，说是很高。",
+]
+DEFAULT_TRIGGER = "信息就这些了，请开始深度诊断。"
+STAGES = ("prediagnosis", "mdt")
+
+
+# ========== 服务进程内存 ==========
+def read_rss_mb(pid: int) -> Optional[float]:
+    """进程常驻内存（MB）；优先 psutil，缺省读 /proc（仅 Linux）"""
+    try:
+        import psutil
+
+        return psutil.Process(pid).memory_info().rss / 1024 / 1024
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler:
+    """后台按固定间隔采样服务进程内存"""
+
+    def __init__(self, pid: Optional[int], interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def _sample(self) -> None:
+        rss = read_rss_mb(self.pid) if self.pid else None
+        if rss is not None:
+            self.samples.append(rss)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self._sample()
+
+    def start(self) -> None:
+        self._sample()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._sample()
+
+    def as_dict(self) -> Dict[str, Any]:
+        if not self.samples:
+            return {}
+        return {
+            "rss_start_mb": round(self.samples[0], 1),
+            "rss_end_mb": round(self.samples[-1], 1),
+            "rss_peak_mb": round(max(self.samples), 1),
+            "rss_growth_mb": round(self.samples[-1] - self.samples[0], 1),
+        }
+
+
+# ========== 单轮流式运行 ==========
+async def stream_run(
+    client: httpx.AsyncClient,
+    thread_id: str,
+    input_data: Dict[str, Any],
+    assistant_id: str = "agent",
+) -> Dict[str, Any]:
+    """
+    执行一轮流式运行并计时（读完整个流才返回）。
+
+    Returns:
+        {"ttfb_s", "latency_s", "events", "error"}；error 为 None 表示成功
+    """
+    payload = {
+        "assistant_id": assistant_id,
+        "input": input_data,
+        "stream_mode": ["values", "messages", "custom"],
+        "config": {},
+    }
+    started = time.perf_counter()
+    ttfb, events, error = None, 0, None
+    try:
+        async with client.stream("POST", f"/threads/{thread_id}/runs/stream", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+                if line.startswith("event: "):
+                    events += 1
+                    if line[7:].strip() == "error":
+                        error = "stream error event"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "ttfb_s": ttfb,
+        "latency_s": time.perf_counter() - started,
+        "events": events,
+        "error": error,
+    }
+
+
+async def simulate_patient(
+    client: httpx.AsyncClient,
+    patient_index: int,
+    turns: List[str],
+    trigger: Optional[str] = DEFAULT_TRIGGER,
+    assistant_id: str = "agent",
+) -> List[Dict[str, Any]]:
+    """一个患者的完整会话：逐轮预诊断，最后触发 MDT；任一轮出错即结束该患者"""
+    records = []
+    started = time.perf_counter()
+    try:
+        response = await client.post("/threads", json={"metadata": {"loadtest_patient": patient_index}})
+        response.raise_for_status()
+        thread_id = response.json()["thread_id"]
+    except Exception as e:
+        return [{"patient": patient_index, "stage": "create_thread", "turn": 0,
+                 "latency_s": time.perf_counter() - started, "ttfb_s": None, "events": 0,
+                 "error": f"{type(e).__name__}: {e}"}]
+
+    plan = [("prediagnosis", {"messages": [{"role": "human", "content": text}]}) for text in turns]
+    if trigger is not None:
+        # 直接置 start_diagnosis，保证即使 fake 模型不调用触发工具也会进入 MDT
+        plan.append(("mdt", {"messages": [{"role": "human", "content": trigger}], "start_diagnosis": True}))
+
+    for turn, (stage, input_data) in enumerate(plan, 1):
+        result = await stream_run(client, thread_id, input_data, assistant_id)
+        records.append({"patient": patient_index, "thread_id": thread_id, "stage": stage, "turn": turn, **result})
+        if result["error"]:
+            break
+    return records
+
+
+# ========== 汇总 ==========
+def _quantiles(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50_s": round(_percentile(values, 0.50), 3),
+        "p95_s": round(_percentile(values, 0.95), 3),
+        "p99_s": round(_percentile(values, 0.99), 3),
+        "max_s": round(max(values), 3) if values else 0.0,
+    }
+
+
+def summarize_load(
+    records: List[Dict[str, Any]],
+    patients: int,
+    wall_s: float,
+    memory: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """按阶段汇总延迟 / 首字节时间分位数与吞吐量"""
+    ok = [r for r in records if not r.get("error")]
+    failed_patients = {r["patient"] for r in records if r.get("error")}
+    completed = patients - len(failed_patients)
+    stages = {}
+    for stage in STAGES:
+        rows = [r for r in ok if r["stage"] == stage]
+        if not rows:
+            continue
+        stages[stage] = {
+            "runs": len(rows),
+            "latency": _quantiles([r["latency_s"] for r in rows]),
+            "ttfb": _quantiles([r["ttfb_s"] for r in rows if r["ttfb_s"] is not None]),
+        }
+    return {
+        "patients": patients,
+        "completed_patients": completed,
+        "failed_patients": len(failed_patients),
+        "runs": len(records),
+        "errors": len(records) - len(ok),
+        "error_samples": sorted({r["error"] for r in records if r.get("error")})[:5],
+        "wall_s": round(wall_s, 2),
+        "runs_per_s": round(len(ok) / wall_s, 3) if wall_s else 0.0,
+        "patients_per_min": round(completed * 60 / wall_s, 2) if wall_s else 0.0,
+        "stages": stages,
+        "memory": memory or {},
+    }
+
+
+async def run_load_test(
+    base_url: str,
+    patients: int = 10,
+    concurrency: int = 10,
+    turns: Optional[List[str]] = None,
+    trigger: Optional[str] = DEFAULT_TRIGGER,
+    ramp_s: float = 0.0,
+    assistant_id: str = "agent",
+    server_pid: Optional[int] = None,
+    timeout: float = 1800.0,
+) -> Dict[str, Any]:
+    """
+    运行压测并返回汇总（records 字段含每一轮的原始记录）。
+
+    Args:
+        patients: 模拟的患者总数
+        concurrency: 同时进行中的患者数上限
+        ramp_s: 在该时间内均匀启动各患者（0 表示同时启动）
+        server_pid: 服务进程 PID，给出时采样内存增长
+        timeout: 单轮请求的读取超时（MDT 一轮可能很长）
+    """
+    turns = DEFAULT_TURNS if turns is None else turns
+    semaphore = asyncio.Semaphore(concurrency)
+    sampler = MemorySampler(server_pid)
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=base_url.rstrip("/"), timeout=httpx.Timeout(timeout, connect=10.0),
+                                 limits=limits) as client:
+        async def _one(i: int) -> List[Dict[str, Any]]:
+            if ramp_s and patients > 1:
+                await asyncio.sleep(ramp_s * i / (patients - 1))
+            async with semaphore:
+                return await simulate_patient(client, i, turns, trigger, assistant_id)
+
+        sampler.start()
+        started = time.perf_counter()
+        batches = await asyncio.gather(*(_one(i) for i in range(patients)))
+        wall_s = time.perf_counter() - started
+        await sampler.stop()
+
+    records = [r for batch in batches for r in batch]
+    report = summarize_load(records, patients, wall_s, sampler.as_dict())
+    report["records"] = records
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n[LoadTest] 患者 {report['completed_patients']}/{report['patients']} 完成，"
+          f"{report['runs']} 轮（出错 {report['errors']}），用时 {report['wall_s']}s")
+    print(f"  吞吐量: {report['runs_per_s']} runs/s, {report['patients_per_min']} patients/min")
+    for stage, stats in report["stages"].items():
+        lat, ttfb = stats["latency"], stats["ttfb"]
+        print(f"  {stage:<13} n={stats['runs']:<5} latency p50/p95/p99 = "
+              f"{lat['p50_s']}/{lat['p95_s']}/{lat['p99_s']}s  "
+              f"TTFB p50/p95/p99 = {ttfb.get('p50_s')}/{ttfb.get('p95_s')}/{ttfb.get('p99_s')}s")
+    memory = report.get("memory") or {}
+    if memory:
+        print(f"  服务内存: {memory['rss_start_mb']} -> {memory['rss_end_mb']} MB "
+              f"(峰值 {memory['rss_peak_mb']} MB, 增长 {memory['rss_growth_mb']} MB)")
+    for sample in report.get("error_samples", []):
+        print(f"  [ERROR] {sample}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="LangGraph HTTP API 多患者并发压测")
+    parser.add_argument("--base-url", default=os.getenv("DEEPRARE_API_URL", "http://127.0.0.1:2024"))
+    parser.add_argument("--patients", type=int, default=10, help="模拟的患者总数")
+    parser.add_argument("--concurrency", type=int, default=10, help="同时进行中的患者数")
+    parser.add_argument("--ramp", type=float, default=0.0, help="在该秒数内均匀启动各患者")
+    parser.add_argument("--script", default=None, help='对话脚本 JSON: {"turns": [...], "trigger": "..."}')
+    parser.add_argument("--no-mdt", action="store_true", help="只跑预诊断轮，不触发 MDT")
+    parser.add_argument("--assistant-id", default="agent")
+    parser.add_argument("--server-pid", type=int, default=None, help="服务进程 PID（采样内存增长）")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="单轮读取超时（秒）")
+    parser.add_argument("--output", default=None, help="结果 JSON（含每轮原始记录）")
+    args = parser.parse_args()
+
+    turns, trigger = DEFAULT_TURNS, DEFAULT_TRIGGER
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+        turns, trigger = script.get("turns", turns), script.get("trigger", trigger)
+    if args.no_mdt:
+        trigger = None
+
+    report = asyncio.run(run_load_test(
+        args.base_url, patients=args.patients, concurrency=args.concurrency,
+        turns=turns, trigger=trigger, ramp_s=args.ramp, assistant_id=args.assistant_id,
+        server_pid=args.server_pid, timeout=args.timeout,
+    ))
+    print_report(report)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+纯 Python 热路径微基准
+--------------------
+每次工具调用都会经过的代码（SectionStore 路径解析与查询、患者事实增删、病历渲染、
+JSON 解析、证据引用处理、MDT 状态 reducer）没有任何基准，性能回退只能在线上发现。
+
+本模块用规模递增的合成患者（10 ~ 10k 条记录）与长消息历史测量每个热路径的
+ops/s 与单次调用的峰值内存分配（tracemalloc），结果可保存为基线并在之后对比：
+
+    python -m benchmarks.microbench --save benchmarks/results/micro_baseline.json
+    python -m benchmarks.microbench --compare benchmarks/results/micro_baseline.json --threshold 0.25
+    python -m benchmarks.microbench --filter patientinfo --sizes 10,1000
+
+对比时任一基准 ops/s 下降超过 threshold 即以退出码 1 结束（可接入部署前检查）。
+基线与机器相关，请在同一台机器上生成与对比。
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+SIZES = (10, 100, 1000, 10000)
+PATIENT_BUCKETS = ("symptoms", "vitals", "exams", "medications", "family_history", "past_medical_history", "others")
+
+# name -> (factory(size) -> 零参数可调用对象, sizes)
+BENCHMARKS: Dict[str, Any] = {}
+
+
+def bench(name: str, sizes: Sequence[int] = SIZES):
+    """注册基准：被装饰函数接收规模参数，完成准备工作后返回被测的零参数函数"""
+    def decorator(factory: Callable[[int], Callable[[], Any]]):
+        BENCHMARKS[name] = (factory, tuple(sizes))
+        return factory
+    return decorator
+
+
+# ========== 合成数据 ==========
+def make_patient_info(n_records: int, seed: int = 0) -> Dict[str, Any]:
+    """n_records 条事实记录均匀分布在各分桶中（ID 与 upsert_patient_facts 生成的格式一致）"""
+    rng = random.Random(seed)
+    info: Dict[str, Any] = {"base_info": {"name": "张三", "age": 8, "gender": "男"}}
+    for bucket in PATIENT_BUCKETS:
+        info[bucket] = []
+    for i in range(n_records):
+        bucket = PATIENT_BUCKETS[i % len(PATIENT_BUCKETS)]
+        info[bucket].append({
+            "id": f"R{i:05d}",
+            "name": f"finding-{i}",
+            "value": round(rng.uniform(0, 100), 2),
+            "onset": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "note": "反复发作，伴随发热" if i % 3 == 0 else None,
+            "t_time": "2025-11-01T00:00:00+00:00",
+        })
+    return info
+
+
+def make_messages(n_messages: int) -> List[Any]:
+    """人 / AI（含工具调用）/ 工具消息交替的长对话历史（均带 id，与图状态中一致）"""
+    messages: List[Any] = []
+    for i in range(n_messages):
+        kind = i % 3
+        if kind == 0:
+            messages.append(HumanMessage(content=f"第 {i} 条患者描述：反复抽搐，发育迟缓。", id=f"h{i}"))
+        elif kind == 1:
+            messages.append(AIMessage(
+                content="",
+                tool_calls=[{"name": "phenotype_to_hpo_tool", "args": {"phenotypes": [f"seizure {i}"]}, "id": f"call{i}"}],
+                id=f"a{i}",
+            ))
+        else:
+            messages.append(ToolMessage(content=f"HP:0001250 Seizure ({i})", tool_call_id=f"call{i - 1}", id=f"t{i}"))
+    return messages
+
+
+def make_section_store(n_records: int):
+    from DeepRareAgent.utils.section_store import SectionStore
+
+    store = SectionStore()
+    for i in range(n_records):
+        store.add("exams", {"k": f"lab{i % 50}", "value": i % 17, "unit": "mmol/L", "_t": f"2025-01-01T00:00:{i % 60:02d}Z"})
+        if i % 5 == 0:
+            store.add("phenotypes", {"k": f"HP:{i:07d}", "value": "present"})
+    return store
+
+
+def make_report(n_refs: int, ref_format: str = "{i}") -> str:
+    lines = ["## 诊断结论", "考虑 Dravet 综合征。"]
+    for i in range(1, n_refs + 1):
+        lines.append(f"- 依据 {i}：SCN1A 相关表型 <ref>{ref_format.format(i=i)}</ref>")
+    return "\n".join(lines)
+
+
+# ========== 基准 ==========
+@bench("section_store.parse_path", sizes=(1,))
+def _bench_parse_path(size: int):
+    store = make_section_store(0)
+    paths = ["exams[3]", "basic:name", "exams?k=FPG&value>=7.0&pick=last", "vitals?_t>=2025-11-01&pick=first", "phenotypes"]
+
+    def run():
+        for path in paths:
+            store._parse_path(path)
+    return run
+
+
+@bench("section_store.get_key")
+def _bench_store_get_key(size: int):
+    store = make_section_store(size)
+    return lambda: store.get("exams:lab7")
+
+
+@bench("section_store.query")
+def _bench_store_query(size: int):
+    store = make_section_store(size)
+    return lambda: store.get("exams?k=lab7&value>=5&pick=last")
+
+
+@bench("section_store.set")
+def _bench_store_set(size: int):
+    store = make_section_store(size)
+    return lambda: store.set("exams:lab7", {"value": 9})
+
+
+def _patient_state(size: int) -> Dict[str, Any]:
+    return {"patient_info": make_patient_info(size), "messages": make_messages(100)}
+
+
+@bench("patientinfo.upsert_patient_facts")
+def _bench_upsert(size: int):
+    from DeepRareAgent.tools.patientinfo import upsert_patient_facts
+
+    state = _patient_state(size)
+    payload = {"symptoms": [{"id": "R00000", "value": 1.0}, {"name": "new finding", "value": 2.0}]}
+    return lambda: upsert_patient_facts.func(payload, state, "call-1")
+
+
+@bench("patientinfo.delete_patient_facts")
+def _bench_delete(size: int):
+    from DeepRareAgent.tools.patientinfo import delete_patient_facts
+
+    state = _patient_state(size)
+    payload = {"symptoms": [f"R{i:05d}" for i in range(0, min(size, 70), 7)]}
+    return lambda: delete_patient_facts.func(payload, state, "call-1")
+
+
+@bench("patientinfo.patient_info_to_text")
+def _bench_to_text(size: int):
+    from DeepRareAgent.tools.patientinfo import patient_info_to_text
+
+    state = _patient_state(size)
+    return lambda: patient_info_to_text.func(state)
+
+
+@bench("json_utils.parse_json_from_markdown")
+def _bench_parse_json(size: int):
+    from DeepRareAgent.utils.json_utils import parse_json_from_markdown
+
+    body = json.dumps({"is_satisfied": False, "reinvestigate_reason": "需要补充基因检测 " * max(1, size // 10),
+                       "items": list(range(size))}, ensure_ascii=False)
+    text = f"审核意见如下：\n```json\n{body}\n```\n以上。"
+    return lambda: parse_json_from_markdown(text)
+
+
+@bench("json_utils.parse_json_from_markdown.loose", sizes=(10, 100, 1000))
+def _bench_parse_json_loose(size: int):
+    from DeepRareAgent.utils.json_utils import parse_json_from_markdown
+
+    items = ", ".join(f"'k{i}': true" for i in range(size))
+    text = f"```json\n{{'is_satisfied': false, {items},}}\n```"
+    return lambda: parse_json_from_markdown(text)
+
+
+@bench("report_utils.process_expert_report_references")
+def _bench_expert_refs(size: int):
+    from DeepRareAgent.utils.report_utils import process_expert_report_references
+
+    report = make_report(size)
+    evidences = [f"PMID:{30000000 + i} SCN1A variant evidence {i}" for i in range(size)]
+    return lambda: process_expert_report_references(report, evidences)
+
+
+@bench("summary._resolve_evidence_references")
+def _bench_summary_refs(size: int):
+    from DeepRareAgent.p03summary_agent import _resolve_evidence_references
+
+    report = make_report(size, "group_1.{i}")
+    mapping = {f"group_1.{i}": f"PMID:{30000000 + i} evidence {i}" for i in range(1, size + 1)}
+    return lambda: _resolve_evidence_references(report, mapping)
+
+
+@bench("reducers.add_messages")
+def _bench_add_messages(size: int):
+    from langgraph.graph.message import add_messages
+
+    history = make_messages(size)
+    update = [AIMessage(content="新一轮报告", id="new-report"), history[-1]]
+    return lambda: add_messages(history, update)
+
+
+@bench("reducers.expert_pool_ior")
+def _bench_expert_pool(size: int):
+    import operator
+
+    def expert(group_id):
+        return {"group_id": group_id, "messages": make_messages(size), "report": "报告", "evidences": [],
+                "is_satisfied": False, "reinvestigate_reason": None, "has_error": False}
+
+    pool = {f"group_{i}": expert(f"group_{i}") for i in range(1, 4)}
+    update = {"group_2": expert("group_2")}
+    return lambda: operator.ior(dict(pool), update)
+
+
+# ========== 测量 ==========
+def measure(fn: Callable[[], Any], min_time: float = 0.2, repeat: int = 3) -> Dict[str, float]:
+    """自动确定循环次数，取 repeat 次中最快的一次；另单独跑一次测峰值内存分配"""
+    fn()  # 预热（导入、正则编译等）
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat or loops >= 1 << 20:
+            break
+        loops *= 10 if elapsed < min_time / (repeat * 100) else 2
+
+    best = elapsed / loops
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat - 1):
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            best = min(best, (time.perf_counter() - start) / loops)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "ops_per_s": round(1.0 / best, 2) if best > 0 else float("inf"),
+        "us_per_op": round(best * 1e6, 3),
+        "alloc_peak_kb": round((peak - baseline) / 1024, 2),
+        "loops": loops,
+    }
+
+
+def run_benchmarks(
+    name_filter: Optional[str] = None,
+    sizes: Optional[Sequence[int]] = None,
+    min_time: float = 0.2,
+    repeat: int = 3,
+) -> Dict[str, Dict[str, Any]]:
+    """运行匹配的基准，返回 {"name[size]": 指标}；依赖缺失（如无 config.yml）的基准跳过"""
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, (factory, default_sizes) in BENCHMARKS.items():
+        if name_filter and name_filter not in name:
+            continue
+        run_sizes = [s for s in default_sizes if sizes is None or s in sizes or default_sizes == (1,)]
+        for size in run_sizes:
+            key = f"{name}[{size}]"
+            try:
+                fn = factory(size)
+            except (ImportError, FileNotFoundError) as e:
+                print(f"[SKIP] {key}: {e}")
+                break
+            metrics = measure(fn, min_time=min_time, repeat=repeat)
+            results[key] = metrics
+            print(f"[Micro] {key:<58} {metrics['ops_per_s']:>14,.1f} ops/s "
+                  f"{metrics['us_per_op']:>12,.2f} us/op {metrics['alloc_peak_kb']:>10,.1f} KB")
+    return results
+
+
+def save_results(results: Dict[str, Dict[str, Any]], path: str) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "created": datetime.now(timezone.utc).isoformat(),
+            },
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+
+
+def compare_results(
+    current: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float = 0.25,
+) -> List[Dict[str, Any]]:
+    """返回 ops/s 相对基线下降超过 threshold 的基准（只比较两边都有的条目）"""
+    regressions = []
+    for key, metrics in current.items():
+        base = baseline.get(key)
+        if not base or not base.get("ops_per_s"):
+            continue
+        ratio = metrics["ops_per_s"] / base["ops_per_s"]
+        if ratio < 1.0 - threshold:
+            regressions.append({
+                "benchmark": key,
+                "baseline_ops_per_s": base["ops_per_s"],
+                "ops_per_s": metrics["ops_per_s"],
+                "ratio": round(ratio, 3),
+                "alloc_peak_kb": metrics.get("alloc_peak_kb"),
+                "baseline_alloc_peak_kb": base.get("alloc_peak_kb"),
+            })
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DeepRareAgent 热路径微基准")
+    parser.add_argument("--filter", default=None, help="只运行名称包含该子串的基准")
+    parser.add_argument("--sizes", default=None, help="规模列表，如 10,1000")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每个基准的最短计时（秒）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", default=None, help="把结果保存为基线 JSON")
+    parser.add_argument("--compare", default=None, help="与基线 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.25, help="ops/s 允许下降的比例")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")] if args.sizes else None
+    results = run_benchmarks(args.filter, sizes, args.min_time, args.repeat)
+    if args.save:
+        save_results(results, args.save)
+        print(f"[Micro] 基线已保存: {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(results, baseline, args.threshold)
+        for r in regressions:
+            print(f"[REGRESSION] {r['benchmark']}: {r['baseline_ops_per_s']:,.1f} -> {r['ops_per_s']:,.1f} ops/s "
+                  f"(x{r['ratio']})")
+        if regressions:
+            sys.exit(1)
+        print(f"[Micro] 与基线相比无超过 {args.threshold:.0%} 的回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,422 @@
 """
 DeepRareAgent Benchmark Script
 ------------------------------
-This script is designed to evaluate the DeepRareAgent against the RareBench dataset.
-It mocks the RareBench input format and runs the agent to calculate Top-K accuracy.
+在 RareBench 格式的病例集上评测 DeepRareAgent 主图（MDT 会诊 + 汇总报告）。
+
+- 从 JSON / JSONL 流式读取病例（JSONL 逐行读取，不一次性载入内存）
+- 跳过预诊断：以 start_diagnosis=True 的状态写入 prediagnosis 节点之后直接续跑主图
+- 全局信号量限制并发病例数
+- 从 final_report 中提取排序后的诊断列表，统计 Top-1/3/5/10
+- 记录每个病例的耗时、token 用量与工具调用次数，逐条写入结果 JSONL
+
+病例格式（字段名兼容 RareBench 原始数据）:
+    {"case_id": "1", "phenotypes": ["HP:0001263", "HP:0000407"],
+     "description": "Patient presents with...", "gold_standard_disease": "ORPHA:12345"}
+    {"id": "2", "Phenotype": ["HP:0001250"], "RareDisease": ["OMIM:607208", "Dravet syndrome"], "Department": "Neurology"}
+
+用法:
+    python -m benchmarks.run_rarebench --cases data/hms.jsonl --concurrency 8 --output results.jsonl
+
+离线压测时可把各模型配置为 provider: fake / replay，工具指向 benchmarks.stub_servers。
 
 Reference: RareBench (NeurIPS 2024), RareAgents (ArXiv 2024)
 """
 
 import argparse
-import json
 import asyncio
-from typing import List, Dict, Any
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from DeepRareAgent.schema import init_patient_info
+
+TOP_KS = (1, 3, 5, 10)
+
+# 评测时要求汇总节点额外输出一段排序后的候选诊断，便于稳定提取
+BENCHMARK_SUMMARY_STYLE = """按照系统提示词的标准格式生成诊断报告，并在报告最后追加以下章节：
+
+## 候选诊断排序
+按可能性从高到低列出最多 10 个候选疾病，每行一个，格式为：
+1. 疾病英文名（OMIM:编号 或 ORPHA:编号）
+"""
+
+
+# ========== 病例读取 ==========
+def normalize_case(raw: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """把不同来源的病例字段统一为 case_id / phenotypes / description / gold / category"""
+    gold = (
+        raw.get("gold_standard_disease")
+        or raw.get("gold")
+        or raw.get("RareDisease")
+        or raw.get("diagnosis")
+        or []
+    )
+    if isinstance(gold, str):
+        gold = [gold]
+    phenotypes = raw.get("phenotypes") or raw.get("Phenotype") or []
+    description = raw.get("description") or raw.get("Description") or ""
+    if not description and phenotypes:
+        description = "患者表型（HPO）: " + ", ".join(phenotypes)
+    return {
+        "case_id": str(raw.get("case_id") or raw.get("id") or index),
+        "phenotypes": list(phenotypes),
+        "description": description,
+        "gold": [str(g) for g in gold],
+        "category": raw.get("category") or raw.get("Department"),
+    }
+
+
+def iter_cases(path: str) -> Iterator[Dict[str, Any]]:
+    """流式读取病例：.jsonl 逐行解析；.json 支持列表或 {"cases": [...]}"""
+    file_path = Path(path)
+    if file_path.suffix == ".jsonl":
+        with open(file_path, "r", encoding="utf-8") as f:
+            for index, line in enumerate(f):
+                line = line.strip()
+                if line:
+                    yield normalize_case(json.loads(line), index)
+        return
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("cases", [])
+    for index, raw in enumerate(data):
+        yield normalize_case(raw, index)
+
+
+def build_initial_state(case: Dict[str, Any]) -> Dict[str, Any]:
+    """构建跳过预诊断的主图状态（summary_with_dialogue 已存在时 prepare_mdt 不再调用 LLM）"""
+    description = case["description"]
+    if case["phenotypes"] and "HP:" not in description:
+        description += "\n患者表型（HPO）: " + ", ".join(case["phenotypes"])
+    return {
+        "messages": [HumanMessage(content=description)],
+        "start_diagnosis": True,
+        "final_report": "",
+        "patient_info": init_patient_info(),
+        "summary_with_dialogue": description,
+        "patient_portrait": "",
+        "expert_pool": {},
+        "blackboard": {"published_reports": {}, "conflicts": {}, "common_understandings": {}},
+        "consensus_reached": False,
+        "summary_style": BENCHMARK_SUMMARY_STYLE,
+    }
+
+
+# ========== 诊断提取与匹配 ==========
+_RANKED_SECTION = re.compile(r"#+\s*候选诊断排序\s*\n(.*?)(?=\n#+\s|\Z)", re.S)
+_PRIMARY_SECTION = re.compile(r"#+\s*主要诊断\s*\n(.*?)(?=\n#+\s|\Z)", re.S)
+_DIFFERENTIAL_SECTION = re.compile(r"#+\s*需要鉴别的疾病\s*\n(.*?)(?=\n#+\s|\n---|\Z)", re.S)
+_LIST_ITEM = re.compile(r"^\s*(?:\d+[.、)]|[-*])\s*(.+?)\s*$", re.M)
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_ID_PATTERN = re.compile(r"\b(OMIM|ORPHA|ORPHANET|MONDO)\s*[:#]?\s*#?\s*(\d+)", re.I)
+
+
+def _bold_with_ids(text: str) -> Optional[str]:
+    """"**疾病名**（英文名，OMIM #编号）：说明" -> 疾病名 + 紧随其后的括号内容"""
+    bold = _BOLD.search(text)
+    if bold is None:
+        return None
+    ids = re.match(r"\s*[（(][^）)]*[）)]", text[bold.end():])
+    return bold.group(1) + (ids.group(0) if ids else "")
+
+
+def _clean_item(text: str) -> str:
+    text = text.strip()
+    if text.startswith("**"):
+        text = _bold_with_ids(text) or text
+    # 去掉 "：说明" / ": 说明"（OMIM:123 这类编号中的冒号后没有空格，不受影响）
+    text = re.split(r"：|:\s", text, maxsplit=1)[0]
+    return text.strip(" *")
+
+
+def extract_ranked_diagnoses(report: str, max_items: int = 10) -> List[str]:
+    """
+    从 final_report 中提取排序后的诊断列表。
+
+    优先读取 "候选诊断排序" 章节；否则按默认报告格式取 "主要诊断" + "需要鉴别的疾病"。
+    """
+    report = report or ""
+    ranked = _RANKED_SECTION.search(report)
+    if ranked:
+        items = [_clean_item(m) for m in _LIST_ITEM.findall(ranked.group(1))]
+    else:
+        items = []
+        primary = _PRIMARY_SECTION.search(report)
+        if primary:
+            main = _bold_with_ids(primary.group(1))
+            if main:
+                items.append(main)
+        differential = _DIFFERENTIAL_SECTION.search(report)
+        if differential:
+            items.extend(_clean_item(m) for m in _LIST_ITEM.findall(differential.group(1)))
+    seen, out = set(), []
+    for item in items:
+        key = item.lower()
+        if item and key not in seen:
+            seen.add(key)
+            out.append(item)
+    return out[:max_items]
+
+
+def _ids_of(text: str) -> set:
+    out = set()
+    for prefix, number in _ID_PATTERN.findall(text):
+        prefix = prefix.upper()
+        out.add(f"{'ORPHA' if prefix == 'ORPHANET' else prefix}:{int(number)}")
+    return out
 
-# Placeholder for future import of the actual agent
-# from DeepRareAgent.graph import graph
 
-async def load_rarebench_cases(file_path: str) -> List[Dict[str, Any]]:
+def _norm_name(text: str) -> str:
+    text = _ID_PATTERN.sub(" ", text.lower())
+    text = re.sub(r"[（(][^）)]*[）)]", " ", text)
+    return " ".join(re.findall(r"[a-z0-9]+|[一-鿿]+", text))
+
+
+def match_rank(predictions: Sequence[str], golds: Sequence[str]) -> Optional[int]:
+    """金标准在预测列表中的名次（从 1 开始）；未命中返回 None。编号相同或名称规范化后相同即算命中"""
+    gold_ids = set().union(*(_ids_of(g) for g in golds)) if golds else set()
+    gold_names = {_norm_name(g) for g in golds} - {""}
+    for rank, prediction in enumerate(predictions, 1):
+        if gold_ids & _ids_of(prediction):
+            return rank
+        if _norm_name(prediction) in gold_names:
+            return rank
+    return None
+
+
+# ========== 单病例统计 ==========
+class CaseStats(BaseCallbackHandler):
+    """统计单个病例的 LLM 调用、token 用量与工具调用"""
+
+    run_inline = True
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.tool_calls: Counter = Counter()
+        self.tool_errors = 0
+
+    def on_llm_end(self, response, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    self.input_tokens += usage.get("input_tokens", 0) or 0
+                    self.output_tokens += usage.get("output_tokens", 0) or 0
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        with self._lock:
+            self.tool_calls[(serialized or {}).get("name") or kwargs.get("name") or "unknown"] += 1
+
+    def on_tool_error(self, error, **kwargs):
+        with self._lock:
+            self.tool_errors += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "tool_calls": sum(self.tool_calls.values()),
+            "tool_call_counts": dict(self.tool_calls),
+            "tool_errors": self.tool_errors,
+        }
+
+
+# ========== 执行 ==========
+async def run_case(
+    graph: Any,
+    case: Dict[str, Any],
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    运行单个病例：把初始状态作为 prediagnosis 节点的输出写入检查点，再从路由处续跑。
+    graph 需带检查点（create_main_graph(checkpointer=...)）。
+    """
+    thread_id = f"rarebench-{case['case_id']}"
+    stats = CaseStats()
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [stats]}
+    started = time.perf_counter()
+    error = None
+    final_report = ""
+    try:
+        await graph.aupdate_state(config, build_initial_state(case), as_node="prediagnosis")
+        result = await asyncio.wait_for(graph.ainvoke(None, config), timeout)
+        final_report = (result or {}).get("final_report", "") or ""
+    except asyncio.TimeoutError:
+        error = f"timeout after {timeout}s"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        checkpointer = getattr(graph, "checkpointer", None)
+        if checkpointer is not None and hasattr(checkpointer, "adelete_thread"):
+            await checkpointer.adelete_thread(thread_id)
+
+    predictions = extract_ranked_diagnoses(final_report)
+    return {
+        "case_id": case["case_id"],
+        "category": case.get("category"),
+        "gold": case["gold"],
+        "predictions": predictions,
+        "rank": match_rank(predictions, case["gold"]),
+        "latency_s": round(time.perf_counter() - started, 3),
+        "error": error,
+        **stats.as_dict(),
+    }
+
+
+async def evaluate_agent(
+    graph: Any,
+    cases: Iterable[Dict[str, Any]],
+    concurrency: int = 4,
+    output_path: Optional[str] = None,
+    timeout: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
     """
-    Load RareBench cases from a JSON file.
-    Expected format: 
-    [
-        {
-            "case_id": "1",
-            "phenotypes": ["HP:000123", "HP:000456"],
-            "description": "Patient presents with...",
-            "gold_standard_disease": "ORPHA:12345"
-        },
-        ...
-    ]
+    并发评测：全局信号量限制同时运行的病例数，病例按需从迭代器读取（不预先创建全部任务）。
+    每个病例完成后立即追加写入 output_path。
     """
-    # In a real scenario, this would read a file. 
-    # For now, we return a mock case.
-    mock_case = {
-        "case_id": "mock_001",
-        "phenotypes": ["HP:0001263", "HP:0000407"],
-        "description": "A 5-year-old boy globally delayed in development...",
-        "gold_standard_disease": "Angelman syndrome"
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Dict[str, Any]] = []
+    pending = set()
+    out_file = open(output_path, "a", encoding="utf-8") if output_path else None
+    if out_file is not None and out_file.tell() > 0:
+        # 上次崩溃时末行可能没写完：先换行，新结果不会接在半截行后面
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                out_file.write("\n")
+
+    async def _one(case):
+        try:
+            result = await run_case(graph, case, timeout)
+        finally:
+            semaphore.release()
+        results.append(result)
+        if out_file is not None:
+            out_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out_file.flush()
+        status = f"rank={result['rank']}" if not result["error"] else f"ERROR {result['error']}"
+        print(f"[Bench] {result['case_id']}: {status} ({result['latency_s']}s, "
+              f"{result['input_tokens'] + result['output_tokens']} tokens, {result['tool_calls']} tools)")
+
+    try:
+        count = 0
+        for case in cases:
+            if limit is not None and count >= limit:
+                break
+            await semaphore.acquire()
+            task = asyncio.create_task(_one(case))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            count += 1
+        if pending:
+            await asyncio.gather(*pending)
+    finally:
+        if out_file is not None:
+            out_file.close()
+    return results
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def summarize(results: Sequence[Dict[str, Any]], ks: Sequence[int] = TOP_KS) -> Dict[str, Any]:
+    """汇总 Top-k 准确率与耗时 / token / 工具调用统计"""
+    n = len(results)
+    if not n:
+        return {"cases": 0}
+    latencies = [r["latency_s"] for r in results]
+    tokens = [r["input_tokens"] + r["output_tokens"] for r in results]
+    return {
+        "cases": n,
+        "errors": sum(1 for r in results if r.get("error")),
+        **{f"top{k}": sum(1 for r in results if r.get("rank") and r["rank"] <= k) / n for k in ks},
+        "latency_mean_s": round(statistics.fmean(latencies), 3),
+        "latency_p50_s": round(_percentile(latencies, 0.5), 3),
+        "latency_p95_s": round(_percentile(latencies, 0.95), 3),
+        "tokens_mean": round(statistics.fmean(tokens), 1),
+        "input_tokens_total": sum(r["input_tokens"] for r in results),
+        "output_tokens_total": sum(r["output_tokens"] for r in results),
+        "llm_calls_mean": round(statistics.fmean(r["llm_calls"] for r in results), 2),
+        "tool_calls_mean": round(statistics.fmean(r["tool_calls"] for r in results), 2),
     }
-    return [mock_case]
-
-async def evaluate_agent(cases: List[Dict[str, Any]]):
-    print(f"Starting evaluation on {len(cases)} cases...")
-    correct_top1 = 0
-    correct_top5 = 0
-
-    for case in cases:
-        print(f"Processing Case {case['case_id']}...")
-        
-        # TODO: Integrate with DeepRareAgent.graph.ainvoke()
-        # inputs = {"messages": [HumanMessage(content=case['description'])]}
-        # result = await graph.ainvoke(inputs)
-        
-        # Mock result for now
-        predicted_diseases = ["Angelman syndrome", "Prader-Willi syndrome", "Rett syndrome"]
-        
-        print(f"  Gold Standard: {case['gold_standard_disease']}")
-        print(f"  Predictions: {predicted_diseases}")
-        
-        if case['gold_standard_disease'] == predicted_diseases[0]:
-            correct_top1 += 1
-        if case['gold_standard_disease'] in predicted_diseases[:5]:
-            correct_top5 += 1
-            
-    print("-" * 30)
-    print(f"Top-1 Accuracy: {correct_top1 / len(cases):.2%}")
-    print(f"Top-5 Accuracy: {correct_top5 / len(cases):.2%}")
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print("-" * 40)
+    print(f"Cases: {summary.get('cases', 0)} (errors: {summary.get('errors', 0)})")
+    for k in TOP_KS:
+        if f"top{k}" in summary:
+            print(f"Top-{k} Accuracy: {summary[f'top{k}']:.2%}")
+    if summary.get("cases"):
+        print(f"Latency: mean {summary['latency_mean_s']}s, p50 {summary['latency_p50_s']}s, p95 {summary['latency_p95_s']}s")
+        print(f"Tokens / case: {summary['tokens_mean']} (in {summary['input_tokens_total']}, out {summary['output_tokens_total']})")
+        print(f"LLM calls / case: {summary['llm_calls_mean']}, tool calls / case: {summary['tool_calls_mean']}")
+
+
+def build_benchmark_graph():
+    """构建带内存检查点的主图（每个病例结束后删除其线程）"""
+    from langgraph.checkpoint.memory import InMemorySaver
+    from DeepRareAgent.graph import create_main_graph
+
+    return create_main_graph(checkpointer=InMemorySaver())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DeepRareAgent RareBench 评测")
+    parser.add_argument("--cases", required=True, help="病例文件（.json 或 .jsonl）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时运行的病例数")
+    parser.add_argument("--limit", type=int, default=None, help="最多运行的病例数")
+    parser.add_argument("--timeout", type=float, default=None, help="单病例超时（秒）")
+    parser.add_argument("--output", default=None, help="逐病例结果 JSONL（追加写入）")
+    parser.add_argument("--summary", default=None, help="汇总结果 JSON")
+    parser.add_argument("--ontology", default=None, help="MONDO OBO 文件，提供时追加本体感知评分（见 benchmarks.scoring）")
+    args = parser.parse_args()
+
+    graph = build_benchmark_graph()
+    results = asyncio.run(evaluate_agent(
+        graph,
+        iter_cases(args.cases),
+        concurrency=args.concurrency,
+        output_path=args.output,
+        timeout=args.timeout,
+        limit=args.limit,
+    ))
+    summary = summarize(results)
+    print_summary(summary)
+    if args.ontology:
+        from benchmarks.scoring import DiseaseOntology, print_scores, score_results
+
+        summary["ontology_scores"] = score_results(results, DiseaseOntology.from_obo(args.ontology))
+        print_scores(summary["ontology_scores"])
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
 
 if __name__ == "__main__":
-    asyncio.run(evaluate_agent(await load_rarebench_cases("mock.json")))
+    main()
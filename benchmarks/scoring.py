@@ -0,0 +1,394 @@
+"""
+本体感知的向量化评分
+--------------------
+run_rarebench 的 match_rank 只认"编号相同或名称相同"，同一疾病的 MONDO / ORPHA / OMIM
+编号互不相认，父子 / 兄弟疾病也一律算错，并且逐病例在 Python 中计算。
+
+本模块:
+- DiseaseOntology: 从 MONDO OBO 读取等价映射（xref 中 source="MONDO:equivalentTo" 的条目）、
+  名称 / 精确同义词与 is_a 层级，把任意编号或名称归一到规范编号（MONDO > ORPHA > OMIM）
+- encode_results: 把结果表中的预测与金标准编码为整数矩阵（未收录的编号 / 名称各自成一类）
+- 在整张表上用 NumPy 计算 Top-k、MRR 与本体距离部分得分（距离 d 得 decay**d 分，
+  d 为经最近公共祖先的 is_a 跳数，超过 max_distance 得 0），并按疾病类别切片
+
+用法:
+    python -m benchmarks.scoring --results runs/hms/results.jsonl --ontology mondo.obo
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.run_rarebench import TOP_KS, _ID_PATTERN, _norm_name
+
+# 规范编号的前缀优先级（数值越小越优先）
+PREFIX_PRIORITY = {"MONDO": 0, "ORPHA": 1, "OMIM": 2}
+EQUIVALENCE_SOURCES = ("MONDO:equivalentTo",)
+
+_OBO_ID = re.compile(r"^(MONDO|ORPHANET|ORPHA|OMIM)\s*:\s*(\d+)$", re.I)
+_OBO_SYNONYM = re.compile(r'^"(.+?)"\s+EXACT')
+
+
+def normalize_id(prefix: str, number: str) -> str:
+    """统一编号写法：Orphanet -> ORPHA，MONDO 保留 7 位补零，其余去掉前导零"""
+    prefix = prefix.upper()
+    if prefix == "ORPHANET":
+        prefix = "ORPHA"
+    if prefix == "MONDO":
+        return f"MONDO:{int(number):07d}"
+    return f"{prefix}:{int(number)}"
+
+
+def extract_ids(text: str) -> List[str]:
+    """按出现顺序提取文本中的疾病编号"""
+    return [normalize_id(prefix, number) for prefix, number in _ID_PATTERN.findall(text or "")]
+
+
+def _parse_obo_id(text: str) -> Optional[str]:
+    match = _OBO_ID.match(text.strip())
+    return normalize_id(*match.groups()) if match else None
+
+
+# ========== 本体 ==========
+class DiseaseOntology:
+    """疾病编号等价类（并查集）、名称索引与 is_a 层级"""
+
+    def __init__(self):
+        self._union: Dict[str, str] = {}
+        self._labels: Dict[str, str] = {}
+        self._is_a: List[Tuple[str, str]] = []
+        self._canonical: Optional[Dict[str, str]] = None
+
+    # ---- 构建 ----
+    def _find(self, node: str) -> str:
+        self._union.setdefault(node, node)
+        root = node
+        while self._union[root] != root:
+            root = self._union[root]
+        while self._union[node] != root:
+            self._union[node], node = root, self._union[node]
+        return root
+
+    def add_equivalence(self, a: str, b: str) -> None:
+        self._union[self._find(a)] = self._find(b)
+        self._canonical = None
+
+    def add_label(self, disease_id: str, name: str) -> None:
+        key = _norm_name(name)
+        if key:
+            self._labels.setdefault(key, disease_id)
+
+    def add_is_a(self, child: str, parent: str) -> None:
+        self._find(child)
+        self._find(parent)
+        self._is_a.append((child, parent))
+        self._canonical = None
+
+    @classmethod
+    def from_obo(cls, path: str, equivalence_sources: Sequence[str] = EQUIVALENCE_SOURCES) -> "DiseaseOntology":
+        """读取 MONDO OBO（mondo.obo）：id / name / EXACT synonym / is_a / 等价 xref"""
+        ontology = cls()
+        current: Optional[str] = None
+        in_term = False
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    current = None
+                    in_term = line == "[Term]"
+                    continue
+                if not in_term or ":" not in line:
+                    continue
+                tag, value = line.split(":", 1)
+                value = value.strip()
+                if tag == "id":
+                    current = _parse_obo_id(value)
+                    if current:
+                        ontology._find(current)
+                elif current is None:
+                    continue
+                elif tag == "name":
+                    ontology.add_label(current, value)
+                elif tag == "synonym":
+                    match = _OBO_SYNONYM.match(value)
+                    if match:
+                        ontology.add_label(current, match.group(1))
+                elif tag == "is_a":
+                    parent = _parse_obo_id(value.split("!")[0])
+                    if parent:
+                        ontology.add_is_a(current, parent)
+                elif tag == "xref":
+                    target = _parse_obo_id(value.split()[0])
+                    if target and any(f'source="{s}"' in value for s in equivalence_sources):
+                        ontology.add_equivalence(current, target)
+        return ontology
+
+    # ---- 查询 ----
+    def _build(self) -> Dict[str, str]:
+        if self._canonical is None:
+            groups: Dict[str, List[str]] = defaultdict(list)
+            for node in list(self._union):
+                groups[self._find(node)].append(node)
+            canonical = {}
+            for members in groups.values():
+                best = min(members, key=lambda m: (PREFIX_PRIORITY.get(m.split(":")[0], 9), m))
+                for member in members:
+                    canonical[member] = best
+            self._canonical = canonical
+        return self._canonical
+
+    def canonical(self, disease_id: str) -> str:
+        """规范编号；未收录的编号原样返回"""
+        return self._build().get(disease_id, disease_id)
+
+    def resolve(self, text: str) -> List[str]:
+        """
+        预测 / 金标准文本 -> 规范键列表：
+        文本中的编号或规范化名称被本体收录时只返回其规范编号；
+        否则返回文本中的全部编号与 "name:<规范化名称>"，由 encode_results 视为同一疾病的别名
+        """
+        ids = extract_ids(text)
+        known = self._build()
+        for disease_id in ids:
+            if disease_id in known:
+                return [known[disease_id]]
+        name = _norm_name(text)
+        if name in self._labels:
+            return [self.canonical(self._labels[name])]
+        return ids + ([f"name:{name}"] if name else [])
+
+    def parents(self) -> Dict[str, set]:
+        """规范编号之间的 is_a 关系"""
+        out: Dict[str, set] = defaultdict(set)
+        for child, parent in self._is_a:
+            child, parent = self.canonical(child), self.canonical(parent)
+            if child != parent:
+                out[child].add(parent)
+        return out
+
+
+# ========== 编码 ==========
+class EncodedResults(NamedTuple):
+    predictions: np.ndarray      # (n, K) int32，-1 为空
+    golds: np.ndarray            # (n, M) int32，-1 为空
+    categories: np.ndarray       # (n,) 类别下标
+    category_names: List[str]
+    vocabulary: List[str]        # 下标 -> 规范键
+
+
+def _as_list(value: Any) -> List[str]:
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def encode_results(
+    results: Iterable[Dict[str, Any]],
+    ontology: Optional[DiseaseOntology] = None,
+    max_predictions: int = 10,
+) -> EncodedResults:
+    """
+    把结果记录（predictions / gold / category）编码为整数矩阵；同一文本只解析一次。
+    本体未收录的疾病，同一文本中出现的编号与名称互为别名（与 match_rank 的"编号或名称相同"一致）。
+    """
+    ontology = ontology or DiseaseOntology()
+    records = list(results)
+    aliases = DiseaseOntology()
+    resolved: Dict[str, List[str]] = {}
+
+    def _keys(text: str) -> List[str]:
+        keys = resolved.get(text)
+        if keys is None:
+            keys = resolved[text] = ontology.resolve(text)
+            for key in keys:
+                aliases.add_equivalence(keys[0], key)
+        return keys
+
+    for record in records:
+        for text in (record.get("predictions") or [])[:max_predictions]:
+            _keys(text)
+        for text in _as_list(record.get("gold")):
+            _keys(text)
+
+    vocab: Dict[str, int] = {}
+    codes = {
+        text: vocab.setdefault(aliases._find(keys[0]), len(vocab)) if keys else -1
+        for text, keys in resolved.items()
+    }
+    pred_rows, gold_rows, cat_codes = [], [], []
+    categories: Dict[str, int] = {}
+    for record in records:
+        pred_rows.append([codes[p] for p in (record.get("predictions") or [])[:max_predictions]])
+        # 同一疾病的编号与名称会归一到同一个键，去重后保留顺序
+        gold_rows.append(list(dict.fromkeys(c for c in (codes[g] for g in _as_list(record.get("gold"))) if c >= 0)))
+        category = record.get("category") or "unknown"
+        cat_codes.append(categories.setdefault(category, len(categories)))
+
+    def _pad(rows: List[List[int]], width: int) -> np.ndarray:
+        out = np.full((len(rows), max(width, 1)), -1, dtype=np.int32)
+        for i, row in enumerate(rows):
+            out[i, :len(row)] = row
+        return out
+
+    return EncodedResults(
+        predictions=_pad(pred_rows, max((len(r) for r in pred_rows), default=0)),
+        golds=_pad(gold_rows, max((len(r) for r in gold_rows), default=0)),
+        categories=np.asarray(cat_codes, dtype=np.int32),
+        category_names=list(categories),
+        vocabulary=list(vocab),
+    )
+
+
+# ========== 指标 ==========
+def compute_ranks(predictions: np.ndarray, golds: np.ndarray) -> np.ndarray:
+    """首个命中金标准的名次（从 1 开始），未命中为 0"""
+    hit = ((predictions[:, :, None] == golds[:, None, :]) & (golds[:, None, :] >= 0)).any(axis=2)
+    return np.where(hit.any(axis=1), hit.argmax(axis=1) + 1, 0)
+
+
+def ancestor_table(
+    ontology: DiseaseOntology, vocabulary: Sequence[str], max_distance: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每个词表项在 max_distance 跳以内的祖先（含自身）及跳数，填充为 (V, A) 矩阵（-1 为空）。
+    只需展开词表中出现的疾病，祖先不在词表中时追加编号。
+    """
+    parents = ontology.parents()
+    index = {key: i for i, key in enumerate(vocabulary)}
+    rows: List[List[Tuple[int, int]]] = []
+    for key in vocabulary:
+        seen = {key: 0}
+        queue = deque([key])
+        while queue:
+            node = queue.popleft()
+            if seen[node] >= max_distance:
+                continue
+            for parent in parents.get(node, ()):
+                if parent not in seen:
+                    seen[parent] = seen[node] + 1
+                    queue.append(parent)
+        rows.append([(index.setdefault(node, len(index)), depth) for node, depth in seen.items()])
+
+    width = max((len(r) for r in rows), default=1)
+    anc = np.full((len(rows), width), -1, dtype=np.int32)
+    dist = np.zeros((len(rows), width), dtype=np.int16)
+    for i, row in enumerate(rows):
+        anc[i, :len(row)] = [a for a, _ in row]
+        dist[i, :len(row)] = [d for _, d in row]
+    return anc, dist
+
+
+def partial_credit(
+    encoded: EncodedResults,
+    ontology: DiseaseOntology,
+    max_distance: int = 2,
+    decay: float = 0.5,
+    chunk_size: int = 65536,
+) -> np.ndarray:
+    """
+    每个 (病例, 名次) 的部分得分 (n, K)：与任一金标准的本体距离 d <= max_distance 时得 decay**d，
+    完全命中 (d=0) 得 1。按预测-金标准对分块计算，控制内存峰值。
+    """
+    pred, gold = encoded.predictions, encoded.golds
+    n, k = pred.shape
+    credit = np.zeros((n, k), dtype=np.float32)
+    if not encoded.vocabulary:
+        return credit
+    anc, dist = ancestor_table(ontology, encoded.vocabulary, max_distance)
+
+    # 所有有效的 (预测, 金标准) 对
+    rows, cols, gcols = np.nonzero((pred[:, :, None] >= 0) & (gold[:, None, :] >= 0))
+    p_ids, g_ids = pred[rows, cols], gold[rows, gcols]
+    for start in range(0, len(rows), chunk_size):
+        sl = slice(start, start + chunk_size)
+        ap, dp = anc[p_ids[sl]], dist[p_ids[sl]]
+        ag, dg = anc[g_ids[sl]], dist[g_ids[sl]]
+        shared = (ap[:, :, None] == ag[:, None, :]) & (ap[:, :, None] >= 0)
+        total = np.where(shared, dp[:, :, None] + dg[:, None, :], np.iinfo(np.int16).max).min(axis=(1, 2))
+        score = np.where(total <= max_distance, np.power(decay, np.minimum(total, max_distance)), 0.0)
+        np.maximum.at(credit, (rows[sl], cols[sl]), score.astype(np.float32))
+    return credit
+
+
+def _metrics(ranks: np.ndarray, credit: np.ndarray, ks: Sequence[int], mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    if mask is not None:
+        ranks, credit = ranks[mask], credit[mask]
+    n = len(ranks)
+    if not n:
+        return {"cases": 0}
+    hit = ranks > 0
+    out: Dict[str, Any] = {"cases": int(n)}
+    for k in ks:
+        out[f"top{k}"] = round(float((hit & (ranks <= k)).mean()), 4)
+    out["mrr"] = round(float(np.where(hit, 1.0 / np.maximum(ranks, 1), 0.0).mean()), 4)
+    for k in ks:
+        out[f"partial@{k}"] = round(float(credit[:, :k].max(axis=1).mean()), 4) if credit.shape[1] else 0.0
+    return out
+
+
+def score_results(
+    results: Iterable[Dict[str, Any]],
+    ontology: Optional[DiseaseOntology] = None,
+    ks: Sequence[int] = TOP_KS,
+    max_distance: int = 2,
+    decay: float = 0.5,
+) -> Dict[str, Any]:
+    """
+    对整张结果表评分，返回总体与按类别切片的 Top-k / MRR / partial@k。
+    出错的病例（无预测）计为未命中。
+    """
+    ontology = ontology or DiseaseOntology()
+    encoded = encode_results(results, ontology, max_predictions=max(ks))
+    ranks = compute_ranks(encoded.predictions, encoded.golds)
+    credit = partial_credit(encoded, ontology, max_distance=max_distance, decay=decay)
+    summary = _metrics(ranks, credit, ks)
+    summary["by_category"] = {
+        name: _metrics(ranks, credit, ks, encoded.categories == i)
+        for i, name in enumerate(encoded.category_names)
+    }
+    return summary
+
+
+def print_scores(scores: Dict[str, Any], ks: Sequence[int] = TOP_KS) -> None:
+    def _line(label: str, s: Dict[str, Any]) -> str:
+        tops = " ".join(f"top{k}={s[f'top{k}']:.2%}" for k in ks)
+        return f"{label}: n={s['cases']} {tops} mrr={s['mrr']:.3f} partial@{ks[-1]}={s[f'partial@{ks[-1]}']:.3f}"
+
+    print("-" * 40)
+    if not scores.get("cases"):
+        print("No cases")
+        return
+    print(_line("All", scores))
+    for name, s in sorted(scores.get("by_category", {}).items()):
+        print(_line(f"  {name}", s))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本体感知的 RareBench 结果评分")
+    parser.add_argument("--results", required=True, help="结果 JSONL（run_rarebench / sharding 输出）")
+    parser.add_argument("--ontology", default=None, help="MONDO OBO 文件（缺省只做编号 / 名称精确匹配）")
+    parser.add_argument("--max-distance", type=int, default=2, help="部分得分的最大 is_a 跳数")
+    parser.add_argument("--decay", type=float, default=0.5, help="每一跳的得分衰减")
+    parser.add_argument("--output", default=None, help="评分结果 JSON")
+    args = parser.parse_args()
+
+    from benchmarks.sharding import read_results
+
+    ontology = DiseaseOntology.from_obo(args.ontology) if args.ontology else None
+    scores = score_results(read_results(Path(args.results)), ontology, max_distance=args.max_distance, decay=args.decay)
+    print_scores(scores)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(scores, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
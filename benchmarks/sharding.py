@@ -0,0 +1,213 @@
+"""
+分片、可续跑的 RareBench 评测
+------------------------------
+完整的 RareBench 评测（数千病例 × 多轮 MDT）要跑数小时，任何崩溃都会从头开始。
+本模块把病例按 case_id 的稳定哈希分到 N 个分片，每个分片在独立的工作进程中运行
+（各自的事件循环与并发上限），结果逐条追加写入该分片的结果文件：
+
+    <output-dir>/shard-000-of-008.jsonl
+    ...
+
+- 续跑: 重新执行同一命令时，结果文件中已成功完成的病例会被跳过（出错 / 超时的病例会重跑）
+- 合并: merge 把所有分片按 case_id 去重（成功结果优先、同类取最新），写出
+  results.jsonl 与 summary.json
+
+用法:
+    python -m benchmarks.sharding run --cases data/hms.jsonl --shards 8 --workers 4 \\
+        --concurrency 4 --output-dir runs/hms
+    python -m benchmarks.sharding merge --output-dir runs/hms
+"""
+
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.run_rarebench import evaluate_agent, iter_cases, print_summary, summarize
+
+DEFAULT_GRAPH_FACTORY = "benchmarks.run_rarebench:build_benchmark_graph"
+
+
+def shard_of(case_id: str, num_shards: int) -> int:
+    """按 case_id 的稳定哈希分片（与进程、Python 哈希随机化无关）"""
+    digest = hashlib.sha1(str(case_id).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % num_shards
+
+
+def shard_path(output_dir: str, shard_index: int, num_shards: int) -> Path:
+    return Path(output_dir) / f"shard-{shard_index:03d}-of-{num_shards:03d}.jsonl"
+
+
+def read_results(path: Path) -> Iterator[Dict[str, Any]]:
+    """读取结果文件；崩溃时写了一半的末行会被忽略"""
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def repair_results_file(path: Path) -> None:
+    """截掉崩溃时写了一半的末行（没有换行结尾），否则续跑追加的第一条结果会接在它后面、整行无法解析"""
+    if not path.exists():
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            keep = data.rfind(b"\n") + 1
+            f.truncate(keep)
+            print(f"[Shard] {path.name}: 截掉未写完的末行（{len(data) - keep} 字节）")
+
+
+def completed_case_ids(path: Path) -> Set[str]:
+    """已成功完成的病例（出错的病例不算完成，续跑时会重跑）"""
+    return {r["case_id"] for r in read_results(path) if not r.get("error")}
+
+
+def _load_factory(spec: str):
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _pending_cases(
+    cases: Iterable[Dict[str, Any]], shard_index: int, num_shards: int, done: Set[str]
+) -> Iterator[Dict[str, Any]]:
+    for case in cases:
+        if shard_of(case["case_id"], num_shards) == shard_index and case["case_id"] not in done:
+            yield case
+
+
+def run_shard(
+    cases_path: str,
+    shard_index: int,
+    num_shards: int,
+    output_dir: str,
+    concurrency: int = 4,
+    timeout: Optional[float] = None,
+    graph_factory: str = DEFAULT_GRAPH_FACTORY,
+) -> Dict[str, Any]:
+    """
+    工作进程入口：运行一个分片中尚未完成的病例（独立事件循环）。
+
+    Returns:
+        {"shard": 序号, "skipped": 已完成跳过数, "ran": 本次运行数, "errors": 本次出错数, "pid": 工作进程}
+    """
+    path = shard_path(output_dir, shard_index, num_shards)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    repair_results_file(path)
+    done = completed_case_ids(path)
+    graph = _load_factory(graph_factory)()
+    results = asyncio.run(evaluate_agent(
+        graph,
+        _pending_cases(iter_cases(cases_path), shard_index, num_shards, done),
+        concurrency=concurrency,
+        output_path=str(path),
+        timeout=timeout,
+    ))
+    return {
+        "shard": shard_index,
+        "skipped": len(done),
+        "ran": len(results),
+        "errors": sum(1 for r in results if r.get("error")),
+        "pid": os.getpid(),
+    }
+
+
+def run_sharded(
+    cases_path: str,
+    num_shards: int,
+    output_dir: str,
+    workers: Optional[int] = None,
+    concurrency: int = 4,
+    timeout: Optional[float] = None,
+    graph_factory: str = DEFAULT_GRAPH_FACTORY,
+) -> List[Dict[str, Any]]:
+    """
+    在进程池中运行全部分片。总并发 = min(workers, num_shards) × concurrency，
+    按 CPU 核数与 API 配额调整；分片数大于进程数时，由新的工作进程接着跑下一个分片。
+    """
+    workers = min(workers or num_shards, num_shards)
+    # spawn: 每个工作进程从干净的解释器开始，不继承父进程的事件循环与连接池；
+    # max_tasks_per_child=1: 每个分片一个新进程，进程级的模型池、缓存等单例不会跨分片
+    # （以及跨 asyncio.run）复用
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as pool:
+        futures = [
+            pool.submit(run_shard, cases_path, i, num_shards, output_dir, concurrency, timeout, graph_factory)
+            for i in range(num_shards)
+        ]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            print(f"[Shard {report['shard']:03d}] 跳过已完成 {report['skipped']}，"
+                  f"本次运行 {report['ran']}（出错 {report['errors']}）")
+    return sorted(reports, key=lambda r: r["shard"])
+
+
+def merge_shards(output_dir: str, write: bool = True) -> List[Dict[str, Any]]:
+    """
+    合并所有分片结果：同一病例有多条记录时，成功结果优先，其次取最新一条。
+    write=True 时写出 results.jsonl 与 summary.json。
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for path in sorted(Path(output_dir).glob("shard-*-of-*.jsonl")):
+        for record in read_results(path):
+            previous = merged.get(record["case_id"])
+            if previous is None or not (record.get("error") and not previous.get("error")):
+                merged[record["case_id"]] = record
+    results = list(merged.values())
+    if write:
+        out_dir = Path(output_dir)
+        with open(out_dir / "results.jsonl", "w", encoding="utf-8") as f:
+            for record in results:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        with open(out_dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump(summarize(results), f, ensure_ascii=False, indent=2)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="分片、可续跑的 RareBench 评测")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="运行（或续跑）全部分片，结束后自动合并")
+    run_parser.add_argument("--cases", required=True, help="病例文件（.json 或 .jsonl）")
+    run_parser.add_argument("--shards", type=int, required=True, help="分片数")
+    run_parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认等于分片数）")
+    run_parser.add_argument("--concurrency", type=int, default=4, help="每个进程同时运行的病例数")
+    run_parser.add_argument("--timeout", type=float, default=None, help="单病例超时（秒）")
+    run_parser.add_argument("--output-dir", required=True)
+    run_parser.add_argument("--graph-factory", default=DEFAULT_GRAPH_FACTORY,
+                            help="构建带检查点主图的函数（module:function）")
+
+    merge_parser = sub.add_parser("merge", help="合并分片结果")
+    merge_parser.add_argument("--output-dir", required=True)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_sharded(
+            args.cases, args.shards, args.output_dir,
+            workers=args.workers, concurrency=args.concurrency,
+            timeout=args.timeout, graph_factory=args.graph_factory,
+        )
+    print_summary(summarize(merge_shards(args.output_dir)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+外部 API 的本地替身服务（JAX HPO、NCBI E-utilities、LitSense）
+
+在不访问真实接口的情况下，以可控的延迟分布、错误率与限流压测异步 / 连接池化的工具路径。
+工具通过 HPO_API_BASE_URL / NCBI_EUTILS_BASE_URL / LITSENSE_API_BASE_URL 指向替身服务。
+
+    python -m benchmarks.stub_servers --port 8765 --config stub.json
+"""
+from benchmarks.stub_servers.fixtures import DEFAULT_FIXTURES, FixtureStore, load_fixtures
+from benchmarks.stub_servers.server import (
+    LatencyModel,
+    RouteBehavior,
+    StubAPIServer,
+    StubServerConfig,
+    StubServerThread,
+)
+
+__all__ = [
+    "DEFAULT_FIXTURES",
+    "FixtureStore",
+    "load_fixtures",
+    "LatencyModel",
+    "RouteBehavior",
+    "StubAPIServer",
+    "StubServerConfig",
+    "StubServerThread",
+]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+启动替身服务
+
+    python -m benchmarks.stub_servers --port 8765 \
+        --config stub.json --fixtures fixtures.json
+
+配置文件（JSON 或 YAML）结构见 StubServerConfig.from_dict。
+"""
+import argparse
+import asyncio
+import json
+
+import yaml
+
+from benchmarks.stub_servers.fixtures import FixtureStore, load_fixtures
+from benchmarks.stub_servers.server import StubAPIServer, StubServerConfig
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HPO / E-utilities / LitSense 本地替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", help="延迟 / 错误率 / 限流配置（JSON 或 YAML）")
+    parser.add_argument("--fixtures", help="覆盖内置夹具的 JSON 文件")
+    parser.add_argument("--no-synthesize", action="store_true", help="未命中夹具时返回空结果而不是合成数据")
+    args = parser.parse_args()
+
+    config_data = None
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config_data = yaml.safe_load(f) if args.config.endswith((".yml", ".yaml")) else json.load(f)
+
+    server = StubAPIServer(
+        args.host,
+        args.port,
+        StubServerConfig.from_dict(config_data),
+        FixtureStore(load_fixtures(args.fixtures), synthesize=not args.no_synthesize),
+    )
+
+    async def _run():
+        await server.start()
+        print(f"[StubServer] listening on {server.base_url}")
+        for key, value in server.env().items():
+            print(f"export {key}={value}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(_run())
+    except KeyboardInterrupt:
+        print("\n[StubServer] stopped")
+
+
+if __name__ == "__main__":
+    main()
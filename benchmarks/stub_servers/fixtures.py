@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+替身服务的夹具数据
+
+内置一小份真实形态的数据（HPO 术语、术语-疾病注释、PubMed 文献、LitSense 片段），
+未命中夹具的查询按查询内容的哈希确定性地合成结果，保证压测时响应体大小与真实接口相近、
+且同一查询每次返回相同结果。
+
+可通过 JSON 文件覆盖 / 扩充（结构同 DEFAULT_FIXTURES）:
+    python -m benchmarks.stub_servers --fixtures my_fixtures.json
+"""
+import copy
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+DEFAULT_FIXTURES: Dict[str, Any] = {
+    "hpo_terms": [
+        {"id": "HP:0001250", "name": "Seizure", "synonyms": ["Seizures", "Epileptic seizure", "癫痫发作", "抽搐"],
+         "definition": "A seizure is an intermittent abnormality of nervous system physiology characterised by a transient occurrence of signs and/or symptoms due to abnormal excessive or synchronous neuronal activity in the brain."},
+        {"id": "HP:0001263", "name": "Global developmental delay", "synonyms": ["Developmental delay", "发育迟缓", "全面发育迟缓"],
+         "definition": "A delay in the achievement of motor or mental milestones in the domains of development of a child."},
+        {"id": "HP:0000407", "name": "Sensorineural hearing impairment", "synonyms": ["Sensorineural deafness", "感音神经性耳聋", "听力下降", "听力损失"],
+         "definition": "A type of hearing impairment in one or both ears related to an abnormal functionality of the cochlear nerve."},
+        {"id": "HP:0000662", "name": "Nyctalopia", "synonyms": ["Night blindness", "夜盲"],
+         "definition": "Inability to see well at night or in poor light."},
+        {"id": "HP:0000505", "name": "Visual impairment", "synonyms": ["Blurred vision", "Poor vision", "视力模糊", "视力下降"],
+         "definition": "Visual impairment (or vision impairment) is vision loss (of a person) to such a degree as to qualify as an additional support need."},
+        {"id": "HP:0001252", "name": "Hypotonia", "synonyms": ["Muscular hypotonia", "Low muscle tone", "肌张力低下"],
+         "definition": "Hypotonia is an abnormally low muscle tone (the amount of tension or resistance to movement in a muscle)."},
+        {"id": "HP:0001324", "name": "Muscle weakness", "synonyms": ["Muscular weakness", "肌无力", "乏力"],
+         "definition": "Reduced strength of muscles."},
+        {"id": "HP:0002376", "name": "Developmental regression", "synonyms": ["Loss of developmental milestones", "发育倒退"],
+         "definition": "Loss of developmental skills, as manifested by loss of previously achieved motor, language or social milestones."},
+        {"id": "HP:0001256", "name": "Intellectual disability, mild", "synonyms": ["Mild mental retardation", "轻度智力障碍"],
+         "definition": "Mild intellectual disability is defined as an intelligence quotient (IQ) in the range of 50-69."},
+        {"id": "HP:0000316", "name": "Hypertelorism", "synonyms": ["Widely spaced eyes", "眼距增宽"],
+         "definition": "Interpupillary distance more than 2 SD above the mean."},
+    ],
+    "hpo_annotations": {
+        "HP:0001250": [
+            {"id": "OMIM:607208", "name": "Dravet syndrome", "mondoId": "MONDO:0100135", "description": "Developmental and epileptic encephalopathy with onset in the first year of life."},
+            {"id": "OMIM:105830", "name": "Angelman syndrome", "mondoId": "MONDO:0007113", "description": "Neurogenetic disorder characterized by severe intellectual disability and seizures."},
+            {"id": "OMIM:312750", "name": "Rett syndrome", "mondoId": "MONDO:0010726", "description": "Progressive neurodevelopmental disorder occurring almost exclusively in females."},
+        ],
+        "HP:0001263": [
+            {"id": "OMIM:105830", "name": "Angelman syndrome", "mondoId": "MONDO:0007113", "description": "Neurogenetic disorder characterized by severe intellectual disability and seizures."},
+            {"id": "OMIM:176270", "name": "Prader-Willi syndrome", "mondoId": "MONDO:0008300", "description": "Complex genetic disorder with hypotonia, developmental delay and hyperphagia."},
+            {"id": "OMIM:312750", "name": "Rett syndrome", "mondoId": "MONDO:0010726", "description": "Progressive neurodevelopmental disorder occurring almost exclusively in females."},
+        ],
+        "HP:0000407": [
+            {"id": "OMIM:276900", "name": "Usher syndrome, type 1", "mondoId": "MONDO:0010168", "description": "Congenital profound deafness with retinitis pigmentosa."},
+            {"id": "OMIM:221200", "name": "Deafness, autosomal recessive 1A", "mondoId": "MONDO:0009076", "description": "Nonsyndromic sensorineural hearing loss."},
+        ],
+        "HP:0000662": [
+            {"id": "OMIM:276900", "name": "Usher syndrome, type 1", "mondoId": "MONDO:0010168", "description": "Congenital profound deafness with retinitis pigmentosa."},
+            {"id": "OMIM:268000", "name": "Retinitis pigmentosa", "mondoId": "MONDO:0019200", "description": "Progressive degeneration of photoreceptors leading to night blindness."},
+        ],
+    },
+    "articles": [
+        {"pmid": "28494777", "title": "Dravet syndrome: clinical features, genetics and treatment.",
+         "abstract": "Dravet syndrome is a severe developmental and epileptic encephalopathy caused in most cases by SCN1A variants. Seizures begin in the first year of life.",
+         "year": "2017", "journal": "Epilepsia"},
+        {"pmid": "24126612", "title": "Angelman syndrome: a review highlighting musculoskeletal and neurological features.",
+         "abstract": "Angelman syndrome is caused by loss of function of the maternally inherited UBE3A gene and presents with developmental delay, seizures and ataxia.",
+         "year": "2013", "journal": "Journal of Neurodevelopmental Disorders"},
+        {"pmid": "31722021", "title": "Gene therapy for retinitis pigmentosa: current status and future directions.",
+         "abstract": "Retinitis pigmentosa is a group of inherited retinal dystrophies. Night blindness is usually the first symptom. Several gene therapy trials are ongoing.",
+         "year": "2019", "journal": "Progress in Retinal and Eye Research"},
+        {"pmid": "20301399", "title": "Usher Syndrome Type I.",
+         "abstract": "Usher syndrome type I is characterized by congenital bilateral profound sensorineural hearing loss, vestibular areflexia and adolescent-onset retinitis pigmentosa.",
+         "year": "2020", "journal": "GeneReviews"},
+    ],
+    "litsense": [
+        {"score": 0.92, "pmcid": "PMC5422423", "pmid": 28494777, "section": "abstract",
+         "text": "Dravet syndrome is a severe developmental and epileptic encephalopathy caused in most cases by SCN1A variants.",
+         "annotations": ["0|15|disease|MESH:D004831", "75|5|gene|6323"]},
+        {"score": 0.88, "pmcid": "PMC3851836", "pmid": 24126612, "section": "intro",
+         "text": "Angelman syndrome results from loss of function of the maternally inherited UBE3A allele.",
+         "annotations": ["0|17|disease|MESH:D017204", "60|5|gene|7337"]},
+        {"score": 0.81, "pmcid": "PMC6960364", "pmid": 31722021, "section": "discussion",
+         "text": "Night blindness is usually the first symptom of retinitis pigmentosa, followed by progressive loss of the peripheral visual field.",
+         "annotations": ["0|15|disease|MESH:D009755", "51|20|disease|MESH:D012174"]},
+    ],
+}
+
+_WORDS = (
+    "syndrome dystrophy encephalopathy myopathy ataxia deficiency dysplasia neuropathy "
+    "retinal cerebellar mitochondrial congenital progressive autosomal recessive dominant "
+    "infantile juvenile hereditary familial metabolic lysosomal skeletal cardiac renal"
+).split()
+
+
+def load_fixtures(path: Optional[str] = None) -> Dict[str, Any]:
+    """加载夹具：内置数据，可用 JSON 文件覆盖同名段"""
+    fixtures = copy.deepcopy(DEFAULT_FIXTURES)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            fixtures.update(json.load(f))
+    return fixtures
+
+
+def _seed(*parts: Any) -> int:
+    return int(hashlib.sha256("\x00".join(map(str, parts)).encode("utf-8")).hexdigest()[:12], 16)
+
+
+def _phrase(seed: int, n: int) -> str:
+    return " ".join(_WORDS[(seed >> (i * 5)) % len(_WORDS)] for i in range(n))
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in re.split(r"[\s,;:()\[\]\"']+", text.lower()) if t]
+
+
+class FixtureStore:
+    """按请求参数检索夹具，未命中时确定性合成"""
+
+    def __init__(self, fixtures: Optional[Dict[str, Any]] = None, synthesize: bool = True):
+        self.fixtures = fixtures if fixtures is not None else load_fixtures()
+        self.synthesize = synthesize
+        self._articles = {a["pmid"]: a for a in self.fixtures.get("articles", [])}
+
+    # ---- JAX HPO ----
+    def hpo_search(self, query: str, rows: int) -> Dict[str, Any]:
+        q = query.strip().lower()
+        terms = []
+        for term in self.fixtures.get("hpo_terms", []):
+            names = [term["name"]] + list(term.get("synonyms") or [])
+            if any(q and (q in n.lower() or n.lower() in q) for n in names):
+                terms.append({**term, "translations": term.get("translations")})
+        if not terms and self.synthesize and q:
+            for i in range(rows):
+                seed = _seed("hpo", q, i)
+                terms.append({
+                    "id": f"HP:{seed % 9000000 + 1000000:07d}",
+                    "name": _phrase(seed, 3).capitalize(),
+                    "definition": f"Synthetic term for '{query}': {_phrase(seed >> 3, 12)}.",
+                    "synonyms": [_phrase(seed >> 7, 2)],
+                    "translations": None,
+                })
+        return {"terms": terms[:rows], "totalCount": len(terms)}
+
+    def hpo_annotation(self, hpo_id: str) -> Dict[str, Any]:
+        diseases = self.fixtures.get("hpo_annotations", {}).get(hpo_id)
+        if diseases is None:
+            diseases = []
+            if self.synthesize:
+                # 从 300 个合成疾病中挑选，不同术语之间会有共现，便于测试排序
+                seed = _seed("annotation", hpo_id)
+                for i in range(5 + seed % 11):
+                    k = _seed(hpo_id, i) % 300
+                    diseases.append({
+                        "id": f"OMIM:{600000 + k}",
+                        "name": _phrase(_seed("disease", k), 3).title(),
+                        "mondoId": f"MONDO:{k:07d}",
+                        "description": _phrase(_seed("desc", k), 16).capitalize() + ".",
+                    })
+        return {"diseases": diseases, "genes": [], "medicalActions": []}
+
+    # ---- NCBI E-utilities ----
+    def pubmed_search(self, term: str, retmax: int) -> List[str]:
+        tokens = set(_tokens(term)) - {"and", "or", "not"}
+        scored = []
+        for article in self.fixtures.get("articles", []):
+            text = set(_tokens(article["title"] + " " + article["abstract"]))
+            overlap = len(tokens & text)
+            if overlap:
+                scored.append((-overlap, article["pmid"]))
+        ids = [pmid for _, pmid in sorted(scored)]
+        if self.synthesize:
+            i = 0
+            while len(ids) < retmax:
+                ids.append(str(30000000 + _seed("pmid", term, i) % 9000000))
+                i += 1
+        return ids[:retmax]
+
+    def article(self, pmid: str) -> Dict[str, Any]:
+        if pmid in self._articles:
+            return self._articles[pmid]
+        seed = _seed("article", pmid)
+        return {
+            "pmid": pmid,
+            "title": f"{_phrase(seed, 6).capitalize()}.",
+            "abstract": " ".join(_phrase(seed >> i, 12).capitalize() + "." for i in range(6)),
+            "year": str(1995 + seed % 30),
+            "journal": _phrase(seed >> 11, 2).title() + " Journal",
+        }
+
+    # ---- LitSense ----
+    def litsense(self, query: str) -> List[Dict[str, Any]]:
+        tokens = set(_tokens(query))
+        hits = [r for r in self.fixtures.get("litsense", []) if tokens & set(_tokens(r["text"]))]
+        if not hits and self.synthesize:
+            for i in range(10):
+                seed = _seed("litsense", query, i)
+                hits.append({
+                    "score": round(0.9 - i * 0.04, 3),
+                    "pmcid": f"PMC{seed % 9000000 + 1000000}",
+                    "pmid": 30000000 + seed % 9000000,
+                    "section": ("abstract", "intro", "results", "discussion")[seed % 4],
+                    "text": _phrase(seed, 20).capitalize() + ".",
+                    "annotations": [],
+                })
+        return sorted(hits, key=lambda r: -r["score"])
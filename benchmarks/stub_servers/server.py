@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+基于 asyncio 的 HTTP 替身服务（HTTP/1.1，支持 keep-alive）
+
+一个进程同时提供三组接口，路径前缀与工具的 base URL 环境变量对应:
+    /hpo/api/hp/search                      -> HPO_API_BASE_URL=http://host:port/hpo/api
+    /hpo/api/network/annotation/{id}
+    /eutils/esearch.fcgi, /eutils/efetch.fcgi -> NCBI_EUTILS_BASE_URL=http://host:port/eutils/
+    /litsense/api/                          -> LITSENSE_API_BASE_URL=http://host:port/litsense/api/
+
+每个路由可单独配置延迟分布与错误率，全局可配置令牌桶限流（超限返回 429 + Retry-After）。
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from benchmarks.stub_servers.fixtures import FixtureStore
+
+ROUTES = ("hpo_search", "hpo_annotation", "esearch", "efetch", "litsense")
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+@dataclass
+class LatencyModel:
+    """
+    延迟分布（毫秒）:
+        fixed: value
+        uniform: low ~ high
+        lognormal: 中位数 median，形状 sigma（长尾，接近真实 API）
+    """
+    kind: str = "fixed"
+    value: float = 0.0
+    low: float = 0.0
+    high: float = 0.0
+    median: float = 0.0
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.low, self.high) / 1000.0
+        if self.kind == "lognormal":
+            if self.median <= 0:
+                return 0.0
+            return rng.lognormvariate(math.log(self.median), self.sigma) / 1000.0
+        return max(self.value, 0.0) / 1000.0
+
+
+@dataclass
+class RouteBehavior:
+    """单个路由的行为：延迟分布 + 错误率"""
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+@dataclass
+class StubServerConfig:
+    """替身服务配置"""
+    default: RouteBehavior = field(default_factory=RouteBehavior)
+    routes: Dict[str, RouteBehavior] = field(default_factory=dict)
+    rate_limit_rps: Optional[float] = None
+    rate_limit_burst: int = 10
+    seed: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "StubServerConfig":
+        """
+        从字典构建，例如:
+            {"default": {"latency": {"kind": "lognormal", "median": 300, "sigma": 0.6}, "error_rate": 0.02},
+             "routes": {"efetch": {"latency": {"kind": "fixed", "value": 800}}},
+             "rate_limit_rps": 3, "rate_limit_burst": 3}
+        """
+        data = data or {}
+
+        def _behavior(d: Optional[Dict[str, Any]]) -> RouteBehavior:
+            d = dict(d or {})
+            latency = LatencyModel(**(d.pop("latency", None) or {}))
+            return RouteBehavior(latency=latency, **d)
+
+        unknown = set((data.get("routes") or {})) - set(ROUTES)
+        if unknown:
+            raise ValueError(f"未知路由: {sorted(unknown)}，可选: {ROUTES}")
+        return cls(
+            default=_behavior(data.get("default")),
+            routes={k: _behavior(v) for k, v in (data.get("routes") or {}).items()},
+            rate_limit_rps=data.get("rate_limit_rps"),
+            rate_limit_burst=int(data.get("rate_limit_burst", 10)),
+            seed=int(data.get("seed", 0)),
+        )
+
+    def behavior(self, route: str) -> RouteBehavior:
+        return self.routes.get(route, self.default)
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+Response = Tuple[int, str, bytes]
+
+
+class StubAPIServer:
+    """HPO / E-utilities / LitSense 替身服务"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        config: Optional[StubServerConfig] = None,
+        fixtures: Optional[FixtureStore] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.config = config or StubServerConfig()
+        self.fixtures = fixtures or FixtureStore()
+        self._rng = random.Random(self.config.seed)
+        self._bucket = (
+            _TokenBucket(self.config.rate_limit_rps, self.config.rate_limit_burst)
+            if self.config.rate_limit_rps else None
+        )
+        self._server: Optional[asyncio.base_events.Server] = None
+        self.stats: Dict[str, Dict[str, int]] = {
+            r: {"requests": 0, "errors": 0, "rate_limited": 0} for r in ROUTES
+        }
+        self._handlers: Dict[str, Callable[[Dict[str, List[str]], str], Response]] = {
+            "hpo_search": self._hpo_search,
+            "hpo_annotation": self._hpo_annotation,
+            "esearch": self._esearch,
+            "efetch": self._efetch,
+            "litsense": self._litsense,
+        }
+
+    # ---- 生命周期 ----
+    async def start(self) -> "StubAPIServer":
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """工具读取的 base URL 环境变量"""
+        return {
+            "HPO_API_BASE_URL": f"{self.base_url}/hpo/api",
+            "NCBI_EUTILS_BASE_URL": f"{self.base_url}/eutils/",
+            "LITSENSE_API_BASE_URL": f"{self.base_url}/litsense/api/",
+        }
+
+    # ---- HTTP ----
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._write(writer, (400, "text/plain", b"bad request line"), keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0) or 0)
+                body = await reader.readexactly(length) if length else b""
+
+                status, content_type, payload = await self._dispatch(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._write(writer, (status, content_type, payload), keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write(self, writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+        status, content_type, payload = response
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 429:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+
+    def _route(self, path: str) -> Tuple[Optional[str], str]:
+        path = unquote(path)
+        if path.rstrip("/") == "/hpo/api/hp/search":
+            return "hpo_search", ""
+        if path.startswith("/hpo/api/network/annotation/"):
+            return "hpo_annotation", path.rsplit("/", 1)[-1]
+        if path.rstrip("/").endswith("/eutils/esearch.fcgi"):
+            return "esearch", ""
+        if path.rstrip("/").endswith("/eutils/efetch.fcgi"):
+            return "efetch", ""
+        if path.rstrip("/") == "/litsense/api":
+            return "litsense", ""
+        return None, ""
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Response:
+        parts = urlsplit(target)
+        route, arg = self._route(parts.path)
+        if route is None:
+            return 404, "text/plain", b"not found"
+        params = parse_qs(parts.query)
+        if method == "POST" and body:
+            params.update(parse_qs(body.decode("utf-8")))
+
+        stats = self.stats[route]
+        stats["requests"] += 1
+        if self._bucket is not None and not self._bucket.take():
+            stats["rate_limited"] += 1
+            return 429, "application/json", b'{"error": "rate limit exceeded"}'
+
+        behavior = self.config.behavior(route)
+        delay = behavior.latency.sample(self._rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if behavior.error_rate and self._rng.random() < behavior.error_rate:
+            stats["errors"] += 1
+            return behavior.error_status, "application/json", b'{"error": "injected failure"}'
+        return self._handlers[route](params, arg)
+
+    # ---- 路由处理 ----
+    @staticmethod
+    def _param(params: Dict[str, List[str]], name: str, default: str = "") -> str:
+        values = params.get(name)
+        return values[0] if values else default
+
+    @staticmethod
+    def _json(data: Any) -> Response:
+        return 200, "application/json", json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    def _hpo_search(self, params, _arg) -> Response:
+        rows = int(self._param(params, "rows", "10") or 10)
+        return self._json(self.fixtures.hpo_search(self._param(params, "q"), rows))
+
+    def _hpo_annotation(self, _params, hpo_id) -> Response:
+        return self._json(self.fixtures.hpo_annotation(hpo_id))
+
+    def _esearch(self, params, _arg) -> Response:
+        term = self._param(params, "term")
+        retmax = int(self._param(params, "retmax", "20") or 20)
+        ids = self.fixtures.pubmed_search(term, retmax)
+        if self._param(params, "retmode") == "json":
+            return self._json({
+                "header": {"type": "esearch", "version": "0.3"},
+                "esearchresult": {"count": str(len(ids)), "retmax": str(len(ids)), "retstart": "0", "idlist": ids},
+            })
+        xml = (
+            '<?xml version="1.0" encoding="UTF-8" ?>\n<eSearchResult>'
+            f"<Count>{len(ids)}</Count><RetMax>{len(ids)}</RetMax><RetStart>0</RetStart><IdList>"
+            + "".join(f"<Id>{i}</Id>" for i in ids)
+            + "</IdList></eSearchResult>"
+        )
+        return 200, "text/xml", xml.encode("utf-8")
+
+    def _efetch(self, params, _arg) -> Response:
+        ids = [i for i in self._param(params, "id").split(",") if i.strip()]
+        records = []
+        for pmid in ids:
+            a = self.fixtures.article(pmid.strip())
+            records.append(
+                f"PMID- {a['pmid']}\nTI  - {a['title']}\nAB  - {a['abstract']}\n"
+                f"DP  - {a['year']}\nJT  - {a['journal']}\n"
+            )
+        return 200, "text/plain", "\n".join(records).encode("utf-8")
+
+    def _litsense(self, params, _arg) -> Response:
+        return self._json(self.fixtures.litsense(self._param(params, "query")))
+
+
+class StubServerThread:
+    """
+    在后台线程的事件循环中运行替身服务（供同步代码、测试与基准脚本使用）
+
+        with StubServerThread(config) as server:
+            os.environ.update(server.env())
+    """
+
+    def __init__(self, config: Optional[StubServerConfig] = None,
+                 fixtures: Optional[FixtureStore] = None, host: str = "127.0.0.1", port: int = 0):
+        self.server = StubAPIServer(host, port, config, fixtures)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="stub-api-server", daemon=True)
+
+    def __enter__(self) -> StubAPIServer:
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self._loop).result(timeout=10)
+        return self.server
+
+    def __exit__(self, *exc) -> None:
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop.close()
@@ -0,0 +1,263 @@
+"""
+配置扫描：绘制 成本 / 延迟 / 准确率 的 Pareto 前沿
+------------------------------------------------
+max_rounds、专家组数量、各组模型、是否运行互审……这些取舍过去只能手改 config.yml 逐个重跑。
+本模块读取一份扫描说明，把基础配置与每个变体的覆盖项合并成独立的配置文件，
+每个变体在独立的工作进程中（通过 DEEPRARE_CONFIG_PATH 加载自己的配置）跑同一批病例，
+最后输出每个变体的准确率、p50/p95 延迟、token 与工具调用次数，标出 Pareto 前沿，
+并给出满足准确率目标的最省 token 的配置。
+
+扫描说明 (YAML / JSON):
+    cases: data/hms.jsonl
+    limit: 50                 # 所有变体使用同一批前 N 个病例
+    concurrency: 4            # 每个变体同时运行的病例数
+    parallel: 2               # 同时运行的变体数
+    timeout: 900
+    base_config: config.yml   # 缺省为 DEEPRARE_CONFIG_PATH 或项目根目录 config.yml
+    llm_cache: true           # 变体间共享磁盘精确匹配缓存（键含模型、参数与消息，相同请求才会复用）
+    variants:                 # 命名变体：点号路径 -> 覆盖值，null 表示删除该项
+      two_groups: {}
+      one_group:
+        multi_expert_diagnosis_agent.group_2: null
+    grid:                     # 与每个命名变体做笛卡尔积
+      mdt_config.max_rounds: [1, 2, 3]
+      mdt_config.enable_reviewer: [true, false]
+
+用法:
+    python -m benchmarks.sweep --spec sweep.yml --output-dir runs/sweep --target top1=0.4
+    再次执行同一命令时，各变体已完成的病例会被跳过（见 benchmarks.sharding）。
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.run_rarebench import iter_cases, summarize
+from benchmarks.sharding import DEFAULT_GRAPH_FACTORY, merge_shards, run_shard
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+TABLE_COLUMNS = (
+    "variant", "cases", "errors", "top1", "top3", "top10",
+    "latency_p50_s", "latency_p95_s", "tokens_mean", "llm_calls_mean", "tool_calls_mean",
+)
+
+
+# ========== 变体展开 ==========
+def set_dotted(data: Dict[str, Any], dotted: str, value: Any) -> None:
+    """按点号路径写入嵌套字典；value 为 None 时删除该项"""
+    *parents, leaf = dotted.split(".")
+    node = data
+    for key in parents:
+        if not isinstance(node.get(key), dict):
+            node[key] = {}
+        node = node[key]
+    if value is None:
+        node.pop(leaf, None)
+    else:
+        node[leaf] = copy.deepcopy(value)
+
+
+def apply_overrides(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """在基础配置的副本上应用覆盖项"""
+    out = copy.deepcopy(base)
+    for dotted, value in overrides.items():
+        set_dotted(out, dotted, value)
+    return out
+
+
+def _short(dotted: str) -> str:
+    return dotted.rsplit(".", 1)[-1]
+
+
+def expand_variants(spec: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """命名变体 × grid 的笛卡尔积 -> [(变体名, 覆盖项)]"""
+    named = spec.get("variants") or {"base": {}}
+    grid = spec.get("grid") or {}
+    keys = list(grid)
+    out = []
+    for name, overrides in named.items():
+        for combo in itertools.product(*(grid[k] for k in keys)):
+            label = ",".join([name] + [f"{_short(k)}={v}" for k, v in zip(keys, combo)])
+            out.append((label, {**(overrides or {}), **dict(zip(keys, combo))}))
+    return out
+
+
+def _safe_name(label: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_=," else "_" for c in label)
+
+
+def load_spec(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f) if path.endswith(".json") else yaml.safe_load(f)
+
+
+def _base_config_path(spec: Dict[str, Any]) -> Path:
+    path = spec.get("base_config") or os.getenv("DEEPRARE_CONFIG_PATH") or "config.yml"
+    path = Path(path)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+# ========== 执行 ==========
+def run_variant(
+    config_path: str,
+    cases_path: str,
+    output_dir: str,
+    concurrency: int,
+    timeout: Optional[float],
+    graph_factory: str,
+) -> Dict[str, Any]:
+    """工作进程入口：先指向变体配置再构建主图（每个进程只跑一个变体，配置单例不会串用）"""
+    os.environ["DEEPRARE_CONFIG_PATH"] = config_path
+    return run_shard(cases_path, 0, 1, output_dir, concurrency, timeout, graph_factory)
+
+
+def run_sweep(
+    spec: Dict[str, Any],
+    output_dir: str,
+    graph_factory: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    运行全部变体并返回结果表（每个变体一行，含 pareto 标记）。
+    同时写出 <output_dir>/sweep.json 与 sweep.csv。
+    """
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    with open(_base_config_path(spec), "r", encoding="utf-8") as f:
+        base = yaml.safe_load(f) or {}
+    if spec.get("llm_cache", True):
+        base = apply_overrides(base, {
+            "llm_cache.enabled": True,
+            "llm_cache.backend": "disk",
+            "llm_cache.path": str((out / "llm_cache.sqlite").resolve()),
+        })
+
+    # 所有变体共用同一批病例
+    cases_path = out / "cases.jsonl"
+    if not cases_path.exists():
+        limit = spec.get("limit")
+        with open(cases_path, "w", encoding="utf-8") as f:
+            for i, case in enumerate(iter_cases(spec["cases"])):
+                if limit is not None and i >= limit:
+                    break
+                f.write(json.dumps(case, ensure_ascii=False) + "\n")
+
+    variants = expand_variants(spec)
+    jobs = {}
+    for label, overrides in variants:
+        variant_dir = out / _safe_name(label)
+        variant_dir.mkdir(exist_ok=True)
+        config_path = variant_dir / "config.yml"
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(apply_overrides(base, overrides), f, allow_unicode=True, sort_keys=False)
+        with open(variant_dir / "overrides.json", "w", encoding="utf-8") as f:
+            json.dump(overrides, f, ensure_ascii=False, indent=2)
+        jobs[label] = (str(config_path), str(variant_dir))
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=min(int(spec.get("parallel", 1)), len(jobs)),
+        mp_context=context,
+        max_tasks_per_child=1,
+    ) as pool:
+        futures = {
+            pool.submit(
+                run_variant, config_path, str(cases_path), variant_dir,
+                int(spec.get("concurrency", 4)), spec.get("timeout"),
+                graph_factory or spec.get("graph_factory") or DEFAULT_GRAPH_FACTORY,
+            ): label
+            for label, (config_path, variant_dir) in jobs.items()
+        }
+        for future in as_completed(futures):
+            report = future.result()
+            print(f"[Sweep] {futures[future]}: 本次运行 {report['ran']}，跳过 {report['skipped']}，出错 {report['errors']}")
+
+    rows = []
+    for label, (_, variant_dir) in jobs.items():
+        summary = summarize(merge_shards(variant_dir))
+        rows.append({"variant": label, **{k: summary.get(k) for k in TABLE_COLUMNS[1:]}})
+    mark_pareto(rows)
+
+    with open(out / "sweep.json", "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+    with open(out / "sweep.csv", "w", encoding="utf-8") as f:
+        f.write(",".join(TABLE_COLUMNS + ("pareto",)) + "\n")
+        for row in rows:
+            f.write(",".join(f'"{row[c]}"' if c == "variant" else str(row.get(c, "")) for c in TABLE_COLUMNS + ("pareto",)) + "\n")
+    return rows
+
+
+# ========== 分析 ==========
+def mark_pareto(
+    rows: List[Dict[str, Any]],
+    accuracy: str = "top1",
+    costs: Sequence[str] = ("tokens_mean", "latency_p50_s"),
+) -> None:
+    """标出准确率越高越好、成本越低越好意义下未被支配的变体（row["pareto"]）"""
+    def _vector(row):
+        return (-(row.get(accuracy) or 0.0),) + tuple(row.get(c) or 0.0 for c in costs)
+
+    for row in rows:
+        mine = _vector(row)
+        row["pareto"] = not any(
+            all(a <= b for a, b in zip(_vector(other), mine)) and _vector(other) != mine
+            for other in rows if other is not row and other.get("cases")
+        ) and bool(row.get("cases"))
+
+
+def cheapest_meeting(
+    rows: Sequence[Dict[str, Any]], metric: str, target: float, cost: str = "tokens_mean"
+) -> Optional[Dict[str, Any]]:
+    """满足 metric >= target 的变体中 cost 最低者"""
+    eligible = [r for r in rows if (r.get(metric) or 0.0) >= target]
+    return min(eligible, key=lambda r: r.get(cost) or 0.0) if eligible else None
+
+
+def print_table(rows: Sequence[Dict[str, Any]]) -> None:
+    headers = TABLE_COLUMNS + ("pareto",)
+    cells = [[str(h) for h in headers]]
+    for row in sorted(rows, key=lambda r: (-(r.get("top1") or 0.0), r.get("tokens_mean") or 0.0)):
+        cells.append([
+            f"{row.get(h):.2%}" if h.startswith("top") and row.get(h) is not None
+            else ("*" if row.get(h) else "") if h == "pareto"
+            else str(row.get(h, ""))
+            for h in headers
+        ])
+    widths = [max(len(r[i]) for r in cells) for i in range(len(headers))]
+    for i, r in enumerate(cells):
+        print("  ".join(c.ljust(w) for c, w in zip(r, widths)))
+        if i == 0:
+            print("  ".join("-" * w for w in widths))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DeepRareAgent 配置扫描")
+    parser.add_argument("--spec", required=True, help="扫描说明（YAML / JSON）")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--target", default=None, help="准确率目标，例如 top1=0.4")
+    args = parser.parse_args()
+
+    rows = run_sweep(load_spec(args.spec), args.output_dir)
+    print_table(rows)
+    if args.target:
+        metric, _, value = args.target.partition("=")
+        best = cheapest_meeting(rows, metric.strip(), float(value))
+        if best is None:
+            print(f"[Sweep] 没有变体满足 {args.target}")
+        else:
+            print(f"[Sweep] 满足 {args.target} 的最省 token 配置: {best['variant']} "
+                  f"({best['tokens_mean']} tokens/case, p50 {best['latency_p50_s']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+检查点分叉的 what-if 运行
+------------------------
+评估审核提示词、汇总风格这类后段逻辑时，过去只能整条流水线重跑，而专家组深度检索占了约 80% 的成本。
+本模块从已保存的线程检查点中取出某个节点边界处的状态，分叉到新线程，只重跑下游节点：
+
+- at="expert_review": MDT 子图中第 round 轮专家组全部完成、互审之前的状态
+  -> 重跑 expert_review -> summary（审核不满意也不会再派回专家组，只观察结论与报告的变化）
+- at="summary": MDT 结束、汇总之前的状态 -> 只重跑 summary（一次 LLM 调用）
+
+修改的配置分两类：
+- settings_overrides: 点号路径覆盖 config.yml 中的值（如 mdt_config.reviewer_prompt_path、
+  summary_agent.model_name），仅在本次运行期间生效（修改的是进程级 settings，不要与正式流量同进程并发）；
+  与加载 config.yml 一样，键名含 path/dir 的相对路径按项目根目录解析，提示词文件不存在时直接报错
+  （节点自身在读不到提示词时会静默回退到默认提示词，对比结果就失去意义）
+- state_overrides: 覆盖分叉状态中的字段（如 summary_style）
+
+分叉线程写入源图的检查点（线程名 <thread_id>-whatif-<随机后缀>），可以在 Studio 中与源线程对比。
+
+用法:
+    python -m benchmarks.whatif --graph-factory myproject.graphs:build_graph --thread-id abc \\
+        --at expert_review --round 1 --set mdt_config.reviewer_prompt_path=prompts/reviewer_v2.txt
+    graph-factory 需返回带持久化检查点（与产生源线程的检查点相同）的主图。
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import json
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from benchmarks.run_rarebench import CaseStats, extract_ranked_diagnoses
+from DeepRareAgent.schema import MainGraphState
+
+MDT_NODE = "mdt_diagnosis"
+BOUNDARIES = ("expert_review", "summary")
+
+
+# ========== 配置覆盖 ==========
+@contextlib.contextmanager
+def override_settings(overrides: Optional[Dict[str, Any]] = None) -> Iterator[None]:
+    """
+    临时覆盖 settings 中的点号路径（退出时恢复）
+
+    Raises:
+        FileNotFoundError: 覆盖的 *prompt*path* 指向不存在的文件
+    """
+    from DeepRareAgent.config import settings
+    from DeepRareAgent.config.loader import ConfigObject, cfg_loader
+
+    missing = object()
+    applied = []
+    try:
+        for dotted, value in (overrides or {}).items():
+            *parents, leaf = dotted.split(".")
+            node = settings
+            for key in parents:
+                node = getattr(node, key)
+            # 经 ConfigObject 转换：子配置转为对象，path/dir 字段按项目根目录解析
+            value = getattr(ConfigObject({leaf: value}, cfg_loader.project_root), leaf)
+            if "prompt" in leaf and "path" in leaf and isinstance(value, str) and not Path(value).is_file():
+                raise FileNotFoundError(f"覆盖的提示词文件不存在: {dotted}={value}")
+            applied.append((node, leaf, getattr(node, leaf, missing)))
+            setattr(node, leaf, value)
+        yield
+    finally:
+        for node, leaf, previous in reversed(applied):
+            if previous is missing:
+                delattr(node, leaf)
+            else:
+                setattr(node, leaf, previous)
+
+
+# ========== 边界查找 ==========
+async def _latest_mdt_namespace(graph: Any, thread_id: str) -> Optional[str]:
+    """线程中最近一次 MDT 子图运行的检查点命名空间"""
+    latest, latest_id = None, ""
+    async for item in graph.checkpointer.alist({"configurable": {"thread_id": thread_id}}):
+        ns = item.config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = item.config["configurable"]["checkpoint_id"]
+        if ns.split(":")[0] == MDT_NODE and checkpoint_id > latest_id:
+            latest, latest_id = ns, checkpoint_id
+    return latest
+
+
+async def load_boundary_state(
+    graph: Any,
+    thread_id: str,
+    at: str = "expert_review",
+    round_index: int = 1,
+) -> Dict[str, Any]:
+    """
+    取出源线程在节点边界处的主图状态。
+
+    Args:
+        graph: 带检查点的主图（create_main_graph(checkpointer=...)）
+        thread_id: 源线程
+        at: "expert_review" 或 "summary"
+        round_index: at="expert_review" 时的轮次（从 1 开始）
+
+    Raises:
+        ValueError: 边界不存在（线程未运行到该处，或轮次超出实际轮数）
+    """
+    if at not in BOUNDARIES:
+        raise ValueError(f"不支持的分叉边界: {at}，可选 {BOUNDARIES}")
+    config = {"configurable": {"thread_id": thread_id}}
+
+    main_before_mdt, main_before_summary = None, None
+    async for snapshot in graph.aget_state_history(config):
+        if snapshot.next == ("summary",) and main_before_summary is None:
+            main_before_summary = snapshot.values
+        if snapshot.next == (MDT_NODE,) and main_before_mdt is None:
+            main_before_mdt = snapshot.values
+
+    if at == "summary":
+        if main_before_summary is None:
+            raise ValueError(f"线程 {thread_id} 中没有 MDT 结束、汇总之前的检查点")
+        return dict(main_before_summary)
+
+    namespace = await _latest_mdt_namespace(graph, thread_id)
+    if namespace is None or main_before_mdt is None:
+        raise ValueError(f"线程 {thread_id} 中没有 MDT 子图检查点")
+    async for snapshot in graph.aget_state_history({"configurable": {"thread_id": thread_id, "checkpoint_ns": namespace}}):
+        if "expert_review" in snapshot.next and snapshot.values.get("round_count", 0) == round_index - 1:
+            # 子图状态只含 MDT 字段，主图专有字段（summary_style 等）取自进入 MDT 之前的主图状态
+            return {**main_before_mdt, **snapshot.values}
+    raise ValueError(f"线程 {thread_id} 中没有第 {round_index} 轮互审之前的检查点")
+
+
+# ========== 下游重跑 ==========
+def create_tail_graph(at: str, checkpointer: Any = None):
+    """从边界开始的下游图：expert_review -> summary 或只有 summary"""
+    from DeepRareAgent.p03summary_agent import summary_node
+
+    workflow = StateGraph(MainGraphState)
+    workflow.add_node("summary", summary_node)
+    if at == "expert_review":
+        from DeepRareAgent.p02_mdt.export_reviewer_node import expert_reviewer_node
+
+        workflow.add_node("expert_review", expert_reviewer_node)
+        workflow.add_edge(START, "expert_review")
+        workflow.add_edge("expert_review", "summary")
+    else:
+        workflow.add_edge(START, "summary")
+    workflow.add_edge("summary", END)
+    return workflow.compile(name="WhatIfTail", checkpointer=checkpointer)
+
+
+async def run_what_if(
+    graph: Any,
+    thread_id: str,
+    at: str = "expert_review",
+    round_index: int = 1,
+    settings_overrides: Optional[Dict[str, Any]] = None,
+    state_overrides: Optional[Dict[str, Any]] = None,
+    fork_thread_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    从源线程的边界处分叉并在修改后的配置下重跑下游节点。
+
+    Returns:
+        {"fork_thread_id", "at", "round", "final_report", "predictions",
+         "verdicts": {group_id: {is_satisfied, reinvestigate_reason}}, "llm_calls", "input_tokens", ...}
+    """
+    state = await load_boundary_state(graph, thread_id, at, round_index)
+    state.update(state_overrides or {})
+    fork_thread_id = fork_thread_id or f"{thread_id}-whatif-{uuid.uuid4().hex[:8]}"
+    tail = create_tail_graph(at, getattr(graph, "checkpointer", None) or InMemorySaver())
+
+    stats = CaseStats()
+    config = {"configurable": {"thread_id": fork_thread_id}, "callbacks": [stats]}
+    with override_settings(settings_overrides):
+        result = await tail.ainvoke(state, config)
+
+    final_report = result.get("final_report", "") or ""
+    return {
+        "fork_thread_id": fork_thread_id,
+        "source_thread_id": thread_id,
+        "at": at,
+        "round": round_index if at == "expert_review" else None,
+        "final_report": final_report,
+        "predictions": extract_ranked_diagnoses(final_report),
+        "verdicts": {
+            group_id: {
+                "is_satisfied": expert.get("is_satisfied"),
+                "reinvestigate_reason": expert.get("reinvestigate_reason"),
+            }
+            for group_id, expert in (result.get("expert_pool") or {}).items()
+        },
+        **stats.as_dict(),
+    }
+
+
+def _parse_assignments(items) -> Dict[str, Any]:
+    """key=value（value 按 JSON 解析，失败时作为字符串）"""
+    out = {}
+    for item in items or []:
+        key, _, raw = item.partition("=")
+        try:
+            out[key.strip()] = json.loads(raw)
+        except ValueError:
+            out[key.strip()] = raw
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="从已保存的检查点分叉并只重跑下游节点")
+    parser.add_argument("--graph-factory", required=True, help="返回带持久化检查点主图的函数（module:function）")
+    parser.add_argument("--thread-id", required=True, help="源线程")
+    parser.add_argument("--at", choices=BOUNDARIES, default="expert_review", help="分叉边界")
+    parser.add_argument("--round", type=int, default=1, help="at=expert_review 时的轮次")
+    parser.add_argument("--set", action="append", default=[], help="配置覆盖，如 summary_agent.temperature=0")
+    parser.add_argument("--state", action="append", default=[], help="状态覆盖，如 summary_style=...")
+    parser.add_argument("--output", default=None, help="结果 JSON")
+    args = parser.parse_args()
+
+    module_name, _, attr = args.graph_factory.partition(":")
+    graph = getattr(importlib.import_module(module_name), attr)()
+    result = asyncio.run(run_what_if(
+        graph, args.thread_id, at=args.at, round_index=args.round,
+        settings_overrides=_parse_assignments(args.set),
+        state_overrides=_parse_assignments(args.state),
+    ))
+    print(f"[WhatIf] fork={result['fork_thread_id']} LLM 调用 {result['llm_calls']} 次，"
+          f"tokens {result['input_tokens'] + result['output_tokens']}")
+    for group_id, verdict in result["verdicts"].items():
+        print(f"  {group_id}: satisfied={verdict['is_satisfied']} {verdict['reinvestigate_reason'] or ''}")
+    print(f"  predictions: {result['predictions'][:5]}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
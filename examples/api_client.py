@@ -175,7 +175,8 @@ class DeepRareAgentClient:
         payload = {
             "assistant_id": self.assistant_id,
             "input": input_data,
-            "stream_mode": stream_mode or ["values", "messages"],
+            # custom: 汇总节点逐 token 推送的最终报告
+            "stream_mode": stream_mode or ["values", "messages", "custom"],
             "config": config or {}
         }
         
@@ -290,6 +291,11 @@ async def print_stream_events(events: AsyncIterator[StreamEvent]):
                 if msg.get("type") == "ai" or msg.get("role") == "ai":
                     content = msg.get("content", "")
                     print(content, end="", flush=True)
+        elif event.event == "custom":
+            # 汇总节点流式推送的最终报告
+            data = event.data
+            if isinstance(data, dict) and data.get("event") in ("summary_token", "summary_evidence"):
+                print(data.get("content", ""), end="", flush=True)
         elif event.event == "values":
             # 打印重要状态
             data = event.data
@@ -0,0 +1,112 @@
+"""
+测试 LLM / 工具 I/O 的录制与回放
+"""
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain.agents import create_agent
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.tools import InjectedToolCallId, tool
+from langgraph.types import Command
+from typing_extensions import Annotated
+
+from DeepRareAgent.utils.cassette import (
+    Cassette,
+    CassetteMiddleware,
+    CassetteMissError,
+    record_cassettes,
+    replay_cassette,
+    tool_fingerprint,
+)
+from DeepRareAgent.utils.fake_llm import FakeChatModel, ReplayChatModel
+
+CALLS = {"live": 0, "command": 0}
+
+
+@tool
+async def lookup_gene(symbol: str) -> str:
+    """查询基因"""
+    CALLS["live"] += 1
+    if symbol == "BAD":
+        raise ValueError("未知基因")
+    return f"{symbol}: 致病基因"
+
+
+@tool
+async def save_note(note: str, tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    """记录证据（返回 Command 的状态类工具，不录制）"""
+    CALLS["command"] += 1
+    return Command(update={"messages": [ToolMessage(content=f"已记录: {note}", tool_call_id=tool_call_id)]})
+
+
+def _script():
+    return [
+        {"content": "", "tool_calls": [{"name": "lookup_gene", "args": {"symbol": "SCN1A"}}]},
+        {"content": "", "tool_calls": [{"name": "save_note", "args": {"note": "SCN1A 阳性"}}]},
+        {"content": "", "tool_calls": [{"name": "lookup_gene", "args": {"symbol": "BAD"}}]},
+        "SCN1A 相关 Dravet 综合征",
+    ]
+
+
+class _ErrorToText(AgentMiddleware):
+    """把工具异常转成 ToolMessage（模拟 ToolErrorHandlerMiddleware）"""
+
+    async def awrap_tool_call(self, request, handler):
+        try:
+            return await handler(request)
+        except Exception as e:
+            return ToolMessage(content=f"{type(e).__name__}: {e}", tool_call_id=request.tool_call["id"])
+
+
+def _run(model):
+    agent = create_agent(model=model, tools=[lookup_gene, save_note], middleware=[_ErrorToText(), CassetteMiddleware()])
+    config = {"configurable": {"thread_id": "case/001"}}
+    return asyncio.run(agent.ainvoke({"messages": [HumanMessage(content="分析患者")]}, config=config))
+
+
+def test_record_then_replay():
+    with tempfile.TemporaryDirectory() as tmp:
+        with record_cassettes(tmp) as recorder:
+            recorded = _run(FakeChatModel(responses=_script(), latency_ms=20))
+        path = recorder.path_for("case/001")
+        assert path.name == "case_001.jsonl"
+        records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert [r["kind"] for r in records] == ["llm", "tool", "llm", "llm", "tool", "llm"]
+        assert records[0]["latency_s"] >= 0.015
+        assert records[4]["error_type"] == "ValueError"
+        assert CALLS["live"] == 2 and CALLS["command"] == 1
+
+        # 回放：模型与录制的工具不再真实执行，结果与录制时一致；
+        # 未录制的 Command 工具照常执行，不会错取其他工具的记录
+        with replay_cassette(str(path), time_scale=0):
+            replayed = _run(ReplayChatModel())
+        assert CALLS["live"] == 2 and CALLS["command"] == 2
+        assert [m.content for m in replayed["messages"]] == [m.content for m in recorded["messages"]]
+        assert replayed["messages"][4].content == "已记录: SCN1A 阳性"
+        assert replayed["messages"][6].content == "ValueError: 未知基因"
+    print("[PASS] 录制与回放")
+
+
+def test_unrecorded_tool_not_matched_by_order():
+    """非 strict 的顺序回退只取同名工具记录"""
+    records = [{"kind": "tool", "key": "k1", "name": "search_pubmed", "content": "PMID:1"}]
+    cassette = Cassette(records)
+    try:
+        cassette.take("tool", tool_fingerprint("save_evidence", {}), name="save_evidence")
+        raise AssertionError("未录制的工具不应取到记录")
+    except CassetteMissError:
+        pass
+    assert cassette.take("tool", "other", name="search_pubmed")["content"] == "PMID:1"
+    print("[PASS] 未录制工具不错位")
+
+
+if __name__ == "__main__":
+    test_record_then_replay()
+    test_unrecorded_tool_not_matched_by_order()
+    print("\n所有测试通过")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 Token 预算上下文管理
+验证未超预算时不改动、先省略陈旧工具输出、再压缩早期轮次，以及关键消息始终保留
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from DeepRareAgent.utils.context_budget import fit_messages_to_budget
+from DeepRareAgent.utils.token_utils import estimate_messages_tokens
+
+
+def _expert_history(rounds: int = 3):
+    """模拟多轮会诊后的专家消息：分诊画像 + 每轮工具调用 + 审核注入"""
+    messages = [AIMessage(content="研究和讨论的患者病例信息如下:\n\n35岁男性，四肢疼痛10年")]
+    for r in range(rounds):
+        call_id = f"call_{r}"
+        messages.append(AIMessage(content="", tool_calls=[{"name": "search_pubmed", "args": {"query": f"fabry {r}"}, "id": call_id}]))
+        messages.append(ToolMessage(content="文献内容 " * 2000, tool_call_id=call_id, name="search_pubmed"))
+        messages.append(AIMessage(content=f"第{r + 1}轮诊断报告：法布雷病可能性高。" * 20))
+        messages.append(HumanMessage(content=f"诊断的信息如下:\n\n35岁男性（第{r + 1}轮）"))
+        messages.append(HumanMessage(content=f"你已经查看了其他专家的报告，并基于以下原因提出了疑问：第{r + 1}轮"))
+    return messages
+
+
+def test_under_budget_untouched():
+    """测试未超预算时原样返回"""
+    messages = _expert_history(1)
+    trimmed, report = fit_messages_to_budget(messages, 10 ** 6)
+    assert trimmed == messages and not report.trimmed
+    print("[PASS] 未超预算测试通过")
+
+
+def test_drop_stale_tool_outputs_first():
+    """测试优先省略陈旧工具输出"""
+    messages = _expert_history(3)
+    total = estimate_messages_tokens(messages)
+    trimmed, report = fit_messages_to_budget(messages, total - 2000, keep_recent_tool_outputs=1)
+    assert report.dropped_tool_outputs >= 1 and report.summarized_messages == 0
+    assert report.tokens_after <= total - 2000
+    tool_contents = [m.content for m in trimmed if isinstance(m, ToolMessage)]
+    assert tool_contents[0].startswith("[已省略") and not tool_contents[-1].startswith("[已省略")
+    print(f"[PASS] 工具输出省略测试通过 ({report.tokens_before} -> {report.tokens_after})")
+
+
+def test_summarize_keeps_protected_messages():
+    """测试压缩早期轮次时保留患者画像与最新审核意见，且不留下孤立的工具结果"""
+    messages = _expert_history(3)
+    trimmed, report = fit_messages_to_budget(messages, 800, keep_recent_tool_outputs=0)
+    assert report.summarized_messages > 0
+    contents = [m.content for m in trimmed]
+    assert contents[0].startswith("研究和讨论的患者病例信息如下")
+    assert any(c.startswith("[早期讨论摘要") for c in contents)
+    assert contents[-1] == "你已经查看了其他专家的报告，并基于以下原因提出了疑问：第3轮"
+    assert "诊断的信息如下:\n\n35岁男性（第3轮）" in contents
+
+    # 每条工具结果之前必须能找到对应的工具调用
+    seen_calls = set()
+    for m in trimmed:
+        if isinstance(m, AIMessage):
+            seen_calls.update(c["id"] for c in m.tool_calls)
+        if isinstance(m, ToolMessage):
+            assert m.tool_call_id in seen_calls
+    print(f"[PASS] 早期轮次压缩测试通过 ({report.tokens_before} -> {report.tokens_after})")
+
+
+if __name__ == "__main__":
+    test_under_budget_untouched()
+    test_drop_stale_tool_outputs_first()
+    test_summarize_keeps_protected_messages()
+    print("\n[PASS] 所有上下文预算测试通过！")
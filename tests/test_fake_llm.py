@@ -0,0 +1,111 @@
+"""
+测试离线模型：fake（脚本化响应）与 replay（回放录制响应）
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.load import dumpd
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from pydantic import BaseModel
+
+from DeepRareAgent.utils.fake_llm import FakeChatModel, ReplayChatModel, prompt_fingerprint
+from DeepRareAgent.utils.model_factory import create_llm_from_config
+
+
+@tool
+def lookup_gene(symbol: str) -> str:
+    """查询基因"""
+    return f"{symbol}: 致病基因"
+
+
+class Verdict(BaseModel):
+    is_satisfied: bool
+    reinvestigate_reason: str = ""
+
+
+def test_factory_returns_offline_models():
+    """provider: fake 由工厂创建，规则优先于顺序脚本"""
+    cfg = SimpleNamespace(
+        provider="fake",
+        model_name="fake-expert",
+        rules=[{"match": "审核", "response": '{"is_satisfied": true}'}],
+        responses=["第一条", {"content": "", "tool_calls": [{"name": "lookup_gene", "args": {"symbol": "SCN1A"}}]}],
+        output_tokens=7,
+    )
+    llm = create_llm_from_config(cfg)
+    assert isinstance(llm, FakeChatModel)
+    assert llm.invoke("你好").content == "第一条"
+    second = llm.invoke("你好")
+    assert second.tool_calls[0]["args"] == {"symbol": "SCN1A"}
+    assert second.usage_metadata["output_tokens"] == 7
+    assert llm.invoke("请审核").content == '{"is_satisfied": true}'
+    assert llm.invoke("你好").content == "第一条"  # 循环使用
+    print("[PASS] 工厂创建 fake 模型")
+
+
+def test_structured_output_and_latency():
+    """强制工具调用时把 JSON 正文转成工具调用；合成延迟生效"""
+    llm = FakeChatModel(default_response='{"is_satisfied": false, "reinvestigate_reason": "需复查"}', latency_ms=50)
+    structured = llm.with_structured_output(Verdict, include_raw=True)
+    start = time.perf_counter()
+    out = asyncio.run(structured.ainvoke([HumanMessage(content="审核")]))
+    assert time.perf_counter() - start >= 0.045
+    assert out["parsed"] == Verdict(is_satisfied=False, reinvestigate_reason="需复查")
+    print("[PASS] 结构化输出与合成延迟")
+
+
+def test_agent_loop_with_fake_model():
+    """fake 模型可以驱动完整的 agent 工具调用循环"""
+    from langchain.agents import create_agent
+
+    llm = FakeChatModel(responses=[
+        {"content": "", "tool_calls": [{"name": "lookup_gene", "args": {"symbol": "SCN1A"}}]},
+        "SCN1A 相关 Dravet 综合征",
+    ])
+    agent = create_agent(model=llm, tools=[lookup_gene])
+    result = agent.invoke({"messages": [HumanMessage(content="分析")]})
+    assert result["messages"][2].content == "SCN1A: 致病基因"
+    assert result["messages"][-1].content == "SCN1A 相关 Dravet 综合征"
+    print("[PASS] agent 循环")
+
+
+def test_replay_by_fingerprint():
+    """replay 按消息指纹匹配，找不到时按录制顺序回放"""
+    first = [HumanMessage(content="病例 A")]
+    second = [HumanMessage(content="病例 B")]
+    records = [
+        {"kind": "llm", "key": prompt_fingerprint(first), "message": dumpd(AIMessage(content="A 的回复")), "latency_s": 0.2},
+        {"kind": "tool", "name": "lookup_gene"},
+        {"kind": "llm", "key": prompt_fingerprint(second), "message": dumpd(AIMessage(content="B 的回复")), "latency_s": 0.2},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "cassette.jsonl"
+        path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in records), encoding="utf-8")
+
+        llm = ReplayChatModel(cassette_path=str(path), time_scale=0)
+        assert llm.invoke(second).content == "B 的回复"
+        assert llm.invoke([HumanMessage(content="未录制")]).content == "A 的回复"
+
+        strict = ReplayChatModel(cassette_path=str(path), time_scale=0, strict=True)
+        try:
+            strict.invoke([HumanMessage(content="未录制")])
+            raise AssertionError("strict 模式应当报错")
+        except KeyError:
+            pass
+    print("[PASS] replay 回放")
+
+
+if __name__ == "__main__":
+    test_factory_returns_offline_models()
+    test_structured_output_and_latency()
+    test_agent_loop_with_fake_model()
+    test_replay_by_fingerprint()
+    print("\n所有测试通过")
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+测试 JSON 解析：严格解析快速路径与 json5 兜底
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from DeepRareAgent.utils import json_utils
+from DeepRareAgent.utils.json_utils import coerce_bool, parse_json_from_markdown
+
+
+def test_strict_fast_path():
+    """标准 JSON、代码块、夹杂正文的 JSON 都走严格解析"""
+    assert parse_json_from_markdown('{"is_satisfied": true, "reinvestigate_reason": ""}') == {
+        "is_satisfied": True, "reinvestigate_reason": ""
+    }
+    fenced = '审核结论如下：\n```json\n{"is_satisfied": false, "reinvestigate_reason": "需排除 X"}\n```'
+    assert parse_json_from_markdown(fenced)["reinvestigate_reason"] == "需排除 X"
+    inline = '结论 {"is_satisfied": true} 完毕'
+    assert parse_json_from_markdown(inline) == {"is_satisfied": True}
+    print("[PASS] 严格解析快速路径")
+
+
+def test_json5_fallback():
+    """单引号、尾逗号等宽松格式由 json5 兜底"""
+    loose = "```json\n{'is_satisfied': true, 'reinvestigate_reason': '',}\n```"
+    assert parse_json_from_markdown(loose)["is_satisfied"] is True
+    try:
+        parse_json_from_markdown("没有 JSON")
+        raise AssertionError("应当抛出 ValueError")
+    except ValueError:
+        pass
+    print("[PASS] json5 兜底")
+
+
+def test_stdlib_without_orjson():
+    """未安装 orjson 时使用标准库 json"""
+    saved = json_utils.orjson
+    json_utils.orjson = None
+    try:
+        assert parse_json_from_markdown('{"a": 1}') == {"a": 1}
+    finally:
+        json_utils.orjson = saved
+    print("[PASS] 标准库解析")
+
+
+def test_coerce_bool():
+    assert coerce_bool(True) is True
+    assert coerce_bool("true") is True
+    assert coerce_bool("是") is True
+    assert coerce_bool("False") is False
+    assert coerce_bool(0) is False
+    assert coerce_bool(None) is False
+    print("[PASS] 布尔值规范化")
+
+
+if __name__ == "__main__":
+    test_strict_fast_path()
+    test_json5_fallback()
+    test_stdlib_without_orjson()
+    test_coerce_bool()
+    print("\n所有测试通过")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 LLM 精确匹配响应缓存
+验证命中/未命中、消息 id 规范化、磁盘后端淘汰与工厂按温度挂载
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from DeepRareAgent.utils.llm_cache import (
+    DiskResponseBackend,
+    ExactMatchLLMCache,
+    MemoryResponseBackend,
+    configure_response_cache,
+)
+
+
+def test_repeat_request_hits_cache():
+    """测试相同消息第二次直接返回缓存结果"""
+    cache = ExactMatchLLMCache(MemoryResponseBackend())
+    llm = FakeListChatModel(responses=["first", "second"], cache=cache)
+
+    history = [HumanMessage(content="患者女，12岁，反复肢端疼痛"), AIMessage(content="请补充家族史", id="run-1")]
+    assert llm.invoke(history).content == "first"
+
+    # 历史消息 id 不同（每次运行都会变化）仍应命中
+    replay = [HumanMessage(content="患者女，12岁，反复肢端疼痛"), AIMessage(content="请补充家族史", id="run-2")]
+    assert llm.invoke(replay).content == "first"
+    assert llm.invoke("另一个问题").content == "second"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    print("[PASS] 重复请求命中测试通过")
+
+
+def test_disk_backend_eviction():
+    """测试磁盘后端跨实例复用与条目上限淘汰"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "responses.sqlite")
+        backend = DiskResponseBackend(path, max_entries=2)
+        for i in range(3):
+            backend.set(f"k{i}", f"v{i}")
+        assert backend.get("k0") is None
+        assert backend.stats()["entries"] == 2
+
+        reopened = DiskResponseBackend(path, max_entries=2)
+        assert reopened.get("k2") == "v2"
+    print("[PASS] 磁盘后端测试通过")
+
+
+def test_factory_attaches_cache_by_temperature():
+    """测试工厂只给低温模型挂载缓存"""
+    from DeepRareAgent.utils.model_factory import clear_llm_pool, create_llm_from_config
+
+    cache = configure_response_cache({"enabled": True, "max_temperature": 0.3})
+    clear_llm_pool()
+    try:
+        base = dict(provider="openai", model_name="m", base_url="https://api.example.com/v1", api_key="k")
+        low = create_llm_from_config(SimpleNamespace(temperature=0.1, **base))
+        high = create_llm_from_config(SimpleNamespace(temperature=0.9, **base))
+        assert low.cache is cache
+        assert high.cache is None
+    finally:
+        configure_response_cache(None)
+        clear_llm_pool()
+    print("[PASS] 工厂挂载缓存测试通过")
+
+
+if __name__ == "__main__":
+    test_repeat_request_hits_cache()
+    test_disk_backend_eviction()
+    test_factory_attaches_cache_by_temperature()
+    print("\n[PASS] 所有响应缓存测试通过！")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 LLM 调用治理器
+验证并发上限、优先级通道、TPM 限流与模型混入
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from DeepRareAgent.utils.llm_governor import (
+    LANE_INTERACTIVE,
+    EndpointGovernor,
+    LLMGovernorMixin,
+    configure_governors,
+    get_governor,
+    llm_priority,
+)
+
+
+def test_concurrency_limit():
+    """测试同时在途请求数不超过上限"""
+    governor = EndpointGovernor("test", max_concurrency=2)
+    peak = {"now": 0, "max": 0}
+
+    async def call():
+        async with governor.aslot():
+            peak["now"] += 1
+            peak["max"] = max(peak["max"], peak["now"])
+            await asyncio.sleep(0.02)
+            peak["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak["max"] == 2
+    assert governor.stats()["granted"] == 6
+    print("[PASS] 并发上限测试通过")
+
+
+def test_priority_lane():
+    """测试 interactive 请求插队到排队中的 background 请求之前"""
+    governor = EndpointGovernor("test", max_concurrency=1)
+    order = []
+
+    async def call(name, lane):
+        async with governor.aslot(lane=lane):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        first = asyncio.create_task(call("bg-0", "background"))
+        await asyncio.sleep(0.001)
+        waiting = [asyncio.create_task(call(f"bg-{i}", "background")) for i in (1, 2)]
+        await asyncio.sleep(0.001)
+        with llm_priority(LANE_INTERACTIVE):
+            urgent = asyncio.create_task(call("chat", None))
+        await asyncio.gather(first, urgent, *waiting)
+
+    asyncio.run(main())
+    assert order == ["bg-0", "chat", "bg-1", "bg-2"], order
+    print("[PASS] 优先级通道测试通过")
+
+
+def test_tokens_per_minute():
+    """测试令牌桶不足时请求被推迟"""
+    governor = EndpointGovernor("test", max_concurrency=4, tokens_per_minute=6000)  # 100 token/s
+    with governor.slot(tokens=6000):
+        pass
+    started = time.monotonic()
+    with governor.slot(tokens=10):
+        pass
+    waited = time.monotonic() - started
+    assert 0.05 <= waited < 1.0, waited
+    print(f"[PASS] TPM 限流测试通过 (等待 {waited:.2f}s)")
+
+
+class _GovernedFake(LLMGovernorMixin, FakeListChatModel):
+    def _governor_endpoint(self) -> str:
+        return "openai:https://fake.example.com/v1"
+
+
+def test_mixin_routes_through_governor():
+    """测试模型混入的同步/异步调用都经过治理器"""
+    configure_governors({"enabled": True, "default": {"max_concurrency": 1}})
+    try:
+        llm = _GovernedFake(responses=["ok"] * 3)
+        assert llm.invoke("hi").content == "ok"
+        assert asyncio.run(llm.ainvoke("hi")).content == "ok"
+        assert "".join(c.content for c in llm.stream("hi")) == "ok"
+        stats = get_governor("openai:https://fake.example.com/v1").stats()
+        assert stats["granted"] == 3 and stats["in_flight"] == 0
+    finally:
+        configure_governors(None)
+    print("[PASS] 模型混入测试通过")
+
+
+if __name__ == "__main__":
+    test_concurrency_limit()
+    test_priority_lane()
+    test_tokens_per_minute()
+    test_mixin_routes_through_governor()
+    print("\n[PASS] 所有治理器测试通过！")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试对冲请求与故障切换
+验证慢请求触发对冲、失败立即切换、主请求快速返回时不对冲、流式对冲
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from DeepRareAgent.utils.llm_hedging import HedgedRequestMixin, get_hedge_stats, get_latency_tracker
+
+
+class _ScriptedModel(BaseChatModel):
+    reply: str = "ok"
+    delay: float = 0.0
+    fail: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.fail:
+            raise RuntimeError(f"{self.reply} failed")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self._generate(messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.reply} failed")
+        for ch in self.reply:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=ch))
+
+
+class _HedgedModel(HedgedRequestMixin, _ScriptedModel):
+    hedge_fallbacks: List[Any] = []
+    hedge_settings: Dict[str, Any] = {}
+
+
+_FAST_HEDGE = {"initial_delay": 0.05, "min_delay": 0.01, "min_samples": 100}
+
+
+def _model(**kwargs) -> _HedgedModel:
+    get_latency_tracker().clear()
+    return _HedgedModel(
+        hedge_fallbacks=[_ScriptedModel(reply="backup", delay=0.01)],
+        hedge_settings=_FAST_HEDGE,
+        **kwargs,
+    )
+
+
+def test_slow_primary_is_hedged():
+    """测试主请求过慢时备用模型获胜"""
+    before = get_hedge_stats()
+    llm = _model(reply="primary", delay=1.0)
+    result = asyncio.run(llm.ainvoke("hi"))
+    assert result.content == "backup"
+    after = get_hedge_stats()
+    assert after["hedged"] == before["hedged"] + 1
+    assert after["hedge_wins"] == before["hedge_wins"] + 1
+    print("[PASS] 慢请求对冲测试通过")
+
+
+def test_fast_primary_not_hedged():
+    """测试主请求在阈值内返回时不发起对冲"""
+    before = get_hedge_stats()
+    llm = _model(reply="primary", delay=0.0)
+    assert asyncio.run(llm.ainvoke("hi")).content == "primary"
+    assert get_hedge_stats()["hedged"] == before["hedged"]
+    print("[PASS] 快速返回不对冲测试通过")
+
+
+def test_failure_fails_over_immediately():
+    """测试主请求报错时立即切换（异步与同步）"""
+    llm = _model(reply="primary", fail=True)
+    llm.hedge_settings = {"initial_delay": 30}
+    result = asyncio.run(asyncio.wait_for(llm.ainvoke("hi"), timeout=1.0))
+    assert result.content == "backup"
+    assert llm.invoke("hi").content == "backup"
+    print("[PASS] 故障切换测试通过")
+
+
+def test_stream_hedge():
+    """测试流式调用以首个 chunk 决出胜者"""
+    llm = _model(reply="primary", delay=1.0)
+
+    async def collect():
+        return "".join([c.content async for c in llm.astream("hi")])
+
+    assert asyncio.run(collect()) == "backup"
+    print("[PASS] 流式对冲测试通过")
+
+
+if __name__ == "__main__":
+    test_slow_primary_is_hedged()
+    test_fast_primary_not_hedged()
+    test_failure_fails_over_immediately()
+    test_stream_hedge()
+    print("\n[PASS] 所有对冲测试通过！")
@@ -0,0 +1,148 @@
+"""
+测试 HTTP API 压测工具（使用本地模拟的 /threads 与 /runs/stream SSE 接口，不依赖 langgraph 服务）
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.loadtest import read_rss_mb, run_load_test, summarize_load
+
+
+class _FakeAPI:
+    """最小的 LangGraph API 替身：创建线程、流式返回几条 SSE 事件；可让 MDT 轮返回错误事件"""
+
+    def __init__(self, fail_mdt: bool = False):
+        self.fail_mdt = fail_mdt
+        self.threads = {}
+        self.handlers = set()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    key, _, value = line.partition(":")
+                    headers[key.lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                payload = json.loads(body or b"{}")
+
+                if path == "/threads":
+                    thread_id = str(uuid.uuid4())
+                    self.threads[thread_id] = []
+                    data = json.dumps({"thread_id": thread_id}).encode()
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                                 + f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                    await writer.drain()
+                    continue
+
+                thread_id = path.split("/")[2]
+                self.threads[thread_id].append(payload["input"])
+                mdt = payload["input"].get("start_diagnosis", False)
+                events = [("metadata", {"run_id": "r"}), ("values", {"messages": []})]
+                if mdt:
+                    events.append(("error", {"message": "boom"}) if self.fail_mdt else ("custom", {"token": "报告"}))
+                chunks = [f"event: {e}\r\ndata: {json.dumps(d)}\r\n\r\n".encode() for e, d in events]
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                             b"Transfer-Encoding: chunked\r\n\r\n")
+                for chunk in chunks:
+                    await asyncio.sleep(0.005 if not mdt else 0.02)
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.handlers.discard(task)
+            writer.close()
+
+    def __enter__(self):
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, "127.0.0.1", 0), self.loop).result(timeout=10)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def _shutdown(self):
+        """停止监听，并取消仍挂在 keep-alive 连接上的处理协程（否则关闭事件循环时会被销毁）"""
+        self.server.close()
+        handlers = list(self.handlers)
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=10)
+        self.loop.close()
+
+
+def test_load_test_end_to_end():
+    """多个患者并发跑完预诊断轮 + MDT 轮，各阶段都有延迟与首字节时间"""
+    api = _FakeAPI()
+    with api as base_url:
+        report = asyncio.run(run_load_test(
+            base_url, patients=6, concurrency=3, turns=["你好", "孩子走路不稳"],
+            server_pid=os.getpid(),
+        ))
+
+    assert report["completed_patients"] == 6 and report["errors"] == 0
+    assert report["runs"] == 6 * 3
+    assert report["stages"]["prediagnosis"]["runs"] == 12
+    assert report["stages"]["mdt"]["runs"] == 6
+    mdt = report["stages"]["mdt"]
+    assert 0 < mdt["ttfb"]["p50_s"] <= mdt["latency"]["p50_s"]
+    assert mdt["latency"]["p50_s"] >= report["stages"]["prediagnosis"]["latency"]["p50_s"]
+    assert report["runs_per_s"] > 0 and report["patients_per_min"] > 0
+    # 最后一轮带 start_diagnosis，前面的轮次不带
+    for inputs in api.threads.values():
+        assert [i.get("start_diagnosis", False) for i in inputs] == [False, False, True]
+    if read_rss_mb(os.getpid()) is not None:
+        assert report["memory"]["rss_peak_mb"] > 0
+    print("[PASS] test_load_test_end_to_end")
+
+
+def test_stream_error_counts_as_failed_patient():
+    """流中的 error 事件计为出错，该患者记为未完成"""
+    with _FakeAPI(fail_mdt=True) as base_url:
+        report = asyncio.run(run_load_test(base_url, patients=2, concurrency=2, turns=["你好"]))
+    assert report["failed_patients"] == 2 and report["errors"] == 2
+    assert "mdt" not in report["stages"]
+    assert report["error_samples"] == ["stream error event"]
+    print("[PASS] test_stream_error_counts_as_failed_patient")
+
+
+def test_summarize_load_without_memory():
+    records = [
+        {"patient": 0, "stage": "prediagnosis", "latency_s": 1.0, "ttfb_s": 0.1, "error": None},
+        {"patient": 0, "stage": "mdt", "latency_s": 10.0, "ttfb_s": 0.5, "error": None},
+    ]
+    report = summarize_load(records, patients=1, wall_s=11.0)
+    assert report["completed_patients"] == 1 and report["memory"] == {}
+    assert report["stages"]["mdt"]["latency"]["p99_s"] == 10.0
+    print("[PASS] test_summarize_load_without_memory")
+
+
+if __name__ == "__main__":
+    test_load_test_end_to_end()
+    test_stream_error_counts_as_failed_patient()
+    test_summarize_load_without_memory()
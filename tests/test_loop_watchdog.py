@@ -0,0 +1,126 @@
+"""
+测试事件循环阻塞监测：循环延迟统计，阻塞归属到节点路径 / 工具 / 最内层帧，子任务沿父任务归属
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Annotated
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from DeepRareAgent.utils.fake_llm import FakeChatModel
+from DeepRareAgent.utils.loop_watchdog import LoopWatchdog, format_report, render_prometheus
+
+BLOCK_S = 0.3
+
+
+def _blocking_fetch() -> str:
+    time.sleep(BLOCK_S)  # 模拟异步代码里的同步 requests 调用
+    return "PMID:1"
+
+
+def _blocking_parse() -> None:
+    time.sleep(BLOCK_S)
+
+
+@tool
+async def fetch_pubmed(query: str) -> str:
+    """检索文献"""
+    return _blocking_fetch()
+
+
+class ToyState(TypedDict, total=False):
+    messages: Annotated[list, add_messages]
+
+
+def build_toy_graph():
+    """prediagnosis（只调 LLM）-> mdt_diagnosis 子图（group_1 调阻塞工具，group_2 在子任务里阻塞）"""
+    llm = FakeChatModel(default_response="好的", latency_ms=20)
+
+    async def prediagnosis(state):
+        return {"messages": [await llm.ainvoke(state["messages"])]}
+
+    async def group_1(state):
+        await fetch_pubmed.ainvoke({"query": "DMD"})
+        return {}
+
+    async def group_2(state):
+        async def parse():
+            await asyncio.sleep(0.4)  # 与 group_1 的阻塞错开
+            _blocking_parse()
+
+        await asyncio.gather(parse())
+        return {}
+
+    sub = StateGraph(ToyState)
+    sub.add_node("group_1", group_1)
+    sub.add_node("group_2", group_2)
+    sub.add_edge(START, "group_1")
+    sub.add_edge(START, "group_2")
+    sub.add_edge("group_1", END)
+    sub.add_edge("group_2", END)
+
+    main = StateGraph(ToyState)
+    main.add_node("prediagnosis", prediagnosis)
+    main.add_node("mdt_diagnosis", sub.compile())
+    main.add_edge(START, "prediagnosis")
+    main.add_edge("prediagnosis", "mdt_diagnosis")
+    main.add_edge("mdt_diagnosis", END)
+    return main.compile()
+
+
+def _run(watchdog, thread_id="t-1"):
+    config = {"callbacks": [watchdog], "configurable": {"thread_id": thread_id}}
+    asyncio.run(build_toy_graph().ainvoke({"messages": [HumanMessage(content="孩子走路不稳")]}, config))
+
+
+def test_blocks_attributed_to_node_and_tool():
+    watchdog = LoopWatchdog(interval_ms=20, threshold_ms=150, log_blocks=False)
+    _run(watchdog)
+    report = watchdog.report()
+    assert report["blocks"]["count"] == 2, report["events"]
+    assert report["lag"]["samples"] > 0 and report["lag"]["max_s"] >= BLOCK_S * 0.8
+
+    spots = {(s["path"], s["call"]): s for s in report["hotspots"]}
+    fetch = spots[("mdt_diagnosis/group_1", "tool:fetch_pubmed")]
+    assert fetch["frame"].startswith("_blocking_fetch") and "fetch_pubmed" in fetch["stack"]
+    # gather 创建的子任务没有自己的运行，沿父任务归属到 group_2
+    parse = spots[("mdt_diagnosis/group_2", "")]
+    assert parse["frame"].startswith("_blocking_parse")
+    assert all(e["thread_id"] == "t-1" for e in report["events"])
+
+    text = format_report(report)
+    assert "mdt_diagnosis/group_1 > tool:fetch_pubmed" in text
+    metrics = render_prometheus(report)
+    assert "deeprare_event_loop_blocks_total 2" in metrics
+    assert 'path="mdt_diagnosis/group_1",call="tool:fetch_pubmed"' in metrics
+    # 运行结束后心跳随循环退出，不再监测
+    assert report["loops"] == 0 and not watchdog._runs
+    print("[PASS] test_blocks_attributed_to_node_and_tool")
+
+
+def test_no_false_positives():
+    """没有同步阻塞时只有心跳延迟样本，没有阻塞事件"""
+    async def main():
+        watchdog.on_chain_start({}, {}, run_id=uuid4(), name="LangGraph")
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+
+    watchdog = LoopWatchdog(interval_ms=10, threshold_ms=150, log_blocks=False)
+    asyncio.run(main())
+    report = watchdog.report()
+    assert report["lag"]["samples"] >= 5 and report["blocks"]["count"] == 0
+    print("[PASS] test_no_false_positives")
+
+
+if __name__ == "__main__":
+    test_blocks_attributed_to_node_and_tool()
+    test_no_false_positives()
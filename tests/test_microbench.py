@@ -0,0 +1,67 @@
+"""
+测试热路径微基准：全部基准可在最小规模下运行，基线保存与回退检测
+"""
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.microbench import (
+    BENCHMARKS,
+    compare_results,
+    make_messages,
+    make_patient_info,
+    measure,
+    run_benchmarks,
+    save_results,
+)
+
+
+def test_synthetic_data():
+    info = make_patient_info(100)
+    assert sum(len(v) for k, v in info.items() if k != "base_info") == 100
+    messages = make_messages(30)
+    assert len(messages) == 30 and len({m.id for m in messages}) == 30
+    print("[PASS] 合成患者与消息历史")
+
+
+def test_all_benchmarks_run_at_small_size():
+    results = run_benchmarks(sizes=[10], min_time=0.01, repeat=2)
+    assert "section_store.parse_path[1]" in results
+    assert "patientinfo.upsert_patient_facts[10]" in results
+    assert "reducers.add_messages[10]" in results
+    for metrics in results.values():
+        assert metrics["ops_per_s"] > 0 and metrics["alloc_peak_kb"] >= 0
+    # 除依赖 config.yml 的汇总模块外都应运行
+    expected = {name for name in BENCHMARKS if not name.startswith("summary.")}
+    assert expected <= {key.split("[")[0] for key in results}
+    print("[PASS] 全部基准可运行")
+
+
+def test_measure_tracks_allocations():
+    metrics = measure(lambda: [0] * 100000, min_time=0.01, repeat=2)
+    assert metrics["alloc_peak_kb"] > 700
+    print("[PASS] 峰值分配统计")
+
+
+def test_baseline_compare():
+    baseline = {"a[10]": {"ops_per_s": 1000.0}, "b[10]": {"ops_per_s": 1000.0}}
+    current = {"a[10]": {"ops_per_s": 700.0}, "b[10]": {"ops_per_s": 900.0}, "c[10]": {"ops_per_s": 1.0}}
+    regressions = compare_results(current, baseline, threshold=0.25)
+    assert [r["benchmark"] for r in regressions] == ["a[10]"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "baseline.json"
+        save_results(current, str(path))
+        saved = json.loads(path.read_text(encoding="utf-8"))
+        assert saved["results"] == current and "python" in saved["meta"]
+    print("[PASS] 基线保存与回退检测")
+
+
+if __name__ == "__main__":
+    test_synthetic_data()
+    test_all_benchmarks_run_at_small_size()
+    test_measure_tracks_allocations()
+    test_baseline_compare()
+    print("\n所有测试通过")
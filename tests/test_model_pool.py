@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 LLM 客户端池
+验证相同配置复用实例、同 endpoint 共享 httpx 连接池、不同参数互不复用
+（只构建客户端，不发起网络请求）
+"""
+
+import asyncio
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from DeepRareAgent.utils.model_factory import (
+    clear_llm_pool,
+    create_llm_from_config,
+    get_http_client,
+    get_llm_pool_stats,
+)
+
+
+def _cfg(**overrides):
+    base = dict(
+        provider="openai",
+        model_name="deepseek-chat",
+        base_url="https://api.example.com/v1",
+        api_key="sk-test",
+        temperature=0.1,
+        model_kwargs={"max_tokens": 1024},
+    )
+    base.update(overrides)
+    return SimpleNamespace(**base)
+
+
+def test_same_config_reuses_instance():
+    """测试相同配置返回同一个实例"""
+    clear_llm_pool()
+    a = create_llm_from_config(_cfg())
+    b = create_llm_from_config(_cfg())
+    assert a is b
+    assert get_llm_pool_stats()["llm_reused"] == 1
+
+    c = create_llm_from_config(_cfg(temperature=0.7))
+    assert c is not a, "不同温度不应复用实例"
+    d = create_llm_from_config(_cfg(), use_pool=False)
+    assert d is not a
+    print("[PASS] 实例复用测试通过")
+
+
+def test_endpoint_shares_http_pool():
+    """测试同 endpoint 的不同模型共享 httpx 连接池"""
+    clear_llm_pool()
+    a = create_llm_from_config(_cfg(model_name="model-a"))
+    b = create_llm_from_config(_cfg(model_name="model-b"))
+    other = create_llm_from_config(_cfg(base_url="https://api.other.com/v1"))
+
+    assert a is not b
+    assert a.http_client is b.http_client
+    assert a.http_async_client is b.http_async_client
+    assert other.http_client is not a.http_client
+    assert get_llm_pool_stats()["http_clients"] == 4
+    print("[PASS] 连接池共享测试通过")
+
+
+def test_anthropic_pooled_client():
+    """测试 anthropic provider 同样使用共享连接池"""
+    clear_llm_pool()
+    cfg = _cfg(provider="anthropic", model_name="glm-4-plus",
+               base_url="https://open.bigmodel.cn/api/anthropic", model_kwargs=None)
+    a = create_llm_from_config(cfg)
+    b = create_llm_from_config(cfg)
+    assert a is b
+    shared = get_http_client("anthropic", cfg.base_url, is_async=False)
+    assert a._client._client is shared
+    print("[PASS] Anthropic 连接池测试通过")
+
+
+def test_async_client_survives_new_event_loop():
+    """共享的异步客户端在多次 asyncio.run 之间可用（每个循环各自的连接池）"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    try:
+        clear_llm_pool()
+        client = get_http_client("openai", url, is_async=True)
+
+        async def fetch():
+            return (await client.get(url)).text
+
+        # 第一个循环留下的 keep-alive 连接不会被第二个循环复用
+        assert asyncio.run(fetch()) == "ok"
+        assert asyncio.run(fetch()) == "ok"
+        assert client.loop_client_count <= 2
+        clear_llm_pool()
+        assert client.loop_client_count == 0
+        assert get_http_client("openai", url, is_async=True) is not client
+    finally:
+        server.shutdown()
+    print("[PASS] 异步客户端跨事件循环测试通过")
+
+
+if __name__ == "__main__":
+    test_same_config_reuses_instance()
+    test_endpoint_shares_http_pool()
+    test_anthropic_pooled_client()
+    test_async_client_survives_new_event_loop()
+    print("\n[PASS] 所有客户端池测试通过！")
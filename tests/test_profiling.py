@@ -0,0 +1,117 @@
+"""
+测试按需节点剖析：关闭时零包装，按运行选中，样本按节点归属，输出 speedscope / 折叠栈 / 任务时间线
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+import operator
+from typing import Annotated, Any, Dict
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, START, StateGraph
+from typing_extensions import TypedDict
+
+from DeepRareAgent.utils.profiling import configure_profiling, profile_node
+
+
+class ToyState(TypedDict, total=False):
+    done: Annotated[list, operator.add]
+
+
+def _spin_alpha(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def _spin_beta(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def group_1(state: ToyState, config: RunnableConfig) -> Dict[str, Any]:
+    async def chunk():
+        _spin_alpha(0.05)
+        await asyncio.sleep(0)
+
+    await asyncio.gather(*(chunk() for _ in range(4)))
+    return {"done": ["group_1"]}
+
+
+async def group_2(state: ToyState) -> Dict[str, Any]:
+    for _ in range(4):
+        _spin_beta(0.05)
+        await asyncio.sleep(0)
+    return {"done": ["group_2"]}
+
+
+def summary(state: ToyState) -> Dict[str, Any]:
+    _spin_alpha(0.05)
+    return {}
+
+
+def _build():
+    graph = StateGraph(ToyState)
+    graph.add_node("group_1", profile_node("group_1", group_1))
+    graph.add_node("group_2", profile_node("group_2", group_2))
+    graph.add_node("summary", profile_node("summary", summary))
+    graph.add_edge(START, "group_1")
+    graph.add_edge(START, "group_2")
+    graph.add_edge(["group_1", "group_2"], "summary")
+    graph.add_edge("summary", END)
+    return graph.compile()
+
+
+def test_off_is_zero_cost():
+    configure_profiling({"mode": "off"})
+    assert profile_node("group_1", group_1) is group_1
+    configure_profiling({"mode": "on_demand", "nodes": ["summary"]})
+    assert profile_node("group_1", group_1) is group_1
+    assert profile_node("summary", summary) is not summary
+    configure_profiling(None)
+    print("[PASS] test_off_is_zero_cost")
+
+
+def test_on_demand_profiles_selected_run_only():
+    """只有带 profile=true 的运行写出文件；并发节点的样本互不混入"""
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_profiling({"mode": "on_demand", "output_dir": tmp, "interval_ms": 2})
+        try:
+            graph = _build()
+            asyncio.run(graph.ainvoke({"done": []}, {"configurable": {"thread_id": "quiet"}}))
+            assert not list(Path(tmp).rglob("*"))
+
+            asyncio.run(graph.ainvoke({"done": []}, {"configurable": {"thread_id": "slow-patient", "profile": True}}))
+        finally:
+            configure_profiling(None)
+
+        directory = Path(tmp) / "slow-patient"
+        by_node = {}
+        for path in directory.glob("*.folded"):
+            node = path.name[: -len(".folded")].split("-", 3)[-1]
+            by_node[node] = path.read_text(encoding="utf-8")
+        assert set(by_node) == {"group_1", "group_2", "summary"}
+        assert "_spin_alpha" in by_node["group_1"] and "_spin_beta" not in by_node["group_1"]
+        assert "_spin_beta" in by_node["group_2"] and "_spin_alpha" not in by_node["group_2"]
+        assert "_spin_alpha" in by_node["summary"]  # 同步节点采样其所在线程
+
+        speedscope = json.loads(next(directory.glob("*group_1.speedscope.json")).read_text(encoding="utf-8"))
+        profile = speedscope["profiles"][0]
+        assert profile["type"] == "sampled" and len(profile["samples"]) == len(profile["weights"]) > 0
+        assert all(0 <= i < len(speedscope["shared"]["frames"]) for s in profile["samples"] for i in s)
+
+        timeline = json.loads(next(directory.glob("*group_1.tasks.json")).read_text(encoding="utf-8"))
+        tasks = [e for e in timeline["traceEvents"] if e["cat"] == "task"]
+        assert len(tasks) == 4 and all(e["args"]["finished"] for e in tasks)
+    print("[PASS] test_on_demand_profiles_selected_run_only")
+
+
+if __name__ == "__main__":
+    test_off_is_zero_cost()
+    test_on_demand_profiles_selected_run_only()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 Provider 提示前缀缓存
+验证 Anthropic 请求中的 cache_control 断点、OpenAI 请求保持不变以及命中统计
+（只构建请求体，不发起网络请求）
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain.agents.middleware.types import ModelRequest, ModelResponse
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from DeepRareAgent.utils.model_factory import create_llm_from_config
+from DeepRareAgent.utils.prompt_cache import (
+    PromptCacheMiddleware,
+    get_prompt_cache_stats,
+    record_prompt_cache_usage,
+    reset_prompt_cache_stats,
+)
+
+
+def _model(provider: str):
+    return create_llm_from_config(SimpleNamespace(
+        provider=provider, model_name="test-model", base_url="https://api.example.com",
+        api_key="k", temperature=0.1,
+    ))
+
+
+def _run_middleware(model):
+    captured = {}
+
+    def handler(request):
+        captured["request"] = request
+        return ModelResponse(result=[AIMessage(content="ok")])
+
+    request = ModelRequest(
+        model=model,
+        messages=[HumanMessage(content="患者病例信息..."), AIMessage(content="分析中"), HumanMessage(content="继续")],
+        system_message=SystemMessage(content="你是罕见病专家"),
+        tools=[],
+        tool_choice=None,
+        response_format=None,
+        state={"messages": []},
+        runtime=None,
+    )
+    PromptCacheMiddleware("test_agent").wrap_model_call(request, handler)
+    return captured["request"]
+
+
+def test_anthropic_breakpoints():
+    """测试 Anthropic 模型的系统提示词与最后一条消息带缓存断点"""
+    model = _model("anthropic")
+    request = _run_middleware(model)
+    payload = model._get_request_payload(
+        [request.system_message, *request.messages], **request.model_settings
+    )
+    assert payload["system"][-1]["cache_control"]["type"] == "ephemeral"
+    assert payload["messages"][-1]["content"][-1]["cache_control"]["type"] == "ephemeral"
+    assert "cache_control" not in payload["messages"][0].get("content", [{}])[0]
+    print("[PASS] Anthropic 缓存断点测试通过")
+
+
+def test_openai_request_untouched():
+    """测试 OpenAI 兼容模型不修改请求（依赖自动前缀缓存）"""
+    request = _run_middleware(_model("openai"))
+    assert request.system_message.content == "你是罕见病专家"
+    assert "cache_control" not in request.model_settings
+    print("[PASS] OpenAI 请求保持不变测试通过")
+
+
+def test_cache_hit_accounting():
+    """测试缓存命中 token 统计"""
+    reset_prompt_cache_stats()
+    usage = {
+        "input_tokens": 1000, "output_tokens": 10, "total_tokens": 1010,
+        "input_token_details": {"cache_read": 800, "cache_creation": 0},
+    }
+    current = record_prompt_cache_usage("expert", [AIMessage(content="ok", usage_metadata=usage)])
+    assert current["cache_read"] == 800
+    stats = get_prompt_cache_stats()["expert"]
+    assert stats["calls"] == 1 and stats["hit_ratio"] == 0.8
+    print("[PASS] 缓存命中统计测试通过")
+
+
+if __name__ == "__main__":
+    test_anthropic_breakpoints()
+    test_openai_request_untouched()
+    test_cache_hit_accounting()
+    print("\n[PASS] 所有提示前缀缓存测试通过！")
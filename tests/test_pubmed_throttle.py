@@ -0,0 +1,74 @@
+"""
+测试 PubMed 工具对 NCBI 正式地址的限速：无 API Key 3 次/秒，NCBI_API_KEY 随请求携带并放宽到 10 次/秒
+"""
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import DeepRareAgent.tools.pubmed_tools as pubmed_tools
+
+
+class _FakeResponse:
+    def raise_for_status(self):
+        pass
+
+
+def _capture_requests(monkeypatch):
+    sent = []
+
+    def fake_get(url, params=None, timeout=None):
+        sent.append((time.monotonic(), url, dict(params or {})))
+        return _FakeResponse()
+
+    monkeypatch.setattr(pubmed_tools.requests, "get", fake_get)
+    monkeypatch.setattr(pubmed_tools, "_ncbi_throttle", pubmed_tools._RequestThrottle())
+    return sent
+
+
+def _burst(count):
+    threads = [threading.Thread(target=pubmed_tools._eutils_get, args=("esearch", {"term": "x"}))
+               for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_live_url_throttled_without_key(monkeypatch):
+    """并发请求 NCBI 正式地址时间隔不小于 1/3 秒"""
+    monkeypatch.delenv("NCBI_EUTILS_BASE_URL", raising=False)
+    monkeypatch.delenv("NCBI_API_KEY", raising=False)
+    sent = _capture_requests(monkeypatch)
+    _burst(4)
+    times = sorted(t for t, _, _ in sent)
+    assert len(times) == 4 and times[-1] - times[0] >= 0.9
+    assert all("api_key" not in params for _, _, params in sent)
+    print("[PASS] test_live_url_throttled_without_key")
+
+
+def test_api_key_and_stub_url(monkeypatch):
+    """有 API Key 时携带 api_key、限速放宽；替身服务地址不限速"""
+    monkeypatch.delenv("NCBI_EUTILS_BASE_URL", raising=False)
+    monkeypatch.setenv("NCBI_API_KEY", "k-123")
+    sent = _capture_requests(monkeypatch)
+    _burst(4)
+    times = sorted(t for t, _, _ in sent)
+    assert 0.25 <= times[-1] - times[0] < 0.9
+    assert all(params["api_key"] == "k-123" for _, _, params in sent)
+
+    monkeypatch.setenv("NCBI_EUTILS_BASE_URL", "http://127.0.0.1:9/eutils")
+    sent.clear()
+    started = time.monotonic()
+    _burst(4)
+    assert time.monotonic() - started < 0.25 and all("api_key" not in p for _, _, p in sent)
+    print("[PASS] test_api_key_and_stub_url")
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试近似重复查询缓存 (MinHash/LSH)
+验证归一化、近似命中、分区隔离、装饰器复用与 LRU 淘汰
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from DeepRareAgent.utils.query_cache import (
+    NearDuplicateQueryCache,
+    jaccard_similarity,
+    near_duplicate_cached,
+    normalize_query_tokens,
+)
+import DeepRareAgent.utils.query_cache as query_cache_module
+
+
+def test_normalize_query_tokens():
+    """测试查询归一化：大小写、语序、停用词、复数"""
+    a = normalize_query_tokens("Fabry disease GLA mutation")
+    b = normalize_query_tokens("GLA mutations in the Fabry Disease")
+    assert a == b, f"归一化结果应一致: {a} vs {b}"
+
+    zh = normalize_query_tokens("法布雷病")
+    assert zh == {"法布", "布雷", "雷病"}
+    print("[PASS] 归一化测试通过")
+
+
+def test_near_duplicate_hit():
+    """测试近似查询命中与不相关查询未命中"""
+    cache = NearDuplicateQueryCache(threshold=0.7)
+    cache.store("search_pubmed", "Fabry disease GLA mutation", ["PMID:1"])
+
+    hit = cache.lookup("search_pubmed", "GLA mutation Fabry disease diagnosis")
+    assert hit is not None, "近似查询应命中"
+    assert hit.result == ["PMID:1"]
+    assert abs(hit.similarity - jaccard_similarity(
+        normalize_query_tokens("Fabry disease GLA mutation"),
+        normalize_query_tokens("GLA mutation Fabry disease diagnosis"),
+    )) < 1e-9
+
+    assert cache.lookup("search_pubmed", "Retinitis pigmentosa gene therapy") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    print(f"[PASS] 近似命中测试通过 (similarity={hit.similarity:.2f})")
+
+
+def test_partition_isolation():
+    """测试不同工具/参数之间互不复用"""
+    cache = NearDuplicateQueryCache(threshold=0.7)
+    cache.store("search_pubmed", "Fabry disease", "pubmed-3", params={"max_results": 3})
+
+    assert cache.lookup("lit_sense_search", "Fabry disease") is None
+    assert cache.lookup("search_pubmed", "Fabry disease", params={"max_results": 5}) is None
+    assert cache.lookup("search_pubmed", "fabry diseases", params={"max_results": 3}) is not None
+    print("[PASS] 分区隔离测试通过")
+
+
+def test_lru_eviction():
+    """测试超过容量后淘汰最久未使用的条目"""
+    cache = NearDuplicateQueryCache(threshold=0.9, max_entries=2)
+    cache.store("ns", "alpha beta", 1)
+    cache.store("ns", "gamma delta", 2)
+    assert cache.lookup("ns", "alpha beta") is not None  # 刷新 alpha beta
+    cache.store("ns", "epsilon zeta", 3)
+
+    assert cache.lookup("ns", "gamma delta") is None
+    assert cache.lookup("ns", "alpha beta") is not None
+    assert cache.stats()["evictions"] == 1
+    print("[PASS] LRU 淘汰测试通过")
+
+
+def test_decorator_reuses_cached_copy():
+    """测试装饰器：近似命中时不调用底层函数，直接返回缓存结果的副本"""
+    query_cache_module._query_cache = NearDuplicateQueryCache(threshold=0.7)
+    query_cache_module._query_cache_enabled = True
+
+    calls = []
+
+    @near_duplicate_cached("fake_search", param_args=("max_results",))
+    def fake_search(query: str, max_results: int = 3):
+        calls.append((query, max_results))
+        return [f"{query}#{i}" for i in range(max_results)]
+
+    try:
+        first = fake_search("Fabry disease GLA mutation")
+        assert len(first) == 3
+        assert fake_search("GLA mutation Fabry disease diagnosis") == first
+        assert len(calls) == 1
+
+        # 返回的是副本，调用方的修改不会写回缓存
+        again = fake_search("fabry disease gla mutation")
+        assert len(calls) == 1
+        again.append("调用方的修改")
+        assert "调用方的修改" not in fake_search("fabry disease gla mutation")
+    finally:
+        query_cache_module._query_cache = None
+        query_cache_module._query_cache_enabled = None
+    print("[PASS] 装饰器复用测试通过")
+
+
+if __name__ == "__main__":
+    test_normalize_query_tokens()
+    test_near_duplicate_hit()
+    test_partition_isolation()
+    test_lru_eviction()
+    test_decorator_reuses_cached_copy()
+    print("\n[PASS] 所有近似缓存测试通过！")
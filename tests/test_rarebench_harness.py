@@ -0,0 +1,147 @@
+"""
+测试 RareBench 评测脚本：病例读取、诊断提取、名次匹配与并发执行
+"""
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from benchmarks.run_rarebench import (
+    evaluate_agent,
+    extract_ranked_diagnoses,
+    iter_cases,
+    match_rank,
+    summarize,
+)
+from DeepRareAgent.schema import MainGraphState
+from DeepRareAgent.utils.fake_llm import FakeChatModel
+
+DEFAULT_REPORT = """# 罕见病诊断报告
+
+## 二、临床诊断
+
+### 主要诊断
+
+**Dravet 综合征**（Dravet syndrome，OMIM #607208）
+
+**诊断依据**：
+1. 婴儿期起病的热性惊厥
+
+### 需要鉴别的疾病
+
+1. **Angelman 综合征**：同样表现为癫痫与发育迟缓
+2. **Rett 综合征**：女性患儿需鉴别
+
+---
+"""
+
+RANKED_REPORT = """## 诊断意见
+略
+
+## 候选诊断排序
+1. Angelman syndrome（OMIM:105830）
+2. Dravet syndrome（OMIM:607208）
+3. Rett syndrome: 女性多见
+"""
+
+
+def test_extract_and_match():
+    ranked = extract_ranked_diagnoses(DEFAULT_REPORT)
+    assert ranked == ["Dravet 综合征（Dravet syndrome，OMIM #607208）", "Angelman 综合征", "Rett 综合征"]
+    assert match_rank(ranked, ["OMIM:607208"]) == 1
+
+    ranked = extract_ranked_diagnoses(RANKED_REPORT)
+    assert ranked == ["Angelman syndrome（OMIM:105830）", "Dravet syndrome（OMIM:607208）", "Rett syndrome"]
+    assert match_rank(ranked, ["ORPHA:33069", "Dravet Syndrome"]) == 2
+    assert match_rank(ranked, ["Rett syndrome"]) == 3
+    assert match_rank(ranked, ["OMIM:176270"]) is None
+    print("[PASS] 诊断提取与名次匹配")
+
+
+def test_iter_cases_formats():
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl = Path(tmp) / "cases.jsonl"
+        jsonl.write_text(
+            json.dumps({"id": 7, "Phenotype": ["HP:0001250"], "RareDisease": ["OMIM:607208"], "Department": "Neurology"})
+            + "\n\n",
+            encoding="utf-8",
+        )
+        cases = list(iter_cases(str(jsonl)))
+        assert cases[0]["case_id"] == "7"
+        assert cases[0]["gold"] == ["OMIM:607208"]
+        assert "HP:0001250" in cases[0]["description"]
+        assert cases[0]["category"] == "Neurology"
+
+        as_json = Path(tmp) / "cases.json"
+        as_json.write_text(json.dumps({"cases": [{"case_id": "a", "gold_standard_disease": "Rett syndrome"}]}), encoding="utf-8")
+        assert list(iter_cases(str(as_json)))[0]["gold"] == ["Rett syndrome"]
+    print("[PASS] 病例读取")
+
+
+@tool
+def lookup_hpo(hpo_id: str) -> str:
+    """查询 HPO 术语"""
+    return hpo_id
+
+
+def _toy_graph(concurrency_probe):
+    """与主图拓扑一致的最小图：prediagnosis -> (start_diagnosis) -> summary"""
+    llm = FakeChatModel(default_response=RANKED_REPORT, latency_ms=30, output_tokens=50)
+
+    async def prediagnosis(state):
+        raise AssertionError("评测时应跳过预诊断")
+
+    async def summary(state, config):
+        concurrency_probe["now"] += 1
+        concurrency_probe["max"] = max(concurrency_probe["max"], concurrency_probe["now"])
+        await lookup_hpo.ainvoke({"hpo_id": "HP:0001250"}, config)
+        report = await llm.ainvoke([HumanMessage(content=state["summary_with_dialogue"])], config)
+        concurrency_probe["now"] -= 1
+        return {"final_report": report.content}
+
+    workflow = StateGraph(MainGraphState)
+    workflow.add_node("prediagnosis", prediagnosis)
+    workflow.add_node("summary", summary)
+    workflow.add_edge(START, "prediagnosis")
+    workflow.add_conditional_edges("prediagnosis", lambda s: "summary" if s.get("start_diagnosis") else END)
+    workflow.add_edge("summary", END)
+    return workflow.compile(checkpointer=InMemorySaver())
+
+
+def test_evaluate_concurrently():
+    probe = {"now": 0, "max": 0}
+    graph = _toy_graph(probe)
+    cases = (
+        {"case_id": str(i), "phenotypes": [], "description": f"病例 {i}", "gold": [gold], "category": None}
+        for i, gold in enumerate(["OMIM:105830", "OMIM:607208", "OMIM:176270"] * 3)
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "results.jsonl"
+        results = asyncio.run(evaluate_agent(graph, cases, concurrency=2, output_path=str(output)))
+        assert len(output.read_text(encoding="utf-8").splitlines()) == 9
+
+    assert probe["max"] == 2
+    assert all(r["error"] is None for r in results)
+    assert all(r["llm_calls"] == 1 and r["output_tokens"] == 50 and r["tool_calls"] == 1 for r in results)
+    summary = summarize(results)
+    assert abs(summary["top1"] - 1 / 3) < 1e-9
+    assert abs(summary["top3"] - 2 / 3) < 1e-9
+    assert summary["top10"] == summary["top3"]
+    # 病例结束后删除检查点线程
+    assert not list(graph.checkpointer.list(None))
+    print("[PASS] 并发评测")
+
+
+if __name__ == "__main__":
+    test_extract_and_match()
+    test_iter_cases_formats()
+    test_evaluate_concurrently()
+    print("\n所有测试通过")
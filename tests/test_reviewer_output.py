@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+测试专家互审结论的解析：tool / json_schema 结构化输出、schema 校验失败的兜底、
+正文解析回退与 coerce_bool（离线 fake 模型）
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import HumanMessage
+
+from DeepRareAgent.utils.fake_llm import FakeChatModel
+
+_CONFIG = {
+    "multi_expert_diagnosis_agent": {"group_1": {"main_agent": {"provider": "fake"}}},
+    "mdt_config": {"reviewer_output_mode": "tool"},
+    "llm_cache": {"enabled": False},
+}
+
+
+@pytest.fixture(autouse=True)
+def fake_settings(monkeypatch, tmp_path):
+    """就地替换进程级 settings 的内容（各模块顶层导入的是同一对象），测试结束后恢复"""
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(yaml.safe_dump(_CONFIG, allow_unicode=True), encoding="utf-8")
+    monkeypatch.setenv("DEEPRARE_CONFIG_PATH", str(config_file))
+    from DeepRareAgent.config import settings
+    from DeepRareAgent.config.loader import ConfigObject, cfg_loader
+
+    original = dict(settings.__dict__)
+    settings.__dict__.clear()
+    settings.__dict__.update(ConfigObject(_CONFIG, cfg_loader.project_root).__dict__)
+    yield settings
+    settings.__dict__.clear()
+    settings.__dict__.update(original)
+
+
+def _review(monkeypatch, settings, mode, model):
+    """以指定输出方式对 group_1 跑一次互审"""
+    import DeepRareAgent.p02_mdt.export_reviewer_node as reviewer
+
+    settings.mdt_config.reviewer_output_mode = mode
+    monkeypatch.setattr(reviewer, "create_llm_from_config", lambda cfg: model)
+    expert = {"group_id": "group_1", "messages": [HumanMessage(content="请审核其他专家的报告")]}
+    return asyncio.run(reviewer.process_single_expert_review("group_1", expert))
+
+
+def test_normalize_verdict():
+    """字符串 / 数字形式的布尔值、非字符串的原因、非对象输入"""
+    from DeepRareAgent.p02_mdt.export_reviewer_node import ReviewVerdict, normalize_verdict
+
+    assert normalize_verdict({"is_satisfied": "是"}) == {"is_satisfied": True, "reinvestigate_reason": ""}
+    assert normalize_verdict({"is_satisfied": "False", "reinvestigate_reason": None})["is_satisfied"] is False
+    assert normalize_verdict({"is_satisfied": 1})["is_satisfied"] is True
+    assert normalize_verdict({"is_satisfied": "不确定"})["is_satisfied"] is False
+    assert normalize_verdict({})["is_satisfied"] is False
+    verdict = normalize_verdict({"is_satisfied": False, "reinvestigate_reason": ["补充基因检测", "复查 EEG"]})
+    assert json.loads(verdict["reinvestigate_reason"]) == ["补充基因检测", "复查 EEG"]
+    assert normalize_verdict(ReviewVerdict(is_satisfied=True)) == {"is_satisfied": True, "reinvestigate_reason": ""}
+    with pytest.raises(ValueError):
+        normalize_verdict(["is_satisfied", True])
+    print("[PASS] 审核结论规范化")
+
+
+@pytest.mark.parametrize("mode", ["tool", "json_schema"])
+def test_structured_modes(monkeypatch, fake_settings, mode):
+    """结构化输出：结论来自工具调用，追加到专家消息的是不带 tool_calls 的纯文本回复"""
+    model = FakeChatModel(default_response='{"is_satisfied": false, "reinvestigate_reason": "需要补充基因检测"}')
+    group_id, result, response = _review(monkeypatch, fake_settings, mode, model)
+    assert group_id == "group_1"
+    assert result == {"is_satisfied": False, "reinvestigate_reason": "需要补充基因检测"}
+    assert not response.tool_calls and json.loads(response.content) == result
+    assert response.usage_metadata["input_tokens"] > 0
+    print(f"[PASS] 结构化审核结论 ({mode})")
+
+
+def test_schema_failure_uses_tool_args(monkeypatch, fake_settings):
+    """"是" 通不过 ReviewVerdict 的 bool 校验时，退回工具参数并经 coerce_bool 规范化"""
+    model = FakeChatModel(default_response='{"is_satisfied": "是", "reinvestigate_reason": ""}')
+    _, result, response = _review(monkeypatch, fake_settings, "tool", model)
+    assert result == {"is_satisfied": True, "reinvestigate_reason": ""}
+    assert not response.tool_calls
+    print("[PASS] schema 校验失败时使用工具参数")
+
+
+def test_text_mode_and_fallback(monkeypatch, fake_settings):
+    """text 方式从正文解析；结构化输出失败时退回正文解析；都失败时返回 has_error"""
+    fenced = '审核意见如下:\n```json\n{"is_satisfied": "true", "reinvestigate_reason": ""}\n```'
+    _, result, response = _review(monkeypatch, fake_settings, "text", FakeChatModel(default_response=fenced))
+    assert result == {"is_satisfied": True, "reinvestigate_reason": ""}
+    assert response.content == fenced
+
+    # 第一次（强制工具调用）只回了正文 -> 结构化解析失败，第二次按正文解析
+    model = FakeChatModel(responses=["我认为报告没有冲突", '{"is_satisfied": "满意"}'])
+    _, result, response = _review(monkeypatch, fake_settings, "tool", model)
+    assert result == {"is_satisfied": True, "reinvestigate_reason": ""}
+    assert response.content == '{"is_satisfied": "满意"}'
+
+    model = FakeChatModel(default_response="无法给出结论")
+    _, result, response = _review(monkeypatch, fake_settings, "tool", model)
+    assert result["has_error"] and result["is_satisfied"] is False and response is None
+    print("[PASS] 正文解析与回退")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
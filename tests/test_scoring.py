@@ -0,0 +1,103 @@
+"""
+测试本体感知的向量化评分
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.scoring import DiseaseOntology, encode_results, score_results
+
+OBO = """format-version: 1.2
+
+[Term]
+id: MONDO:0000001
+name: epilepsy
+
+[Term]
+id: MONDO:0100135
+name: Dravet syndrome
+synonym: "severe myoclonic epilepsy of infancy" EXACT []
+xref: OMIM:607208 {source="MONDO:equivalentTo"}
+xref: Orphanet:33069 {source="MONDO:equivalentTo"}
+xref: OMIM:182389 {source="MONDO:relatedTo"}
+is_a: MONDO:0000001 ! epilepsy
+
+[Term]
+id: MONDO:0011100
+name: generalized epilepsy with febrile seizures plus
+xref: OMIM:604233 {source="MONDO:equivalentTo"}
+is_a: MONDO:0000001 ! epilepsy
+
+[Typedef]
+id: part_of
+name: part of
+"""
+
+
+def _ontology():
+    with tempfile.NamedTemporaryFile("w", suffix=".obo", delete=False, encoding="utf-8") as f:
+        f.write(OBO)
+    return DiseaseOntology.from_obo(f.name)
+
+
+def test_canonical_ids():
+    ontology = _ontology()
+    assert ontology.resolve("OMIM:607208") == ["MONDO:0100135"]
+    assert ontology.resolve("Dravet syndrome (ORPHA:33069)") == ["MONDO:0100135"]
+    assert ontology.resolve("Severe myoclonic epilepsy of infancy") == ["MONDO:0100135"]
+    # relatedTo 不是等价关系
+    assert ontology.resolve("OMIM:182389") == ["OMIM:182389"]
+    assert ontology.resolve("Some disease (OMIM:1)") == ["OMIM:1", "name:some disease"]
+    print("[PASS] 编号 / 名称归一到规范编号")
+
+
+def test_rank_metrics_and_partial_credit():
+    results = [
+        # ORPHA 预测命中 OMIM 金标准（精确匹配会漏掉）
+        {"predictions": ["Epilepsy", "Dravet syndrome (ORPHA:33069)"], "gold": ["OMIM:607208"], "category": "neuro"},
+        # 兄弟疾病：距离 2 -> 0.25 分；父类：距离 1 -> 0.5 分
+        {"predictions": ["GEFS+ (OMIM:604233)", "MONDO:0000001"], "gold": ["Dravet syndrome"], "category": "neuro"},
+        {"predictions": [], "gold": ["OMIM:100100"], "category": "renal", "error": "timeout after 1s"},
+    ]
+    scores = score_results(results, _ontology(), ks=(1, 3))
+    assert scores["cases"] == 3
+    assert scores["top1"] == 0.0 and scores["top3"] == round(1 / 3, 4)
+    assert scores["mrr"] == round(0.5 / 3, 4)
+    assert scores["partial@1"] == round((0.5 + 0.25) / 3, 4)
+    assert scores["partial@3"] == round((1 + 0.5) / 3, 4)
+    assert scores["by_category"]["neuro"]["top3"] == 0.5
+    assert scores["by_category"]["renal"] == {"cases": 1, "top1": 0.0, "top3": 0.0, "mrr": 0.0,
+                                             "partial@1": 0.0, "partial@3": 0.0}
+
+    # 无本体时退化为编号 / 名称精确匹配
+    plain = score_results([{"predictions": ["Dravet syndrome (OMIM:607208)"], "gold": ["Dravet syndrome"]}], ks=(1,))
+    assert plain["top1"] == 1.0
+    print("[PASS] Top-k / MRR / 部分得分 / 类别切片")
+
+
+def test_10k_cases_under_a_second():
+    ontology = _ontology()
+    rng = random.Random(0)
+    pool = [f"OMIM:{600000 + i}" for i in range(2000)] + ["OMIM:607208", "ORPHA:33069", "Dravet syndrome"]
+    results = [
+        {"predictions": rng.sample(pool, 10), "gold": [rng.choice(pool)], "category": f"c{i % 7}"}
+        for i in range(10000)
+    ]
+    started = time.perf_counter()
+    scores = score_results(results, ontology)
+    elapsed = time.perf_counter() - started
+    assert scores["cases"] == 10000 and len(scores["by_category"]) == 7
+    assert encode_results(results[:5], ontology).predictions.shape == (5, 10)
+    assert elapsed < 1.0, elapsed
+    print(f"[PASS] 10k 病例评分耗时 {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    test_canonical_ids()
+    test_rank_metrics_and_partial_credit()
+    test_10k_cases_under_a_second()
+    print("\n所有测试通过")
@@ -0,0 +1,111 @@
+"""
+测试分片、可续跑的评测执行与结果合并
+"""
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from benchmarks.run_rarebench import evaluate_agent
+from benchmarks.sharding import (
+    completed_case_ids,
+    merge_shards,
+    read_results,
+    run_sharded,
+    shard_of,
+    shard_path,
+)
+from DeepRareAgent.schema import MainGraphState
+
+FACTORY = "test_sharding:build_toy_graph"
+
+
+def build_toy_graph():
+    """工作进程中构建的最小图：summary 直接按描述给出排序诊断"""
+
+    async def prediagnosis(state):
+        return {}
+
+    async def summary(state):
+        gold = state["summary_with_dialogue"].split()[-1]
+        return {"final_report": f"## 候选诊断排序\n1. {gold}\n", "messages": [AIMessage(content="done")]}
+
+    workflow = StateGraph(MainGraphState)
+    workflow.add_node("prediagnosis", prediagnosis)
+    workflow.add_node("summary", summary)
+    workflow.add_edge(START, "prediagnosis")
+    workflow.add_conditional_edges("prediagnosis", lambda s: "summary" if s.get("start_diagnosis") else END)
+    workflow.add_edge("summary", END)
+    return workflow.compile(checkpointer=InMemorySaver())
+
+
+def _write_cases(path: Path, n: int) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            gold = f"OMIM:{600000 + i}"
+            f.write(json.dumps({"case_id": f"c{i}", "description": f"病例 {gold}", "gold": gold}) + "\n")
+
+
+def test_shard_assignment_is_stable():
+    assert shard_of("case-42", 8) == shard_of("case-42", 8)
+    assert {shard_of(f"c{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+    print("[PASS] 稳定分片")
+
+
+def test_run_resume_and_merge():
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = Path(tmp) / "cases.jsonl"
+        out = Path(tmp) / "run"
+        _write_cases(cases, 12)
+
+        reports = run_sharded(str(cases), 3, str(out), workers=2, concurrency=2, graph_factory=FACTORY)
+        assert sum(r["ran"] for r in reports) == 12
+        # 分片数多于进程数时每个分片仍在新进程中运行（不复用上一个分片的事件循环与连接池）
+        assert len({r["pid"] for r in reports}) == 3
+
+        # 模拟崩溃：分片 0 的最后一条结果只写了一半（没有换行结尾），另有一条结果出错
+        path = shard_path(str(out), 0, 3)
+        lines = path.read_text(encoding="utf-8").splitlines()
+        shard_cases = {json.loads(line)["case_id"] for line in lines}
+        broken = json.loads(lines[0])
+        broken["error"] = "timeout after 1s"
+        path.write_text("\n".join([json.dumps(broken)] + lines[1:-1] + [lines[-1][:10]]), encoding="utf-8")
+
+        reports = run_sharded(str(cases), 3, str(out), workers=2, concurrency=2, graph_factory=FACTORY)
+        ran = {r["shard"]: r["ran"] for r in reports}
+        assert ran == {0: 2, 1: 0, 2: 0}
+        # 续跑的两条结果各占一行，都计为完成
+        assert completed_case_ids(path) == shard_cases
+
+        results = merge_shards(str(out))
+        assert len(results) == 12
+        assert all(r["error"] is None and r["rank"] == 1 for r in results)
+        summary = json.loads((out / "summary.json").read_text(encoding="utf-8"))
+        assert summary["cases"] == 12 and summary["top1"] == 1.0
+        assert len(list(read_results(out / "results.jsonl"))) == 12
+    print("[PASS] 分片运行、续跑与合并")
+
+
+def test_append_after_partial_line():
+    """直接用 evaluate_agent 续写末行不完整的结果文件时，新结果另起一行"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "results.jsonl"
+        path.write_text(json.dumps({"case_id": "a", "error": None}) + "\n" + '{"case_id": "x', encoding="utf-8")
+        case = {"case_id": "b", "description": "病例", "gold": "OMIM:600001"}
+        asyncio.run(evaluate_agent(build_toy_graph(), [case], output_path=str(path)))
+        assert [r["case_id"] for r in read_results(path)] == ["a", "b"]
+    print("[PASS] 不完整末行之后追加")
+
+
+if __name__ == "__main__":
+    test_shard_assignment_is_stable()
+    test_run_resume_and_merge()
+    test_append_after_partial_line()
+    print("\n所有测试通过")
@@ -0,0 +1,152 @@
+"""
+测试状态体积监测：每超步测一次、按字段 / 子键统计、写入 span、按图层汇总增长与阈值警告
+"""
+import asyncio
+import json
+import operator
+import sys
+import tempfile
+from pathlib import Path
+from typing import Annotated, Any, Dict
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from DeepRareAgent.utils.state_size import StateSizeMonitor, build_state_size_monitor, measure_state
+from DeepRareAgent.utils.tracing import InMemorySpanExporter, SpanTracer
+
+
+class ToyState(TypedDict, total=False):
+    messages: Annotated[list, add_messages]
+    expert_pool: Annotated[Dict[str, Any], operator.ior]
+    round_count: int
+
+
+def build_toy_graph():
+    """prediagnosis -> mdt_diagnosis 子图（fan_out -> group_1 / group_2 并行 -> expert_review，两轮）"""
+    def prediagnosis(state):
+        return {"messages": [AIMessage(content="初步印象：肌无力")]}
+
+    def fan_out(state):
+        return {}
+
+    def group(name):
+        def node(state):
+            report = "证据" * 200 if name == "group_1" else "证据"
+            return {"expert_pool": {name: {"report": report, "evidences": [report]}}}
+        return node
+
+    def expert_review(state):
+        return {"round_count": state["round_count"] + 1, "messages": [AIMessage(content="第一轮结论")]}
+
+    def route(state):
+        return "again" if state["round_count"] < 2 else "done"
+
+    sub = StateGraph(ToyState)
+    sub.add_node("fan_out", fan_out)
+    sub.add_node("group_1", group("group_1"))
+    sub.add_node("group_2", group("group_2"))
+    sub.add_node("expert_review", expert_review)
+    sub.add_edge(START, "fan_out")
+    sub.add_edge("fan_out", "group_1")
+    sub.add_edge("fan_out", "group_2")
+    sub.add_edge(["group_1", "group_2"], "expert_review")
+    sub.add_conditional_edges("expert_review", route, {"again": "fan_out", "done": END})
+
+    main = StateGraph(ToyState)
+    main.add_node("prediagnosis", prediagnosis)
+    main.add_node("mdt_diagnosis", sub.compile())
+    main.add_edge(START, "prediagnosis")
+    main.add_edge("prediagnosis", "mdt_diagnosis")
+    main.add_edge("mdt_diagnosis", END)
+    return main.compile()
+
+
+def _run(callbacks, thread_id="t-1"):
+    config = {"callbacks": callbacks, "configurable": {"thread_id": thread_id}}
+    state = {"messages": [HumanMessage(content="孩子走路不稳")], "expert_pool": {}, "round_count": 0}
+    return asyncio.run(build_toy_graph().ainvoke(state, config))
+
+
+def test_measure_state():
+    sizes = measure_state({
+        "messages": [HumanMessage(content="你好"), AIMessage(content="hello world")],
+        "expert_pool": {"group_1": {"report": "报告" * 10}},
+        "round_count": 1,
+    })
+    assert sizes["messages"]["messages"] == 2 and sizes["messages"]["bytes"] > 0
+    assert sizes["expert_pool.group_1"]["tokens"] == 20
+    assert sizes["expert_pool"]["bytes"] == sizes["expert_pool.group_1"]["bytes"]
+    assert sizes["round_count"] == {"bytes": sizes["round_count"]["bytes"], "messages": 0, "tokens": 0}
+    print("[PASS] test_measure_state")
+
+
+def test_snapshots_spans_and_summary():
+    """并行节点同一超步只测一次；span 带字段大小；汇总按图层给出增长与归属"""
+    memory = InMemorySpanExporter()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "state_size.jsonl"
+        monitor = StateSizeMonitor(jsonl_path=str(path))
+        _run([SpanTracer([memory]), monitor])
+        monitor.close()
+        lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+    # 主图: prediagnosis、mdt_diagnosis 两个超步 + 最终状态
+    main_lines = [l for l in lines if l["layer"] == "main"]
+    assert [l["step"] for l in main_lines] == [1, 2, "final"]
+    # 子图每轮: fan_out、group_1+group_2（只测一次）、expert_review，两轮 + 最终状态
+    mdt_lines = [l for l in lines if l["layer"] == "mdt_diagnosis"]
+    assert len(mdt_lines) == 7
+    assert mdt_lines[2]["after"] == "group_1,group_2"
+
+    measured = [s for s in memory.spans if "state_total_bytes" in s["attributes"]]
+    assert len(measured) == len(lines) - 2  # 最终状态不对应节点 span
+    group_spans = [s for s in measured if s["name"] in ("group_1", "group_2")]
+    assert len(group_spans) == 2  # 每轮一个
+    review = next(s for s in measured if s["name"] == "expert_review")
+    assert review["attributes"]["state_bytes.expert_pool"] > review["attributes"]["state_bytes.messages"] > 0
+    assert review["attributes"]["state_messages.messages"] == 2
+
+    summary = monitor.thread_summary("t-1")
+    assert set(summary) == {"main", "mdt_diagnosis"}
+    mdt = summary["mdt_diagnosis"]
+    assert mdt["snapshots"] == 7 and mdt["peak_total_bytes"] == mdt["last_total_bytes"]
+    assert mdt["last"]["expert_pool.group_1"]["bytes"] > mdt["last"]["expert_pool.group_2"]["bytes"]
+    assert mdt["growth_by_node"]["group_1,group_2"]["expert_pool"] == mdt["growth"]["expert_pool"] > 0
+    assert summary["main"]["growth"]["messages"] > 0
+    assert monitor.thread_summary("unknown") == {}
+    print("[PASS] test_snapshots_spans_and_summary")
+
+
+def test_depth_and_warnings():
+    """max_depth=1 只测主图；阈值每个线程每个字段只警告一次"""
+    monitor = StateSizeMonitor(max_depth=1, warn_key_tokens=100)
+    _run([monitor])
+    assert set(monitor.thread_summary("t-1")) == {"main"}
+    assert len(monitor._warned) == 2  # main.expert_pool 与 main.expert_pool.group_1
+    _run([monitor])
+    assert len(monitor._warned) == 2
+    print("[PASS] test_depth_and_warnings")
+
+
+def test_directory_jsonl_path_is_ignored():
+    """配置中留空的 jsonl_path 被加载器解析成项目根目录：不写 JSONL，阈值警告照常"""
+    assert build_state_size_monitor({"enabled": False}) is None
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor = build_state_size_monitor({"enabled": True, "jsonl_path": tmp, "warn_key_tokens": 100})
+        assert monitor.jsonl_path is None
+        _run([monitor])
+        assert ("t-1", "main", "expert_pool", "tokens") in monitor._warned
+        assert not list(Path(tmp).iterdir())
+    print("[PASS] test_directory_jsonl_path_is_ignored")
+
+
+if __name__ == "__main__":
+    test_measure_state()
+    test_snapshots_spans_and_summary()
+    test_depth_and_warnings()
+    test_directory_jsonl_path_is_ignored()
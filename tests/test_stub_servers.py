@@ -0,0 +1,110 @@
+"""
+测试外部 API 替身服务，以及工具通过 base URL 环境变量指向替身服务
+"""
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+
+from benchmarks.stub_servers import StubServerConfig, StubServerThread
+
+
+@contextmanager
+def _tool_env(server):
+    saved = {k: os.environ.get(k) for k in server.env()}
+    os.environ.update(server.env())
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def test_tools_against_stub():
+    """HPO / PubMed / LitSense 工具经由替身服务返回夹具数据"""
+    from DeepRareAgent.tools.hpo_tools import hpo_to_diseases_tool, phenotype_to_hpo_tool
+    from DeepRareAgent.tools.litsense_tool import lit_sense_search
+    from DeepRareAgent.tools.pubmed_tools import search_pubmed
+
+    with StubServerThread() as server, _tool_env(server):
+        terms = phenotype_to_hpo_tool.invoke({"phenotypes": ["癫痫发作", "夜盲"], "top_k": 3})
+        assert [t.id for t in terms.results] == ["HP:0001250", "HP:0000662"]
+
+        diseases = hpo_to_diseases_tool.invoke({"hpo_ids": ["HP:0001250", "HP:0001263"], "top_k": 3})
+        assert diseases.diseases[0].count == 2
+        assert {d.name for d in diseases.diseases[:2]} == {"Angelman syndrome", "Rett syndrome"}
+
+        articles = search_pubmed.invoke({"query": "Dravet syndrome SCN1A stub", "max_results": 3})
+        assert len(articles.items) == 3
+        assert articles.items[0].pmid == "28494777"
+        assert articles.items[0].journal == "Epilepsia"
+
+        snippets = lit_sense_search.invoke({"query": "UBE3A Angelman stub"})
+        assert snippets["error"] is None
+        assert snippets["results"][0]["pmid"] == 24126612
+
+        assert server.stats["hpo_annotation"]["requests"] == 2
+        assert server.stats["efetch"]["requests"] == 1
+    print("[PASS] 工具指向替身服务")
+
+
+def test_pubmed_near_duplicate_hit():
+    """PubMed 近似命中直接返回缓存结果的副本：不再请求 E-utilities，条数不超过 max_results"""
+    from DeepRareAgent.tools.pubmed_tools import search_pubmed
+
+    with StubServerThread() as server, _tool_env(server):
+        first = search_pubmed.invoke({"query": "Dravet syndrome SCN1A epilepsy", "max_results": 2})
+        near = search_pubmed.invoke({"query": "SCN1A Dravet syndrome epilepsy infant", "max_results": 2})
+        assert server.stats["esearch"]["requests"] == 1 and server.stats["efetch"]["requests"] == 1
+        assert [a.pmid for a in near.items] == [a.pmid for a in first.items] and len(near.items) <= 2
+        assert near is not first and near.items[0] is not first.items[0]
+    print("[PASS] PubMed 近似命中")
+
+
+def test_errors_and_rate_limit():
+    """错误注入与令牌桶限流"""
+    config = StubServerConfig.from_dict({
+        "routes": {"hpo_search": {"error_rate": 1.0, "error_status": 500}},
+        "rate_limit_rps": 0.001,
+        "rate_limit_burst": 3,
+    })
+    with StubServerThread(config) as server:
+        with httpx.Client(base_url=server.base_url) as client:
+            statuses = [client.get("/hpo/api/hp/search", params={"q": "seizure"}).status_code for _ in range(3)]
+            limited = client.get("/litsense/api/", params={"query": "x"})
+        assert statuses == [500, 500, 500]
+        assert limited.status_code == 429
+        assert limited.headers["retry-after"] == "1"
+        assert server.stats["litsense"]["rate_limited"] == 1
+    print("[PASS] 错误注入与限流")
+
+
+def test_latency_distribution():
+    """延迟分布按配置生效"""
+    import time
+
+    config = StubServerConfig.from_dict({"default": {"latency": {"kind": "uniform", "low": 40, "high": 60}}})
+    with StubServerThread(config) as server:
+        with httpx.Client(base_url=server.base_url) as client:
+            start = time.perf_counter()
+            resp = client.get("/hpo/api/network/annotation/HP:9999999")
+            elapsed = time.perf_counter() - start
+        assert resp.status_code == 200
+        assert len(resp.json()["diseases"]) >= 5  # 未命中夹具时合成
+        assert elapsed >= 0.04
+    print("[PASS] 延迟分布")
+
+
+if __name__ == "__main__":
+    test_tools_against_stub()
+    test_pubmed_near_duplicate_hit()
+    test_errors_and_rate_limit()
+    test_latency_distribution()
+    print("\n所有测试通过")
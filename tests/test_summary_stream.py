@@ -0,0 +1,129 @@
+"""
+测试汇总节点的流式输出：跨 chunk 的 <ref> 标签收集，以及 custom 流事件顺序（离线 fake 模型）
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langgraph.graph import END, START, StateGraph
+
+from DeepRareAgent.utils.fake_llm import FakeChatModel
+
+_CONFIG = {
+    "summary_agent": {
+        "provider": "fake",
+        "system_prompt_path": "DeepRareAgent/prompts/03summary_prompt.txt",
+    },
+    "llm_cache": {"enabled": False},
+}
+
+REPORT = (
+    "## 候选诊断排序\n1. Dravet syndrome (OMIM:607208)<ref>group_1.1</ref>\n"
+    "2. GEFS+ (OMIM:604233)<ref>group_2.1</ref><ref>group_1.1</ref><ref>group_9.1</ref>\n"
+)
+
+
+class _ChunkedFakeModel(FakeChatModel):
+    """按固定字符数切分响应逐块流式返回，模拟 <ref> 标签被切断在两个 chunk 之间"""
+
+    chunk_chars: int = 5
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message, _ = self._pick(messages)
+        text = message.content
+        for i in range(0, len(text), self.chunk_chars):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + self.chunk_chars]))
+
+
+@pytest.fixture(autouse=True)
+def fake_settings(monkeypatch, tmp_path):
+    """就地替换进程级 settings 的内容（各模块顶层导入的是同一对象），测试结束后恢复"""
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(yaml.safe_dump(_CONFIG, allow_unicode=True), encoding="utf-8")
+    monkeypatch.setenv("DEEPRARE_CONFIG_PATH", str(config_file))
+    from DeepRareAgent.config import settings
+    from DeepRareAgent.config.loader import ConfigObject, cfg_loader
+
+    original = dict(settings.__dict__)
+    settings.__dict__.clear()
+    settings.__dict__.update(ConfigObject(_CONFIG, cfg_loader.project_root).__dict__)
+    yield settings
+    settings.__dict__.clear()
+    settings.__dict__.update(original)
+
+
+def test_ref_collector_split_tags():
+    """标签在任意位置被切断时仍能收集到（去重并保持出现顺序）"""
+    from DeepRareAgent.p03summary_agent import _RefCollector
+
+    for size in (1, 2, 3, 7, 11):
+        collector = _RefCollector()
+        for i in range(0, len(REPORT), size):
+            collector.feed(REPORT[i:i + size])
+        assert collector.keys == ["group_1.1", "group_2.1", "group_9.1"], size
+
+    # 不完整的标签或普通的 "<" 不会误收集，也不会让缓冲区无限增长
+    collector = _RefCollector()
+    for piece in ["a < b, <re", "f>group_1", ".x</ref> ", "<" + "x" * 100]:
+        collector.feed(piece)
+    assert collector.keys == [] and len(collector._pending) <= 64
+    print("[PASS] 跨 chunk 的引用标签")
+
+
+def test_summary_stream_events(monkeypatch):
+    """custom 流依次推送 summary_token*、summary_evidence、summary_done，内容与最终报告一致"""
+    import DeepRareAgent.p03summary_agent as summary_agent
+    from DeepRareAgent.schema import MainGraphState
+
+    model = _ChunkedFakeModel(default_response=REPORT)
+    monkeypatch.setattr(summary_agent, "create_llm_from_config", lambda cfg: model)
+
+    workflow = StateGraph(MainGraphState)
+    workflow.add_node("summary", summary_agent.summary_node)
+    workflow.add_edge(START, "summary")
+    workflow.add_edge("summary", END)
+    graph = workflow.compile()
+
+    state = {
+        "messages": [],
+        "blackboard": {"published_reports": {"group_1": "报告一", "group_2": "报告二"}, "conflicts": {}},
+        "expert_pool": {
+            "group_1": {"evidences": ["SCN1A 新发错义变异"]},
+            "group_2": {"evidences": ["热敏感性惊厥家族史"]},
+        },
+    }
+
+    async def _run():
+        events, final_report = [], None
+        async for mode, chunk in graph.astream(state, stream_mode=["custom", "updates"]):
+            if mode == "custom":
+                events.append(chunk)
+            elif "summary" in chunk:
+                final_report = chunk["summary"]["final_report"]
+        return events, final_report
+
+    events, final_report = asyncio.run(_run())
+    kinds = [e["event"] for e in events]
+    assert kinds[-2:] == ["summary_evidence", "summary_done"]
+    assert set(kinds[:-2]) == {"summary_token"} and len(kinds) - 2 > 10
+
+    streamed = "".join(e["content"] for e in events if e["event"] == "summary_token")
+    assert streamed == REPORT
+    evidence = events[-2]["content"]
+    assert "[group_1.1] SCN1A 新发错义变异" in evidence and "[group_2.1] 热敏感性惊厥家族史" in evidence
+    assert evidence.index("[group_1.1]") < evidence.index("[group_2.1]")
+    assert "group_9.1" not in evidence  # 不存在的引用只告警
+    assert final_report == REPORT + evidence
+    assert events[-1]["length"] == len(final_report)
+    print("[PASS] 汇总流式事件顺序")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
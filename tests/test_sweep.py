@@ -0,0 +1,112 @@
+"""
+测试配置扫描：变体展开、配置覆盖传递到工作进程、结果表与 Pareto 前沿
+"""
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from benchmarks.sweep import apply_overrides, cheapest_meeting, expand_variants, mark_pareto, run_sweep
+from DeepRareAgent.schema import MainGraphState
+
+
+def build_toy_graph():
+    """工作进程中构建：按变体配置的 max_rounds 决定输出 token 数与答案是否正确"""
+    from DeepRareAgent.config import settings
+    from DeepRareAgent.utils.fake_llm import FakeChatModel
+
+    rounds = settings.mdt_config.max_rounds
+    model = FakeChatModel(output_tokens=100 * rounds)
+
+    async def prediagnosis(state):
+        return {}
+
+    async def summary(state):
+        gold = state["summary_with_dialogue"].split()[-1]
+        answer = gold if rounds >= 2 else "OMIM:1"
+        message = await model.ainvoke([HumanMessage(content="summarize")])
+        return {"final_report": f"## 候选诊断排序\n1. {answer}\n", "messages": [message]}
+
+    workflow = StateGraph(MainGraphState)
+    workflow.add_node("prediagnosis", prediagnosis)
+    workflow.add_node("summary", summary)
+    workflow.add_edge(START, "prediagnosis")
+    workflow.add_conditional_edges("prediagnosis", lambda s: "summary" if s.get("start_diagnosis") else END)
+    workflow.add_edge("summary", END)
+    return workflow.compile(checkpointer=InMemorySaver())
+
+
+def test_expand_and_override():
+    spec = {
+        "variants": {"a": {"multi_expert_diagnosis_agent.group_2": None}, "b": {}},
+        "grid": {"mdt_config.max_rounds": [1, 3]},
+    }
+    variants = expand_variants(spec)
+    assert [name for name, _ in variants] == ["a,max_rounds=1", "a,max_rounds=3", "b,max_rounds=1", "b,max_rounds=3"]
+    base = {"mdt_config": {"max_rounds": 2}, "multi_expert_diagnosis_agent": {"group_1": {}, "group_2": {}}}
+    merged = apply_overrides(base, variants[1][1])
+    assert merged["mdt_config"]["max_rounds"] == 3
+    assert list(merged["multi_expert_diagnosis_agent"]) == ["group_1"]
+    assert base["multi_expert_diagnosis_agent"]["group_2"] == {}
+    print("[PASS] 变体展开与覆盖")
+
+
+def test_pareto_and_target():
+    rows = [
+        {"variant": "cheap", "cases": 10, "top1": 0.3, "tokens_mean": 100, "latency_p50_s": 1.0},
+        {"variant": "good", "cases": 10, "top1": 0.5, "tokens_mean": 300, "latency_p50_s": 2.0},
+        {"variant": "worse", "cases": 10, "top1": 0.5, "tokens_mean": 400, "latency_p50_s": 2.0},
+    ]
+    mark_pareto(rows)
+    assert [r["pareto"] for r in rows] == [True, True, False]
+    assert cheapest_meeting(rows, "top1", 0.4)["variant"] == "good"
+    assert cheapest_meeting(rows, "top1", 0.9) is None
+    print("[PASS] Pareto 前沿与目标选择")
+
+
+def test_run_sweep_in_workers():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        with open(tmp / "base.yml", "w", encoding="utf-8") as f:
+            yaml.safe_dump({"mdt_config": {"max_rounds": 3}}, f)
+        with open(tmp / "cases.jsonl", "w", encoding="utf-8") as f:
+            for i in range(6):
+                f.write(json.dumps({"case_id": f"c{i}", "description": f"病例 OMIM:{600000 + i}", "gold": f"OMIM:{600000 + i}"}) + "\n")
+        spec = {
+            "cases": str(tmp / "cases.jsonl"),
+            "limit": 4,
+            "base_config": str(tmp / "base.yml"),
+            "parallel": 2,
+            "concurrency": 2,
+            "grid": {"mdt_config.max_rounds": [1, 2]},
+        }
+        rows = run_sweep(spec, str(tmp / "out"), graph_factory="test_sweep:build_toy_graph")
+        by_name = {r["variant"]: r for r in rows}
+        assert by_name["base,max_rounds=1"]["top1"] == 0.0
+        assert by_name["base,max_rounds=2"]["top1"] == 1.0
+        assert by_name["base,max_rounds=1"]["cases"] == 4
+        assert by_name["base,max_rounds=2"]["tokens_mean"] > by_name["base,max_rounds=1"]["tokens_mean"]
+        assert all(r["pareto"] for r in rows)
+        config = yaml.safe_load((tmp / "out" / "base,max_rounds=1" / "config.yml").read_text(encoding="utf-8"))
+        assert config["llm_cache"]["enabled"] is True and config["mdt_config"]["max_rounds"] == 1
+        assert (tmp / "out" / "sweep.csv").exists()
+
+        # 再次运行时所有病例均已完成
+        rows_again = run_sweep(spec, str(tmp / "out"), graph_factory="test_sweep:build_toy_graph")
+        assert [r["top1"] for r in rows_again] == [r["top1"] for r in rows]
+    print("[PASS] 多进程运行变体并汇总结果表")
+
+
+if __name__ == "__main__":
+    test_expand_and_override()
+    test_pareto_and_target()
+    test_run_sweep_in_workers()
+    print("\n所有测试通过")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试惰性工具注册表
+验证导入工具包不会加载重量级依赖，工具在首次使用时才导入
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def _run_isolated(code: str) -> str:
+    """在独立子进程中执行，避免受其他测试已加载模块的影响"""
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=str(project_root),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+def test_import_is_lazy():
+    """测试导入 DeepRareAgent.tools 不加载 Biopython / wikipedia / MCP 适配器"""
+    output = _run_isolated(
+        "import sys\n"
+        "import DeepRareAgent.tools as tools\n"
+        "heavy = ['Bio', 'wikipedia', 'baidusearch', 'langchain_mcp_adapters', 'langchain_tavily']\n"
+        "print(','.join(m for m in heavy if m in sys.modules))\n"
+    )
+    assert output == "", f"导入工具包时不应加载: {output}"
+    print("[PASS] 工具包导入未加载重量级依赖")
+
+
+def test_registry_metadata_without_import():
+    """测试注册表元数据无需导入即可使用"""
+    from DeepRareAgent.tools import TOOL_REGISTRY, default_TOOL_EXCLUDE_LIST, list_tools
+
+    assert "search_pubmed" in TOOL_REGISTRY
+    assert "search_pubmed" in default_TOOL_EXCLUDE_LIST
+    assert "not_a_tool" not in default_TOOL_EXCLUDE_LIST
+    assert {spec.name for spec in list_tools("hpo")} == {"phenotype_to_hpo_tool", "hpo_to_diseases_tool"}
+    print("[PASS] 注册表元数据测试通过")
+
+
+def test_get_tool_loads_on_demand():
+    """测试按名称加载工具，并只导入对应模块"""
+    output = _run_isolated(
+        "import sys\n"
+        "from DeepRareAgent.tools import get_tool, is_tool_loaded\n"
+        "t = get_tool('extract_evidences')\n"
+        "print(t.name, is_tool_loaded('extract_evidences'), is_tool_loaded('search_pubmed'), 'Bio' in sys.modules)\n"
+    )
+    assert output == "extract_evidences True False False", output
+    print("[PASS] 按需加载测试通过")
+
+
+def test_unknown_tool_raises():
+    """测试未注册工具名抛出 ValueError"""
+    from DeepRareAgent.tools import resolve_tools
+
+    try:
+        resolve_tools(["extract_evidences", "not_a_tool"])
+    except ValueError as e:
+        assert "not_a_tool" in str(e)
+    else:
+        raise AssertionError("未注册工具应抛出 ValueError")
+    print("[PASS] 未注册工具测试通过")
+
+
+def test_graph_submodule_does_not_shadow_export():
+    """测试导入 graph 子模块时导入系统的绑定不会覆盖包的 graph 导出"""
+    code = (
+        "import sys, types\n"
+        "import DeepRareAgent\n"
+        "DeepRareAgent.graph = types.ModuleType('DeepRareAgent.graph')\n"
+        "DeepRareAgent.other = 1\n"
+        "print('graph' in vars(DeepRareAgent), DeepRareAgent.other, 'DeepRareAgent.graph' in sys.modules)\n"
+    )
+    assert _run_isolated(code) == "False 1 False"
+    print("[PASS] graph 子模块不覆盖主图导出")
+
+
+if __name__ == "__main__":
+    test_import_is_lazy()
+    test_registry_metadata_without_import()
+    test_get_tool_loads_on_demand()
+    test_unknown_tool_raises()
+    test_graph_submodule_does_not_shadow_export()
+    print("\n[PASS] 所有工具注册表测试通过！")
@@ -0,0 +1,213 @@
+"""
+测试节点 / LLM / 工具 span：span 树结构、属性、耗时拆分与三种导出器
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Annotated, Any, Dict
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from DeepRareAgent.utils.fake_llm import FakeChatModel
+from DeepRareAgent.utils.tracing import (
+    InMemorySpanExporter,
+    JsonlSpanExporter,
+    OTLPSpanExporter,
+    SpanTracer,
+    annotate_run,
+    read_spans,
+    span_breakdown,
+    to_otlp_json,
+)
+
+
+@tool
+def lookup_gene(symbol: str) -> str:
+    """查询基因"""
+    return f"{symbol}: 致病基因"
+
+
+class ToyState(TypedDict, total=False):
+    messages: Annotated[list, add_messages]
+    round_count: int
+
+
+def build_toy_graph():
+    """prediagnosis（LLM + 工具）-> mdt_diagnosis 子图（group_1 调用 LLM）"""
+    llm = FakeChatModel(default_response="初步印象", output_tokens=5, latency_ms=20)
+
+    async def prediagnosis(state):
+        reply = await llm.ainvoke(state["messages"])
+        await lookup_gene.ainvoke({"symbol": "DMD"})
+        return {"messages": [reply]}
+
+    async def group_1(state):
+        reply = await llm.ainvoke(state["messages"])
+        return {"messages": [reply], "round_count": state.get("round_count", 0) + 1}
+
+    sub = StateGraph(ToyState)
+    sub.add_node("group_1", group_1)
+    sub.add_edge(START, "group_1")
+    sub.add_edge("group_1", END)
+
+    main = StateGraph(ToyState)
+    main.add_node("prediagnosis", prediagnosis)
+    main.add_node("mdt_diagnosis", sub.compile())
+    main.add_edge(START, "prediagnosis")
+    main.add_edge("prediagnosis", "mdt_diagnosis")
+    main.add_edge("mdt_diagnosis", END)
+    return main.compile()
+
+
+def _run_traced(tracer):
+    graph = build_toy_graph()
+    config = {"callbacks": [tracer], "configurable": {"thread_id": "t-1"}}
+    asyncio.run(graph.ainvoke({"messages": [HumanMessage(content="孩子走路不稳")], "round_count": 0}, config))
+
+
+def test_span_tree_and_attributes():
+    """图 -> 节点 -> LLM / 工具 的父子关系，以及 token、大小等属性"""
+    memory = InMemorySpanExporter()
+    _run_traced(SpanTracer([memory]))
+    spans = memory.spans
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["name"], []).append(span)
+
+    roots = [s for s in spans if s["kind"] == "graph"]
+    assert len(roots) == 1 and roots[0]["parent_id"] is None
+    assert len({s["trace_id"] for s in spans}) == 1
+
+    pre = by_name["prediagnosis"][0]
+    group = by_name["group_1"][0]
+    mdt = by_name["mdt_diagnosis"][0]
+    assert pre["kind"] == "node" and pre["parent_id"] == roots[0]["span_id"]
+    assert pre["attributes"]["thread_id"] == "t-1"
+    assert group["attributes"]["mdt_round"] == 0
+    # 子图节点挂在 mdt_diagnosis 节点之下（中间的子图运行不生成 span）
+    assert group["parent_id"] == mdt["span_id"]
+
+    llm_spans = [s for s in spans if s["kind"] == "llm"]
+    assert len(llm_spans) == 2
+    assert {s["parent_id"] for s in llm_spans} == {pre["span_id"], group["span_id"]}
+    assert all(s["attributes"]["output_tokens"] == 5 and s["attributes"]["request_bytes"] > 0 for s in llm_spans)
+    assert all(s["attributes"]["response_cache_hit"] is False for s in llm_spans)
+
+    tool_span = by_name["tool:lookup_gene"][0]
+    assert tool_span["parent_id"] == pre["span_id"]
+    assert tool_span["attributes"]["response_bytes"] > 0 and tool_span["status"] == "ok"
+    print("[PASS] test_span_tree_and_attributes")
+
+
+def test_breakdown():
+    """节点耗时拆成 LLM / 工具 / 其余，且 LLM 时间不超过节点耗时"""
+    memory = InMemorySpanExporter()
+    _run_traced(SpanTracer([memory]))
+    breakdown = span_breakdown(memory.spans)
+    pre = breakdown["prediagnosis"]
+    assert pre["count"] == 1 and pre["llm_calls"] == 1 and pre["tool_calls"] == 1
+    assert 0.015 <= pre["llm_s"] <= pre["total_s"]
+    assert breakdown["mdt_diagnosis"]["llm_calls"] == 1  # 递归统计子图内的 LLM
+    print("[PASS] test_breakdown")
+
+
+def test_annotate_run():
+    """annotate_run 给进行中的 span 补充属性；对未知 run_id 无副作用"""
+    from uuid import uuid4
+
+    memory = InMemorySpanExporter()
+    tracer = SpanTracer([memory])
+    run_id = uuid4()
+    tracer.on_chat_model_start({}, [[HumanMessage(content="你好")]], run_id=run_id,
+                                invocation_params={"model": "m"})
+    annotate_run(run_id, queue_wait_s=0.25)
+    annotate_run(uuid4(), queue_wait_s=9.0)
+    tracer.on_llm_error(RuntimeError("429"), run_id=run_id)
+    span = memory.spans[0]
+    assert span["name"] == "llm:m" and span["attributes"]["queue_wait_s"] == 0.25
+    assert span["status"] == "error" and "429" in span["error"]
+    print("[PASS] test_annotate_run")
+
+
+def test_jsonl_and_otlp_exporters():
+    """JSONL 文件可读回；OTLP 导出器向接收端 POST 合法的 JSON"""
+    received = []
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append((self.path, json.loads(self.rfile.read(int(self.headers["Content-Length"])))))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "traces" / "spans.jsonl"
+            otlp = OTLPSpanExporter(f"http://127.0.0.1:{server.server_address[1]}", interval=0.05)
+            tracer = SpanTracer([JsonlSpanExporter(str(path)), otlp])
+            _run_traced(tracer)
+            tracer.shutdown()
+            spans = read_spans(str(path))
+    finally:
+        server.shutdown()
+
+    assert {s["name"] for s in spans} >= {"prediagnosis", "group_1", "tool:lookup_gene"}
+    assert received and all(p == "/v1/traces" for p, _ in received)
+    otlp_spans = [s for _, body in received for s in body["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+    assert len(otlp_spans) == len(spans)
+    encoded = to_otlp_json(spans)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    llm = next(s for s in encoded if s["name"].startswith("llm:"))
+    attrs = {a["key"]: a["value"] for a in llm["attributes"]}
+    assert attrs["output_tokens"] == {"intValue": "5"} and len(llm["traceId"]) == 32 and len(llm["spanId"]) == 16
+    print("[PASS] test_jsonl_and_otlp_exporters")
+
+
+def test_jsonl_writes_off_event_loop():
+    """JSONL 文件在后台线程中批量写入，flush 后按导出顺序全部落盘"""
+    writer_threads = []
+
+    class RecordingExporter(JsonlSpanExporter):
+        def _write(self, lines):
+            writer_threads.append(threading.current_thread().name)
+            super()._write(lines)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "spans.jsonl"
+        exporter = RecordingExporter(str(path))
+
+        async def _export():
+            for i in range(200):
+                exporter.export({"span_id": f"{i:016x}", "name": f"span {i}"})
+
+        asyncio.run(_export())
+        exporter.flush()
+        spans = read_spans(str(path))
+        exporter.export({"span_id": "last", "name": "after flush"})
+        exporter.shutdown()
+        assert read_spans(str(path))[-1]["span_id"] == "last"
+
+    assert [s["name"] for s in spans] == [f"span {i}" for i in range(200)]
+    assert writer_threads and set(writer_threads) == {"jsonl-span-exporter"}
+    print("[PASS] test_jsonl_writes_off_event_loop")
+
+
+if __name__ == "__main__":
+    test_span_tree_and_attributes()
+    test_breakdown()
+    test_annotate_run()
+    test_jsonl_and_otlp_exporters()
+    test_jsonl_writes_off_event_loop()
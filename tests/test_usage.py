@@ -0,0 +1,127 @@
+"""
+测试 token 与费用统计：按线程 / 节点 / 专家组 / 子代理 / 轮次归类，费用估算与 Prometheus 输出
+"""
+import asyncio
+import sys
+from pathlib import Path
+from typing import Annotated
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from DeepRareAgent.utils.fake_llm import FakeChatModel
+from DeepRareAgent.utils.usage import UsageTracker, estimate_cost, render_prometheus
+
+PRICES = [{"match": "fake-sub", "input": 2.0, "output": 4.0}, {"match": "fake", "input": 1.0, "output": 2.0}]
+
+llm = FakeChatModel(model_name="fake-main", default_response="好的", output_tokens=10)
+sub_llm = FakeChatModel(model_name="fake-sub", default_response="子代理结论", output_tokens=20)
+
+
+@tool
+async def task(description: str, subagent_type: str) -> str:
+    """调用子代理"""
+    return (await sub_llm.ainvoke(description)).content
+
+
+class ToyState(TypedDict, total=False):
+    messages: Annotated[list, add_messages]
+    round_count: int
+
+
+def build_toy_graph():
+    async def prediagnosis(state):
+        return {"messages": [await llm.ainvoke(state["messages"])]}
+
+    async def group_1(state):
+        await task.ainvoke({"description": "查文献", "subagent_type": "literature"})
+        return {"messages": [await llm.ainvoke(state["messages"])]}
+
+    async def group_2(state):
+        return {"messages": [await llm.ainvoke(state["messages"])]}
+
+    async def expert_review(state):
+        await llm.ainvoke(state["messages"])
+        return {"round_count": state.get("round_count", 0) + 1}
+
+    def fan_out(state):
+        return {}
+
+    def route(state):
+        return "again" if state["round_count"] < 2 else "done"
+
+    sub = StateGraph(ToyState)
+    for name, fn in (("fan_out", fan_out), ("group_1", group_1), ("group_2", group_2), ("expert_review", expert_review)):
+        sub.add_node(name, fn)
+    sub.add_edge(START, "fan_out")
+    sub.add_edge("fan_out", "group_1")
+    sub.add_edge("fan_out", "group_2")
+    sub.add_edge(["group_1", "group_2"], "expert_review")
+    sub.add_conditional_edges("expert_review", route, {"again": "fan_out", "done": END})
+
+    main = StateGraph(ToyState)
+    main.add_node("prediagnosis", prediagnosis)
+    main.add_node("mdt_diagnosis", sub.compile())
+    main.add_edge(START, "prediagnosis")
+    main.add_edge("prediagnosis", "mdt_diagnosis")
+    main.add_edge("mdt_diagnosis", END)
+    return main.compile()
+
+
+def _run(tracker, thread_id):
+    config = {"callbacks": [tracker], "configurable": {"thread_id": thread_id}}
+    asyncio.run(build_toy_graph().ainvoke({"messages": [HumanMessage(content="孩子走路不稳")], "round_count": 0}, config))
+
+
+def test_breakdown_by_dimension():
+    """两轮 MDT：各维度调用次数与 token 合计一致"""
+    tracker = UsageTracker(prices=PRICES)
+    _run(tracker, "t-1")
+    usage = tracker.thread_usage("t-1")
+    total = usage["total"]
+    # prediagnosis 1 + 每轮（group_1 2 次含子代理 + group_2 1 次 + expert_review 1 次）× 2 轮
+    assert usage["by_node"]["prediagnosis"]["llm_calls"] == 1
+    assert usage["by_node"]["group_1"]["llm_calls"] == 4
+    assert usage["by_node"]["group_2"]["llm_calls"] == 2
+    assert usage["by_node"]["expert_review"]["llm_calls"] == 2
+    assert total["llm_calls"] == 9
+    assert usage["by_group"]["group_1"]["llm_calls"] == 4 and "expert_review" not in usage["by_group"]
+    assert usage["by_subagent"] == {"literature": usage["by_subagent"]["literature"]}
+    assert usage["by_subagent"]["literature"]["llm_calls"] == 2
+    assert usage["by_round"]["1"]["llm_calls"] == 4 and usage["by_round"]["2"]["llm_calls"] == 4
+    assert usage["by_model"]["fake-sub"]["output_tokens"] == 40
+    assert total["output_tokens"] == 7 * 10 + 2 * 20
+    for dim in ("by_node", "by_model"):
+        assert sum(b["input_tokens"] for b in usage[dim].values()) == total["input_tokens"]
+    assert total["unpriced_calls"] == 0 and total["cost_usd"] > 0
+    assert tracker.thread_usage("unknown")["total"]["llm_calls"] == 0
+    print("[PASS] test_breakdown_by_dimension")
+
+
+def test_cost_threads_and_metrics():
+    """费用按最先匹配的价格计算；线程分开统计，进程级指标累加"""
+    assert estimate_cost(PRICES, "fake-sub", 1_000_000, 500_000) == 2.0 + 2.0
+    assert estimate_cost([{"match": "m", "input": 1.0, "cached_input": 0.1, "output": 0}], "m", 1000, 0, 1000) == 0.0001
+    assert estimate_cost(PRICES, "gpt", 10, 10) is None
+
+    tracker = UsageTracker(prices=PRICES[1:], max_threads=1, budget_usd_per_thread=1e-9)
+    _run(tracker, "a")
+    _run(tracker, "b")
+    assert tracker.thread_usage("a")["total"]["llm_calls"] == 0  # 超出 max_threads 被淘汰
+    assert tracker.thread_usage("b")["total"]["llm_calls"] == 9
+    metrics = tracker.metrics()
+    assert metrics["total"]["llm_calls"] == 18 and metrics["by_round"] == {}
+    text = render_prometheus(metrics)
+    assert 'deeprare_llm_calls_total{group="group_1"} 8' in text
+    assert 'deeprare_llm_tokens_total{model="fake-sub",type="output"} 80' in text
+    print("[PASS] test_cost_threads_and_metrics")
+
+
+if __name__ == "__main__":
+    test_breakdown_by_dimension()
+    test_cost_threads_and_metrics()
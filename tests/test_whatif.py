@@ -0,0 +1,180 @@
+"""
+测试检查点分叉：从第 1 轮互审之前 / 汇总之前分叉，只重跑下游节点（离线 fake 模型）
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# 下游节点通过 settings 创建模型：测试期间换成一份只含 fake 模型的配置
+_CONFIG = {
+    "multi_expert_diagnosis_agent": {
+        "group_1": {"main_agent": {
+            "provider": "fake",
+            "rules": [{"match": ".", "response": '{"is_satisfied": false, "reinvestigate_reason": "需要补充基因检测"}'}],
+        }},
+    },
+    "mdt_config": {"max_rounds": 3, "reviewer_output_mode": "tool"},
+    "summary_agent": {
+        "provider": "fake",
+        "default_response": "## 候选诊断排序\n1. Dravet syndrome (OMIM:607208)\n",
+        "system_prompt_path": "DeepRareAgent/prompts/03summary_prompt.txt",
+    },
+    "llm_cache": {"enabled": False},
+}
+
+
+@pytest.fixture(autouse=True)
+def fake_settings(monkeypatch, tmp_path):
+    """就地替换进程级 settings 的内容（各模块顶层导入的是同一对象），测试结束后恢复"""
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(yaml.safe_dump(_CONFIG, allow_unicode=True), encoding="utf-8")
+    # 没有 config.yml 的环境中，首次导入 DeepRareAgent.config 时从这份临时配置加载
+    monkeypatch.setenv("DEEPRARE_CONFIG_PATH", str(config_file))
+    from DeepRareAgent.config import settings
+    from DeepRareAgent.config.loader import ConfigObject, cfg_loader
+
+    original = dict(settings.__dict__)
+    settings.__dict__.clear()
+    settings.__dict__.update(ConfigObject(_CONFIG, cfg_loader.project_root).__dict__)
+    yield settings
+    settings.__dict__.clear()
+    settings.__dict__.update(original)
+
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from benchmarks.whatif import load_boundary_state, override_settings, run_what_if
+from DeepRareAgent.schema import MainGraphState, MDTGraphState
+
+
+def build_source_graph():
+    """与主图同名节点的最小源图：MDT 子图跑两轮（专家组与互审均为脚本节点）"""
+
+    def group_1(state):
+        n = state.get("round_count", 0) + 1
+        expert = {**state["expert_pool"]["group_1"], "report": f"第 {n} 轮报告"}
+        expert["messages"] = expert["messages"] + [AIMessage(content=f"第 {n} 轮报告")]
+        return {"expert_pool": {"group_1": expert}}
+
+    def expert_review(state):
+        return {
+            "round_count": state.get("round_count", 0) + 1,
+            "blackboard": {"published_reports": {"group_1": state["expert_pool"]["group_1"]["report"]}, "conflicts": {}},
+        }
+
+    mdt = StateGraph(MDTGraphState)
+    mdt.add_node("group_1", group_1)
+    mdt.add_node("expert_review", expert_review)
+    mdt.add_edge(START, "group_1")
+    mdt.add_edge("group_1", "expert_review")
+    mdt.add_conditional_edges("expert_review", lambda s: "group_1" if s["round_count"] < 2 else END)
+
+    def prepare_mdt(state):
+        return {
+            "expert_pool": {"group_1": {"group_id": "group_1", "messages": [AIMessage(content="病例")], "report": "",
+                                        "evidences": [], "is_satisfied": False, "has_error": False}},
+            "round_count": 0,
+            "max_rounds": 2,
+        }
+
+    main = StateGraph(MainGraphState)
+    main.add_node("prepare_mdt", prepare_mdt)
+    main.add_node("mdt_diagnosis", mdt.compile())
+    main.add_node("summary", lambda s: {"final_report": "original report"})
+    main.add_edge(START, "prepare_mdt")
+    main.add_edge("prepare_mdt", "mdt_diagnosis")
+    main.add_edge("mdt_diagnosis", "summary")
+    main.add_edge("summary", END)
+    return main.compile(checkpointer=InMemorySaver())
+
+
+async def _source():
+    graph = build_source_graph()
+    await graph.ainvoke({"messages": [], "summary_style": "原始风格", "patient_portrait": "患者画像"},
+                        {"configurable": {"thread_id": "src"}})
+    return graph
+
+
+def test_load_boundaries():
+    async def _run():
+        graph = await _source()
+        round_1 = await load_boundary_state(graph, "src", "expert_review", 1)
+        assert round_1["round_count"] == 0 and round_1["expert_pool"]["group_1"]["report"] == "第 1 轮报告"
+        assert round_1["summary_style"] == "原始风格"
+        round_2 = await load_boundary_state(graph, "src", "expert_review", 2)
+        assert round_2["expert_pool"]["group_1"]["report"] == "第 2 轮报告"
+        before_summary = await load_boundary_state(graph, "src", "summary")
+        assert before_summary["round_count"] == 2 and not before_summary.get("final_report")
+        try:
+            await load_boundary_state(graph, "src", "expert_review", 3)
+            assert False, "第 3 轮不存在"
+        except ValueError:
+            pass
+
+    asyncio.run(_run())
+    print("[PASS] 定位节点边界")
+
+
+def test_fork_reruns_only_downstream():
+    async def _run():
+        graph = await _source()
+        result = await run_what_if(
+            graph, "src", at="expert_review", round_index=1,
+            state_overrides={"summary_style": "只列候选诊断"},
+        )
+        assert result["llm_calls"] == 2  # 互审 + 汇总
+        assert result["verdicts"]["group_1"] == {"is_satisfied": False, "reinvestigate_reason": "需要补充基因检测"}
+        assert result["predictions"] == ["Dravet syndrome (OMIM:607208)"]
+        fork = await graph.aget_state({"configurable": {"thread_id": result["fork_thread_id"]}})
+        assert fork.values["summary_style"] == "只列候选诊断"
+        # 源线程不受影响
+        source = await graph.aget_state({"configurable": {"thread_id": "src"}})
+        assert source.values["final_report"] == "original report"
+
+        result = await run_what_if(
+            graph, "src", at="summary",
+            settings_overrides={"summary_agent.default_response": "## 候选诊断排序\n1. GEFS+ (OMIM:604233)\n"},
+        )
+        assert result["llm_calls"] == 1
+        assert result["predictions"] == ["GEFS+ (OMIM:604233)"]
+
+    asyncio.run(_run())
+    print("[PASS] 分叉后只重跑下游节点")
+
+
+def test_override_settings_restores():
+    from DeepRareAgent.config import settings
+
+    with override_settings({"mdt_config.max_rounds": 1, "mdt_config.new_flag": {"a": 1}}):
+        assert settings.mdt_config.max_rounds == 1 and settings.mdt_config.new_flag.a == 1
+    assert settings.mdt_config.max_rounds == 3 and not hasattr(settings.mdt_config, "new_flag")
+    print("[PASS] 配置覆盖退出后恢复")
+
+
+def test_override_settings_resolves_paths():
+    from DeepRareAgent.config import settings
+    from DeepRareAgent.config.loader import cfg_loader
+
+    relative = "DeepRareAgent/prompts/02deepagent_reviewer_prompt.txt"
+    with override_settings({"mdt_config.reviewer_prompt_path": relative}):
+        assert settings.mdt_config.reviewer_prompt_path == str(cfg_loader.project_root / relative)
+    assert not hasattr(settings.mdt_config, "reviewer_prompt_path")
+
+    # 提示词文件不存在时报错，已应用的覆盖同样恢复
+    with pytest.raises(FileNotFoundError):
+        with override_settings({"mdt_config.max_rounds": 1,
+                                "mdt_config.reviewer_prompt_path": "prompts/reviewer_v2.txt"}):
+            pass
+    assert settings.mdt_config.max_rounds == 3 and not hasattr(settings.mdt_config, "reviewer_prompt_path")
+    print("[PASS] 配置覆盖按项目根目录解析路径")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))